@@ -8,6 +8,7 @@
 #include <windows.h>
 #include <cstdint>
 #include <cstdio>
+#include <cstdlib>
 #include <cstring>
 #include <string>
 #include <memory>
@@ -20,17 +21,279 @@ struct ShmHeader {
     uint32_t bpp;         // 8/24/32...
     uint32_t stride;      // 4byte align
     uint64_t frame_id;    // +1 / frame
+    uint64_t timestamp_us; // SHM_FLAG_HIRES_TS: QPC の µs（キャプチャ完了時点）
+    uint32_t seq;         // seqlock: 奇数=書き込み中 / 偶数=確定
+    uint32_t flags;       // SHM_FLAG_*（旧 reserved。0 = 従来どおり）
+};
+// 版 2（SHM_FLAG_EXT_HEADER）: ShmHeader の直後に置く。ピクセルは header_size から（読み手は sonycam/header.py）
+struct ShmHeaderExt {
+    uint32_t version;      // 2
+    uint32_t header_size;  // ピクセル領域の先頭 offset（64 = キャッシュライン境界）
+    uint64_t segment_size; // マッピング全体のバイト数
+    uint32_t pixel_format; // GenICam PFNC のコード（Mono8 / BayerXX8 / BGR8 / BGRa8）
+};
+#pragma pack(pop)
+static_assert(sizeof(ShmHeader) + sizeof(ShmHeaderExt) == 64, "CBRG v2 header must be 64 bytes");
+
+// ShmHeader.flags / RingHeader.flags
+static const uint32_t SHM_FLAG_BOTTOM_UP = 0x1;   // 行が下から上（biHeight > 0 の DIB）
+// timestamp_us は QueryPerformanceCounter の µs（Python の time.perf_counter_ns() // 1000 と同じ時計）。
+// Capture() が返った直後（共有メモリへのコピー前）に取る。無ければ旧来の GetTickCount64() * 1000
+static const uint32_t SHM_FLAG_HIRES_TS = 0x2;
+static const uint32_t SHM_FLAG_EXT_HEADER = 0x4;  // ShmHeaderExt あり（環境変数 CAM1_HEADER_VERSION=1 で旧 44B）
+// ビット 8..11: Bayer の CFA 並び（0 = 非 Bayer / 1 RG / 2 GR / 3 GB / 4 BG。読み手は sonycam/bayer.py）
+static const uint32_t SHM_CFA_SHIFT = 8;
+// 見張り（sonycam/watchdog.py）が止まった / 落ちたと判断した時に立てる。引き継いだブリッジが消す
+static const uint32_t SHM_FLAG_STALE = 0x8;
+// ビット 16..31: epoch。見張りが開いたままの同じ幾何のセグメントを引き継ぐたびに +1（frame_id は続きから）
+static const uint32_t SHM_EPOCH_SHIFT = 16;
+
+// ===== seqlock 手順（読み手は sonycam/reader.py の read_frame）=====
+// 書き手: seq を奇数にする → px/frame_id/timestamp_us を書く → seq を偶数にする
+// 読み手: s1=seq（奇数なら待つ）→ コピー → s2=seq。s1==s2 の時だけ採用（違えば捨てて再試行）
+// seq は offset 36 で 4byte 境界に乗るので Interlocked で読み書きできる（フルバリア）
+static inline void seq_store(volatile uint32_t* p, uint32_t v) {
+    InterlockedExchange(reinterpret_cast<volatile LONG*>(p), static_cast<LONG>(v));
+}
+
+// ===== リング形式 'CBRR'（環境変数 CAM1_RING_SLOTS=N, N>=2 の時だけ。読み手は sonycam/ring.py）=====
+// [RingHeader 64B][SlotHeader 32B x N][pad → 4096][slot 0]...[slot N-1]
+// frame_id f は slot (f-1)%N。スロットごとに state で seqlock、確定後に write_index = f
+#pragma pack(push,1)
+struct RingHeader {
+    uint32_t magic;       // 'CBRR' = 0x52524243（初期化の最後に書く）
+    uint32_t version;     // 1
+    uint32_t nslots;
+    uint32_t width, height;
+    uint32_t bpp;
+    uint32_t stride;
+    uint32_t flags;       // SHM_FLAG_*
+    uint64_t slot_pitch;  // スロット間バイト数（4096 境界）
+    uint64_t data_offset; // slot 0 の先頭
+    uint64_t write_index; // 公開済みの最新 frame_id
+    uint64_t reserved1;
+};
+struct SlotHeader {
+    uint64_t frame_id;
     uint64_t timestamp_us;
+    uint32_t state;       // seqlock: 奇数=書き込み中 / 偶数=確定
+    uint32_t reserved0;
+    uint64_t reserved1;
+};
+#pragma pack(pop)
+
+// ===== テレメトリページ 'CBRT'（"<名前>_telemetry"、128B。読み手は sonycam/telemetry.py）=====
+// フレームごとに seqlock（seq 奇数 → 全フィールド → seq 偶数）で書く。fps と *_avg/*_max は直近 1 秒の窓
+#pragma pack(push,1)
+struct TelemetryPage {
+    uint32_t magic;       // 'CBRT' = 0x54524243（初期化の最後に書く）
+    uint32_t version;     // 1
     uint32_t seq;
-    uint32_t reserved;
+    uint32_t pid;
+    uint64_t updated_us;  // qpc_us()
+    uint64_t frames;      // 成功したキャプチャ数
+    uint64_t failed;      // 失敗したキャプチャ数
+    uint64_t zero_frames; // probe が全部 0 のフレーム数
+    uint64_t saturated_frames; // probe の 99% 以上が 255 のフレーム数
+    uint32_t fps_milli;
+    uint32_t capture_us_last, capture_us_avg, capture_us_max;
+    uint32_t copy_us_last, copy_us_avg, copy_us_max;
+    uint32_t probe_bytes;
+    uint64_t probe_sum;   // 先頭 64KB の合計（SUM 行と同じ）
+    uint32_t zero_ppm;    // probe 中の 0 の割合 [ppm]
+    uint32_t sat_ppm;     // probe 中の 255 の割合 [ppm]
+    uint64_t started_us;
+    uint64_t reserved[2];
 };
 #pragma pack(pop)
+static_assert(sizeof(TelemetryPage) == 128, "TelemetryPage must be 128 bytes");
+
+// ===== 制御ページ 'CBRC'（"<名前>_control"。読み手は sonycam/control.py）=====
+// 読み手がスロットに要求（SET / GET）を書いて state を PENDING にし、ブリッジは Capture の前に答えて DONE にする。
+// effective_frame は新しい設定で撮られる最初の frame_id（次のフレーム + lag。lag は CAM1_CONTROL_LAG、既定 1:
+// 設定した時点でドライバに溜まっていて、もう露光の済んだフレームの数）
+#pragma pack(push,1)
+struct ControlPage {
+    uint32_t magic;       // 'CBRC' = 0x43524243（初期化の最後に書く）
+    uint32_t version;     // 1
+    uint32_t nslots;
+    uint32_t pid;
+    uint32_t caps;        // 受け付ける設定（1 << CTRL_KEY_*）
+    uint32_t lag;
+    uint32_t next_id;     // 読み手がスロットの確保と一緒に進める
+    uint32_t reserved0;
+    uint64_t served;      // 答えた数
+    uint64_t started_us;
+    uint64_t reserved[2];
+};
+struct ControlSlot {
+    uint32_t state;       // 0 FREE / 1 CLAIMED / 2 PENDING / 3 DONE
+    uint32_t request_id;
+    uint16_t op;          // 1 SET / 2 GET
+    uint16_t key;         // CTRL_KEY_*
+    int32_t  status;      // CTRL_STATUS_*
+    uint32_t pid;
+    uint32_t reserved0;
+    uint64_t stamp_us;    // qpc_us()
+    uint64_t effective_frame;
+    double   value[4];    // 要求の値 → 応答では採った値
+    uint64_t reserved1;
+};
+#pragma pack(pop)
+static_assert(sizeof(ControlPage) == 64 && sizeof(ControlSlot) == 80, "CBRC layout");
+static const uint32_t CTRL_NSLOTS = 16;
+static const uint32_t CTRL_PENDING = 2, CTRL_DONE = 3;
+static const uint16_t CTRL_OP_SET = 1, CTRL_OP_GET = 2;
+enum { CTRL_KEY_EXPOSURE_US = 1, CTRL_KEY_GAIN_DB = 2, CTRL_KEY_ROI = 3, CTRL_KEY_TRIGGER = 4,
+       CTRL_KEY_PIXEL_FORMAT = 5 };
+enum { CTRL_STATUS_OK = 0, CTRL_STATUS_UNSUPPORTED = 1, CTRL_STATUS_INVALID = 2, CTRL_STATUS_FAILED = 3,
+       CTRL_STATUS_RESTART = 4 };
+
+// 今の設定（初期値は main の SetFeature と同じ）
+struct CamSettings {
+    double exposureUs, gainDb;
+    double offX, offY;
+    double trigger;
+};
+
+// QPC → µs（counter * 1e6 が 64bit を溢れないよう商と余りに分ける）
+static uint64_t qpc_us() {
+    static LARGE_INTEGER freq = {};
+    if (!freq.QuadPart) QueryPerformanceFrequency(&freq);
+    LARGE_INTEGER c;
+    QueryPerformanceCounter(&c);
+    const uint64_t f = (uint64_t)freq.QuadPart, v = (uint64_t)c.QuadPart;
+    return (v / f) * 1000000ULL + (v % f) * 1000000ULL / f;
+}
+
+static inline size_t align_page(size_t n) { return (n + 4095) & ~(size_t)4095; }
+
+static uint32_t ring_slots_from_env() {
+    char buf[16];
+    DWORD k = GetEnvironmentVariableA("CAM1_RING_SLOTS", buf, sizeof(buf));
+    if (k == 0 || k >= sizeof(buf)) return 0;
+    uint32_t n = (uint32_t)std::strtoul(buf, nullptr, 10);
+    return (n >= 2) ? n : 0;
+}
+
+// ===== 画素形式（環境変数 CAM1_PIXEL_FORMAT。既定 RGB8Packed）=====
+// BayerRG8 / BayerGR8 / BayerGB8 / BayerBG8 なら生値（8bpp）をそのまま載せ、demosaic は読み手が行う。
+// 転送量は RGB8 の 1/3
+static std::string pixel_format_from_env() {
+    char buf[32];
+    DWORD k = GetEnvironmentVariableA("CAM1_PIXEL_FORMAT", buf, sizeof(buf));
+    if (k == 0 || k >= sizeof(buf)) return "RGB8Packed";
+    return std::string(buf, k);
+}
+
+static uint32_t cfa_code(const std::string& pf) {
+    static const char* const names[] = { "BayerRG8", "BayerGR8", "BayerGB8", "BayerBG8" };
+    for (uint32_t i = 0; i < 4; ++i)
+        if (pf == names[i]) return i + 1;
+    return 0;
+}
+
+// ===== ヘッダの版（環境変数 CAM1_HEADER_VERSION。既定 2、1 で旧ブリッジと同じ 44 バイトのヘッダ）=====
+static uint32_t header_version_from_env() {
+    char buf[8];
+    DWORD k = GetEnvironmentVariableA("CAM1_HEADER_VERSION", buf, sizeof(buf));
+    if (k == 0 || k >= sizeof(buf)) return 2;
+    return (std::strtoul(buf, nullptr, 10) == 1) ? 1 : 2;
+}
+
+// bpp / CFA → GenICam PFNC のコード
+static uint32_t pfnc_code(uint32_t bpp, uint32_t cfa) {
+    static const uint32_t bayer[] = { 0x01080009, 0x01080008, 0x0108000A, 0x0108000B };  // RG GR GB BG
+    if (bpp == 8) return cfa ? bayer[cfa - 1] : 0x01080001;    // Mono8
+    if (bpp == 24) return 0x02180015;                          // BGR8（DIB）
+    if (bpp == 32) return 0x02200017;                          // BGRa8
+    return 0;
+}
+
+static uint32_t control_lag_from_env() {
+    char buf[8];
+    DWORD k = GetEnvironmentVariableA("CAM1_CONTROL_LAG", buf, sizeof(buf));
+    if (k == 0 || k >= sizeof(buf)) return 1;
+    return (uint32_t)std::strtoul(buf, nullptr, 10);
+}
 
 static inline uint32_t aligned_stride(uint32_t w, uint32_t bppBits) {
     const uint32_t bytes = bppBits / 8;
     return ((w * bytes + 3) / 4) * 4;
 }
 
+// 要求 1 件を適用する -> CTRL_STATUS_*。v は応答の値（採った値）に書き換える
+// 幅・高さ・画素形式はマッピングの幾何が変わるので受けない（起動し直し）。ROI はオフセットだけ動かす
+static int32_t apply_control(CSonyCam* cam, CamSettings& cur, uint16_t op, uint16_t key, double* v,
+                             uint32_t W, uint32_t H, uint32_t pfnc) {
+    switch (key) {
+    case CTRL_KEY_EXPOSURE_US:
+        if (op == CTRL_OP_SET) {
+            if (!(v[0] >= 10.0 && v[0] <= 10e6)) { v[0] = cur.exposureUs; return CTRL_STATUS_INVALID; }
+            cam->SetFeature("ExposureTime", v[0]);
+            cur.exposureUs = v[0];
+        }
+        v[0] = cur.exposureUs;
+        return CTRL_STATUS_OK;
+    case CTRL_KEY_GAIN_DB:
+        if (op == CTRL_OP_SET) {
+            if (!(v[0] >= 0.0 && v[0] <= 48.0)) { v[0] = cur.gainDb; return CTRL_STATUS_INVALID; }
+            cam->SetFeature("Gain", v[0]);
+            cur.gainDb = v[0];
+        }
+        v[0] = cur.gainDb;
+        return CTRL_STATUS_OK;
+    case CTRL_KEY_ROI: {
+        int32_t st = CTRL_STATUS_OK;
+        if (op == CTRL_OP_SET) {
+            if (v[2] != (double)W || v[3] != (double)H) st = CTRL_STATUS_RESTART;
+            else if (v[0] < 0.0 || v[1] < 0.0) st = CTRL_STATUS_INVALID;
+            else {
+                cam->SetFeature("OffsetX", v[0]);
+                cam->SetFeature("OffsetY", v[1]);
+                cur.offX = v[0]; cur.offY = v[1];
+            }
+        }
+        v[0] = cur.offX; v[1] = cur.offY; v[2] = W; v[3] = H;
+        return st;
+    }
+    case CTRL_KEY_TRIGGER:
+        if (op == CTRL_OP_SET) {
+            if (v[0] != 0.0 && v[0] != 1.0) { v[0] = cur.trigger; return CTRL_STATUS_INVALID; }
+            cam->SetFeature("TriggerMode", v[0] != 0.0 ? "On" : "Off");
+            cur.trigger = v[0];
+        }
+        v[0] = cur.trigger;
+        return CTRL_STATUS_OK;
+    case CTRL_KEY_PIXEL_FORMAT: {
+        const bool same = (op == CTRL_OP_GET) || (uint32_t)v[0] == pfnc;
+        v[0] = pfnc;
+        return same ? CTRL_STATUS_OK : CTRL_STATUS_RESTART;
+    }
+    }
+    return CTRL_STATUS_UNSUPPORTED;
+}
+
+// 出ている要求に全部答える（Capture の前。nextFrame はこれから撮るフレームの frame_id）
+static void serve_control(CSonyCam* cam, ControlPage* page, CamSettings& cur, uint64_t nextFrame,
+                          uint32_t W, uint32_t H, uint32_t pfnc) {
+    ControlSlot* slots = (ControlSlot*)(page + 1);
+    for (uint32_t i = 0; i < page->nslots; ++i) {
+        ControlSlot* sl = &slots[i];
+        if (sl->state != CTRL_PENDING) continue;
+        MemoryBarrier();                         // PENDING を見てから値を読む
+        int32_t st = (sl->key < 32 && (page->caps & (1u << sl->key)))
+                   ? apply_control(cam, cur, sl->op, sl->key, sl->value, W, H, pfnc)
+                   : CTRL_STATUS_UNSUPPORTED;
+        sl->status = st;
+        sl->effective_frame = (sl->op == CTRL_OP_SET && st == CTRL_STATUS_OK) ? nextFrame + page->lag : 0;
+        sl->stamp_us = qpc_us();
+        page->served++;
+        MemoryBarrier();
+        seq_store(&sl->state, CTRL_DONE);        // 最後に
+    }
+}
+
 // パイプから finalize/quit/exit が来たら止める（非ブロッキング）
 static bool poll_finalize_nonblock() {
     HANDLE hIn = GetStdHandle(STD_INPUT_HANDLE);
@@ -71,9 +334,11 @@ int main() {
     cam->SetFeature("TriggerMode", "Off");
     cam->SetFeature("ExposureAuto", "Off");
     cam->SetFeature("GainAuto", "Off");
-    cam->SetFeature("ExposureTime", 10000.0); // 10ms
-    cam->SetFeature("Gain", 18.0);
-    cam->SetFeature("PixelFormat", "RGB8Packed");
+    CamSettings cur = { 10000.0, 18.0, 0.0, 0.0, 0.0 };   // 制御ページの GET / SET はここから
+    cam->SetFeature("ExposureTime", cur.exposureUs); // 10ms
+    cam->SetFeature("Gain", cur.gainDb);
+    const std::string pixelFormat = pixel_format_from_env();
+    cam->SetFeature("PixelFormat", pixelFormat.c_str());
     cam->SetFeature("ReverseX", "Off");
     cam->SetFeature("ReverseY", "Off");
     // 必要なら PixelFormat を明示（機種依存。無視される場合あり）
@@ -90,47 +355,188 @@ int main() {
 
     PBITMAPINFO bmi = cam->GetBMPINFO();
     uint32_t W = bmi->bmiHeader.biWidth;
-    uint32_t H = bmi->bmiHeader.biHeight;
+    // biHeight > 0 の DIB は下から上に並ぶ。高さは絶対値、向きは flags で読み手に伝える
+    const LONG biH = bmi->bmiHeader.biHeight;
+    uint32_t H = (uint32_t)(biH < 0 ? -biH : biH);
     uint32_t BPP = bmi->bmiHeader.biBitCount;   // 8/24/32 ...
+    // Bayer を要求しても SDK 側で色変換された（8bpp でない）なら CFA は載せない
+    const uint32_t CFA = (BPP == 8) ? cfa_code(pixelFormat) : 0;
+    const uint32_t hdrVersion = header_version_from_env();
+    const uint32_t FLAGS = ((biH > 0) ? SHM_FLAG_BOTTOM_UP : 0) | SHM_FLAG_HIRES_TS | (CFA << SHM_CFA_SHIFT)
+                         | ((hdrVersion >= 2) ? SHM_FLAG_EXT_HEADER : 0);
     uint32_t STRIDE = aligned_stride(W, BPP);
     size_t   IMG_BYTES = (size_t)STRIDE * H;
     size_t   capBytes = (size_t)bmi->bmiHeader.biSizeImage; // DIB実サイズ
     size_t   copyBytes = (capBytes < IMG_BYTES) ? capBytes : IMG_BYTES;
 
-    // ===== 共有メモリ確保（ヘッダ + 実転送バイト数）=====
-    DWORD TOTAL = (DWORD)(sizeof(ShmHeader) + copyBytes);
-    HANDLE hMap = CreateFileMappingW(INVALID_HANDLE_VALUE, NULL, PAGE_READWRITE, 0, TOTAL, shmW);
+    // ===== 共有メモリ確保（ヘッダ + 実転送バイト数 / リングなら N スロット分）=====
+    const uint32_t ringSlots = ring_slots_from_env();
+    const size_t slotPitch = align_page(copyBytes);
+    const size_t dataOffset = align_page(sizeof(RingHeader) + sizeof(SlotHeader) * ringSlots);
+    const size_t HDR_BYTES = (hdrVersion >= 2) ? sizeof(ShmHeader) + sizeof(ShmHeaderExt) : sizeof(ShmHeader);
+    const size_t TOTAL = ringSlots ? dataOffset + slotPitch * ringSlots
+                                   : HDR_BYTES + copyBytes;
+    HANDLE hMap = CreateFileMappingW(INVALID_HANDLE_VALUE, NULL, PAGE_READWRITE,
+                                     (DWORD)((uint64_t)TOTAL >> 32), (DWORD)TOTAL, shmW);
     if (!hMap) { std::fprintf(stderr, "CreateFileMapping failed: %lu\n", GetLastError()); return 1; }
+    const bool existed = (GetLastError() == ERROR_ALREADY_EXISTS);   // 読み手・見張りが開いたまま
     void* base = MapViewOfFile(hMap, FILE_MAP_ALL_ACCESS, 0, 0, TOTAL);
     if (!base) { std::fprintf(stderr, "MapViewOfFile failed: %lu\n", GetLastError()); CloseHandle(hMap); return 1; }
 
-    ShmHeader* hdr = (ShmHeader*)base;
-    uint8_t* px = (uint8_t*)(hdr + 1);
+    ShmHeader* hdr = nullptr;
+    uint8_t* px = nullptr;
+    RingHeader* ring = nullptr;
+    SlotHeader* slots = nullptr;
+    uint8_t* slotBase = nullptr;
+    uint64_t local_id = 0;
+    uint32_t seq = 0;
+
+    if (ringSlots) {
+        ring = (RingHeader*)base;
+        slots = (SlotHeader*)(ring + 1);
+        slotBase = (uint8_t*)base + dataOffset;
+        ring->magic = 0;
+        ring->version = 1; ring->nslots = ringSlots;
+        ring->width = W; ring->height = H; ring->bpp = BPP; ring->stride = STRIDE;
+        ring->flags = FLAGS; ring->reserved1 = 0;
+        ring->slot_pitch = slotPitch; ring->data_offset = dataOffset; ring->write_index = 0;
+        std::memset(slots, 0, sizeof(SlotHeader) * ringSlots);
+        MemoryBarrier();
+        ring->magic = 0x52524243;  // 'CBRR'
+    } else {
+        hdr = (ShmHeader*)base;
+        px = (uint8_t*)base + HDR_BYTES;
+        // 落ちた / 止められたブリッジの代わりなら引き継ぐ（同じ幾何・同じヘッダ長）: magic はそのまま、
+        // frame_id と seq は続きから、epoch を +1。読み手は開き直さずに続きを読める
+        const size_t oldHdr = (hdr->flags & SHM_FLAG_EXT_HEADER) ? ((ShmHeaderExt*)(hdr + 1))->header_size
+                                                                  : sizeof(ShmHeader);
+        const bool resume = existed && hdr->magic == 0x47524243 && hdr->width == W && hdr->height == H
+                         && hdr->bpp == BPP && hdr->stride == STRIDE && oldHdr == HDR_BYTES;
+        uint32_t epoch = 0;
+        if (resume) {
+            epoch = ((hdr->flags >> SHM_EPOCH_SHIFT) + 1) & 0xFFFF;
+            local_id = hdr->frame_id;
+            seq = hdr->seq + 2;   // 書き込み中（奇数）に落ちていれば奇数のまま、次の確定で偶数に戻る
+            seq_store(&hdr->seq, seq);
+            std::printf("RESUME FRAME %llu EPOCH %u\n", (unsigned long long)local_id, epoch);
+        } else {
+            // magic は最後に書く（読み手の attach は magic を見てから残りを信じる）
+            hdr->magic = 0;
+            hdr->width = W; hdr->height = H; hdr->bpp = BPP; hdr->stride = STRIDE;
+            hdr->frame_id = 0; hdr->timestamp_us = 0; hdr->seq = 0;
+        }
+        if (hdrVersion >= 2) {
+            ShmHeaderExt* ext = (ShmHeaderExt*)(hdr + 1);
+            ext->version = 2;
+            ext->header_size = (uint32_t)HDR_BYTES;
+            ext->segment_size = TOTAL;
+            ext->pixel_format = pfnc_code(BPP, CFA);
+        }
+        hdr->flags = FLAGS | (epoch << SHM_EPOCH_SHIFT);   // SHM_FLAG_STALE はここで消える
+        MemoryBarrier();
+        hdr->magic = 0x47524243;  // 'CBRG'
+    }
 
-    hdr->magic = 0x47524243;  // 'CBRG'
-    hdr->width = W; hdr->height = H; hdr->bpp = BPP; hdr->stride = STRIDE;
-    hdr->frame_id = 0; hdr->timestamp_us = 0; hdr->seq = 0; hdr->reserved = 0;
+    // フレーム到着通知（manual-reset の名前付きイベント "<名前>_ready"。読み手は sonycam/notify.py）
+    // Capture 前に Reset、フレーム確定後に Set。読み手は sleep ポーリングせずに待てる
+    const std::wstring readyName = std::wstring(shmW) + L"_ready";
+    HANDLE hReady = CreateEventW(NULL, TRUE, FALSE, readyName.c_str());
+
+    // テレメトリページ（作れなくてもフレームの公開は続ける）
+    const std::wstring teleName = std::wstring(shmW) + L"_telemetry";
+    HANDLE hTele = CreateFileMappingW(INVALID_HANDLE_VALUE, NULL, PAGE_READWRITE, 0,
+                                      (DWORD)sizeof(TelemetryPage), teleName.c_str());
+    TelemetryPage* tele = hTele ? (TelemetryPage*)MapViewOfFile(hTele, FILE_MAP_ALL_ACCESS, 0, 0,
+                                                                sizeof(TelemetryPage)) : nullptr;
+    if (tele) {
+        std::memset(tele, 0, sizeof(TelemetryPage));
+        tele->version = 1; tele->pid = GetCurrentProcessId();
+        tele->started_us = tele->updated_us = qpc_us();
+        MemoryBarrier();
+        tele->magic = 0x54524243;  // 'CBRT'
+    }
+    // 制御ページ（作れなくてもフレームの公開は続ける）。見張りが起動し直した時は出ていた要求ごと引き継ぐ
+    const std::wstring ctrlName = std::wstring(shmW) + L"_control";
+    const DWORD CTRL_BYTES = (DWORD)(sizeof(ControlPage) + sizeof(ControlSlot) * CTRL_NSLOTS);
+    HANDLE hCtrl = CreateFileMappingW(INVALID_HANDLE_VALUE, NULL, PAGE_READWRITE, 0, CTRL_BYTES, ctrlName.c_str());
+    const bool ctrlExisted = hCtrl && (GetLastError() == ERROR_ALREADY_EXISTS);
+    ControlPage* ctrl = hCtrl ? (ControlPage*)MapViewOfFile(hCtrl, FILE_MAP_ALL_ACCESS, 0, 0, CTRL_BYTES) : nullptr;
+    if (ctrl) {
+        if (!(ctrlExisted && ctrl->magic == 0x43524243 && ctrl->version == 1 && ctrl->nslots == CTRL_NSLOTS)) {
+            std::memset(ctrl, 0, CTRL_BYTES);
+            ctrl->version = 1; ctrl->nslots = CTRL_NSLOTS;
+        }
+        ctrl->pid = GetCurrentProcessId();
+        ctrl->lag = control_lag_from_env();
+        ctrl->started_us = qpc_us();
+        ctrl->caps = (1u << CTRL_KEY_EXPOSURE_US) | (1u << CTRL_KEY_GAIN_DB) | (1u << CTRL_KEY_ROI)
+                   | (1u << CTRL_KEY_TRIGGER) | (1u << CTRL_KEY_PIXEL_FORMAT);
+        MemoryBarrier();
+        ctrl->magic = 0x43524243;  // 'CBRC'
+    }
+    const uint32_t PFNC = pfnc_code(BPP, CFA);
+
+    uint64_t winStart = qpc_us(), winFrames = 0, winCap = 0, winCopy = 0;
+    uint32_t winCapMax = 0, winCopyMax = 0;
+    // 直近 1 秒の窓を締めて fps と *_avg/*_max を書く（tele の seqlock の内側で呼ぶ）
+    auto roll_window = [&](uint64_t now) {
+        const uint64_t dt = now - winStart;
+        if (dt < 1000000ULL) return;
+        tele->fps_milli = (uint32_t)(winFrames * 1000000000ULL / dt);
+        if (winFrames) {
+            tele->capture_us_avg = (uint32_t)(winCap / winFrames); tele->capture_us_max = winCapMax;
+            tele->copy_us_avg = (uint32_t)(winCopy / winFrames); tele->copy_us_max = winCopyMax;
+        }
+        winStart = now; winFrames = winCap = winCopy = 0; winCapMax = winCopyMax = 0;
+    };
 
     // 起動情報 → stdout（Python 側が拾う）
     std::string serial = cam->GetSerialNumber();
     std::puts(serial.c_str());
-    std::printf("WH %u %u BPP %u STRIDE %u\n", W, H, BPP, STRIDE);
+    if (CFA)
+        std::printf("WH %u %u BPP %u STRIDE %u CFA %.2s\n", W, H, BPP, STRIDE, pixelFormat.c_str() + 5);
+    else
+        std::printf("WH %u %u BPP %u STRIDE %u\n", W, H, BPP, STRIDE);
+    if (ringSlots)
+        std::printf("RING %u PITCH %zu OFFSET %zu\n", ringSlots, slotPitch, dataOffset);
     std::fflush(stdout);
 
     // フレームバッファ（必ず biSizeImage 分）
     std::unique_ptr<BYTE[]> frame(new BYTE[capBytes]);
 
     // ===== 連続キャプチャ＆共有メモリ書き出し =====
-    uint64_t local_id = 0;
     for (;;) {
         if (poll_finalize_nonblock()) break;
+        if (ctrl) serve_control(cam.get(), ctrl, cur, local_id + 1, W, H, PFNC);
 
+        if (hReady) ResetEvent(hReady);
+        const uint64_t t0 = qpc_us();
         bool ok = cam->Capture(frame.get());
+        const uint64_t ts = qpc_us();
+        if (!ok) {
+            // 失敗したフレームは公開しない（コピーも frame_id・seq・ready イベントもそのまま）。
+            // 失敗が続けば frame_id が止まるので、見張り（sonycam/watchdog.py）が stale として扱う
+            if (tele) {
+                const uint64_t now = qpc_us();
+                seq_store(&tele->seq, tele->seq + 1);   // 奇数: 書き込み中
+                tele->failed++;
+                roll_window(now);
+                tele->updated_us = now;
+                seq_store(&tele->seq, tele->seq + 1);   // 偶数: 確定
+            }
+            continue;
+        }
 
-        // 先頭64KBの合計で“ゼロっぽさ”を観測（パターン注入はしない）
+        // 先頭64KBの合計で“ゼロっぽさ”を観測（パターン注入はしない）。0 と 255 の数も数える
         size_t PROBE = (copyBytes < (size_t)65536) ? copyBytes : (size_t)65536;
         unsigned long long sum = 0;
-        for (size_t i = 0; i < PROBE; ++i) sum += frame[i];
+        size_t zeros = 0, sats = 0;
+        for (size_t i = 0; i < PROBE; ++i) {
+            const BYTE v = frame[i];
+            sum += v;
+            zeros += (v == 0);
+            sats += (v == 255);
+        }
 
         // 30フレームに1回だけ SUM を出す（デバッグ用）
         static uint64_t cnt = 0;
@@ -139,16 +545,58 @@ int main() {
             std::fflush(stdout);
         }
 
-        // 共有メモリへコピー
-        std::memcpy(px, frame.get(), copyBytes);
-        hdr->frame_id = ++local_id;
-        hdr->timestamp_us = GetTickCount64() * 1000ULL; // お手軽タイムスタンプ
+        if (ring) {
+            // 次のスロットへコピー → 確定後に write_index を進める
+            const uint64_t fid = ++local_id;
+            const size_t i = (size_t)((fid - 1) % ringSlots);
+            SlotHeader* sh = &slots[i];
+            seq_store(&sh->state, sh->state + 1);   // 奇数: 書き込み中
+            std::memcpy(slotBase + i * slotPitch, frame.get(), copyBytes);
+            sh->frame_id = fid;
+            sh->timestamp_us = ts;
+            seq_store(&sh->state, sh->state + 1);   // 偶数: 確定
+            InterlockedExchange64(reinterpret_cast<volatile LONG64*>(&ring->write_index), (LONG64)fid);
+        } else {
+            // 共有メモリへコピー（seqlock で囲む）
+            seq = (seq + 1) | 1;
+            seq_store(&hdr->seq, seq);     // 奇数: 書き込み中（引き継いだ直後で奇数なら 2 進めて奇数）
+            std::memcpy(px, frame.get(), copyBytes);
+            hdr->frame_id = ++local_id;
+            hdr->timestamp_us = ts;
+            seq_store(&hdr->seq, ++seq);   // 偶数: 確定
+        }
+        if (hReady) SetEvent(hReady);
+
+        if (tele) {
+            const uint64_t now = qpc_us();
+            const uint32_t capUs = (uint32_t)(ts - t0), copyUs = (uint32_t)(now - ts);
+            const uint32_t zeroPpm = PROBE ? (uint32_t)(zeros * 1000000ULL / PROBE) : 0;
+            const uint32_t satPpm = PROBE ? (uint32_t)(sats * 1000000ULL / PROBE) : 0;
+            seq_store(&tele->seq, tele->seq + 1);   // 奇数: 書き込み中
+            tele->frames++;
+            tele->capture_us_last = capUs; tele->copy_us_last = copyUs;
+            tele->probe_bytes = (uint32_t)PROBE; tele->probe_sum = sum;
+            tele->zero_ppm = zeroPpm; tele->sat_ppm = satPpm;
+            if (PROBE && zeros == PROBE) tele->zero_frames++;
+            if (satPpm >= 990000) tele->saturated_frames++;
+            winFrames++; winCap += capUs; winCopy += copyUs;
+            if (capUs > winCapMax) winCapMax = capUs;
+            if (copyUs > winCopyMax) winCopyMax = copyUs;
+            roll_window(now);
+            tele->updated_us = now;
+            seq_store(&tele->seq, tele->seq + 1);   // 偶数: 確定
+        }
 
         // 少し譲る（必要なら調整）
         // Sleep(0);
     }
 
     cam->StreamStop();
+    if (hReady) CloseHandle(hReady);
+    if (tele) UnmapViewOfFile(tele);
+    if (hTele) CloseHandle(hTele);
+    if (ctrl) UnmapViewOfFile(ctrl);
+    if (hCtrl) CloseHandle(hCtrl);
     UnmapViewOfFile(base);
     CloseHandle(hMap);
     return 0;
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# _shm.py — ベンチ/ストレス用: プロセス間で共有するファイルバックの一時セグメント
+import mmap
+import os
+import tempfile
+
+
+def temp_segment(size):
+    """/dev/shm（無ければ一時ディレクトリ）に size バイトのファイルを作り、パスを返す"""
+    tmpdir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    fd, path = tempfile.mkstemp(prefix="cbrg_", dir=tmpdir)
+    os.ftruncate(fd, size)
+    os.close(fd)
+    return path
+
+
+def map_file(path, size):
+    with open(path, "r+b") as f:
+        return mmap.mmap(f.fileno(), size)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# bench_aio.py — 1 つのイベントループに複数カメラ × 複数消費者を載せ、ループが塞がらないことを確認する
+#   生産者: FrameWriter を別プロセスで --cams 台（--fps）
+#   消費者: FrameStream を各カメラに --consumers 本。途中で半分をキャンセルして後始末を確認
+#   ループ遅延: 1ms 周期の心拍タスクが実際に起きた時刻のずれ
+#   AsyncBridge: 起動ログ（シリアル/WH）と finalize に応答する小さなスタンドインで起動/停止を確認
+#   python bench/bench_aio.py --cams 4 --consumers 3 --fps 30 --seconds 3
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from _shm import map_file, temp_segment  # noqa: E402
+from sonycam.aio import AsyncBridge, FrameStream  # noqa: E402
+from sonycam.reader import FrameReader  # noqa: E402
+from sonycam.writer import FrameWriter, segment_size  # noqa: E402
+
+W, H, BPP = 1232, 1028, 24
+
+FAKE_BRIDGE = r"""
+import sys
+name = sys.stdin.readline().strip()
+sys.stdout.write("Enter the shared memory name: 12345678\n")
+print("WH 1232 1028 BPP 24 STRIDE 3696", flush=True)
+for line in sys.stdin:
+    if line.strip() in ("finalize", "quit", "exit"):
+        break
+    print("ECHO " + line.strip(), flush=True)
+"""
+
+
+def producer(path, size, fps, stop):
+    wr = FrameWriter(map_file(path, size), W, H, BPP)
+    period = 1.0 / fps
+    t_next = time.perf_counter()
+    while not stop.is_set():
+        with wr.frame() as px:
+            px[::64, ::64] = wr.frame_id & 0xFF
+        t_next += period
+        dt = t_next - time.perf_counter()
+        if dt > 0:
+            time.sleep(dt)
+    wr.close()
+
+
+async def consume(stream, counts, key):
+    async with stream:
+        async for f in stream:
+            counts[key] += 1
+
+
+async def heartbeat(lags, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t = loop.time()
+        await asyncio.sleep(0.001)
+        lags.append((loop.time() - t - 0.001) * 1000)
+
+
+async def run(paths, size, a):
+    counts, tasks, streams = {}, [], []
+    for ci, path in enumerate(paths):
+        for k in range(a.consumers):
+            key = (ci, k)
+            counts[key] = 0
+            s = FrameStream(FrameReader(map_file(path, size)))
+            streams.append((key, s))
+            tasks.append(asyncio.ensure_future(consume(s, counts, key)))
+    lags, stop = [], asyncio.Event()
+    hb = asyncio.ensure_future(heartbeat(lags, stop))
+    await asyncio.sleep(a.seconds / 2)
+    cancelled = tasks[::2]
+    for t in cancelled:
+        t.cancel()
+    await asyncio.gather(*cancelled, return_exceptions=True)
+    await asyncio.sleep(a.seconds / 2)
+    for t in tasks[1::2]:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    stop.set()
+    await hb
+    for _, s in streams:
+        await s.aclose()
+        s._source.close()
+
+    lags.sort()
+    cancelled_keys = {k for k, _ in streams[::2]}
+    print(f"{len(paths)} cams x {a.consumers} consumers, {a.fps:.0f} fps, {W}x{H} {BPP}bpp")
+    for (key, s) in streams:
+        print(f"  cam{key[0]} consumer{key[1]}  frames={counts[key]:5d} dropped={s.dropped:4d}"
+              f"{'  (cancelled at half time)' if key in cancelled_keys else ''}")
+    print(f"loop lag ms: p50={lags[len(lags) // 2]:.2f} p99={lags[int(len(lags) * 0.99)]:.2f} max={lags[-1]:.2f}")
+
+    async with AsyncBridge("Local\\FakeCam", argv=[sys.executable, "-c", FAKE_BRIDGE]) as cam:
+        await cam.send("ping")
+        echo = await cam.readline(timeout=2.0)
+        print(f"AsyncBridge: serial={cam.serial} geometry={cam.geometry} reply={echo!r}")
+    print(f"AsyncBridge stopped cleanly: {cam.proc is None}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cams", type=int, default=4)
+    ap.add_argument("--consumers", type=int, default=3)
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    a = ap.parse_args()
+    size = segment_size(W, H, BPP)
+    paths = [temp_segment(size) for _ in range(a.cams)]
+    for p in paths:
+        FrameWriter(map_file(p, size), W, H, BPP).close()
+    stop = mp.Event()
+    procs = [mp.Process(target=producer, args=(p, size, a.fps, stop)) for p in paths]
+    for p in procs:
+        p.start()
+    try:
+        asyncio.run(run(paths, size, a))
+    finally:
+        stop.set()
+        for p in procs:
+            p.join()
+        for p in paths:
+            os.unlink(p)
+
+
+if __name__ == "__main__":
+    main()
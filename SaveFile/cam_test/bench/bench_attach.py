@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# bench_attach.py — 共有メモリへの接続（attach）の時間と、使えないセグメントでの失敗の速さ・理由（カメラ不要）
+#   生産者: sonycam-produce --bridge（CAM1.exe のスタンドイン）を別プロセスで。--header-version 1 / 2
+#   warm: 生産者が動いている状態で 1 回の接続（開いて閉じるまで）
+#     guess 64KB + remap: srcback の旧方式（64KB 決め打ちでマップ → ヘッダを読む → 開き直す）
+#     open_shm (2 maps):  これまでの open_shm（44 バイトをマップ → 閉じる → 全体をマップ。版 2 は末尾 20 バイト足りない）
+#     attach:             1 回マップして検証（posix / file）
+#   cold: 起動から最初のフレームを読めるまで。WH 行を待ってから attach / attach(timeout) だけで待つ
+#   fail: 無い名前・リング・途中で切れたファイル・新しい版・空ファイル・ヘッダの無いセグメント
+#   python bench/bench_attach.py [--size 2464x2056] [--iters 300] [--cold 3]
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sonycam.header import (HDR_SIZE, HDR_SIZE_V2, MAGIC, AttachError, ShmHeader,  # noqa: E402
+                            ShmHeaderExt)
+from sonycam.launcher import launch_cam, read_wh_line, stop_cam  # noqa: E402
+from sonycam.reader import FrameReader, attach  # noqa: E402
+from sonycam.ring import RingWriter, ring_size  # noqa: E402
+from sonycam.transport import create_segment, open_segment, resolve, signal_name, unlink_segment  # noqa: E402
+from sonycam.writer import FrameWriter, segment_size  # noqa: E402
+
+ROOT = str(Path(__file__).resolve().parents[1])
+
+
+def stand_in(name, size, version):
+    code = f"import sys; sys.path.insert(0, {ROOT!r}); from sonycam.cli import produce_main; sys.exit(produce_main())"
+    argv = [sys.executable, "-c", code, "--bridge", "--size", size, "--fps", "30",
+            "--header-version", str(version)]
+    return launch_cam(None, name, argv=argv)
+
+
+def guess_remap(name):
+    """旧方式: 64KB をマップしてヘッダを読み、大きさを計算して開き直す"""
+    m = open_segment(name, 65536)
+    hdr = ShmHeader.from_buffer_copy(m)
+    m.close()
+    if hdr.magic != MAGIC:
+        raise RuntimeError("no header")
+    return FrameReader(open_segment(name, HDR_SIZE + hdr.stride * hdr.height))
+
+
+def open_two_maps(name):
+    """これまでの open_shm: ヘッダだけマップ → 閉じる → 全体をマップ"""
+    m = open_segment(name, HDR_SIZE)
+    hdr = ShmHeader.from_buffer_copy(m)
+    m.close()
+    if hdr.magic != MAGIC or hdr.width * hdr.height == 0:
+        raise RuntimeError("no header")
+    return FrameReader(open_segment(name, HDR_SIZE + hdr.stride * hdr.height), name=signal_name(name))
+
+
+def warm(name, iters):
+    rows = []
+    for label, fn in (("guess 64KB + remap", guess_remap), ("open_shm (2 maps)", open_two_maps),
+                      ("attach", attach)):
+        ts = []
+        for _ in range(iters):
+            t0 = time.perf_counter()
+            rd = fn(name)
+            t1 = time.perf_counter()
+            rd.close()
+            ts.append(t1 - t0)
+        ts.sort()
+        rows.append((label, ts[len(ts) // 2] * 1e6, ts[int(len(ts) * 0.99)] * 1e6))
+    return rows
+
+
+def cold(size, version, use_attach, n):
+    """起動 → 最初のフレームを読めるまで [ms]（中央値）"""
+    ts = []
+    for i in range(n):
+        name = f"posix:attach_cold_{os.getpid()}_{version}_{i}"
+        t0 = time.perf_counter()
+        proc = stand_in(name, size, version)
+        try:
+            if use_attach:
+                rd = attach(name, timeout=20.0)
+            else:
+                wh, last = read_wh_line(proc.stdout, 20.0)
+                if wh[0] is None:
+                    raise RuntimeError(f"no WH line: {last}")
+                rd = attach(name)
+            if rd.wait_for_frame(0, 5.0) is None:
+                raise RuntimeError("no frame")
+            rd.read_frame()
+            ts.append(time.perf_counter() - t0)
+            rd.close()
+        finally:
+            stop_cam(proc)
+            proc.wait()
+            unlink_segment(name)
+    ts.sort()
+    return ts[len(ts) // 2] * 1e3
+
+
+def broken_segments(tag):
+    """使えないセグメントを作る -> [(説明, 名前)]"""
+    out = []
+
+    def seg(label, size, fill=None):
+        name = f"posix:attach_{tag}_{len(out)}"
+        if size == 0:                              # 作った直後（まだ ftruncate していない）
+            open(resolve(name)[1], "wb").close()
+        else:
+            m = create_segment(name, size)
+            if fill is not None:
+                fill(m)
+            m.close()
+        out.append((label, name))
+
+    def header_v2(m, version=2):
+        wr = FrameWriter(m, 640, 480, 24)
+        ext = ShmHeaderExt.from_buffer(m, HDR_SIZE)
+        ext.version = version
+        del ext
+        wr.close()
+
+    full = segment_size(640, 480, 24)
+    out.append(("missing name", f"posix:attach_{tag}_missing"))
+    seg("ring segment (CBRR)", ring_size(640, 480, 24, 2), lambda m: RingWriter(m, 640, 480, 24, 2).close())
+    seg("newer header version (3)", full, lambda m: header_v2(m, 3))
+    seg("headerless (random bytes)", full, lambda m: m.write(os.urandom(HDR_SIZE_V2)))
+    seg("empty file (just created)", 0)
+    seg("magic=0 (producer starting)", full)
+    # 途中で切れたファイル: 正しいヘッダの後ろが半分しかない
+    name = f"posix:attach_{tag}_{len(out)}"
+    m = create_segment(name, full)
+    header_v2(m)
+    m.close()
+    with open(resolve(name)[1], "r+b") as f:
+        os.ftruncate(f.fileno(), full // 2)
+    out.append(("truncated (half the pixels)", name))
+    return out
+
+
+def fail_fast(tag):
+    rows = []
+    for label, name in broken_segments(tag):
+        for timeout in (0.0, 0.2):
+            t0 = time.perf_counter()
+            try:
+                attach(name, timeout=timeout).close()
+                reason, retry = "attached?!", None
+            except AttachError as e:
+                reason, retry = str(e), e.retry
+            rows.append((label, timeout, (time.perf_counter() - t0) * 1e3, retry, reason))
+        unlink_segment(name)
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="2464x2056")
+    ap.add_argument("--iters", type=int, default=300)
+    ap.add_argument("--cold", type=int, default=3, help="起動からの計測の回数（0 で省略）")
+    a = ap.parse_args()
+    ok = True
+    for version in (1, 2):
+        name = f"posix:attach_{os.getpid()}_v{version}"
+        proc = stand_in(name, a.size, version)
+        try:
+            rd = attach(name, timeout=20.0)
+            layout = rd.layout
+            rd.close()
+            print(f"v{version} {a.size}: header_size={layout.header_size} segment_size={layout.segment_size}")
+            print(f"  {'warm attach':22s} {'p50 us':>8s} {'p99 us':>8s}")
+            for label, p50, p99 in warm(name, a.iters):
+                print(f"  {label:22s} {p50:8.1f} {p99:8.1f}")
+        finally:
+            stop_cam(proc)
+            proc.wait()
+            unlink_segment(name)
+        if a.cold:
+            t_wh = cold(a.size, version, False, a.cold)
+            t_at = cold(a.size, version, True, a.cold)
+            print(f"  cold start -> first frame: WH line + attach {t_wh:7.1f} ms   attach(timeout) {t_at:7.1f} ms")
+    print(f"{'unusable segment':30s} {'timeout':>7s} {'ms':>7s} {'retry':>5s}  reason")
+    for label, timeout, ms, retry, reason in fail_fast(os.getpid()):
+        print(f"{label:30s} {timeout:7.1f} {ms:7.2f} {str(retry):>5s}  {reason}")
+        ok &= retry is not None                             # どれも接続できてはいけない
+        ok &= bool(retry and timeout) or ms < 5.0           # 待っても直らないものは待たない
+    print("ok" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# bench_convert.py — 2464x2056 での形式別変換スループット（Converter + 事前確保出力 vs 旧 to_bgr）
+#   旧 to_bgr は 32bpp で非連続ビューを返すので、imwrite/imshow 相当の ascontiguousarray まで含めて測る
+#   python bench/bench_convert.py [--size 2464x2056] [-n 20]
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sonycam.convert import TARGETS, Converter, OutputPool, to_bgr  # noqa: E402
+from sonycam.header import aligned_stride  # noqa: E402
+
+
+def timeit(fn, n):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="2464x2056")
+    ap.add_argument("-n", type=int, default=20)
+    a = ap.parse_args()
+    w, h = map(int, a.size.lower().split("x"))
+
+    print(f"{w}x{h}, n={a.n}")
+    print(f"{'src':>5s} {'target':>6s} {'order':>9s} {'ms':>7s} {'MPix/s':>8s} {'in MB/s':>8s}")
+    for bpp in (8, 24, 32):
+        stride = aligned_stride(w, bpp)
+        raw = np.random.randint(0, 256, stride * h, dtype=np.uint8).tobytes()
+        in_mb = w * h * (bpp // 8) / 1e6
+
+        def legacy():
+            return np.ascontiguousarray(to_bgr(raw, w, h, bpp, stride))
+        dt = timeit(legacy, a.n)
+        print(f"{bpp:4d}b {'bgr':>6s} {'to_bgr':>9s} {dt * 1e3:7.2f} {w * h / dt / 1e6:8.1f} {in_mb / dt:8.1f}")
+
+        for target in TARGETS:
+            for bottom_up in (False, True):
+                conv = Converter(w, h, bpp, stride, bottom_up, target)
+                src = conv.source_view(raw)
+                pool = OutputPool(conv.out_shape, n=2)
+                dt = timeit(lambda: conv(src, pool.get()), a.n)
+                order = "bottom-up" if bottom_up else "top-down"
+                print(f"{bpp:4d}b {target:>6s} {order:>9s} {dt * 1e3:7.2f} {w * h / dt / 1e6:8.1f} {in_mb / dt:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
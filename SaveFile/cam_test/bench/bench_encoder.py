@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# bench_encoder.py — 取り込みループで保存した時のループの詰まり（従来の cv2.imwrite 直呼び vs EncoderPool）
+#   ループ: --fps で新フレームを作り（2464x2056 BGR）、--every 枚ごとに latest.png を保存する
+#   stall: 1 周の所要時間が周期を超えた分。見張り: 別スレッドが latest.* を読み続け、書きかけが見えないか確認
+#   python bench/bench_encoder.py [--fps 30] [--seconds 4] [--every 5] [--format png]
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sonycam.encoder import POLICIES, EncoderPool  # noqa: E402
+
+W, H = 2464, 2056
+
+
+def make_frames(n):
+    rng = np.random.default_rng(0)
+    base = cv2.GaussianBlur(rng.integers(0, 256, (H, W, 3), dtype=np.uint8), (0, 0), 8)
+    return [np.roll(base, 37 * i, axis=1) for i in range(n)]
+
+
+def watcher(path, stop, result):
+    """latest.* を読み続け、読めなかった（書きかけ）回数を数える"""
+    reads = bad = 0
+    while not stop.is_set():
+        if os.path.exists(path):
+            if path.endswith(".npy"):
+                try:
+                    ok = np.load(path).shape == (H, W, 3)
+                except (ValueError, OSError, EOFError):
+                    ok = False
+            else:
+                ok = cv2.imread(path) is not None
+            reads += 1
+            bad += not ok
+        time.sleep(0.002)
+    result.update(reads=reads, bad=bad)
+
+
+def run(label, save, frames, a, path):
+    period = 1.0 / a.fps
+    stop, seen = threading.Event(), {}
+    wt = threading.Thread(target=watcher, args=(path, stop, seen))
+    wt.start()
+    stalls = []
+    t_end = time.perf_counter() + a.seconds
+    i = 0
+    t_next = time.perf_counter()
+    while time.perf_counter() < t_end:
+        t0 = time.perf_counter()
+        img = frames[i % len(frames)]
+        if i % a.every == 0:
+            save(img)
+        stalls.append(max(0.0, time.perf_counter() - t0 - period))
+        i += 1
+        t_next += period
+        dt = t_next - time.perf_counter()
+        if dt > 0:
+            time.sleep(dt)
+        else:
+            t_next = time.perf_counter()
+    return i, stalls, stop, wt, seen
+
+
+def report(label, n, stalls, seen, extra=""):
+    stalls.sort()
+    late = sum(1 for s in stalls if s > 0)
+    print(f"{label:22s} frames={n:4d} late={late:4d} stall max={stalls[-1] * 1e3:7.1f}ms "
+          f"p99={stalls[int(len(stalls) * 0.99)] * 1e3:6.1f}ms  watcher reads={seen['reads']} "
+          f"torn={seen['bad']}{extra}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--seconds", type=float, default=4.0)
+    ap.add_argument("--every", type=int, default=5, help="何枚ごとに保存するか")
+    ap.add_argument("--format", default="png", choices=("png", "jpg", "npy"))
+    ap.add_argument("--workers", type=int, default=2)
+    a = ap.parse_args()
+    frames = make_frames(4)
+    d = tempfile.mkdtemp(prefix="sonycam_enc_")
+    path = os.path.join(d, "latest." + a.format)
+    print(f"{W}x{H} BGR @ {a.fps:.0f} fps, save every {a.every} frames as .{a.format}")
+
+    n, stalls, stop, wt, seen = run("imwrite", lambda img: cv2.imwrite(path, img), frames, a, path)
+    stop.set()
+    wt.join()
+    report("imwrite (inline)", n, stalls, seen)
+    os.unlink(path)
+
+    for policy in POLICIES:
+        with EncoderPool(workers=a.workers, maxsize=2, policy=policy) as enc:
+            n, stalls, stop, wt, seen = run(policy, lambda img: enc.submit(img, path, copy=False),
+                                            frames, a, path)
+            enc.flush()
+            stop.set()
+            wt.join()
+            st = enc.stats()
+        report(f"EncoderPool {policy}", n, stalls, seen,
+               f"\n{'':22s} written={st['written']} dropped={st['dropped']} "
+               f"max_depth={st['max_depth']} encode p50={st['encode_ms_p50']:.0f}ms "
+               f"p99={st['encode_ms_p99']:.0f}ms write p50={st['write_ms_p50']:.1f}ms "
+               f"latency p99={st['latency_ms_p99']:.0f}ms")
+        os.unlink(path)
+    leftovers = [f for f in os.listdir(d) if f.endswith(".tmp")]
+    os.rmdir(d) if not os.listdir(d) else None
+    print(f"temp files left behind: {len(leftovers)}")
+
+
+if __name__ == "__main__":
+    main()
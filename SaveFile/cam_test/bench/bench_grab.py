@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# bench_grab.py — その場の 1 枚（FrameReader.grab）の要求からフレームまでの遅れ（カメラ不要）
+#   生産者: sonycam-produce --bridge（CAM1.exe のスタンドイン）を別プロセスで、いくつかの fps で
+#   要求はフレーム周期の中のいろいろな位置から（乱数で待ってから grab()）
+#   grab:   要求時刻より後に撮れた最初のフレーム。latency = 要求からコピーし終わるまで。
+#           期待値は平均で周期の半分 + コピー、最悪で 1 周期 + コピー
+#   latest: 要求の時点で今ある最新フレームをすぐ読む（これまでの sonycam-capture）。速いが、要求より前に
+#           撮れたフレームを返す割合（stale）と、その古さを出す
+#   deadline: 要求より後のフレームがあるのに書き手が次を書き込み中（seq 奇数）のまま期限が来たら、
+#           TornFrameError ではなく None を timeout どおりに返すこと（プロセス内の FrameWriter で）
+#   python bench/bench_grab.py [--size 1280x960] [--fps 10,30,60,120] [--iters 200]
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sonycam.header import now_us  # noqa: E402
+from sonycam.launcher import launch_cam, stop_cam  # noqa: E402
+from sonycam.reader import FrameReader, attach  # noqa: E402
+from sonycam.writer import FrameWriter, segment_size  # noqa: E402
+
+ROOT = str(Path(__file__).resolve().parents[1])
+
+
+def stand_in(name, size, fps):
+    code = f"import sys; sys.path.insert(0, {ROOT!r}); from sonycam.cli import produce_main; sys.exit(produce_main())"
+    argv = [sys.executable, "-c", code, "--bridge", "--size", size, "--fps", str(fps)]
+    return launch_cam(None, name, argv=argv)
+
+
+def pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(int(len(xs) * q), len(xs) - 1)]
+
+
+def check_deadline(timeout=0.05):
+    """要求の後に 1 枚確定 → 次を書き込み中のまま grab() -> (結果, 掛かった秒)"""
+    w, h, bpp = 64, 48, 24
+    buf = bytearray(segment_size(w, h, bpp))
+    wr = FrameWriter(buf, w, h, bpp)
+    rd = FrameReader(buf)
+    after = time.monotonic()
+    wr.publish(np.zeros((h, w, 3), np.uint8))
+    with wr.frame():
+        t0 = time.monotonic()
+        g = rd.grab(after, timeout=timeout)
+        dt = time.monotonic() - t0
+    rd.close()
+    wr.close()
+    return g, dt
+
+
+def run(name, size, fps, iters):
+    period = 1.0 / fps
+    proc = stand_in(name, size, fps)
+    try:
+        with attach(name, timeout=20.0) as rd:
+            rd.wait_for_frame(0, 5.0)
+            out = np.empty(rd.pixels().shape, np.uint8)
+            lat, lag, skipped, late, misses, reused = [], [], 0, 0, 0, True
+            for _ in range(iters):
+                time.sleep(random.uniform(0, 1.5 * period))
+                t_req = time.monotonic()
+                req_us = now_us()
+                g = rd.grab(t_req, timeout=1.0 + 2 * period, out=out)
+                if g is None:
+                    misses += 1
+                    continue
+                lat.append(g.latency_s)
+                lag.append((g.timestamp_us - req_us) / 1e6)  # 要求から撮れるまで（スタンドインは同じ時計）
+                skipped += g.skipped
+                late += g.timestamp_us <= req_us
+                reused &= g.image is out
+
+            stale, age = 0, []
+            for _ in range(iters):
+                time.sleep(random.uniform(0, 1.5 * period))
+                req_us = now_us()
+                _, ts, _ = rd.read_frame(out)
+                if ts <= req_us:
+                    stale += 1
+                    age.append((req_us - ts) / 1e6)
+    finally:
+        stop_cam(proc)
+        proc.wait()
+    return dict(lat=lat, lag=lag, skipped=skipped, late=late, misses=misses, reused=reused, stale=stale, age=age)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="1280x960")
+    ap.add_argument("--fps", default="10,30,60,120")
+    ap.add_argument("--iters", type=int, default=200)
+    a = ap.parse_args()
+    name = f"posix:grab_bench_{os.getpid()}"
+    g, dt = check_deadline()
+    print(f"deadline while the writer is busy: grab -> {g} after {dt * 1e3:.1f} ms (timeout 50 ms)")
+    ok = g is None and dt < 0.2
+    print(f"{a.size} stand-in, {a.iters} requests per rate (ms)")
+    print(f"{'fps':>5s} {'period':>7s} | {'grab p50':>8s} {'p99':>6s} {'max':>6s} {'capture lag p50':>15s} "
+          f"{'skipped':>7s} {'before req':>10s} | {'latest stale':>12s} {'age p50':>7s}")
+    for fps in map(float, a.fps.split(",")):
+        r = run(name, a.size, fps, a.iters)
+        period_ms = 1e3 / fps
+        lat = [x * 1e3 for x in r["lat"]]
+        lag = [x * 1e3 for x in r["lag"]]
+        age = [x * 1e3 for x in r["age"]] or [0.0]
+        print(f"{fps:5g} {period_ms:7.1f} | {pct(lat, 0.5):8.1f} {pct(lat, 0.99):6.1f} {max(lat):6.1f} "
+              f"{pct(lag, 0.5):15.1f} {r['skipped']:7d} {r['late']:10d} | "
+              f"{r['stale']:5d}/{a.iters:<6d} {pct(age, 0.5):7.1f}")
+        # 要求より前のフレームを返さない・取りこぼさない・out を使い回す。遅れは 1 周期 + コピーの余裕まで
+        ok &= r["late"] == 0 and r["misses"] == 0 and r["reused"]
+        ok &= pct(lat, 0.99) < 1.5 * period_ms + 20.0
+    print("ok" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# bench_import.py — `python -X importtime` で sonycam の読み込み時間を測り、予算超過なら exit 1
+#   ヘッダだけのツール（peek/watch）は numpy/cv2 を読み込まないこと、と予算内であることを確認する
+#   python bench/bench_import.py [--budget-ms 30]
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# (表示名, 実行するコード, 予算チェック対象か)
+CASES = [
+    ("import sonycam", "import sonycam", True),
+    ("sonycam.HeaderMap", "import sonycam; sonycam.HeaderMap", True),
+    ("import sonycam.cli", "import sonycam.cli", True),
+    ("import sonycam.notify", "import sonycam.notify", True),
+    ("import sonycam.reader", "import sonycam.reader", False),
+    ("import sonycam.convert + cv2", "import sonycam.convert; sonycam.convert._cv2()", False),
+]
+HEAVY = ("numpy", "cv2")
+
+
+def _env():
+    return dict(os.environ, PYTHONPATH=str(ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+
+
+def importtime(code):
+    """-> {モジュール名: (self us, 累積 us, 深さ)}"""
+    r = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                       cwd=str(ROOT), env=_env(), capture_output=True, text=True, check=True)
+    mods = {}
+    for line in r.stderr.splitlines():
+        parts = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or len(parts) != 3:
+            continue
+        try:
+            self_us, cum_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue                    # 見出し行
+        raw = parts[2]
+        mods[raw.strip()] = (self_us, cum_us, (len(raw) - len(raw.lstrip()) - 1) // 2)
+    return mods
+
+
+def wall_ms(code, n=5):
+    """インタプリタ起動込みの最短実行時間 [ms]"""
+    best = float("inf")
+    for _ in range(n):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=str(ROOT), env=_env(), check=True)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000.0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--budget-ms", type=float, default=30.0)
+    a = ap.parse_args()
+
+    failed = False
+    base = wall_ms("pass")
+    print(f"interpreter startup: {base:.1f} ms")
+    print(f"{'case':32s} {'import ms':>9s} {'wall ms':>8s}  heavy")
+    for label, code, checked in CASES:
+        mods = importtime(code)
+        own = sum(c for k, (_, c, d) in mods.items() if d == 0 and k.split(".")[0] == "sonycam") / 1000.0
+        heavy = [m for m in HEAVY if m in mods]
+        wall = wall_ms(code) - base
+        bad = checked and (heavy or own > a.budget_ms)
+        failed |= bool(bad)
+        print(f"{label:32s} {own:9.1f} {wall:8.1f}  {','.join(heavy) or '-'}{'  <-- FAIL' if bad else ''}")
+    if failed:
+        print(f"header-only imports must stay under {a.budget_ms} ms without numpy/cv2")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
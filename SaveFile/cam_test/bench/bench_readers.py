@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+# bench_readers.py — 読み出し方式の端から端までの比較（スタンドイン生産者 → 各方式の消費者）
+#   生産者: sonycam.producer.Producer を別プロセスで（posix 共有メモリ、--fps、スクロールするカラーバー）
+#   方式:
+#     string_at      ctypes.string_at + np.frombuffer().copy()   （旧 read_cam1_local_oneshot.py）
+#     mmap_read      seek(0) → read(ヘッダ) → read(ピクセル)      （旧 capture_every_2s*.py）
+#     prefix64k      先頭 64KB の比較で更新検出 → read(全体)       （旧 stream_reader_min.py）
+#     header_poll    frame_id を 1ms 周期で見て snapshot(out)     （旧 watch_hdr + コピー）
+#     read_frame     wait_for_frame + read_frame(out)（seqlock 付き・通知待ち）
+#     zero_copy      wait_for_frame + pixels()（コピーなし。読み手はビューを使う）
+#   指標: fps（受け取った別フレーム数/秒）、dropped、GB/s（読み手がコピーしたバイト）、
+#         遅延（生産者の確定時刻 → 読み手が手にした時刻）p50/p90/p99/max、CPU ms/フレーム（読み手プロセス）、
+#         確保 KB/フレーム（tracemalloc の 1 フレーム中のピーク。別パスで測る）
+#   --soak 秒: 1 方式を長時間回して RSS と tracemalloc の増加を見る
+#   --json で機械可読の結果を書き、--compare 旧.json で差分を表示する
+#   python bench/bench_readers.py [--sizes 640x480,2464x2056] [--bpp 8,24,32] [--seconds 2] [--json out.json]
+import argparse
+import ctypes as C
+import json
+import multiprocessing as mp
+import os
+import platform
+import struct
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sonycam.header import HDR_FMT, HDR_SIZE  # noqa: E402
+from sonycam.producer import Producer, SyntheticSource  # noqa: E402
+from sonycam.reader import FrameReader, TornFrameError  # noqa: E402
+from sonycam.transport import open_segment  # noqa: E402
+from sonycam.writer import now_us  # noqa: E402
+
+SIZES = "640x480,1232x1028,2464x2056"
+PROBE = 65536
+
+
+# ---- 方式: make(m) -> step(last_id, deadline) -> (frame_id, timestamp_us, コピーしたバイト数) / None ----
+def make_string_at(m):
+    base = C.addressof(C.c_char.from_buffer(m))
+    keep = []
+
+    def step(last_id, deadline):
+        while time.perf_counter() < deadline:
+            _, w, h, bpp, stride, fid, ts, _, _ = struct.unpack(HDR_FMT, C.string_at(base, HDR_SIZE))
+            if fid != last_id:
+                raw = C.string_at(base + HDR_SIZE, stride * h)
+                arr = np.frombuffer(raw, np.uint8).copy()
+                keep[:] = [arr]
+                return fid, ts, 2 * stride * h
+            time.sleep(0.001)
+        return None
+    step.close = lambda: keep.clear()
+    return step
+
+
+def make_mmap_read(m):
+    def step(last_id, deadline):
+        while time.perf_counter() < deadline:
+            m.seek(0)
+            _, w, h, bpp, stride, fid, ts, _, _ = struct.unpack(HDR_FMT, m.read(HDR_SIZE))
+            if fid != last_id:
+                raw = m.read(stride * h)
+                np.frombuffer(raw, np.uint8)
+                return fid, ts, stride * h
+            time.sleep(0.001)
+        return None
+    return step
+
+
+def make_prefix64k(m):
+    state = {}
+
+    def step(last_id, deadline):
+        while time.perf_counter() < deadline:
+            cur = m[HDR_SIZE:HDR_SIZE + PROBE]
+            if cur != state.get("last"):
+                state["last"] = cur
+                m.seek(0)
+                _, w, h, bpp, stride, fid, ts, _, _ = struct.unpack(HDR_FMT, m.read(HDR_SIZE))
+                raw = m.read(stride * h)
+                np.frombuffer(raw, np.uint8)
+                return fid, ts, stride * h + PROBE
+            time.sleep(0.002)
+        return None
+    return step
+
+
+def _reader(m):
+    rd = FrameReader(m)
+    out = np.empty(rd.pixels().shape, np.uint8)
+    return rd, out
+
+
+def make_header_poll(m):
+    rd, out = _reader(m)
+    nbytes = out.nbytes
+
+    def step(last_id, deadline):
+        while time.perf_counter() < deadline:
+            fid = rd.frame_id
+            if fid != last_id:
+                ts = rd.header.timestamp_us
+                rd.snapshot(out)
+                return fid, ts, nbytes
+            time.sleep(0.001)
+        return None
+    step.close = rd.close
+    return step
+
+
+def make_read_frame(m):
+    rd, out = _reader(m)
+    nbytes = out.nbytes
+
+    def step(last_id, deadline):
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or rd.wait_for_frame(last_id, remaining) is None:
+                return None
+            try:
+                fid, ts, _ = rd.read_frame(out)
+            except TornFrameError:
+                continue
+            return fid, ts, nbytes
+    step.close = rd.close
+    return step
+
+
+def make_zero_copy(m):
+    rd = FrameReader(m)
+
+    def step(last_id, deadline):
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0 or rd.wait_for_frame(last_id, remaining) is None:
+            return None
+        hdr = rd.header
+        ts, fid = hdr.timestamp_us, hdr.frame_id
+        rd.pixels()
+        return fid, ts, 0
+    step.close = rd.close
+    return step
+
+
+STRATEGIES = {
+    "string_at": make_string_at, "mmap_read": make_mmap_read, "prefix64k": make_prefix64k,
+    "header_poll": make_header_poll, "read_frame": make_read_frame, "zero_copy": make_zero_copy,
+}
+
+
+# ---- 生産者プロセス ----
+def producer_main(name, w, h, bpp, fps, ready, stop):
+    with Producer(name, SyntheticSource(w, h, bpp, "bars"), fps) as prod:
+        ready.set()
+        prod.run(stop=stop)
+
+
+class ProducerProc:
+    def __init__(self, w, h, bpp, fps):
+        self.name = f"posix:sonycam_bench_{os.getpid()}_{w}x{h}_{bpp}"
+        self.stop, ready = mp.Event(), mp.Event()
+        self.proc = mp.Process(target=producer_main,
+                               args=(self.name, w, h, bpp, fps, ready, self.stop))
+        self.proc.start()
+        if not ready.wait(30):
+            self.close()
+            raise RuntimeError("producer did not start")
+
+    def close(self):
+        self.stop.set()
+        self.proc.join()
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_strategy(name, seg, seconds, alloc_frames=10):
+    m = open_segment(seg)
+    step = STRATEGIES[name](m)
+    try:
+        # 計測パス
+        lat, last_id, frames, dropped, nbytes = [], 0, 0, 0, 0
+        deadline_all = time.perf_counter() + 5.0
+        r = step(0, deadline_all)                       # 1 枚目は助走
+        if r is None:
+            raise RuntimeError("no frames from producer")
+        last_id = r[0]
+        cpu0, t0 = time.process_time(), time.perf_counter()
+        t_end = t0 + seconds
+        while True:
+            r = step(last_id, t_end)
+            if r is None:
+                break
+            fid, ts, n = r
+            lat.append(now_us() - ts)
+            dropped += max(0, fid - last_id - 1)
+            last_id = fid
+            frames += 1
+            nbytes += n
+        wall, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+        # 確保量パス（tracemalloc は遅いので別に数枚だけ）
+        tracemalloc.start()
+        peaks = []
+        for _ in range(alloc_frames):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            r = step(last_id, time.perf_counter() + 2.0)
+            if r is None:
+                break
+            last_id = r[0]
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+    finally:
+        getattr(step, "close", lambda: None)()
+        del step
+        m.close()
+    lat.sort()
+
+    def pct(p):
+        return lat[min(len(lat) - 1, int(len(lat) * p))] / 1000 if lat else None
+    return {
+        "strategy": name, "frames": frames, "dropped": dropped, "seconds": wall,
+        "fps": frames / wall, "GBps": nbytes / wall / 1e9,
+        "lat_ms_p50": pct(0.5), "lat_ms_p90": pct(0.9), "lat_ms_p99": pct(0.99),
+        "lat_ms_max": lat[-1] / 1000 if lat else None,
+        "cpu_ms_per_frame": cpu / frames * 1e3 if frames else None,
+        "alloc_kb_per_frame": sorted(peaks)[len(peaks) // 2] / 1024 if peaks else None,
+    }
+
+
+def soak(seg, name, seconds, every):
+    m = open_segment(seg)
+    step = STRATEGIES[name](m)
+    tracemalloc.start()
+    samples, last_id, frames = [], 0, 0
+    t0 = time.perf_counter()
+    t_next = t0
+    try:
+        while time.perf_counter() - t0 < seconds:
+            r = step(last_id, time.perf_counter() + 1.0)
+            if r is not None:
+                last_id = r[0]
+                frames += 1
+            if time.perf_counter() >= t_next:
+                samples.append((time.perf_counter() - t0, rss_bytes(), tracemalloc.get_traced_memory()[0]))
+                print(f"  t={samples[-1][0]:6.0f}s frames={frames:7d} rss={samples[-1][1] / 1e6:8.1f} MB "
+                      f"traced={samples[-1][2] / 1e6:7.2f} MB", flush=True)
+                t_next += every
+    finally:
+        tracemalloc.stop()
+        getattr(step, "close", lambda: None)()
+        del step
+        m.close()
+    # 立ち上がりの 1 サンプルを除いた増加量
+    first = samples[1] if len(samples) > 2 else samples[0]
+    return {
+        "strategy": name, "soak_seconds": seconds, "frames": frames,
+        "rss_start_mb": first[1] / 1e6, "rss_end_mb": samples[-1][1] / 1e6,
+        "rss_growth_mb": (samples[-1][1] - first[1]) / 1e6,
+        "traced_growth_mb": (samples[-1][2] - first[2]) / 1e6,
+        "samples": [{"t": t, "rss": r, "traced": tr} for t, r, tr in samples],
+    }
+
+
+def meta():
+    try:
+        import subprocess
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parent).stdout.strip() or None
+    except OSError:
+        rev = None
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "git": rev, "python": platform.python_version(),
+            "numpy": np.__version__, "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def compare(old_path, results):
+    with open(old_path) as f:
+        old = {(r["strategy"], r["w"], r["h"], r["bpp"]): r for r in json.load(f)["results"]}
+    print(f"\ncompared with {old_path} (new / old):")
+    for r in results:
+        o = old.get((r["strategy"], r["w"], r["h"], r["bpp"]))
+        if not o:
+            continue
+        ratio = [f"{k}={r[k] / o[k]:.2f}x" for k in ("fps", "lat_ms_p99", "cpu_ms_per_frame")
+                 if r.get(k) and o.get(k)]
+        print(f"  {r['strategy']:12s} {r['w']}x{r['h']} {r['bpp']:2d}b  " + " ".join(ratio))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default=SIZES)
+    ap.add_argument("--bpp", default="8,24,32")
+    ap.add_argument("--strategies", default=",".join(STRATEGIES))
+    ap.add_argument("--fps", type=float, default=60.0, help="生産者のレート")
+    ap.add_argument("--seconds", type=float, default=2.0, help="1 組み合わせの計測時間")
+    ap.add_argument("--json", default=None, help="結果を書く JSON ファイル")
+    ap.add_argument("--compare", default=None, help="前回の JSON と比べる")
+    ap.add_argument("--soak", type=float, default=None, help="長時間試験の秒数（--strategies の先頭 1 つ）")
+    ap.add_argument("--soak-every", type=float, default=10.0)
+    a = ap.parse_args()
+    sizes = [tuple(map(int, s.lower().split("x"))) for s in a.sizes.split(",")]
+    bpps = [int(b) for b in a.bpp.split(",")]
+    names = a.strategies.split(",")
+    for n in names:
+        if n not in STRATEGIES:
+            ap.error(f"unknown strategy {n!r} (choose from {', '.join(STRATEGIES)})")
+    out = {"meta": meta(), "producer_fps": a.fps, "results": []}
+
+    if a.soak:
+        w, h = sizes[-1]
+        prod = ProducerProc(w, h, bpps[-1], a.fps)
+        try:
+            print(f"soak: {names[0]} {w}x{h} {bpps[-1]}bpp @ {a.fps:.0f} fps for {a.soak:.0f}s")
+            r = soak(prod.name, names[0], a.soak, a.soak_every)
+        finally:
+            prod.close()
+        r.update(w=w, h=h, bpp=bpps[-1])
+        out["soak"] = r
+        print(f"rss growth {r['rss_growth_mb']:+.1f} MB, traced growth {r['traced_growth_mb']:+.2f} MB "
+              f"over {r['frames']} frames")
+    else:
+        print(f"producer {a.fps:.0f} fps, {a.seconds:g}s per cell")
+        print(f"{'strategy':12s} {'size':>9s} {'bpp':>3s} {'fps':>6s} {'drop':>5s} {'GB/s':>6s} "
+              f"{'p50ms':>6s} {'p90ms':>6s} {'p99ms':>6s} {'cpu ms/f':>8s} {'alloc KB/f':>10s}")
+        for w, h in sizes:
+            for bpp in bpps:
+                prod = ProducerProc(w, h, bpp, a.fps)
+                try:
+                    for n in names:
+                        r = run_strategy(n, prod.name, a.seconds)
+                        r.update(w=w, h=h, bpp=bpp)
+                        out["results"].append(r)
+                        print(f"{n:12s} {w:4d}x{h:<4d} {bpp:3d} {r['fps']:6.1f} {r['dropped']:5d} "
+                              f"{r['GBps']:6.2f} {r['lat_ms_p50']:6.2f} {r['lat_ms_p90']:6.2f} "
+                              f"{r['lat_ms_p99']:6.2f} {r['cpu_ms_per_frame']:8.2f} "
+                              f"{r['alloc_kb_per_frame']:10.1f}", flush=True)
+                finally:
+                    prod.close()
+        if a.compare:
+            compare(a.compare, out["results"])
+    if a.json:
+        with open(a.json, "w") as f:
+            json.dump(out, f, indent=1)
+        print(f"wrote {a.json}")
+
+
+if __name__ == "__main__":
+    main()
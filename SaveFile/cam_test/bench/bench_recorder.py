@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# bench_recorder.py — 生録画（Recorder）の書き込みスループットとクラッシュ耐性
+#   1) 上限: メモリ上のフレームを append() で積めるだけ積んだ時の MB/s と fps
+#   2) 実運用: 別プロセスの FrameWriter（--fps）から record() で共有メモリ → ファイルに直接書く
+#      取り逃し（skipped）が 0 か、各フレームに焼き込んだ frame_id が索引と一致するかを確認
+#   3) クラッシュ: 録画プロセスを SIGKILL（Windows は terminate）し、開き直して失ったのが最後の 1 枚以内か確認
+#   --dir は実ディスク上に置くこと（/dev/shm や tmpfs だとメモリ速度になる）
+#   python bench/bench_recorder.py --dir . [--fps 23] [--seconds 5]
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from _shm import map_file, temp_segment  # noqa: E402
+from sonycam.reader import FrameReader  # noqa: E402
+from sonycam.recorder import Recorder, Recording  # noqa: E402
+from sonycam.writer import FrameWriter, segment_size  # noqa: E402
+
+W, H, BPP = 2464, 2056, 24
+
+
+def stamp(px, fid):
+    """左上 8 バイトに frame_id を焼き込む（録画後の照合用）"""
+    px.reshape(-1)[:8] = np.frombuffer(int(fid).to_bytes(8, "little"), np.uint8)
+
+
+def stamped_id(img):
+    return int.from_bytes(np.ascontiguousarray(img).reshape(-1)[:8].tobytes(), "little")
+
+
+def producer(path, size, fps, stop):
+    wr = FrameWriter(map_file(path, size), W, H, BPP)
+    base = np.random.default_rng(1).integers(0, 256, (H, W, 3), dtype=np.uint8)
+    period = 1.0 / fps
+    t_next = time.perf_counter()
+    while not stop.is_set():
+        with wr.frame() as px:
+            np.copyto(px, base)
+            stamp(px, wr.frame_id + 1)
+        t_next += period
+        dt = t_next - time.perf_counter()
+        if dt > 0:
+            time.sleep(dt)
+    wr.close()
+
+
+def open_segment_when_ready(seg, size, timeout=10.0):
+    """生産者の FrameWriter が magic を書くまで待って開く（起動直後は 0 埋めのまま）"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return FrameReader(map_file(seg, size))
+        except ValueError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.01)
+
+
+def recorder_proc(seg, size, out, capacity, ready):
+    rd = open_segment_when_ready(seg, size)
+    rec = Recorder.create(out, rd.header, capacity)
+    rec.last_id = rd.frame_id
+    ready.set()
+    while rec.record(rd, timeout=1.0) is not False:
+        pass
+
+
+def bench_append(out, n):
+    stride = ((W * 3 + 3) // 4) * 4
+    frame = np.random.default_rng(2).integers(0, 256, stride * H, dtype=np.uint8)
+    t0 = time.perf_counter()
+    with Recorder(out, W, H, BPP, n) as rec:
+        for i in range(n):
+            rec.append(frame, i + 1, i)
+        st = rec.stats()
+    dt = time.perf_counter() - t0
+    print(f"append ceiling: {n} frames {st['MB']:.0f} MB in {dt:.2f}s -> "
+          f"{st['MB'] / dt:.0f} MB/s, {n / dt:.1f} fps (write() only: {st['write_MBps']:.0f} MB/s)")
+    os.unlink(out)
+
+
+def verify(out):
+    with Recording(out) as r:
+        bad = sum(stamped_id(r[i]) != int(r.frame_ids[i]) for i in range(len(r)))
+        n, ids, clean = len(r), r.frame_ids.copy(), r.closed_cleanly
+        if n:
+            mid = int(r.timestamps_us[n // 2])
+            assert r.find(int(ids[n // 2])) == n // 2 and r.index_at(mid) == n // 2
+    return n, ids, bad, clean
+
+
+def bench_record(seg, size, out, a):
+    stop = mp.Event()
+    p = mp.Process(target=producer, args=(seg, size, a.fps, stop))
+    p.start()
+    capacity = int(a.fps * a.seconds * 1.5) + 10
+    with open_segment_when_ready(seg, size) as rd:
+        with Recorder.create(out, rd.header, capacity) as rec:
+            rd.wait_for_frame(0, timeout=5.0)
+            rec.last_id = rd.frame_id
+            t_end = time.monotonic() + a.seconds
+            while time.monotonic() < t_end:
+                rec.record(rd, timeout=0.5)
+            st = rec.stats()
+    stop.set()
+    p.join()
+    n, ids, bad, clean = verify(out)
+    gaps = int(np.sum(np.diff(ids.astype(np.int64)) != 1)) if n > 1 else 0
+    print(f"record @ {a.fps:.0f} fps for {a.seconds:.0f}s: frames={st['frames']} skipped={st['skipped']} "
+          f"torn={st['torn']} write={st['write_MBps']:.0f} MB/s "
+          f"({a.fps * st['MB'] / max(1, st['frames']):.0f} MB/s needed)")
+    print(f"  verify: frames={n} id gaps={gaps} stamp mismatches={bad} closed_cleanly={clean}")
+    os.unlink(out)
+    return st["skipped"] == 0 and bad == 0
+
+
+def bench_crash(seg, size, out, a):
+    stop = mp.Event()
+    p = mp.Process(target=producer, args=(seg, size, a.fps, stop))
+    p.start()
+    ready = mp.Event()
+    r = mp.Process(target=recorder_proc, args=(seg, size, out, 1000, ready))
+    r.start()
+    ready.wait(10)
+    time.sleep(a.seconds / 2)
+    with open_segment_when_ready(seg, size) as rd:
+        published = rd.frame_id
+        r.kill()
+        r.join()
+    stop.set()
+    p.join()
+    n, ids, bad, clean = verify(out)
+    lost = published - int(ids[-1]) if n else published
+    print(f"crash: recorder killed at producer frame {published}; reopened {n} frames "
+          f"(last id={int(ids[-1]) if n else None}, behind by {lost}), stamp mismatches={bad}, "
+          f"closed_cleanly={clean}")
+    os.unlink(out)
+    return bad == 0 and lost <= 1
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dir", default=None, help="録画ファイルを置くフォルダ（既定: 一時フォルダ）")
+    ap.add_argument("--fps", type=float, default=23.0, help="2464x2056 時のカメラの最大レート相当")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--append-frames", type=int, default=100)
+    a = ap.parse_args()
+    d = a.dir or tempfile.gettempdir()
+    out = os.path.join(d, f"bench_{os.getpid()}.cbrv")
+    print(f"{W}x{H} {BPP}bpp, {segment_size(W, H, BPP) / 1e6:.1f} MB/frame, file: {out}")
+    bench_append(out, a.append_frames)
+    size = segment_size(W, H, BPP)
+    seg = temp_segment(size)
+    try:
+        ok = bench_record(seg, size, out, a)
+        ok &= bench_crash(seg, size, out, a)
+    finally:
+        os.unlink(seg)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# bench_ring.py — リング形式のスタンドイン生産者と、速い/遅い消費者を別プロセスで回す（カメラ不要）
+#   record : next() で全フレームを取りに行く（録画相当）→ dropped 0 が期待値
+#   slow   : next() + 1枚ごとに --work-ms の処理（PNG 保存相当）→ 追い越された分を dropped で報告
+#   latest : latest() + --work-ms の処理 → 常に最新へ飛ぶ（プレビュー相当）
+#   python bench/bench_ring.py --size 1232x1028 --bpp 24 --fps 30 --slots 8 --work-ms 150
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from _shm import map_file, temp_segment  # noqa: E402
+from sonycam.ring import RingReader, RingWriter, ring_size  # noqa: E402
+
+
+def producer(path, size, w, h, bpp, slots, fps, seconds, ready, result):
+    ring = RingWriter(map_file(path, size), w, h, bpp, slots)
+    ready.set()
+    period = 1.0 / fps if fps > 0 else 0.0
+    t0 = time.perf_counter()
+    t_next = t0
+    n = 0
+    while time.perf_counter() - t0 < seconds:
+        with ring.frame() as px:
+            px.fill(n & 0xFF)
+        n += 1
+        if period:
+            t_next += period
+            dt = t_next - time.perf_counter()
+            if dt > 0:
+                time.sleep(dt)
+    dt = time.perf_counter() - t0
+    result.put(("producer", n, n / dt, n * ring._views[0].nbytes / dt / 1e6))
+    ring.close()
+
+
+def consumer(path, size, mode, work_ms, seconds, result):
+    rd = RingReader(map_file(path, size))
+    out = np.empty(rd._views[0].shape, np.uint8)
+    got = 0
+    gaps = 0
+    last = 0
+    t_end = time.monotonic() + seconds + 0.5
+    while time.monotonic() < t_end:
+        r = rd.latest(out) if mode == "latest" else rd.next(out)
+        if r is None:
+            time.sleep(0.0005)
+            continue
+        fid = r[0]
+        if last and fid != last + 1:
+            gaps += fid - last - 1
+        last = fid
+        got += 1
+        if work_ms:
+            time.sleep(work_ms / 1000.0)
+    result.put((mode, got, gaps, rd.dropped))
+    del out
+    rd.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="1232x1028")
+    ap.add_argument("--bpp", type=int, default=24)
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--slots", type=int, default=8)
+    ap.add_argument("--work-ms", type=float, default=150.0)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    a = ap.parse_args()
+    w, h = map(int, a.size.lower().split("x"))
+    size = ring_size(w, h, a.bpp, a.slots)
+    path = temp_segment(size)
+
+    ready, result = mp.Event(), mp.Queue()
+    procs = [mp.Process(target=producer,
+                        args=(path, size, w, h, a.bpp, a.slots, a.fps, a.seconds, ready, result))]
+    procs[0].start()
+    ready.wait()
+    for mode, work in (("record", 0.0), ("slow", a.work_ms), ("latest", a.work_ms)):
+        p = mp.Process(target=consumer, args=(path, size, mode, work, a.seconds, result))
+        p.start()
+        procs.append(p)
+    rows = [result.get() for _ in procs]
+    for p in procs:
+        p.join()
+    os.unlink(path)
+
+    print(f"{w}x{h} {a.bpp}bpp slots={a.slots} target={a.fps}fps work={a.work_ms}ms")
+    for row in rows:
+        if row[0] == "producer":
+            _, n, fps, mbs = row
+            print(f"producer  frames={n:6d}  {fps:7.1f} fps  {mbs:8.1f} MB/s")
+    for row in rows:
+        if row[0] != "producer":
+            mode, got, gaps, dropped = row
+            print(f"{mode:8s}  got={got:6d}  gaps={gaps:6d}  dropped={dropped:6d}")
+
+
+if __name__ == "__main__":
+    main()
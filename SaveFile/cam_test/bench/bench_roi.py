@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# bench_roi.py — ROI・間引き読み出し（RegionPlan / read_roi / read_decimated）と全体読みの比較（カメラ不要）
+#   全体: string_at（旧）/ read_frame（seqlock 付き所有コピー）
+#   ROI: 256x256 を 1 つ / 128x128 を 4 つ、間引き: skip 2・4・8 / bin 4
+#   表示: 1 回あたりの時間、触れるバイト数（64B キャッシュライン換算）、出力バイト数
+#   python bench/bench_roi.py [--size 2464x2056] [--bpp 24] [--bottom-up] [-n 50]
+import argparse
+import ctypes as C
+import mmap
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sonycam.header import FLAG_BOTTOM_UP, HDR_SIZE, MAGIC, ShmHeader, aligned_stride  # noqa: E402
+from sonycam.reader import FrameReader  # noqa: E402
+from sonycam.roi import RegionPlan  # noqa: E402
+
+
+def make_segment(w, h, bpp, bottom_up):
+    stride = aligned_stride(w, bpp)
+    m = mmap.mmap(-1, HDR_SIZE + stride * h)
+    hdr = ShmHeader.from_buffer(m)
+    hdr.magic, hdr.width, hdr.height, hdr.bpp, hdr.stride = MAGIC, w, h, bpp, stride
+    hdr.flags = FLAG_BOTTOM_UP if bottom_up else 0
+    hdr.frame_id = 1
+    del hdr
+    px = np.frombuffer(m, np.uint8, count=stride * h, offset=HDR_SIZE)
+    px[:] = np.random.randint(0, 256, px.size, dtype=np.uint8)
+    del px
+    return m, stride
+
+
+def measure(fn, n):
+    fn()                                          # ウォームアップ（計画・出力の作成）
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="2464x2056")
+    ap.add_argument("--bpp", type=int, default=24)
+    ap.add_argument("--bottom-up", action="store_true")
+    ap.add_argument("-n", type=int, default=50)
+    a = ap.parse_args()
+    w, h = map(int, a.size.lower().split("x"))
+    m, stride = make_segment(w, h, a.bpp, a.bottom_up)
+    rd = FrameReader(m)
+    full_bytes = stride * h
+    pix_ptr = C.addressof(C.c_char.from_buffer(m)) + HDR_SIZE
+    out = rd.snapshot()
+
+    rows = [("string_at (full)", lambda: np.frombuffer(C.string_at(pix_ptr, full_bytes), np.uint8).copy(),
+             full_bytes, full_bytes),
+            ("read_frame (full)", lambda: rd.read_frame(out), full_bytes, out.nbytes)]
+    cases = [("roi 256x256", [(w // 2 - 128, h // 2 - 128, 256, 256)], 1, "skip"),
+             ("4 x roi 128x128", [(x, y, 128, 128) for x in (64, w - 192) for y in (64, h - 192)], 1, "skip"),
+             ("skip 2", None, 2, "skip"), ("skip 4", None, 4, "skip"), ("skip 8", None, 8, "skip"),
+             ("bin 4", None, 4, "bin")]
+    plans = []
+    for label, rois, step, mode in cases:
+        plan = RegionPlan.from_header(rd.header, rois, step, mode)
+        plans.append(plan)
+        nbytes = sum(o.nbytes for o in plan.outputs)
+        rows.append((label, lambda plan=plan: rd.read_regions(plan), plan.bytes_touched, nbytes))
+
+    print(f"{w}x{h} {a.bpp}bpp stride={stride} bottom_up={a.bottom_up}  (n={a.n})")
+    print(f"{'read':20s} {'ms/read':>9s} {'touched MB':>11s} {'output MB':>10s} {'vs read_frame':>14s}")
+    base = None
+    for label, fn, touched, nbytes in rows:
+        dt = measure(fn, a.n)
+        if label.startswith("read_frame"):
+            base = dt
+        speed = f"x{base / dt:6.1f}" if base else ""
+        print(f"{label:20s} {dt * 1e3:9.3f} {touched / 1e6:11.2f} {nbytes / 1e6:10.3f} {speed:>14s}")
+    for plan in plans:
+        plan.release()
+    rd.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# bench_server.py — FrameServer（MJPEG / 生フレーム TCP）をクライアント 1 / 10 / 50 本で測る（Linux でも動く）
+#   生産者: Producer（スタンドイン、--size / --fps）を別プロセスで
+#   サーバ: FrameServer を別プロセスで（CPU 時間とエンコード回数を /stats から取る）
+#   クライアント: --procs プロセスにスレッドで分けて接続。半分は MJPEG（?scale=0.5）、半分は生フレーム（scale=0.25）、
+#     4 本以上なら MJPEG と生の 1 本ずつを 1 枚ごとに --slow-ms 掛かる遅いクライアントにする（最新へ間引かれて遅延が溜まらないことを見る）
+#   表示: クライアントあたりの fps・合計 MB/s・遅延（timestamp_us からの経過）・エンコード回数 / 取り込み枚数
+#   python bench/bench_server.py [--clients 1,10,50] [--size 2464x2056] [--fps 30] [--seconds 5]
+import argparse
+import json
+import multiprocessing as mp
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sonycam.header import now_us  # noqa: E402
+from sonycam.producer import Producer, SyntheticSource  # noqa: E402
+from sonycam.server import FrameServer, RawClient  # noqa: E402
+
+
+def producer(name, w, h, fps, ready, stop):
+    with Producer(name, SyntheticSource(w, h, 24), fps, telemetry=False) as p:
+        ready.set()
+        p.run(stop=stop)
+
+
+def server(name, ports, ready, stop, q):
+    with FrameServer(name, "127.0.0.1", 0, 0) as srv:
+        srv.start()
+        ports.put((srv.address[1], srv.raw_address[1]))
+        ready.set()
+        stop.wait()
+        q.put((srv.stats(), time.process_time()))
+
+
+def mjpeg_client(port, query, seconds, slow_ms, out):
+    s = socket.create_connection(("127.0.0.1", port), 5.0)
+    s.sendall(f"GET /stream.mjpg?{query} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+    f = s.makefile("rb")
+    while f.readline() not in (b"\r\n", b""):          # 応答ヘッダ
+        pass
+    n = nbytes = 0
+    ages = []
+    t_end = time.monotonic() + seconds
+    while time.monotonic() < t_end:
+        ts = length = None
+        while True:
+            line = f.readline()
+            if not line:
+                t_end = 0
+                break
+            if line == b"\r\n" and length is not None:
+                break
+            k, _, v = line.decode().partition(":")
+            if k.lower() == "content-length":
+                length = int(v)
+            elif k.lower() == "x-timestamp-us":
+                ts = int(v)
+        if not t_end:
+            break
+        f.read(length + 2)
+        ages.append(now_us() - ts)
+        n += 1
+        nbytes += length
+        if slow_ms:
+            time.sleep(slow_ms / 1000)
+    s.close()
+    out.append(("mjpeg", slow_ms > 0, n, nbytes, ages))
+
+
+def raw_client(port, query, seconds, slow_ms, out):
+    n = nbytes = 0
+    ages = []
+    with RawClient("127.0.0.1", port, query) as rc:
+        t_end = time.monotonic() + seconds
+        while time.monotonic() < t_end:
+            fid, ts, img = rc.recv()
+            ages.append(now_us() - ts)
+            n += 1
+            nbytes += img.nbytes
+            if slow_ms:
+                time.sleep(slow_ms / 1000)
+    out.append(("raw", slow_ms > 0, n, nbytes, ages))
+
+
+def client_proc(specs, seconds, q):
+    out = []
+    ts = [threading.Thread(target=raw_client if kind == "raw" else mjpeg_client,
+                           args=(port, query, seconds, slow, out)) for kind, port, query, slow in specs]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    q.put(out)
+
+
+def pct(v, p):
+    v = sorted(v)
+    return v[min(len(v) - 1, int(len(v) * p))] / 1e3 if v else float("nan")
+
+
+def run(name, n, a):
+    ports, ready, stop, sq = mp.Queue(), mp.Event(), mp.Event(), mp.Queue()
+    srv = mp.Process(target=server, args=(name, ports, ready, stop, sq))
+    srv.start()
+    ready.wait(10)
+    http_port, raw_port = ports.get()
+    specs = []
+    for i in range(n):
+        slow = a.slow_ms if (n >= 4 and i >= n - 2) else 0.0
+        if i % 2 == 0:
+            specs.append(("mjpeg", http_port, "scale=0.5&q=80", slow))
+        else:
+            specs.append(("raw", raw_port, "scale=0.25", slow))
+    procs = min(n, a.procs)
+    q = mp.Queue()
+    ps = [mp.Process(target=client_proc, args=(specs[i::procs], a.seconds, q)) for i in range(procs)]
+    try:
+        for p in ps:
+            p.start()
+        res = [r for _ in ps for r in q.get()]
+        for p in ps:
+            p.join()
+        snap = urllib.request.urlopen(f"http://127.0.0.1:{http_port}/snapshot.jpg?scale=0.25").read()
+        assert snap[:2] == b"\xff\xd8", "snapshot is not a JPEG"
+        for _ in range(20):                       # 切断したクライアントは次の送信で外れる
+            live = json.loads(urllib.request.urlopen(f"http://127.0.0.1:{http_port}/stats").read())
+            if not live["clients"]:
+                break
+            time.sleep(0.1)
+        assert not live["clients"], f"clients left registered after disconnect: {live['clients']}"
+    finally:
+        stop.set()
+    st, cpu = sq.get()
+    srv.join()
+    fast = [r for r in res if not r[1]]
+    slow = [r for r in res if r[1]]
+    fps = [r[2] / a.seconds for r in fast]
+    mbps = sum(r[3] for r in res) / a.seconds / 1e6
+    ages = [x for r in fast for x in r[4]]
+    streams = {k: v for k, v in st["encodes"].items() if k in st["served"] and st["served"][k] > 1}
+    per_frame = max(streams.values()) / max(1, st["frames"]) if streams else 0.0
+    line = (f"clients={n:3d}: fps/client mean={sum(fps) / len(fps):5.1f} min={min(fps):5.1f} "
+            f"total={mbps:7.1f} MB/s latency p50={pct(ages, .5):6.1f} p99={pct(ages, .99):6.1f} ms | "
+            f"captured={st['frames']} encodes={sum(st['encodes'].values())} "
+            f"(max {per_frame:.2f}/frame per format, served={sum(st['served'].values())}) "
+            f"server CPU={cpu / a.seconds * 100:.0f}%")
+    for s in slow:
+        line += (f"\n             slow {s[0]:5s} ({a.slow_ms:.0f} ms/frame): frames={s[2]} "
+                 f"latency p50={pct(s[4], .5):.1f} max={pct(s[4], 1):.1f} ms")
+    print(line, flush=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", default="1,10,50")
+    ap.add_argument("--size", default="2464x2056")
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--slow-ms", type=float, default=200.0)
+    ap.add_argument("--procs", type=int, default=max(1, min(8, (os.cpu_count() or 2) // 2)),
+                    help="クライアントを分けるプロセス数")
+    a = ap.parse_args()
+    w, h = map(int, a.size.lower().split("x"))
+    name = f"posix:bench_server_{os.getpid()}"
+    ready, stop = mp.Event(), mp.Event()
+    prod = mp.Process(target=producer, args=(name, w, h, a.fps, ready, stop))
+    prod.start()
+    ready.wait(30)
+    print(f"{w}x{h} 24bpp @ {a.fps:g} fps, {a.seconds:g} s per run; "
+          f"mjpeg ?scale=0.5 / raw scale=0.25 alternating")
+    try:
+        for n in (int(v) for v in a.clients.split(",")):
+            run(name, n, a)
+    finally:
+        stop.set()
+        prod.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# bench_wait.py — 新着フレーム検出の遅延と CPU 使用率: 既存の sleep ポーリング vs wait_for_frame
+#   遅延 = 検出時刻 - ヘッダの timestamp_us（同じ monotonic 時計。Linux ならプロセス間で共通）
+#   CPU  = 消費側プロセスの CPU 時間 / 経過時間
+#   python bench/bench_wait.py --fps 30 --seconds 3
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from _shm import map_file, temp_segment  # noqa: E402
+from sonycam.reader import FrameReader  # noqa: E402
+from sonycam.writer import FrameWriter, now_us, segment_size  # noqa: E402
+
+W, H, BPP = 640, 480, 32
+
+
+def producer(path, size, fps, signal, stop):
+    wr = FrameWriter(map_file(path, size), W, H, BPP)
+    if not signal:
+        wr.signal = None               # 通知しない旧ブリッジ相当
+    period = 1.0 / fps
+    t_next = time.perf_counter()
+    while not stop.is_set():
+        with wr.frame() as px:
+            px[0, 0, 0] = wr.frame_id & 0xFF
+        t_next += period
+        dt = t_next - time.perf_counter()
+        if dt > 0:
+            time.sleep(dt)
+    wr.close()
+
+
+def poll_loop(rd, interval):
+    last = rd.frame_id
+
+    def step():
+        nonlocal last
+        while True:
+            fid = rd.frame_id
+            if fid != last:
+                last = fid
+                return fid
+            time.sleep(interval)
+    return step
+
+
+def wait_loop(rd):
+    last = rd.frame_id
+
+    def step():
+        nonlocal last
+        last = rd.wait_for_frame(last, timeout=1.0) or last
+        return last
+    return step
+
+
+def pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else float("nan")
+
+
+def run(path, size, fps, seconds, signal, make_step):
+    stop = mp.Event()
+    p = mp.Process(target=producer, args=(path, size, fps, signal, stop))
+    p.start()
+    time.sleep(0.2)
+    rd = FrameReader(map_file(path, size))
+    step = make_step(rd)
+    lat = []
+    c0, t0 = time.process_time(), time.monotonic()
+    while time.monotonic() - t0 < seconds:
+        step()
+        lat.append((now_us() - rd.header.timestamp_us) / 1000.0)
+    cpu = (time.process_time() - c0) / (time.monotonic() - t0) * 100
+    stop.set()
+    p.join()
+    rd.close()
+    return lat, cpu
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    a = ap.parse_args()
+    size = segment_size(W, H, BPP)
+    path = temp_segment(size)
+    FrameWriter(map_file(path, size), W, H, BPP).close()
+
+    cases = [
+        ("poll sleep 1ms (cam_test)", True, lambda rd: poll_loop(rd, 0.001)),
+        ("poll sleep 2ms (stream_bayer)", True, lambda rd: poll_loop(rd, 0.002)),
+        ("poll sleep 100ms (multi_shot)", True, lambda rd: poll_loop(rd, 0.1)),
+        ("poll sleep 300ms (watch_hdr)", True, lambda rd: poll_loop(rd, 0.3)),
+        ("wait_for_frame (signal)", True, wait_loop),
+        ("wait_for_frame (no signal)", False, wait_loop),
+    ]
+    print(f"producer {a.fps:.0f} fps, {a.seconds:.0f}s per case")
+    print(f"{'strategy':32s} {'frames':>6s} {'p50 ms':>8s} {'p99 ms':>8s} {'CPU %':>6s}")
+    try:
+        for name, signal, make_step in cases:
+            lat, cpu = run(path, size, a.fps, a.seconds, signal, make_step)
+            print(f"{name:32s} {len(lat):6d} {pct(lat, 0.5):8.2f} {pct(lat, 0.99):8.2f} {cpu:6.1f}")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
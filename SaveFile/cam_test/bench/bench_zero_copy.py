@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# bench_zero_copy.py — 1フレーム読み出しあたりのコピー量/時間を比較（カメラ不要）
+#   旧: string_at + frombuffer.copy / mmap.read
+#   新: FrameReader.pixels()（ビュー）/ snapshot()（所有コピー1回）
+import ctypes as C
+import mmap
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sonycam.header import HDR_SIZE, MAGIC, ShmHeader, aligned_stride  # noqa: E402
+from sonycam.reader import FrameReader  # noqa: E402
+
+W, H, BPP = 2464, 2056, 32
+N = 20
+
+
+def make_segment(w, h, bpp):
+    stride = aligned_stride(w, bpp)
+    m = mmap.mmap(-1, HDR_SIZE + stride * h)
+    hdr = ShmHeader.from_buffer(m)
+    hdr.magic, hdr.width, hdr.height, hdr.bpp, hdr.stride = MAGIC, w, h, bpp, stride
+    hdr.frame_id = 1
+    del hdr
+    px = np.frombuffer(m, np.uint8, count=stride * h, offset=HDR_SIZE)
+    px[:] = np.random.randint(0, 256, px.size, dtype=np.uint8)
+    del px
+    return m, stride
+
+
+def measure(fn):
+    fn()  # ウォームアップ（キャッシュ作成など）
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    peak = 0
+    for _ in range(N):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        r = fn()
+        del r
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    dt = (time.perf_counter() - t0) / N
+    tracemalloc.stop()
+    return dt, peak
+
+
+def main():
+    m, stride = make_segment(W, H, BPP)
+    addr = C.addressof(C.c_char.from_buffer(m))
+    pix_ptr = addr + HDR_SIZE
+    c = BPP // 8
+
+    def old_string_at():
+        raw = C.string_at(pix_ptr, stride * H)
+        arr = np.frombuffer(raw, np.uint8).copy()
+        return arr.reshape(H, stride)[:, :W * c].reshape(H, W, c)
+
+    def old_mmap_read():
+        m.seek(HDR_SIZE)
+        raw = m.read(stride * H)
+        return np.frombuffer(raw, np.uint8).reshape(H, stride)[:, :W * c].reshape(H, W, c)
+
+    rd = FrameReader(m)
+    out = np.empty((H, W, c), np.uint8)
+
+    cases = [
+        ("string_at + copy", old_string_at, 2 * stride * H),
+        ("mmap.read", old_mmap_read, stride * H),
+        ("reader.frame_id", lambda: rd.frame_id, 0),
+        ("reader.pixels()", rd.pixels, 0),
+        ("reader.snapshot()", rd.snapshot, W * H * c),
+        ("reader.snapshot(out)", lambda: rd.snapshot(out), W * H * c),
+    ]
+    print(f"{W}x{H} {BPP}bpp stride={stride} frame={stride * H / 1e6:.1f}MB  N={N}")
+    print(f"{'strategy':24s} {'ms/frame':>9s} {'copied MB':>10s} {'alloc MB':>9s}")
+    for name, fn, copied in cases:
+        dt, peak = measure(fn)
+        print(f"{name:24s} {dt * 1e3:9.3f} {copied / 1e6:10.1f} {peak / 1e6:9.1f}")
+
+    out = None                            # ラムダが掴んでいるので del ではなく None
+    rd.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# check_abort.py — 書き込み中に例外で抜けたフレームが公開されないことの確認（カメラ不要）
+#   1 枚公開 → 次の frame() の途中（半分の行だけ書いた所）で例外 → 読み手は書きかけを返さないこと
+#   その後の frame() で正常に続きから公開できること（frame_id は 1 つだけ進む）
+#   リング（RingWriter）: 書きかけのスロットは奇数のまま、write_index は進まず、latest()/next() が返さないこと
+#   python bench/check_abort.py
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sonycam.reader import FrameReader, TornFrameError  # noqa: E402
+from sonycam.ring import RingReader, RingWriter, ring_size  # noqa: E402
+from sonycam.writer import FrameWriter, segment_size  # noqa: E402
+
+W, H = 4, 4
+
+
+class Abort(Exception):
+    pass
+
+
+def check_writer():
+    buf = bytearray(segment_size(W, H, 8))
+    wr = FrameWriter(buf, W, H, 8)
+    rd = FrameReader(buf)
+    wr.publish(np.full((H, W), 1, np.uint8))
+    try:
+        with wr.frame() as px:
+            px[:H // 2] = 9
+            raise Abort
+    except Abort:
+        pass
+    aborted = (wr.frame_id, rd.seq)
+    try:
+        got = rd.read_frame(timeout=0.05)[2]
+    except TornFrameError:
+        got = None
+    hidden = got is None or got.min() == got.max() == 1
+    fid = wr.publish(np.full((H, W), 2, np.uint8))
+    _, _, img = rd.read_frame()
+    resumed = fid == 2 and not rd.seq & 1 and img.min() == img.max() == 2
+    ok = aborted[0] == 1 and aborted[1] & 1 and hidden and resumed
+    print(f"  FrameWriter  after abort: frame_id={aborted[0]} seq={aborted[1]}"
+          f"  partial hidden={hidden}  resumed={resumed}  {'OK' if ok else 'NG'}")
+    rd.close()
+    wr.close()
+    return ok
+
+
+def check_ring(nslots=2):
+    buf = bytearray(ring_size(W, H, 8, nslots))
+    ring = RingWriter(buf, W, H, 8, nslots)
+    rd = RingReader(buf)
+    for v in range(1, nslots + 1):
+        ring.publish(np.full((H, W), v, np.uint8))
+    try:
+        with ring.frame() as px:          # 最古（frame 1）のスロットを半分だけ上書き
+            px[:H // 2] = 9
+            raise Abort
+    except Abort:
+        pass
+    wi, state = ring.write_index, ring.slots[0].state
+    seen = []
+    r = rd.latest()
+    seen.append(r)
+    while True:
+        r = rd.next()
+        if r is None:
+            break
+        seen.append(r)
+    rd.last_id = 0                        # 追い越された前提で最古から読み直す
+    seen.append(rd.next())
+    old = RingReader(buf)                 # frame 1 を要求する（遅れた）読み手
+    seen.append(old._read(1, None))
+    hidden = all(r is None or (r[2].min() == r[2].max() and r[2].max() != 9) for r in seen)
+    fid = ring.publish(np.full((H, W), nslots + 1, np.uint8))
+    r = rd.latest()
+    resumed = (fid == nslots + 1 and r is not None and r[0] == fid
+               and r[2].min() == r[2].max() == nslots + 1 and not ring.slots[0].state & 1)
+    ok = wi == nslots and state & 1 and hidden and resumed
+    print(f"  RingWriter   after abort: write_index={wi} slot state={state}"
+          f"  partial hidden={hidden}  resumed={resumed}  {'OK' if ok else 'NG'}")
+    old.close()
+    rd.close()
+    ring.close()
+    return ok
+
+
+def main():
+    print("aborted frame() is not published:")
+    ok = check_writer()
+    ok &= check_ring()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# check_bayer.py — Bayer 転送モードの確認（CAM1.exe 無しで Linux でも動く）
+#   生産者: 色帯のテスト画像を CFA 並びでモザイクにし、FrameWriter で別プロセスから書く（flags に並び）
+#   消費者: Demosaicer でフル解像度 / 半分解像度に戻し、各色帯の中央の色が元と合うか確認する
+#   全 4 並び x 行順（上から下 / 下から上）を確認した後、RGB8 と Bayer の転送・コピー・demosaic 時間を比べる
+#   python bench/check_bayer.py [--size 2464x2056] [-n 20]
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from _shm import map_file, temp_segment  # noqa: E402
+from sonycam.bayer import Demosaicer  # noqa: E402
+from sonycam.convert import Converter  # noqa: E402
+from sonycam.header import FLAG_BOTTOM_UP, CFA_PATTERNS, cfa_flags  # noqa: E402
+from sonycam.reader import FrameReader  # noqa: E402
+from sonycam.writer import FrameWriter, segment_size  # noqa: E402
+
+# BGR の色帯（彩度が高く、互いに区別しやすい色）
+BARS = [(40, 40, 220), (40, 220, 40), (220, 40, 40), (40, 220, 220), (220, 40, 220), (220, 220, 40)]
+TOL = 12
+
+
+def color_bars(w, h):
+    img = np.empty((h, w, 3), np.uint8)
+    edges = np.linspace(0, w, len(BARS) + 1).astype(int)
+    for c, x0, x1 in zip(BARS, edges[:-1], edges[1:]):
+        img[:, x0:x1] = c
+    return img, edges
+
+
+def mosaic(bgr, pattern):
+    """上から下の BGR 画像 → CFA 並びの生値（センサーの読み出しと同じ並び）"""
+    ch = {"R": 2, "G": 1, "B": 0}
+    layout = {"RG": "RGGB", "GR": "GRBG", "GB": "GBRG", "BG": "BGGR"}[pattern]
+    raw = np.empty(bgr.shape[:2], np.uint8)
+    for (dy, dx), c in zip(((0, 0), (0, 1), (1, 0), (1, 1)), layout):
+        raw[dy::2, dx::2] = bgr[dy::2, dx::2, ch[c]]
+    return raw
+
+
+def producer(path, size, w, h, pattern, bottom_up):
+    flags = cfa_flags(pattern) | (FLAG_BOTTOM_UP if bottom_up else 0)
+    wr = FrameWriter(map_file(path, size), w, h, 8, flags=flags)
+    raw = mosaic(color_bars(w, h)[0], pattern)
+    wr.publish(raw[::-1] if bottom_up else raw)          # DIB と同じく下から上ならメモリ上は逆順
+    wr.close()
+
+
+def bar_errors(img, edges, scale=1):
+    errs = []
+    cy = img.shape[0] // 2
+    for c, x0, x1 in zip(BARS, edges[:-1], edges[1:]):
+        cx = (x0 + x1) // 2 // scale
+        got = img[cy - 2:cy + 3, cx - 2:cx + 3].reshape(-1, 3).mean(axis=0)
+        errs.append(float(np.abs(got - c).max()))
+    return max(errs)
+
+
+def check_patterns(w, h):
+    size = segment_size(w, h, 8)
+    ok = True
+    for pattern in CFA_PATTERNS[1:]:
+        for bottom_up in (False, True):
+            path = temp_segment(size)
+            try:
+                p = mp.Process(target=producer, args=(path, size, w, h, pattern, bottom_up))
+                p.start()
+                p.join()
+                with FrameReader(map_file(path, size)) as rd:
+                    dm = Demosaicer.from_header(rd.header)
+                    frame = dm.read(rd)
+                    lazy = not frame.demosaiced
+                    _, edges = color_bars(w, h)
+                    e_full = bar_errors(frame.image, edges)
+                    e_half = bar_errors(frame.preview(), edges, scale=2)
+            finally:
+                os.unlink(path)
+            good = lazy and e_full <= TOL and e_half <= TOL
+            ok &= good
+            order = "bottom-up" if bottom_up else "top-down"
+            print(f"  {pattern} {order:>9s}  full err={e_full:5.1f}  half err={e_half:5.1f}"
+                  f"  lazy={lazy}  {'OK' if good else 'NG'}")
+    return ok
+
+
+def timeit(fn, n):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n
+
+
+def bench(w, h, n):
+    rgb = color_bars(w, h)[0]
+    raw = mosaic(rgb, "RG")
+    rows = []
+    for label, bpp, img, flags in (("RGB8", 24, rgb, 0), ("BayerRG8", 8, raw, cfa_flags("RG"))):
+        buf = bytearray(segment_size(w, h, bpp))
+        wr = FrameWriter(buf, w, h, bpp, flags=flags)
+        rd = FrameReader(buf)
+        out = np.empty(rd.pixels().shape, np.uint8)
+        t_pub = timeit(lambda: wr.publish(img), n)
+        t_copy = timeit(lambda: rd.read_frame(out), n)
+        rows.append((label, rd.header.stride * h, t_pub, t_copy))
+        rd.close()
+        wr.close()
+    print(f"{w}x{h}, n={n}")
+    print(f"{'format':>9s} {'MB/frame':>9s} {'publish ms':>11s} {'read_frame ms':>14s}")
+    for label, nbytes, t_pub, t_copy in rows:
+        print(f"{label:>9s} {nbytes / 1e6:9.2f} {t_pub * 1e3:11.2f} {t_copy * 1e3:14.2f}")
+
+    dm = Demosaicer(w, h, "RG")
+    full_out, half_out = dm.full.new_output(), dm.half.new_output()
+    ea = Converter(w, h, 8, None, False, "bgr", cfa="RG", edge_aware=True)
+    print("demosaic (consumer side, only when pixels are requested):")
+    for label, fn in (("full bilinear", lambda: dm.full(raw, full_out)),
+                      ("full edge-aware", lambda: ea(raw, full_out)),
+                      ("half 2x2 bin", lambda: dm.half(raw, half_out))):
+        print(f"  {label:16s} {timeit(fn, n) * 1e3:7.2f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="2464x2056")
+    ap.add_argument("-n", type=int, default=20)
+    a = ap.parse_args()
+    w, h = map(int, a.size.lower().split("x"))
+    print("CFA patterns (synthetic producer process -> Demosaicer):")
+    ok = check_patterns(w, h)
+    bench(w, h, a.n)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# check_control.py — 制御ページ（CBRC）の確認（カメラ不要。CAM1.exe の代わりに sonycam-produce --bridge）
+#   effect:  ゲイン・露光を変え、応答の effective_frame より前のフレームは元の明るさ、以降は新しい明るさであること
+#            （スタンドインは露光・ゲインを明るさの倍率として絵に掛ける）。--control-lag でも同じ
+#   latency: 要求を出してから応答を見るまで（ブリッジは Capture の前に見るので 1 フレーム周期以内のはず）
+#   status:  範囲外 / 幅の変わる ROI / 画素形式 / 知らない設定が ok にならないこと
+#   clients: 複数プロセスが同時に要求しても request_id が重ならず、全部に答えること
+#   restart: ブリッジが止まっている間に出した要求に、起動し直したブリッジが答えること
+#   python bench/check_control.py [--size 1280x960] [--fps 30] [--iters 40]
+import argparse
+import multiprocessing as mp
+import os
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sonycam.control import (STATUS_INVALID, STATUS_OK, STATUS_RESTART, STATUS_UNSUPPORTED,  # noqa: E402
+                             CameraControl, ControlError)
+from sonycam.launcher import launch_cam, stop_cam  # noqa: E402
+from sonycam.reader import attach  # noqa: E402
+
+ROOT = str(Path(__file__).resolve().parents[1])
+
+
+def stand_in(name, size, fps, lag=0):
+    code = f"import sys; sys.path.insert(0, {ROOT!r}); from sonycam.cli import produce_main; sys.exit(produce_main())"
+    argv = [sys.executable, "-c", code, "--bridge", "--size", size, "--fps", str(fps), "--pattern", "checker",
+            "--control-lag", str(lag)]
+    return launch_cam(None, name, argv=argv)
+
+
+class Means:
+    """全フレームの明るさ（1/8 に間引いて平均）を frame_id ごとに記録"""
+
+    def __init__(self, name):
+        self.rd = attach(name, timeout=20.0)
+        self.means = {}
+        self._stop = threading.Event()
+        self._t = threading.Thread(target=self._loop, daemon=True)
+        self._t.start()
+
+    def _loop(self):
+        last = self.rd.frame_id
+        while not self._stop.is_set():
+            if self.rd.wait_for_frame(last, 0.1) is None:
+                continue
+            fid, _, small = self.rd.read_decimated(8)
+            self.means[fid] = float(small.mean())
+            last = fid
+
+    def close(self):
+        self._stop.set()
+        self._t.join(2.0)
+        self.rd.close()
+
+
+def effect(ctl, m, key, value, wait_frames=6):
+    """設定を変えて、effective_frame の前後で明るさが切り替わったか -> (ack, 前, 後, ずれ無し)"""
+    ack = ctl.set(key, value)
+    eff = ack.effective_frame
+    deadline = time.monotonic() + 5.0
+    while max(m.means, default=0) < eff + wait_frames and time.monotonic() < deadline:
+        time.sleep(0.02)
+    before = [v for f, v in m.means.items() if eff - wait_frames <= f < eff]
+    after = [v for f, v in m.means.items() if eff <= f < eff + wait_frames]
+    exact = bool(before and after) and max(before) - min(before) < 0.5 and max(after) - min(after) < 0.5 \
+        and abs(before[-1] - after[0]) > 1.0
+    return ack, before[-1] if before else None, after[0] if after else None, exact
+
+
+def client(name, n, out):
+    with CameraControl(name) as ctl:
+        rids = []
+        for i in range(n):
+            ack = ctl.set("gain_db", 18.0 + (i % 4))
+            rids.append((ack.request_id, ack.status))
+        out.put(rids)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="1280x960")
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--iters", type=int, default=40)
+    ap.add_argument("--clients", type=int, default=4)
+    a = ap.parse_args()
+    name = f"posix:control_check_{os.getpid()}"
+    w, h = map(int, a.size.lower().split("x"))
+    period_ms = 1e3 / a.fps
+    ok = True
+
+    for lag in (0, 2):
+        proc = stand_in(name, a.size, a.fps, lag)
+        try:
+            m = Means(name)
+            with CameraControl(name, timeout=10.0) as ctl:
+                time.sleep(0.3)
+                for key, value in (("gain_db", 24.0), ("exposure_us", 5000.0), ("gain_db", 18.0),
+                                   ("exposure_us", 10000.0)):
+                    ack, b, c, exact = effect(ctl, m, key, value)
+                    print(f"lag {lag}: {key:11s} -> {value:7g} request {ack.request_id:3d} effective_frame "
+                          f"{ack.effective_frame:4d}  mean {b:6.1f} -> {c:6.1f}  switch exactly there: {exact}")
+                    ok &= exact
+                if lag:
+                    continue
+
+                ts = []
+                for i in range(a.iters):
+                    ts.append(ctl.set("gain_db", 18.0).latency_s * 1e3)
+                    time.sleep(0.007 * (i % 5))            # フレーム周期の中のいろいろな位置から
+                ts.sort()
+                p50, p99 = ts[len(ts) // 2], ts[int(len(ts) * 0.99)]
+                print(f"ack latency: p50 {p50:5.1f} ms  p99 {p99:5.1f} ms  (frame period {period_ms:.1f} ms)")
+                ok &= p99 < 2.5 * period_ms
+
+                cases = [("gain_db", 99.0, STATUS_INVALID), ("exposure_us", -1.0, STATUS_INVALID),
+                         ("roi", (0, 0, w // 2, h // 2), STATUS_RESTART),   # 幅・高さが今と違う
+                         ("roi", (16, 8) + tuple(ctl.get("roi")[2:]), STATUS_OK),
+                         ("pixel_format", 0x01080001, STATUS_RESTART), (9, 1.0, STATUS_UNSUPPORTED),
+                         ("trigger", 1, STATUS_OK), ("trigger", 0, STATUS_OK)]
+                for key, value, want in cases:
+                    ack = ctl.wait(ctl.submit(key, value))
+                    print(f"  {str(key):12s} {str(value):22s} -> status {ack.status} value {ack.value}")
+                    ok &= ack.status == want
+                print(f"  settings now: {ctl.settings()}")
+
+                q = mp.Queue()
+                ps = [mp.Process(target=client, args=(name, 25, q)) for _ in range(a.clients)]
+                t0 = time.perf_counter()
+                for p in ps:
+                    p.start()
+                got = [q.get(timeout=60) for _ in ps]
+                for p in ps:
+                    p.join()
+                rids = [r for g in got for r, _ in g]
+                print(f"{a.clients} clients x 25 requests: {len(rids)} answered, {len(set(rids))} distinct ids, "
+                      f"all ok={all(s == STATUS_OK for g in got for _, s in g)} "
+                      f"in {time.perf_counter() - t0:.2f} s")
+                ok &= len(set(rids)) == len(rids) == a.clients * 25
+
+                # ブリッジが止まっている間に出した要求は、起動し直したブリッジが答える
+                os.kill(proc.pid, signal.SIGSTOP)
+                rid = ctl.submit("gain_db", 12.0)
+                try:
+                    ctl.wait(rid, 0.3)
+                    answered_stopped = True
+                except ControlError:
+                    answered_stopped = False
+                os.kill(proc.pid, signal.SIGKILL)
+                proc.wait()
+                proc = stand_in(name, a.size, a.fps, lag)
+                ack = ctl.wait(rid, 20.0)
+                print(f"request {rid} sent while the bridge was stopped: answered before restart={answered_stopped}, "
+                      f"after restart status={ack.status} effective_frame={ack.effective_frame} "
+                      f"(frames continue, epoch {m.rd.epoch})")
+                ok &= not answered_stopped and ack.status == STATUS_OK and m.rd.epoch == 1
+            m.close()
+        finally:
+            stop_cam(proc)
+            proc.wait()
+    try:
+        CameraControl(name)
+        ok = False
+    except ControlError as e:
+        print(f"after the bridge exits: {e}")
+    print("ok" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# check_daemon.py — 常駐デーモン（BridgeDaemon）の確認（カメラ不要。CAM1.exe の代わりに sonycam-produce --bridge）
+#   per-tool launch: これまでのツール 1 回分（起動 → attach → 1 枚読む → finalize）
+#   daemon:          最初の 1 回（デーモンが起動）と、2 回目以降（借りる → 1 枚読む → 返す）
+#   参照数: 2 人で借りて 1 人ずつ返す / 借りたまま落ちたプロセス / idle 秒後に終わること /
+#          リース中にブリッジが落ちたら起動し直すこと / launch=False / sonycam-capture がデーモンから借りること
+#   スタンドインの起動は 0.2 s 前後だが、実機の CAM1.exe は SDK 初期化と空撮りで数秒掛かる（差はその分広がる）
+#   python bench/check_daemon.py [--size 2464x2056] [--idle 1.5] [--iters 50]
+import argparse
+import multiprocessing as mp
+import os
+import signal
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sonycam.cli import capture_main  # noqa: E402
+from sonycam.daemon import BridgeDaemon, lease, registry, request  # noqa: E402
+from sonycam.launcher import launch_cam, stop_cam  # noqa: E402
+from sonycam.reader import attach  # noqa: E402
+
+ROOT = str(Path(__file__).resolve().parents[1])
+
+
+def stand_in_argv(size):
+    code = f"import sys; sys.path.insert(0, {ROOT!r}); from sonycam.cli import produce_main; sys.exit(produce_main())"
+    return [sys.executable, "-c", code, "--bridge", "--size", size, "--fps", "30"]
+
+
+def run_daemon(address, argv, idle):
+    with BridgeDaemon(argv=argv, idle=idle, address=address, restart_delay=0.5) as d:
+        d.run()
+
+
+def hold_and_die(address, name, ready):
+    ls = lease(name, address=address)
+    ls.reader.read_frame()
+    ready.set()
+    time.sleep(0.2)
+    os._exit(1)                                    # close() せずに落ちる
+
+
+def one_frame(rd):
+    if rd.wait_for_frame(0, 5.0) is None:
+        raise RuntimeError("no frame")
+    return rd.read_frame()[0]
+
+
+def wait_until(pred, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if pred():
+            return True
+        time.sleep(0.05)
+    return pred()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="2464x2056")
+    ap.add_argument("--idle", type=float, default=1.5)
+    ap.add_argument("--iters", type=int, default=50)
+    ap.add_argument("--launches", type=int, default=3)
+    a = ap.parse_args()
+    argv = stand_in_argv(a.size)
+    tmp = tempfile.gettempdir()
+    address = os.path.join(tmp, f"sonycam_daemon_check_{os.getpid()}.sock")
+    name = f"posix:daemon_check_{os.getpid()}"
+    ok = True
+
+    ts = []
+    for _ in range(a.launches):
+        t0 = time.perf_counter()
+        proc = launch_cam(None, name, argv=argv)
+        try:
+            with attach(name, timeout=20.0) as rd:
+                one_frame(rd)
+            ts.append(time.perf_counter() - t0)
+        finally:
+            stop_cam(proc)
+            proc.wait()
+    ts.sort()
+    print(f"per-tool launch (stand-in) -> 1 frame: p50 {ts[len(ts) // 2] * 1e3:7.1f} ms")
+
+    d = mp.Process(target=run_daemon, args=(address, argv, a.idle))
+    d.start()
+    try:
+        if not wait_until(lambda: os.path.exists(address), 10.0):
+            raise RuntimeError("daemon did not start")
+        t0 = time.perf_counter()
+        with lease(name, address=address) as rd:
+            one_frame(rd)
+        print(f"daemon first lease (launches bridge) -> 1 frame: {(time.perf_counter() - t0) * 1e3:7.1f} ms")
+        ts = []
+        for _ in range(a.iters):
+            t0 = time.perf_counter()
+            with lease(name, address=address) as rd:
+                one_frame(rd)
+            ts.append(time.perf_counter() - t0)
+        ts.sort()
+        p50, p99 = ts[len(ts) // 2] * 1e3, ts[int(len(ts) * 0.99)] * 1e3
+        print(f"daemon warm lease -> 1 frame -> release: p50 {p50:6.2f} ms  p99 {p99:6.2f} ms")
+        ok &= p50 < 50.0
+
+        os.environ["SONYCAM_DAEMON"] = address     # sonycam-capture も同じデーモンへ
+        out = os.path.join(tmp, f"daemon_check_{os.getpid()}.png")
+        t0 = time.perf_counter()
+        rc = capture_main([name, "-o", out, "--launch"])
+        print(f"sonycam-capture --launch via daemon: rc={rc} {(time.perf_counter() - t0) * 1e3:.1f} ms")
+        ok &= rc == 0 and os.path.exists(out)
+        if os.path.exists(out):
+            os.unlink(out)
+
+        la, lb = lease(name, address=address), lease(name, address=address)
+        refs2 = registry(address)[name]["refs"]
+        la.close()
+        time.sleep(0.1)
+        refs1 = registry(address)[name]["refs"]
+        lb.close()
+        time.sleep(0.1)
+        refs0 = registry(address)[name]["refs"]
+        print(f"refs with 2 leases / after one close / after both: {refs2} / {refs1} / {refs0}")
+        ok &= (refs2, refs1, refs0) == (2, 1, 0)
+
+        ready = mp.Event()
+        p = mp.Process(target=hold_and_die, args=(address, name, ready))
+        p.start()
+        ready.wait(10.0)
+        held = registry(address)[name]["refs"]
+        p.join()
+        back = wait_until(lambda: registry(address)[name]["refs"] == 0, 2.0)
+        print(f"client died holding a lease: refs {held} -> {registry(address)[name]['refs']}")
+        ok &= held == 1 and back
+
+        with lease(name, address=address) as rd:
+            pid = registry(address)[name]["pid"]
+            os.kill(pid, signal.SIGKILL)           # リース中にブリッジが落ちる
+            restarted = wait_until(lambda: registry(address).get(name, {}).get("pid") not in (None, pid), 10.0)
+            info = registry(address).get(name, {})
+            print(f"bridge killed while leased: restarted={restarted} restarts={info.get('restarts')}")
+            ok &= restarted
+        rd2 = lease(name, address=address)
+        one_frame(rd2.reader)
+        rd2.close()
+
+        t0 = time.monotonic()
+        gone = wait_until(lambda: name not in registry(address), a.idle + 3.0)
+        print(f"idle shutdown after last release: {gone} in {time.monotonic() - t0:.1f} s (idle {a.idle} s)")
+        ok &= gone and not os.path.exists("/dev/shm/" + name.split(":", 1)[1])
+        ok &= lease(name, launch=False, address=address) is None
+        print(f"status: launches={request(('status',), address)[1]['launches']}")
+    finally:
+        request(("stop",), address)
+        d.join(10.0)
+    ok &= not os.path.exists(address)
+    print("ok" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
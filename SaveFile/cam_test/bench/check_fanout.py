@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# check_fanout.py — ファンアウト（FanoutHub + Subscriber）の確認と、各自で読む場合との比較（Linux でも動く）
+#   生産者: Producer（--fps、各フレームの左上に frame_id を焼き込む）
+#   A) 各自読み: 消費者 N プロセスがそれぞれ read_frame() で全体をコピー
+#   B) ファンアウト: ハブ 1 プロセスが読み、消費者 N プロセスはハンドル（ビュー）を受け取る
+#      うち 1 人は遅い消費者（--slow-ms 掛かる、queue=1）。速い消費者が止められないこと、
+#      遅い消費者は skip-to-latest で最新に追いつくこと、全員が frame_id と中身の一致したフレームを見ること、
+#      同じ frame_id が 2 度届いたり戻ったりしないことを確認
+#   消費者プロセスの CPU 時間の合計（コピーに使った帯域の目安）とプールの占有を表示する
+#   python bench/check_fanout.py [-n 3] [--size 2464x2056] [--fps 30] [--seconds 4]
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sonycam.fanout import FanoutHub, Subscriber  # noqa: E402
+from sonycam.producer import Producer, SyntheticSource  # noqa: E402
+from sonycam.reader import TornFrameError, open_shm  # noqa: E402
+
+
+class StampedSource(SyntheticSource):
+    def render(self, px, frame_id):
+        super().render(px, frame_id)
+        px.reshape(-1)[:8] = np.frombuffer(int(frame_id).to_bytes(8, "little"), np.uint8)
+
+
+def stamped_id(img):
+    return int.from_bytes(img.reshape(-1)[:8].tobytes(), "little")
+
+
+def producer(name, w, h, fps, ready, stop):
+    with Producer(name, StampedSource(w, h, 24), fps, telemetry=False) as p:
+        ready.set()
+        p.run(stop=stop)
+
+
+def hub_proc(name, ready, stop, q):
+    with FanoutHub(name, nslots=6) as hub:
+        hub.start()
+        ready.set()
+        stop.wait()
+        q.put(hub.stats())
+
+
+def own_reader(name, seconds, q):
+    rd = open_shm(name)
+    out = rd.snapshot()
+    n = bad = 0
+    last = rd.frame_id
+    t_end = time.monotonic() + seconds
+    cpu0 = time.process_time()
+    while time.monotonic() < t_end:
+        if rd.wait_for_frame(last, 0.2) is None:
+            continue
+        try:
+            fid, _, _ = rd.read_frame(out)
+        except TornFrameError:
+            continue
+        bad += stamped_id(out) != fid
+        n += 1
+        last = fid
+    q.put({"frames": n, "bad": bad, "cpu_s": time.process_time() - cpu0})
+    rd.close()
+
+
+def subscriber(name, seconds, slow_ms, label, q):
+    sub = Subscriber(name, queue=1 if slow_ms else 2, label=label)
+    n = bad = repeated = 0
+    ids = []
+    t_end = time.monotonic() + seconds
+    cpu0 = time.process_time()
+    while time.monotonic() < t_end:
+        f = sub.get(timeout=0.2, latest=True)
+        if f is None:
+            continue
+        with f:
+            bad += stamped_id(f.image) != f.frame_id
+            repeated += bool(ids) and f.frame_id <= ids[-1]
+            ids.append(f.frame_id)
+            if slow_ms:
+                time.sleep(slow_ms / 1000)
+        n += 1
+    q.put({"label": label, "frames": n, "bad": bad, "repeated": repeated, "skipped_local": sub.skipped,
+           "cpu_s": time.process_time() - cpu0, "last": ids[-1] if ids else 0})
+    sub.close()
+
+
+def run_consumers(target, argsets):
+    q = mp.Queue()
+    ps = [mp.Process(target=target, args=args + (q,)) for args in argsets]
+    for p in ps:
+        p.start()
+    res = [q.get() for _ in ps]
+    for p in ps:
+        p.join()
+    return res
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=3, help="消費者の数")
+    ap.add_argument("--size", default="2464x2056")
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--seconds", type=float, default=4.0)
+    ap.add_argument("--slow-ms", type=float, default=150.0, help="遅い消費者 1 人の 1 枚あたりの処理時間")
+    a = ap.parse_args()
+    w, h = map(int, a.size.lower().split("x"))
+    name = f"posix:fanout_{os.getpid()}"
+    ready, stop = mp.Event(), mp.Event()
+    prod = mp.Process(target=producer, args=(name, w, h, a.fps, ready, stop))
+    prod.start()
+    ready.wait(30)
+    ok = True
+    try:
+        res = run_consumers(own_reader, [(name, a.seconds)] * a.n)
+        cpu_a = sum(r["cpu_s"] for r in res)
+        print(f"A) each reads: {a.n} consumers, frames={[r['frames'] for r in res]} "
+              f"mismatched={sum(r['bad'] for r in res)} consumer CPU={cpu_a:.2f}s")
+
+        hub_ready, hub_stop, hq = mp.Event(), mp.Event(), mp.Queue()
+        hub = mp.Process(target=hub_proc, args=(name, hub_ready, hub_stop, hq))
+        hub.start()
+        hub_ready.wait(10)
+        args = [(name, a.seconds, a.slow_ms if i == 0 else 0.0, f"{'slow' if i == 0 else 'fast'}{i}")
+                for i in range(a.n)]
+        res = run_consumers(subscriber, args)
+        hub_stop.set()
+        st = hq.get()
+        hub.join()
+        cpu_b = sum(r["cpu_s"] for r in res)
+        print(f"B) fan-out: hub frames={st['frames']} pool_full={st['pool_full']} torn={st['torn']} "
+              f"peak slots in use={st['peak_in_use']}/{st['nslots']} consumer CPU={cpu_b:.2f}s")
+        for r in sorted(res, key=lambda r: r["label"]):
+            print(f"    {r['label']}: frames={r['frames']} mismatched={r['bad']} repeated={r['repeated']} "
+                  f"last id={r['last']}")
+        expect = a.fps * a.seconds
+        fast = [r for r in res if r["label"].startswith("fast")]
+        slow = [r for r in res if r["label"].startswith("slow")]
+        ok = all(r["bad"] == 0 and r["repeated"] == 0 for r in res) and all(r["frames"] >= 0.85 * expect for r in fast)
+        ok &= all(r["frames"] <= a.seconds * 1000 / a.slow_ms + 2 for r in slow)
+        ok &= cpu_b < cpu_a
+    finally:
+        stop.set()
+        prod.join()
+    print("ok" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
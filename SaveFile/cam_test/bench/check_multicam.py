@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# check_multicam.py — MultiCam の確認（CAM1.exe の代わりに sonycam-produce --bridge を N 本起動。Linux でも動く）
+#   1) 揃ったトリガ: 全台 --trigger（共通時計の周期の倍数で書く）→ 組の取りこぼし 0・skew が tolerance 以内
+#   2) 周期違い: 1 台だけ半分の fps → 組はその fps で出て、他の台の余ったフレームは unused に数える
+#   3) 停止: 1 台のブリッジを kill → 組は出なくなるが、残りの台の読み手スレッドは取り込みを続ける
+#   python bench/check_multicam.py [-n 3] [--size 640x480] [--fps 30] [--seconds 3]
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+from sonycam.multicam import MultiCam  # noqa: E402
+from sonycam.telemetry import telemetry_name  # noqa: E402
+from sonycam.transport import unlink_segment  # noqa: E402
+
+os.environ["PYTHONPATH"] = os.pathsep.join([str(ROOT), os.environ.get("PYTHONPATH", "")])
+PRODUCE = "import sys; from sonycam.cli import produce_main; sys.exit(produce_main(sys.argv[1:]))"
+
+
+def bridge_argv(a, fps, trigger=True, serial="SIM{i}"):
+    argv = [sys.executable, "-c", PRODUCE, "--bridge", "--serial", serial,
+            "--size", a.size, "--bpp", "24", "--fps", str(fps)]
+    return argv + (["--trigger"] if trigger else [])
+
+
+def names(a, tag):
+    return [f"posix:mc_{os.getpid()}_{tag}_{i}" for i in range(a.n)]
+
+
+def consume(mc, seconds, slow_s=0.0):
+    n, t_end = 0, time.monotonic() + seconds
+    while time.monotonic() < t_end:
+        fs = mc.next_set(timeout=0.5)
+        if fs is None:
+            continue
+        assert len(fs) == len(mc.cameras)
+        n += 1
+        if slow_s:
+            time.sleep(slow_s)
+    return n
+
+
+def report(title, st):
+    sk = st["skew_ms"]
+    print(f"{title}: sets={st['sets']} incomplete={st['incomplete']} "
+          f"skew p50={sk.get('p50', 0):.2f} p99={sk.get('p99', 0):.2f} max={sk.get('max', 0):.2f} ms")
+    for k, c in st["cameras"].items():
+        print(f"    {k}: frames={c['frames']} dropped={c['dropped']} torn={c['torn']} unused={c['unused']}")
+
+
+def check_synced(a):
+    with MultiCam.launch(names=names(a, "sync"), argv=bridge_argv(a, a.fps), tolerance_ms=a.tol) as mc:
+        time.sleep(0.3)
+        consume(mc, a.seconds)
+        st = mc.stats()
+    report("synced", st)
+    expect = a.fps * a.seconds
+    return st["sets"] >= 0.9 * expect and st["incomplete"] <= 0.02 * expect + 3 and \
+        st["skew_ms"]["max"] <= a.tol
+
+
+def check_mixed_rate(a):
+    cmds = [bridge_argv(a, a.fps / 2, serial="HALF")] + \
+        [bridge_argv(a, a.fps, serial=f"SIM{i}") for i in range(1, a.n)]
+    # launch は全台同じ argv なので 1 台ずつ起動し、読み手は 1 つの MultiCam にまとめる
+    mcs = [MultiCam.launch(names=[nm], argv=c) for nm, c in zip(names(a, "mix"), cmds)]
+    mc = MultiCam(tolerance_ms=a.tol)
+    try:
+        for m in mcs:
+            for key, cam in m.cameras.items():
+                mc.add(key, cam.shm_name)
+        time.sleep(0.3)
+        consume(mc, a.seconds)
+        st = mc.stats()
+    finally:
+        mc.close()
+        for m in mcs:
+            m.close()
+    report("mixed rate", st)
+    expect = a.fps / 2 * a.seconds
+    unused = sum(c["unused"] for k, c in st["cameras"].items())
+    return st["sets"] >= 0.9 * expect and st["sets"] <= 1.1 * expect + 2 and unused > 0
+
+
+def check_stall(a):
+    with MultiCam.launch(names=names(a, "stall"), argv=bridge_argv(a, a.fps), tolerance_ms=a.tol) as mc:
+        time.sleep(0.3)
+        consume(mc, 1.0)
+        victim = list(mc.cameras.values())[0]
+        victim.proc.kill()
+        victim.proc.wait()
+        time.sleep(0.3)
+        before = {k: c.frames for k, c in mc.cameras.items()}
+        sets_before = mc.stats()["sets"]
+        t0 = time.monotonic()
+        got = consume(mc, 1.5)
+        after = {k: c.frames for k, c in mc.cameras.items()}
+        dt = time.monotonic() - t0
+    unlink_segment(victim.shm_name)                 # kill したブリッジの分は自分で消す
+    unlink_segment(telemetry_name(victim.shm_name))
+    grow = {k: (after[k] - before[k]) / dt for k in before}
+    print(f"stall: killed {victim.key}; sets after kill={got} (before {sets_before}); "
+          + " ".join(f"{k}={v:.1f}fps" for k, v in grow.items()))
+    others = [v for k, v in grow.items() if k != victim.key]
+    return got == 0 and all(v >= 0.8 * a.fps for v in others)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=3, help="カメラ台数")
+    ap.add_argument("--size", default="640x480")
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--tol", type=float, default=5.0, help="組の許容ずれ [ms]")
+    ap.add_argument("--seconds", type=float, default=3.0)
+    a = ap.parse_args()
+    ok = True
+    for check in (check_synced, check_mixed_rate, check_stall):
+        r = check(a)
+        print(f"  -> {'ok' if r else 'FAIL'}")
+        ok &= r
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
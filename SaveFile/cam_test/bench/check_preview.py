@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# check_preview.py — 表示を取り込みループから切り離せているかの確認（GUI 不要。imshow の代わりに遅い sink）
+#   生産者: Producer（--fps）を別プロセスで
+#   sink: 1 回 --paint-ms 掛かり、--stall-every 回ごとに --stall-ms 止まる（ウィンドウのドラッグを真似る）
+#   A) 同期表示: 取り込みループの中で read_frame → 縮小 → sink（今の imshow + waitKey と同じ形）
+#   B) Preview.submit: 取り込みループは read_frame → submit だけ。描画は表示スレッド
+#   C) Preview(source=...): 表示スレッドが共有メモリを間引いて自分で読む
+#   取り込みの枚数・取りこぼし、描画回数（上限 --max-fps）、描いたフレームが最新から何枚遅れているかを表示する
+#   python bench/check_preview.py [--size 2464x2056] [--fps 30] [--seconds 4]
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sonycam.header import now_us  # noqa: E402
+from sonycam.preview import Preview, _Fit  # noqa: E402
+from sonycam.producer import Producer, SyntheticSource  # noqa: E402
+from sonycam.reader import TornFrameError, open_shm  # noqa: E402
+
+
+def producer(name, w, h, fps, ready, stop):
+    with Producer(name, SyntheticSource(w, h, 24), fps, telemetry=False) as p:
+        ready.set()
+        p.run(stop=stop)
+
+
+class SlowSink:
+    def __init__(self, paint_ms, stall_every, stall_ms):
+        self.paint_s, self.every, self.stall_s = paint_ms / 1000, stall_every, stall_ms / 1000
+        self.n = 0
+        self.shapes = set()
+
+    def __call__(self, img):
+        self.n += 1
+        self.shapes.add(img.shape)
+        time.sleep(self.stall_s if self.every and self.n % self.every == 0 else self.paint_s)
+
+
+def acquire(rd, seconds, on_frame):
+    """seconds 秒 read_frame し続ける -> (枚数, 取りこぼし)"""
+    out = rd.snapshot()
+    last = rd.frame_id
+    n = dropped = 0
+    t_end = time.monotonic() + seconds
+    while time.monotonic() < t_end:
+        if rd.wait_for_frame(last, 0.2) is None:
+            continue
+        try:
+            fid, ts, img = rd.read_frame(out)
+        except TornFrameError:
+            continue
+        if fid > last + 1:
+            dropped += fid - last - 1
+        last = fid
+        n += 1
+        on_frame(fid, ts, img, rd.header.flags)
+    return n, dropped
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="2464x2056")
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--seconds", type=float, default=4.0)
+    ap.add_argument("--max-fps", type=float, default=20.0)
+    ap.add_argument("--paint-ms", type=float, default=25.0)
+    ap.add_argument("--stall-every", type=int, default=20)
+    ap.add_argument("--stall-ms", type=float, default=600.0)
+    a = ap.parse_args()
+    w, h = map(int, a.size.lower().split("x"))
+    name = f"posix:preview_{os.getpid()}"
+    ready, stop = mp.Event(), mp.Event()
+    prod = mp.Process(target=producer, args=(name, w, h, a.fps, ready, stop))
+    prod.start()
+    ready.wait(30)
+    expect = a.fps * a.seconds
+    ok = True
+    rd = open_shm(name)
+    try:
+        sink = SlowSink(a.paint_ms, a.stall_every, a.stall_ms)
+        fit = _Fit((w, h), (1280, 1024))
+        n, dropped = acquire(rd, a.seconds, lambda fid, ts, img, flags: sink(fit(img)))
+        print(f"A) in-loop paint:   acquired={n}/{expect:.0f} dropped={dropped} painted={sink.n}")
+
+        sink = SlowSink(a.paint_ms, a.stall_every, a.stall_ms)
+        ages = []
+        with Preview(max_fps=a.max_fps, sink=sink) as pv:
+            def submit(fid, ts, img, flags):
+                pv.submit(img, fid, ts, flags)
+                if pv.last is not None:
+                    ages.append(fid - pv.last.frame_id)
+            n, dropped = acquire(rd, a.seconds, submit)
+            st = pv.stats()
+        print(f"B) Preview.submit:  acquired={n}/{expect:.0f} dropped={dropped} painted={st['painted']} "
+              f"accepted={st['accepted']}/{st['submitted']} shapes={sorted(sink.shapes)} "
+              f"writer fps(overlay)={st['writer_fps']:.1f} painted frame behind p50={sorted(ages)[len(ages) // 2]}")
+        ok &= n >= 0.95 * expect and dropped <= 0.02 * expect
+        ok &= st["painted"] <= a.max_fps * a.seconds * 1.1 + 1
+        ok &= len(sink.shapes) == 1 and all(s[1] <= 1280 and s[0] <= 1024 for s in sink.shapes)
+
+        sink = SlowSink(a.paint_ms, 0, 0)
+        pv = Preview(max_fps=a.max_fps, size=(640, 512), source=name, sink=sink).start()
+        time.sleep(a.seconds)
+        lag = rd.frame_id - pv.last.frame_id if pv.last else -1
+        age_ms = (now_us() - pv.last.painted_us) / 1e3 if pv.last else -1
+        st = pv.stats()
+        pv.close()
+        print(f"C) Preview(source): painted={st['painted']} shapes={sorted(sink.shapes)} "
+              f"frames behind at end={lag} last paint {age_ms:.0f} ms ago")
+        ok &= st["painted"] >= 0.5 * min(a.max_fps, 1000 / a.paint_ms) * a.seconds
+        ok &= all(s[1] <= 640 and s[0] <= 512 for s in sink.shapes)
+    finally:
+        rd.close()
+        stop.set()
+        prod.join()
+    print("ok" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# check_watchdog.py — ブリッジの見張り（Watchdog）の確認（カメラ不要。CAM1.exe の代わりに sonycam-produce --bridge）
+#   kill: ブリッジを SIGKILL（落ちた）/ hang: SIGSTOP（cam->Capture で固まった。プロセスは生きている）
+#   fail: Capture が失敗し続ける（--fail-after。ループは回るが公開しない）-> frame_id が止まり "failing" になること
+#   読み手は最初に開いた 1 つのまま: frame_id が戻らないこと、停止中に stale が立つこと、epoch が 1 ずつ増えること
+#   backoff: 起動し直しが失敗し続ける間（すぐ終わるコマンドに差し替え）待ちが倍々になり、戻せば復帰すること
+#   time-to-recover（最後のフレームから再開後の最初のフレームまで）と availability を出す
+#   python bench/check_watchdog.py [--size 1280x960] [--kills 3] [--hangs 2] [--stale 0.5]
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sonycam.reader import attach  # noqa: E402
+from sonycam.transport import unlink_segment  # noqa: E402
+from sonycam.watchdog import Watchdog  # noqa: E402
+
+ROOT = str(Path(__file__).resolve().parents[1])
+
+
+def stand_in_argv(size):
+    code = f"import sys; sys.path.insert(0, {ROOT!r}); from sonycam.cli import produce_main; sys.exit(produce_main())"
+    return [sys.executable, "-c", code, "--bridge", "--size", size, "--fps", "30"]
+
+
+class Consumer:
+    """開いたままの読み手（開き直さない）。frame_id の逆行・見えた epoch・stale を記録"""
+
+    def __init__(self, name):
+        self.rd = attach(name, timeout=20.0)
+        self.buf = self.rd._buf
+        self.frames = self.backwards = 0
+        self.epochs = [self.rd.epoch]
+        self.stale_seen = 0
+        self.gaps = []                             # (epoch, frame_id の飛び)
+        self._stop = threading.Event()
+        self._t = threading.Thread(target=self._loop, daemon=True)
+        self._t.start()
+
+    def _loop(self):
+        rd, last = self.rd, self.rd.frame_id
+        while not self._stop.is_set():
+            fid = rd.wait_for_frame(last, 0.05)
+            if rd.stale:
+                self.stale_seen += 1
+            if fid is None:
+                continue
+            if fid < last:
+                self.backwards += 1
+            ep = rd.epoch
+            if ep != self.epochs[-1]:
+                self.epochs.append(ep)
+                self.gaps.append((ep, fid - last))
+            self.frames += 1
+            last = fid
+
+    def close(self):
+        self._stop.set()
+        self._t.join(2.0)
+        self.rd.close()
+
+
+def wait_until(pred, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if pred():
+            return True
+        time.sleep(0.02)
+    return pred()
+
+
+def inject(wd, kind):
+    """1 回の障害 -> 復帰したか"""
+    n = len(wd.outages)
+    pid = wd.proc.pid
+    os.kill(pid, signal.SIGKILL if kind == "kill" else signal.SIGSTOP)
+    ok = wait_until(lambda: len(wd.outages) > n and wd.outages[-1].recovered is not None, 30.0)
+    if kind == "hang":
+        try:
+            os.kill(pid, signal.SIGCONT)           # 見張りが kill 済みのはず
+        except ProcessLookupError:
+            pass
+    time.sleep(wd.stable + 0.2)                    # stable 秒動かして待ちを初期値に戻す
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="1280x960")
+    ap.add_argument("--kills", type=int, default=3)
+    ap.add_argument("--hangs", type=int, default=2)
+    ap.add_argument("--stale", type=float, default=0.5, help="stale_after [s]")
+    a = ap.parse_args()
+    name = f"posix:watchdog_check_{os.getpid()}"
+    argv = stand_in_argv(a.size)
+    events = []
+    ok = True
+    wd = Watchdog(name, argv=argv, stale_after=a.stale, backoff=0.2, max_backoff=1.6, stable=1.0,
+                  on_event=lambda kind, o: events.append((time.monotonic(), kind)))
+    try:
+        wd.launch()
+        wd.start(interval=0.02)
+        cons = Consumer(name)
+        time.sleep(0.5)
+        for kind, n in (("kill", a.kills), ("hang", a.hangs)):
+            for _ in range(n):
+                rec = inject(wd, kind)
+                o = wd.outages[-1]
+                print(f"{kind:5s} -> {o.kind:7s} detect {(o.detected - o.last_frame) * 1e3:7.1f} ms  "
+                      f"recover {(o.recovered - o.last_frame) * 1e3 if rec else float('nan'):7.1f} ms  "
+                      f"epoch {wd.reader.epoch}")
+                ok &= rec and o.kind == ("died" if kind == "kill" else "stalled")
+
+        # Capture が失敗し続けるブリッジ: 30 枚出した後は公開しない。テレメトリは書き続ける
+        wd.argv = argv + ["--fail-after", "30"]
+        n = len(wd.outages)
+        os.kill(wd.proc.pid, signal.SIGKILL)       # 失敗するブリッジに差し替える（落ちた 1 回）
+        wait_until(lambda: len(wd.outages) > n and wd.outages[-1].recovered is not None, 30.0)
+        wd.argv = argv                             # 次の起動し直しでは普通のブリッジ
+        fid0 = cons.rd.frame_id
+        wait_until(lambda: len(wd.outages) > n + 1, 30.0)
+        stuck = cons.rd.frame_id                   # 失敗している間は進まない
+        rec = wait_until(lambda: wd.outages[-1].recovered is not None, 30.0)
+        o = wd.outages[-1]
+        print(f"fail  -> {o.kind:7s} detect {(o.detected - o.last_frame) * 1e3:7.1f} ms  "
+              f"recover {(o.recovered - o.last_frame) * 1e3 if rec else float('nan'):7.1f} ms  "
+              f"epoch {wd.reader.epoch}  (frames stopped at id={stuck}, {stuck - fid0} after restart)")
+        ok &= rec and o.kind == "failing" and stuck - fid0 <= 30
+        time.sleep(wd.stable + 0.2)
+
+        # 起動し直しが失敗し続ける: 待ちが倍々（上限 max_backoff）になり、戻せば復帰する
+        ok &= wd.stats()["backoff"] == wd.backoff  # stable 秒動いたので初期値
+        wd.argv = [sys.executable, "-c", "import sys; sys.exit(3)"]
+        n_ev = len(events)
+        os.kill(wd.proc.pid, signal.SIGKILL)
+        wait_until(lambda: sum(k == "retry" for _, k in events[n_ev:]) >= 4, 30.0)
+        wd.argv = argv
+        rec = wait_until(lambda: wd.outages[-1].recovered is not None, 30.0)
+        ts = [t for t, k in events[n_ev:] if k in ("died", "retry")]
+        gaps = [round(b - t, 2) for t, b in zip(ts, ts[1:])]
+        o = wd.outages[-1]
+        print(f"failing restarts: attempts={o.attempts} intervals {gaps} s -> recovered={rec} "
+              f"in {(o.recovered - o.last_frame) if rec else float('nan'):.2f} s")
+        ok &= rec and all(b > t * 1.5 for t, b in zip(gaps, gaps[1:]) if b < wd.max_backoff * 0.9)
+        time.sleep(0.5)
+
+        same = cons.rd._buf is cons.buf
+        cons.close()
+        st = wd.stats()
+        print(f"consumer: frames={cons.frames} backwards={cons.backwards} epochs={cons.epochs} "
+              f"stale polls={cons.stale_seen} same mapping={same}")
+        print(f"  frame_id jumps at each epoch: {[g for _, g in cons.gaps]}")
+        print(f"watchdog: outages={st['outages']} (died {st['died']}, stalled {st['stalled']}, "
+              f"failing {st['failing']}) "
+              f"restarts={st['restarts']} ttr p50 {st['ttr_p50'] * 1e3:.0f} ms max {st['ttr_max'] * 1e3:.0f} ms "
+              f"detect p50 {st['detect_p50'] * 1e3:.0f} ms availability {st['availability'] * 100:.1f}% "
+              f"over {st['monitored_s']:.1f} s")
+        n_out = a.kills + a.hangs + 2 + 1
+        ok &= same and cons.backwards == 0 and cons.stale_seen > 0
+        ok &= cons.epochs == list(range(n_out + 1)) and st["outages"] == n_out
+        ok &= not wd.reader.stale
+    finally:
+        wd.close()
+        unlink_segment(name)
+    print("ok" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# stress_seqlock.py — 書き手/読み手を別プロセスで全速で回し、破れたフレームを数える（Linux 可）
+#   書き手: FrameWriter が毎フレーム全画素を同じ値で塗る
+#   読み手: naive（snapshot のみ）と seqlock（read_frame）で、画素が一様でなければ「破れ」
+#   python bench/stress_seqlock.py --seconds 5 --size 640x480 --bpp 32
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from _shm import map_file as _map, temp_segment  # noqa: E402
+from sonycam.reader import FrameReader, TornFrameError  # noqa: E402
+from sonycam.writer import FrameWriter, segment_size  # noqa: E402
+
+
+def writer_proc(path, size, w, h, bpp, stop):
+    wr = FrameWriter(_map(path, size), w, h, bpp)
+    n = 0
+    while not stop.is_set():
+        with wr.frame() as px:
+            px.fill((n + 1) & 0xFF)
+        n += 1
+    wr.close()
+
+
+def reader_proc(path, size, mode, seconds, result):
+    rd = FrameReader(_map(path, size))
+    out = np.empty(rd.pixels().shape, np.uint8)
+    reads = torn = rejected = 0
+    t_end = time.monotonic() + seconds
+    while time.monotonic() < t_end:
+        if mode == "seqlock":
+            try:
+                rd.read_frame(out)
+            except TornFrameError:
+                rejected += 1
+                continue
+        else:
+            rd.snapshot(out)
+        reads += 1
+        if out.min() != out.max():
+            torn += 1
+    result.put((mode, reads, torn, rejected))
+    del out
+    rd.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--size", default="640x480")
+    ap.add_argument("--bpp", type=int, default=32)
+    a = ap.parse_args()
+    w, h = map(int, a.size.lower().split("x"))
+    size = segment_size(w, h, a.bpp)
+
+    path = temp_segment(size)
+    # 読み手が開く前にヘッダを作っておく
+    FrameWriter(_map(path, size), w, h, a.bpp).close()
+
+    stop = mp.Event()
+    result = mp.Queue()
+    wp = mp.Process(target=writer_proc, args=(path, size, w, h, a.bpp, stop))
+    wp.start()
+    try:
+        for mode in ("naive", "seqlock"):
+            rp = mp.Process(target=reader_proc, args=(path, size, mode, a.seconds, result))
+            rp.start()
+            mode, reads, torn, rejected = result.get()
+            rp.join()
+            print(f"{mode:8s} reads={reads:7d} torn={torn:6d} rejected={rejected:6d} "
+                  f"({100.0 * torn / max(1, reads):.2f}% torn)")
+    finally:
+        stop.set()
+        wp.join()
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
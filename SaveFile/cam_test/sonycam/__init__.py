@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Sony カメラ CBRG ブリッジ（CAM1.exe）の Python 側読み出しライブラリ
+
+名前は初回アクセス時に読み込む（PEP 562）。ヘッダだけ使うツールは numpy/cv2 を読み込まない。
+"""
+import importlib
+
+_EXPORTS = {
+    "HDR_FMT": "header", "HDR_SIZE": "header", "MAGIC": "header", "SHM_NAME_DEFAULT": "header",
+    "ShmHeader": "header", "HeaderMap": "header", "aligned_stride": "header",
+    "FLAG_BOTTOM_UP": "header", "FLAG_HIRES_TS": "header", "now_us": "header",
+    "cfa_flags": "header", "cfa_pattern": "header",
+    "FLAG_EXT_HEADER": "header", "LAYOUT_VERSION": "header", "ShmHeaderExt": "header",
+    "PIXEL_FORMATS": "header", "AttachError": "header", "FLAG_STALE": "header", "epoch": "header",
+    "FrameReader": "reader", "TornFrameError": "reader", "Grab": "reader", "open_shm": "reader", "attach": "reader",
+    "RegionPlan": "roi",
+    "FrameWriter": "writer", "segment_size": "writer",
+    "RingReader": "ring", "RingWriter": "ring", "open_ring": "ring", "ring_size": "ring",
+    "FrameWaiter": "notify",
+    "launch_cam": "launcher", "read_wh_line": "launcher", "line_queue": "launcher", "stop_cam": "launcher",
+    "to_bgr": "convert", "Converter": "convert", "OutputPool": "convert",
+    "Demosaicer": "bayer", "BayerFrame": "bayer", "HalfDemosaic": "bayer",
+    "EncoderPool": "encoder", "write_image": "encoder",
+    "Recorder": "recorder", "Recording": "recorder",
+    "create_segment": "transport", "open_segment": "transport", "unlink_segment": "transport",
+    "segment_exists": "transport",
+    "Producer": "producer", "SyntheticSource": "producer", "ReplaySource": "producer",
+    "FrameTracer": "trace", "ClockMap": "trace",
+    "MultiCam": "multicam", "FrameSet": "multicam",
+    "FanoutHub": "fanout", "Subscriber": "fanout",
+    "FrameServer": "server", "RawClient": "server",
+    "Preview": "preview",
+    "MotionDetector": "motion", "ChangeEvent": "motion",
+    "Telemetry": "telemetry", "TelemetryMonitor": "telemetry", "TelemetryWriter": "telemetry",
+    "FrameStream": "aio", "AsyncBridge": "aio",
+    "BridgeDaemon": "daemon", "Lease": "daemon", "lease": "daemon", "registry": "daemon",
+    "Watchdog": "watchdog", "Outage": "watchdog",
+    "CameraControl": "control", "ControlServer": "control", "ControlError": "control", "Ack": "control",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    mod = _EXPORTS.get(name)
+    if mod is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module("." + mod, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return __all__
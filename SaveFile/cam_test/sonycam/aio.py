@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""asyncio 用 API
+
+    async with FrameStream(r"Local\\Cam1Mem") as stream:
+        async for frame in stream:
+            ...                       # frame.image は所有コピー
+
+    async with AsyncBridge(r"Local\\Cam1Mem") as cam:   # CAM1.exe を非同期に起動/終了
+        async with FrameStream(cam.shm_name) as stream: ...
+
+新着待ちはヘッダの frame_id を asyncio.sleep で適応ポーリングする（ctypes フィールドを 1 つ読むだけ）。
+カメラ毎のスレッドは使わないので、多数のカメラ/消費者を 1 つのイベントループに載せられる。
+フレームのコピー（seqlock 付き）は既定でスレッドプールに逃がす（numpy のコピーは GIL を手放す）。
+"""
+import asyncio
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .header import SHM_NAME_DEFAULT
+from .launcher import EXE_NAME_DEFAULT, clean_line, default_libdir, parse_wh, sdk_env
+from .reader import FrameReader, TornFrameError, open_shm
+
+Frame = collections.namedtuple("Frame", "frame_id timestamp_us image")
+
+_COPY_POOL = None
+
+
+def _copy_pool():
+    global _COPY_POOL
+    if _COPY_POOL is None:
+        _COPY_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sonycam-copy")
+    return _COPY_POOL
+
+
+async def wait_for_frame(reader, after_id, timeout=None, max_sleep=0.005, period=None):
+    """FrameReader.wait_for_frame の asyncio 版（ループを塞がない）。timeout なら None"""
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    cap = max_sleep if not period else max(0.0005, min(max_sleep, period / 8))
+    nap = 0.0005
+    while True:
+        fid = reader.frame_id
+        if fid > after_id:
+            return fid
+        if deadline is not None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(nap, remaining))
+        else:
+            await asyncio.sleep(nap)
+        nap = min(nap * 2, cap)
+
+
+class FrameStream:
+    """async for で新着フレームを受け取るストリーム
+
+    source: 共有メモリ名 または FrameReader（テストやスタンドイン用）
+    offload: True ならコピーをスレッドプールで行う
+    遅い消費者は常に最新フレームへ飛ぶ（飛んだ枚数は dropped）。
+    """
+
+    def __init__(self, source=SHM_NAME_DEFAULT, timeout=None, offload=True):
+        self._source = source
+        self._reader = None
+        self.timeout = timeout
+        self.offload = offload
+        self.last_id = 0
+        self.dropped = 0
+        self._period = None
+        self._last_t = None
+        self._inflight = None
+        self._closed = False
+
+    def _open(self):
+        if self._reader is None:
+            if self._closed:
+                raise RuntimeError("stream is closed")
+            src = self._source
+            self._reader = src if isinstance(src, FrameReader) else open_shm(src)
+            self.last_id = self._reader.frame_id
+        return self._reader
+
+    async def next_frame(self, timeout=None):
+        """次の新着フレーム（所有コピー）。timeout なら None"""
+        rd = self._open()
+        timeout = self.timeout if timeout is None else timeout
+        fid = await wait_for_frame(rd, self.last_id, timeout, period=self._period)
+        if fid is None:
+            return None
+        if self.last_id and fid > self.last_id + 1:
+            self.dropped += fid - self.last_id - 1
+        now = time.monotonic()
+        if self._last_t is not None:
+            dt = now - self._last_t
+            self._period = dt if self._period is None else 0.8 * self._period + 0.2 * dt
+        self._last_t = now
+        out = np.empty(rd.pixels().shape, np.uint8)
+        if self.offload:
+            cf = _copy_pool().submit(rd.read_frame, out)
+            self._inflight = cf
+            try:
+                # キャンセルされてもコピー自体は走り切る。close() はその完了を待ってから unmap する
+                fid, ts, img = await asyncio.wrap_future(cf)
+            finally:
+                if cf.done():
+                    self._inflight = None
+        else:
+            fid, ts, img = rd.read_frame(out)
+        self.last_id = fid
+        return Frame(fid, ts, img)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            if self._closed:
+                raise StopAsyncIteration
+            try:
+                frame = await self.next_frame()
+            except TornFrameError:
+                continue
+            if frame is None:
+                raise StopAsyncIteration     # timeout 指定時の打ち切り
+            return frame
+
+    async def aclose(self):
+        """キャンセル中でも安全に閉じる（実行中のコピーを待ってから unmap）"""
+        self._closed = True
+        cf = self._inflight
+        try:
+            if cf is not None and not cf.cancel() and not cf.done():
+                await asyncio.shield(asyncio.wrap_future(cf))
+        except asyncio.CancelledError:
+            # aclose 自体がキャンセルされた → コピー完了だけは同期で待つ（数 ms）
+            cf.exception()
+            raise
+        except Exception:
+            pass
+        finally:
+            self._inflight = None
+            rd, self._reader = self._reader, None
+            if rd is not None and rd is not self._source:
+                rd.close()
+
+    async def __aenter__(self):
+        self._open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+class AsyncBridge:
+    """CAM1.exe を asyncio サブプロセスとして管理する
+
+    start() で起動し WH 行まで待つ。stdout は常に排水して lines（最新 200 行）へ貯める。
+    """
+
+    def __init__(self, shm_name=SHM_NAME_DEFAULT, libdir=None, exe_name=EXE_NAME_DEFAULT,
+                 argv=None, keep_lines=200):
+        self.shm_name = shm_name
+        self.libdir = libdir
+        self.exe_name = exe_name
+        self.argv = argv                  # 実行ファイルの代わりに使うコマンド（スタンドイン用）
+        self.proc = None
+        self.serial = None
+        self.geometry = None              # (w, h, bpp, stride)
+        self.lines = collections.deque(maxlen=keep_lines)
+        self._line_q = None
+        self._drain = None
+
+    async def start(self, wh_timeout=8.0):
+        if self.argv:
+            argv, cwd = list(self.argv), None
+        else:
+            libdir = default_libdir() if self.libdir is None else self.libdir
+            exe = Path(libdir) / self.exe_name
+            if not exe.exists():
+                raise FileNotFoundError(f"{exe} が見つかりません。")
+            argv, cwd = [str(exe)], str(libdir)
+        self._line_q = asyncio.Queue(maxsize=self.lines.maxlen)
+        self.proc = await asyncio.create_subprocess_exec(
+            *argv, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT, cwd=cwd, env=sdk_env())
+        await self.send(self.shm_name)
+        self._drain = asyncio.ensure_future(self._drain_stdout())
+        try:
+            await asyncio.wait_for(self._wait_wh(), wh_timeout)
+        except asyncio.TimeoutError:
+            pass                          # WH を出さない旧ビルド。geometry は None のまま
+        return self
+
+    async def _drain_stdout(self):
+        while True:
+            b = await self.proc.stdout.readline()
+            if not b:
+                break
+            line = clean_line(b.decode("utf-8", "ignore"))
+            if not line:
+                continue
+            self.lines.append(line)
+            if self._line_q.full():
+                self._line_q.get_nowait()  # 読まれない行は古い方から捨てる
+            self._line_q.put_nowait(line)
+
+    async def _wait_wh(self):
+        while True:
+            line = await self._line_q.get()
+            wh = parse_wh(line)
+            if wh:
+                self.geometry = wh
+                return wh
+            if self.serial is None and not line.startswith("SUM "):
+                self.serial = line
+
+    async def readline(self, timeout=None):
+        """stdout の次の 1 行（ノイズ除去済み）。timeout なら None"""
+        try:
+            return await asyncio.wait_for(self._line_q.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def send(self, line):
+        self.proc.stdin.write((line + "\n").encode("ascii"))
+        await self.proc.stdin.drain()
+
+    async def stop(self, timeout=2.0):
+        """finalize → 待つ → terminate → kill。キャンセルされても子プロセスは必ず止める"""
+        proc = self.proc
+        if proc is None:
+            return
+        try:
+            if proc.returncode is None:
+                try:
+                    await self.send("finalize")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                try:
+                    await asyncio.wait_for(proc.wait(), timeout)
+                except asyncio.TimeoutError:
+                    proc.terminate()
+                    try:
+                        await asyncio.wait_for(proc.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        proc.kill()
+                        await proc.wait()
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+            if self._drain is not None:
+                self._drain.cancel()
+            self.proc = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
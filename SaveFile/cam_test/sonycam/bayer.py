@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Bayer 転送モードの読み手側（demosaic は消費者が必要な時だけ行う）
+
+ブリッジを CAM1_PIXEL_FORMAT=BayerRG8 等で起動すると、共有メモリには 8bpp の生値が載り、
+flags に CFA 並びが入る（header.cfa_pattern）。RGB8 に比べて転送・コピーとも 1/3。
+
+    dm = Demosaicer.from_header(reader.header)
+    frame = dm.read(reader)            # 生値だけコピー（1 画素 1 バイト）
+    frame.image                        # 初回アクセス時にフル解像度で demosaic（以後キャッシュ）
+    frame.preview()                    # 2x2 をまとめた半分解像度（プレビュー向け。補間なしで速い）
+
+フル解像度は convert.Converter（cv2 の Bayer 変換）、半分解像度は 2x2 セルの 4 画素を
+cv2.mixChannels で 4 面に分けてから合成する（偶数行/奇数行を 2ch 画像として見るのでコピーは 1 回）。
+"""
+import numpy as np
+
+from .convert import Converter, _cv2
+from .header import FLAG_BOTTOM_UP, cfa_pattern
+
+# 並び -> 左上 2x2 の各位置の色（(0,0), (0,1), (1,0), (1,1)）
+_LAYOUT = {"RG": "RGGB", "GR": "GRBG", "GB": "GBRG", "BG": "BGGR"}
+
+HALF_TARGETS = ("bgr", "rgb", "gray")
+
+
+class HalfDemosaic:
+    """2x2 のセルを 1 画素にまとめる demosaic（R, B はそのまま、G は 2 画素の平均）
+
+    出力は (h//2, w//2[, 3]) の連続配列（画素数はフル解像度の 1/4）。補間しないので偽色が出にくい。
+    作業用の配列は最初に確保して使い回す。
+    """
+
+    def __init__(self, w, h, pattern, stride=None, bottom_up=False, target="bgr"):
+        if pattern not in _LAYOUT:
+            raise ValueError(f"unknown CFA pattern {pattern!r}")
+        if target not in HALF_TARGETS:
+            raise ValueError(f"target must be one of {HALF_TARGETS}")
+        self.w, self.h = w, h
+        self.stride = stride or w
+        self.pattern = pattern
+        self.bottom_up = bool(bottom_up)
+        self.target = target
+        h2, w2 = h // 2, w // 2
+        self.out_shape = (h2, w2) if target == "gray" else (h2, w2, 3)
+        # 面 i = 2x2 セル内の位置 (i // 2, i % 2)
+        pos = {}
+        for i, color in enumerate(_LAYOUT[pattern]):
+            pos.setdefault(color, []).append(i)
+        self._planes = [np.empty((h2, w2), np.uint8) for _ in range(4)]
+        r, b = (self._planes[pos[c][0]] for c in "RB")
+        self._g1, self._g2 = (self._planes[i] for i in pos["G"])
+        self._order = [r, self._g1, b] if target == "rgb" else [b, self._g1, r]
+        self._bgr = np.empty((h2, w2, 3), np.uint8) if target == "gray" else None
+
+    def new_output(self):
+        return np.empty(self.out_shape, np.uint8)
+
+    def source_view(self, buf, offset=0):
+        if isinstance(buf, np.ndarray) and buf.ndim == 2:
+            return buf
+        return np.ndarray((self.h, self.w), np.uint8, buffer=buf, offset=offset,
+                          strides=(self.stride, 1))
+
+    def __call__(self, src, out=None):
+        src = self.source_view(src)
+        if self.bottom_up:
+            src = src[::-1]                  # 上から下に見れば CFA 並びはヘッダの値どおり
+        if out is None:
+            out = self.new_output()
+        cv2 = _cv2()
+        h2, w2 = self._g1.shape
+        # 偶数行 / 奇数行を (h2, w2, 2) の 2ch 画像として見る（ビューのまま。負の stride も可）
+        even = src[0:2 * h2:2, :2 * w2].reshape(h2, w2, 2)
+        odd = src[1:2 * h2:2, :2 * w2].reshape(h2, w2, 2)
+        cv2.mixChannels([even, odd], self._planes, [0, 0, 1, 1, 2, 2, 3, 3])
+        cv2.addWeighted(self._g1, 0.5, self._g2, 0.5, 0, dst=self._g1)
+        if self._bgr is None:
+            cv2.merge(self._order, dst=out)
+        else:
+            cv2.merge(self._order, dst=self._bgr)
+            cv2.cvtColor(self._bgr, cv2.COLOR_BGR2GRAY, dst=out)
+        return out
+
+
+class BayerFrame:
+    """生 Bayer フレームの所有コピー。画素は要求された時に初めて demosaic する
+
+    raw は (h, w) の 8bit 配列。image / preview() の結果は BayerFrame ごとにキャッシュする。
+    """
+
+    __slots__ = ("frame_id", "timestamp_us", "raw", "_dm", "_image", "_preview")
+
+    def __init__(self, frame_id, timestamp_us, raw, demosaicer):
+        self.frame_id = frame_id
+        self.timestamp_us = timestamp_us
+        self.raw = raw
+        self._dm = demosaicer
+        self._image = None
+        self._preview = None
+
+    @property
+    def image(self):
+        """フル解像度の demosaic 結果（初回だけ計算）"""
+        if self._image is None:
+            self._image = self._dm.full(self.raw)
+        return self._image
+
+    def preview(self):
+        """半分解像度の demosaic 結果（初回だけ計算）"""
+        if self._preview is None:
+            self._preview = self._dm.half(self.raw)
+        return self._preview
+
+    @property
+    def demosaiced(self):
+        return self._image is not None
+
+
+class Demosaicer:
+    """1 つの Bayer ストリーム用のフル解像度 / 半分解像度 demosaic の組"""
+
+    def __init__(self, w, h, pattern, stride=None, bottom_up=False, target="bgr",
+                 edge_aware=False):
+        self.pattern = pattern
+        self.full = Converter(w, h, 8, stride, bottom_up, target, cfa=pattern,
+                              edge_aware=edge_aware)
+        self.half = HalfDemosaic(w, h, pattern, stride, bottom_up,
+                                 target if target in HALF_TARGETS else "bgr")
+
+    @classmethod
+    def from_header(cls, hdr, target="bgr", edge_aware=False):
+        """ShmHeader / RingHeader から。Bayer 転送でなければ ValueError"""
+        pattern = cfa_pattern(hdr.flags)
+        if pattern is None or hdr.bpp != 8:
+            raise ValueError(f"not a Bayer stream (bpp={hdr.bpp} flags=0x{hdr.flags:X})")
+        return cls(hdr.width, hdr.height, pattern, hdr.stride,
+                   bool(hdr.flags & FLAG_BOTTOM_UP), target, edge_aware)
+
+    def read(self, reader, out=None, **kw):
+        """reader.read_frame() で生値だけコピーして BayerFrame を返す（demosaic はまだしない）"""
+        fid, ts, raw = reader.read_frame(out, **kw)
+        return BayerFrame(fid, ts, raw, self)
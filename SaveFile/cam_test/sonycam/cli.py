@@ -0,0 +1,662 @@
+# -*- coding: utf-8 -*-
+"""コマンドラインツール（sonycam-peek / sonycam-watch / sonycam-capture / sonycam-snapshot / sonycam-record /
+sonycam-produce / sonycam-trace / sonycam-telemetry / sonycam-fanout / sonycam-serve / sonycam-preview /
+sonycam-daemon / sonycam-control）
+
+peek/watch/telemetry はヘッダしか読まないので numpy/cv2 を読み込まない（起動は数十 ms）。
+"""
+import argparse
+import contextlib
+import sys
+import time
+
+from .header import FLAG_STALE, SHM_NAME_DEFAULT, HeaderMap, cfa_pattern, epoch, pixel_format_name
+
+
+def _fmt(hdr, layout=None):
+    cfa, ep = cfa_pattern(hdr.flags), epoch(hdr.flags)
+    s = (f"magic=0x{hdr.magic:08X} size={hdr.width}x{hdr.height} bpp={hdr.bpp} "
+         f"stride={hdr.stride} frame_id={hdr.frame_id} ts_us={hdr.timestamp_us} seq={hdr.seq}"
+         f"{f' cfa={cfa}' if cfa else ''}{f' epoch={ep}' if ep else ''}"
+         f"{' STALE' if hdr.flags & FLAG_STALE else ''}")
+    if layout is not None:
+        s += (f" version={layout.version} header_size={layout.header_size} "
+              f"segment_size={layout.segment_size} format={pixel_format_name(layout.pixel_format)}")
+    return s
+
+
+def peek_main(argv=None):
+    ap = argparse.ArgumentParser(prog="sonycam-peek", description="CBRG ヘッダを 1 回表示")
+    ap.add_argument("name", nargs="?", default=SHM_NAME_DEFAULT)
+    a = ap.parse_args(argv)
+    try:
+        with HeaderMap(a.name) as hm:
+            print(_fmt(hm.header, hm.layout))
+    except (OSError, RuntimeError) as e:
+        print(f"[err] {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def watch_main(argv=None):
+    ap = argparse.ArgumentParser(prog="sonycam-watch", description="CBRG ヘッダを監視して FPS を表示")
+    ap.add_argument("name", nargs="?", default=SHM_NAME_DEFAULT)
+    ap.add_argument("--interval", type=float, default=0.3, help="表示間隔 [s]")
+    a = ap.parse_args(argv)
+    import ctypes as C
+
+    from .header import ShmHeader
+    from .notify import FrameWaiter, consumer_signal
+    from .transport import signal_name
+    try:
+        hm = HeaderMap(a.name)
+    except (OSError, RuntimeError) as e:
+        print(f"[err] {e}", file=sys.stderr)
+        return 1
+    hdr = hm.header
+    waiter = FrameWaiter(lambda: hdr.frame_id, lambda: hdr.seq,
+                         consumer_signal(signal_name(a.name), C.addressof(hdr) + ShmHeader.seq.offset))
+    last_id, n, t0 = hdr.frame_id, 0, time.monotonic()
+    try:
+        while True:
+            fid = waiter.wait(last_id, timeout=a.interval)
+            if fid is not None:
+                n += fid - last_id
+                last_id = fid
+            dt = time.monotonic() - t0
+            if dt >= a.interval:
+                print(f"\r{_fmt(hdr)} fps={n / dt:.1f}   ", end="", flush=True)
+                n, t0 = 0, time.monotonic()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        waiter.close()
+        hdr = None                        # ビューを外してから close（ラムダが掴んでいるので del ではなく None）
+        hm.close()
+    return 0
+
+
+def capture_main(argv=None):
+    ap = argparse.ArgumentParser(prog="sonycam-capture", description="コマンドを実行した後に撮れたフレームを 1 枚保存")
+    ap.add_argument("name", nargs="?", default=SHM_NAME_DEFAULT)
+    ap.add_argument("-o", "--out", default="capture.png")
+    _launch_args(ap)
+    ap.add_argument("--timeout", type=float, default=5.0, help="起動・最初のフレームを待つ時間 [s]")
+    ap.add_argument("--latest", action="store_true", help="待たずに今ある最新フレームを保存（前に撮れたものでもよい）")
+    a = ap.parse_args(argv)
+    t_req = time.monotonic()
+
+    import cv2
+
+    from .convert import Converter
+
+    try:
+        with _open_source(a, a.timeout) as rd:
+            if a.latest:
+                if rd.wait_for_frame(0, timeout=a.timeout) is None:
+                    print("[err] no frame", file=sys.stderr)
+                    return 1
+                fid, _, px = rd.read_frame()
+                lat = ""
+            else:
+                g = rd.grab(t_req, a.timeout)          # 起動を待った時間も latency に入る
+                if g is None:
+                    print("[err] no frame", file=sys.stderr)
+                    return 1
+                fid, px, lat = g.frame_id, g.image, f" latency={g.latency_s * 1e3:.1f} ms"
+            w, h, bpp, _ = rd.geometry
+            img = Converter.from_header(rd.header, "bgr")(px)
+            cv2.imwrite(a.out, img)
+            print(f"saved: {a.out} (id={fid} {w}x{h} bpp={bpp}{lat})")
+    except (OSError, RuntimeError) as e:
+        print(f"[err] {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _launch_args(ap):
+    ap.add_argument("--launch", action="store_true",
+                    help="CAM1.exe を起動してから取る（常駐デーモンが居ればデーモンが起動して貸す）")
+    ap.add_argument("--libdir", default=None, help="CAM1.exe のあるフォルダ（既定: ./lib）")
+    ap.add_argument("--no-daemon", action="store_true", help="常駐デーモンに問い合わせない")
+
+
+@contextlib.contextmanager
+def _open_source(a, timeout):
+    """FrameReader を開く。常駐デーモンが持っていれば借りる（--launch なら無くてもデーモンが起動）。
+    デーモンが居なければ直接開き、--launch なら自分で CAM1.exe を起動して最後に終える"""
+    from .reader import attach
+    ls = None
+    if not a.no_daemon:
+        from .daemon import lease
+        ls = lease(a.name, launch=a.launch, timeout=max(timeout, 20.0) if a.launch else timeout)
+    if ls is not None:
+        with ls as rd:
+            yield rd
+        return
+    proc = None
+    if a.launch:
+        from .launcher import default_libdir, launch_cam
+        proc = launch_cam(a.libdir or default_libdir(), a.name)
+    try:
+        # 起動直後はヘッダが公開されるまで待つ（WH 行は待たない）。起動しない時はすぐ失敗して理由を出す
+        with attach(a.name, timeout=timeout if a.launch else 0.0) as rd:
+            yield rd
+    finally:
+        if proc is not None:
+            from .launcher import stop_cam
+            stop_cam(proc)
+
+
+def _note_gap(rd, gap):
+    """ブリッジの停止（stale）と再開（epoch の変化）を 1 回ずつ知らせる"""
+    stale, ep = rd.stale, rd.epoch
+    if stale and not gap[1]:
+        print(f"\n[warn] bridge stalled or died at id={rd.frame_id}; waiting for restart", file=sys.stderr)
+    if ep != gap[0]:
+        print(f"\n[info] bridge restarted (epoch {ep}); frames continue from id={rd.frame_id}", file=sys.stderr)
+    gap[:] = [ep, stale]
+
+
+def snapshot_main(argv=None):
+    ap = argparse.ArgumentParser(prog="sonycam-snapshot",
+                                 description="一定間隔で最新フレームを保存（エンコードは別スレッド）")
+    ap.add_argument("name", nargs="?", default=SHM_NAME_DEFAULT)
+    ap.add_argument("-o", "--out", default="latest.png", help=".png / .jpg / .npy")
+    ap.add_argument("--interval", type=float, default=2.0, help="保存間隔 [s]")
+    ap.add_argument("--png-compression", type=int, default=1)
+    ap.add_argument("--jpeg-quality", type=int, default=90)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--policy", default="drop_oldest",
+                    choices=("drop_oldest", "drop_newest", "block"))
+    _launch_args(ap)
+    _motion_args(ap, "変化が続いている間だけ保存する（始まりで 1 枚、以後 --interval ごと）")
+    a = ap.parse_args(argv)
+
+    from .convert import Converter
+    from .encoder import EncoderPool
+    from .reader import TornFrameError
+
+    enc = EncoderPool(workers=a.workers, maxsize=2, policy=a.policy,
+                      png_compression=a.png_compression, jpeg_quality=a.jpeg_quality)
+    try:
+        with _open_source(a, 10.0) as rd:
+            # .npy は生のまま（Bayer ならモザイクのまま）、画像形式は BGR にしてから保存する
+            conv = None if a.out.lower().endswith(".npy") else Converter.from_header(rd.header, "bgr")
+            det = _motion_detector(a, rd)
+            last_id = 0
+            next_save = 0.0
+            gap = [rd.epoch, False]                    # 見張り（watchdog.py）の知らせ: epoch / stale
+            while True:
+                t0 = time.monotonic()
+                _note_gap(rd, gap)
+                if det is not None:                    # 全フレームを間引いて判定し、変化中だけ保存する
+                    if not _motion_step(det, rd) or time.monotonic() < next_save:
+                        continue
+                    next_save = time.monotonic() + a.interval
+                fid = rd.wait_for_frame(last_id, timeout=a.interval)
+                if fid is not None:
+                    try:
+                        last_id, _, px = rd.read_frame()
+                    except TornFrameError:
+                        continue
+                    # 取り込み側は変換して渡すだけ。エンコードと書き込みは EncoderPool のスレッドで行う
+                    enc.submit(px if conv is None else conv(px), a.out, copy=False)
+                    st = enc.stats()
+                    print(f"\r{time.strftime('%H:%M:%S')} queued {a.out} (id={last_id}) "
+                          f"encode p50={st.get('encode_ms_p50', 0):.0f}ms "
+                          f"depth={st['queue_depth']} dropped={st['dropped']}   ",
+                          end="", flush=True)
+                if det is None:
+                    time.sleep(max(0.0, a.interval - (time.monotonic() - t0)))
+    except KeyboardInterrupt:
+        print()
+    except (OSError, RuntimeError) as e:
+        print(f"[err] {e}", file=sys.stderr)
+        return 1
+    finally:
+        enc.close()
+    return 0
+
+
+def _motion_args(ap, help):
+    ap.add_argument("--on-change", action="store_true", help=help)
+    ap.add_argument("--threshold", type=int, default=25, help="変化とみなす輝度差（--on-change）")
+    ap.add_argument("--min-area", type=float, default=0.002, help="変化とみなす画素の割合（--on-change）")
+    ap.add_argument("--hold", type=float, default=1.0, help="変化の終わりとみなす静止時間 [s]（--on-change）")
+
+
+def _motion_detector(a, rd):
+    if not a.on_change:
+        return None
+    from .motion import MotionDetector
+    return MotionDetector.from_header(rd.header, threshold=a.threshold, min_area=a.min_area, hold=a.hold)
+
+
+def _motion_step(det, rd, timeout=1.0):
+    """次の新着を判定する -> 変化中なら ChangeEvent か True、それ以外は None（start / end は表示する）"""
+    from .reader import TornFrameError
+    if rd.wait_for_frame(det.frame_id, timeout) is None:
+        return None
+    try:
+        ev = det.read(rd)
+    except TornFrameError:
+        return None
+    if ev is not None:
+        print(f"\n[{ev.kind}] id={ev.frame_id} area={ev.fraction:.2%} bbox={ev.bbox}", flush=True)
+    if not det.active:
+        return None
+    return ev or True
+
+
+def record_main(argv=None):
+    ap = argparse.ArgumentParser(prog="sonycam-record", description="全フレームを生のまま録画（.cbrv）")
+    ap.add_argument("name", nargs="?", default=SHM_NAME_DEFAULT)
+    ap.add_argument("-o", "--out", default="record.cbrv")
+    ap.add_argument("--frames", type=int, default=1000, help="最大枚数（ファイルはこの分を先に確保）")
+    ap.add_argument("--seconds", type=float, default=None, help="録画時間 [s]（省略時は満杯まで）")
+    ap.add_argument("--sync", action="store_true", help="終了時・flush 時に fsync する")
+    _motion_args(ap, "変化が続いている間のフレームだけ録画する")
+    a = ap.parse_args(argv)
+
+    from .reader import open_shm
+    from .recorder import Recorder
+
+    try:
+        with open_shm(a.name) as rd, \
+                Recorder.create(a.out, rd.header, a.frames, sync=a.sync) as rec:
+            rec.last_id = rd.frame_id                 # 今ある 1 枚は飛ばし、次の新着から
+            det = _motion_detector(a, rd)
+            t_end = None if a.seconds is None else time.monotonic() + a.seconds
+            try:
+                while t_end is None or time.monotonic() < t_end:
+                    if det is not None:
+                        ev = _motion_step(det, rd)
+                        if not ev:
+                            continue
+                        if ev is not True and ev.kind == "start":   # 静止していた間は取りこぼしに数えない
+                            rec.last_id = det.frame_id - 1
+                        if rec.record(rd, timeout=0) is False:
+                            break
+                    elif rec.record(rd, timeout=1.0) is False:
+                        break
+                    st = rec.stats()
+                    print(f"\r{st['frames']}/{st['capacity']} frames  skipped={st['skipped']} "
+                          f"torn={st['torn']} write={st['write_MBps']:.0f} MB/s   ", end="", flush=True)
+            except KeyboardInterrupt:
+                pass
+            print(f"\nsaved: {a.out} ({rec.count} frames)")
+    except (OSError, RuntimeError) as e:
+        print(f"[err] {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def trace_main(argv=None):
+    ap = argparse.ArgumentParser(prog="sonycam-trace",
+                                 description="フレームごとの遅延・取りこぼし・ジッタを測る")
+    ap.add_argument("name", nargs="?", default=SHM_NAME_DEFAULT)
+    ap.add_argument("--seconds", type=float, default=None, help="測る時間 [s]（省略時は Ctrl+C まで）")
+    ap.add_argument("--interval", type=float, default=1.0, help="表示間隔 [s]")
+    ap.add_argument("--convert", action="store_true", help="BGR 変換まで含める（converted 段階）")
+    ap.add_argument("-o", "--out", default=None, help="トレースファイル（.csv / .json = Trace Event 形式）")
+    ap.add_argument("--json", action="store_true", help="最後に stats を JSON で出す")
+    a = ap.parse_args(argv)
+
+    from .convert import Converter
+    from .reader import TornFrameError, open_shm
+    from .trace import FrameTracer
+
+    try:
+        rd = open_shm(a.name)
+    except (OSError, RuntimeError) as e:
+        print(f"[err] {e}", file=sys.stderr)
+        return 1
+    out = rd.snapshot()
+    conv = Converter.from_header(rd.header, "bgr") if a.convert else None
+    tr = FrameTracer(rd.header.flags, a.out)
+    last_id = rd.frame_id
+    t_end = None if a.seconds is None else time.monotonic() + a.seconds
+    t_show = time.monotonic() + a.interval
+    try:
+        while t_end is None or time.monotonic() < t_end:
+            if rd.wait_for_frame(last_id, timeout=a.interval) is None:
+                continue
+            tr.observe()
+            try:
+                fid, ts, _ = rd.read_frame(out)
+            except TornFrameError:
+                continue
+            tr.frame(fid, ts)
+            if conv is not None:
+                conv(out)
+                tr.mark("converted")
+            tr.deliver()
+            last_id = fid
+            if time.monotonic() >= t_show:
+                age = tr.hist["age"].summary()
+                print(f"\rframes={tr.frames} dropped={tr.dropped} age p50={age['p50']:.2f} "
+                      f"p99={age['p99']:.2f} max={age['max']:.2f} ms   ", end="", flush=True)
+                t_show += a.interval
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tr.close()
+        rd.close()
+    st = tr.stats()
+    print()
+    if a.json:
+        import json
+        print(json.dumps(st, indent=1))
+        return 0
+    print(f"frames={st['frames']} dropped={st['dropped']} ({st['drop_rate'] * 100:.2f}%) "
+          f"clock={'hires' if st['hires'] else 'GetTickCount64 (~16 ms)'}")
+    for k, v in st["intervals"].items():
+        if v["count"]:
+            print(f"  {k:22s} p50={v['p50']:7.2f} p90={v['p90']:7.2f} p99={v['p99']:7.2f} "
+                  f"max={v['max']:7.2f} ms")
+    for k in ("period", "arrival"):
+        if k in st:
+            print(f"  {k:22s} mean={st[k]['mean']:7.2f} std={st[k]['std']:6.2f} max={st[k]['max']:7.2f} ms")
+    if a.out:
+        print(f"saved: {a.out}")
+    return 0
+
+
+def telemetry_main(argv=None):
+    ap = argparse.ArgumentParser(prog="sonycam-telemetry",
+                                 description="書き手のテレメトリ（fps・キャプチャ/コピー時間・失敗数）を表示")
+    ap.add_argument("name", nargs="?", default=SHM_NAME_DEFAULT)
+    ap.add_argument("--interval", type=float, default=1.0, help="表示間隔 [s]")
+    ap.add_argument("--once", action="store_true", help="1 回だけ表示")
+    ap.add_argument("--json", action="store_true", help="1 行 1 件の JSON で出す")
+    a = ap.parse_args(argv)
+
+    from .telemetry import TelemetryMonitor
+    try:
+        mon = TelemetryMonitor(a.name)
+    except (OSError, RuntimeError) as e:
+        print(f"[err] {e}", file=sys.stderr)
+        return 1
+    try:
+        while True:
+            t = mon.read()
+            age = mon.age_s()
+            if a.json:
+                import json
+                print(json.dumps(dict(t.to_dict(), age_s=age)), flush=True)
+            else:
+                print(f"{'' if a.once else chr(13)}fps={t.fps:5.1f} frames={t.frames} failed={t.failed} "
+                      f"capture={t.capture_us_avg / 1e3:.2f}/{t.capture_us_max / 1e3:.2f} "
+                      f"copy={t.copy_us_avg / 1e3:.2f}/{t.copy_us_max / 1e3:.2f} ms(avg/max) "
+                      f"probe mean={t.probe_mean:.1f} zero={t.zero_ppm / 1e4:.1f}% sat={t.sat_ppm / 1e4:.1f}% "
+                      f"zero_frames={t.zero_frames} sat_frames={t.saturated_frames} age={age:.1f}s   ",
+                      end="" if not a.once else "\n", flush=True)
+            if a.once:
+                break
+            time.sleep(a.interval)
+    except KeyboardInterrupt:
+        print()
+    finally:
+        mon.close()
+    return 0
+
+
+def fanout_main(argv=None):
+    ap = argparse.ArgumentParser(prog="sonycam-fanout",
+                                 description="1 回だけ読んで複数の消費者プロセスへ配るハブ（購読者ごとの遅れとプールの占有を表示）")
+    ap.add_argument("name", nargs="?", default=SHM_NAME_DEFAULT)
+    ap.add_argument("--slots", type=int, default=8, help="プールのスロット数")
+    ap.add_argument("--interval", type=float, default=2.0, help="状態の表示間隔 [s]（0 で表示しない）")
+    a = ap.parse_args(argv)
+
+    from .fanout import FanoutHub
+    try:
+        hub = FanoutHub(a.name, nslots=a.slots)
+    except (OSError, RuntimeError) as e:
+        print(f"[err] {e}", file=sys.stderr)
+        return 1
+    print(f"[info] fan-out {a.name} -> {hub.pool_name} ({a.slots} slots) at {hub.address}", file=sys.stderr)
+    try:
+        hub.start()
+        while True:
+            time.sleep(a.interval or 3600)
+            if not a.interval:
+                continue
+            st = hub.stats()
+            subs = " ".join(f"{k}:lag={s['lag']},q={s['outstanding']}/{s['queue']},skip={s['skipped']}"
+                            for k, s in st["subscribers"].items())
+            print(f"frames={st['frames']} pool={st['in_use']}/{st['nslots']} (peak {st['peak_in_use']}) "
+                  f"full={st['pool_full']} torn={st['torn']} {subs}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hub.close()
+    return 0
+
+
+def serve_main(argv=None):
+    ap = argparse.ArgumentParser(prog="sonycam-serve",
+                                 description="MJPEG（HTTP）・生フレーム（TCP）・最新 1 枚を LAN へ配信")
+    ap.add_argument("name", nargs="?", default=SHM_NAME_DEFAULT)
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8080, help="HTTP（/stream.mjpg /snapshot.jpg /stats）")
+    ap.add_argument("--raw-port", type=int, default=None, help="生フレームの TCP ポート（省略時は無効）")
+    ap.add_argument("--scale", type=float, default=1.0, help="既定の縮小率（クエリ ?scale= で上書き可）")
+    ap.add_argument("--roi", default=None, help="既定の切り出し x,y,w,h")
+    ap.add_argument("--quality", type=int, default=80, help="JPEG 品質")
+    ap.add_argument("--interval", type=float, default=5.0, help="状態の表示間隔 [s]（0 で表示しない）")
+    a = ap.parse_args(argv)
+
+    from .server import FrameServer
+    roi = tuple(int(v) for v in a.roi.split(",")) if a.roi else None
+    try:
+        srv = FrameServer(a.name, a.host, a.port, a.raw_port, a.scale, roi, a.quality)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"[err] {e}", file=sys.stderr)
+        return 1
+    host, port = srv.address[:2]
+    print(f"[info] http://{host}:{port}/stream.mjpg" +
+          (f"  tcp://{host}:{srv.raw_address[1]}" if srv.raw_address else ""), file=sys.stderr)
+    try:
+        srv.start()
+        while True:
+            time.sleep(a.interval or 3600)
+            if not a.interval:
+                continue
+            st = srv.stats()
+            enc = sum(st["encodes"].values())
+            print(f"frames={st['frames']} encodes={enc} clients={len(st['clients'])} "
+                  f"sent={sum(c['sent'] for c in st['clients'])} "
+                  f"skipped={sum(c['skipped'] for c in st['clients'])} busy={st['busy']}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.close()
+    return 0
+
+
+def preview_main(argv=None):
+    ap = argparse.ArgumentParser(prog="sonycam-preview",
+                                 description="共有メモリをプレビュー表示（取り込みとは別プロセス。ESC / q で終了）")
+    ap.add_argument("name", nargs="?", default=SHM_NAME_DEFAULT)
+    ap.add_argument("--max-fps", type=float, default=30.0, help="描画の上限 [fps]")
+    ap.add_argument("--size", default=None, help="表示の大きさ WxH（省略時はウィンドウに合わせる）")
+    ap.add_argument("--no-overlay", action="store_true", help="frame_id / fps / 経過時間を重ね書きしない")
+    a = ap.parse_args(argv)
+
+    from .preview import Preview
+    size = tuple(map(int, a.size.lower().split("x"))) if a.size else None
+    try:
+        Preview(a.name, a.max_fps, size, not a.no_overlay, source=a.name).run()
+    except (OSError, RuntimeError) as e:
+        print(f"[err] {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def produce_main(argv=None):
+    ap = argparse.ArgumentParser(
+        prog="sonycam-produce",
+        description="CAM1.exe のスタンドイン: 合成パターンか録画を共有メモリへ書き続ける")
+    ap.add_argument("name", nargs="?", default=None,
+                    help="共有メモリ名（posix:/file:/win: 可。--bridge 時は標準入力から読む）")
+    ap.add_argument("--size", default="2464x2056")
+    ap.add_argument("--bpp", type=int, default=24, choices=(8, 24, 32))
+    ap.add_argument("--fps", type=float, default=30.0, help="0 で全速")
+    ap.add_argument("--pattern", default="bars", choices=("bars", "gradient", "checker", "noise"))
+    ap.add_argument("--cfa", default=None, choices=("RG", "GR", "GB", "BG"), help="Bayer で出す")
+    ap.add_argument("--replay", default=None, help=".cbrv 録画 / .npy / 画像ファイル（glob 可）")
+    ap.add_argument("--ring", type=int, default=0, help="リング形式のスロット数（CAM1_RING_SLOTS 相当）")
+    ap.add_argument("--bottom-up", action="store_true", help="下から上の行順で書く")
+    ap.add_argument("--header-version", type=int, default=2, choices=(1, 2),
+                    help="CBRG ヘッダの版（1 = 旧ブリッジの 44 バイト。CAM1_HEADER_VERSION 相当）")
+    ap.add_argument("--frames", type=int, default=None)
+    ap.add_argument("--seconds", type=float, default=None)
+    ap.add_argument("--bridge", action="store_true",
+                    help="CAM1.exe と同じ入出力（名前を標準入力から読み、WH 行を出し、finalize で終わる）")
+    ap.add_argument("--serial", default="SYNTHETIC", help="起動時に出すシリアル番号の代わりの行")
+    ap.add_argument("--trigger", action="store_true",
+                    help="共通の時計の周期の倍数で書く（複数台をハードウェアトリガで揃えた状態を真似る）")
+    ap.add_argument("--control-lag", type=int, default=0,
+                    help="設定が効くまでのフレーム数（CAM1_CONTROL_LAG 相当。0 = 次のフレームから）")
+    ap.add_argument("--fail-after", type=int, default=None,
+                    help="この枚数を公開した後は Capture の失敗を真似る（公開せずテレメトリの failed だけ数える）")
+    a = ap.parse_args(argv)
+
+    import threading
+
+    from .producer import Producer, ReplaySource, SyntheticSource
+
+    name = a.name
+    if a.bridge:
+        sys.stdout.write("Enter the shared memory name: ")
+        sys.stdout.flush()
+        name = sys.stdin.readline().strip() or SHM_NAME_DEFAULT
+    name = name or SHM_NAME_DEFAULT
+    w, h = map(int, a.size.lower().split("x"))
+    bpp = 8 if a.cfa else a.bpp
+    src = ReplaySource(a.replay, w, h, bpp) if a.replay else \
+        SyntheticSource(w, h, bpp, a.pattern, a.cfa)
+    stop = threading.Event()
+    try:
+        prod = Producer(name, src, a.fps, a.ring, bottom_up=a.bottom_up, header_version=a.header_version,
+                        control_lag=a.control_lag, fail_after=a.fail_after)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"[err] {e}", file=sys.stderr)
+        return 1
+    with prod:
+        w, h, bpp, stride = prod.geometry
+        if getattr(prod.writer, "resumed", False):         # SaveFile.cpp と同じ（落ちたブリッジの続き）
+            print(f"RESUME FRAME {prod.writer.frame_id} EPOCH {epoch(prod.writer.header.flags)}")
+        print(a.serial)                                     # ブリッジのシリアル番号行の代わり
+        print(f"WH {w} {h} BPP {bpp} STRIDE {stride}" + (f" CFA {a.cfa}" if a.cfa else ""), flush=True)
+        if a.bridge:
+            # stop_cam() は finalize の直後に terminate するので、SIGTERM でも片付けてから終わる
+            import signal
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+            def wait_finalize():
+                for line in sys.stdin:
+                    if line.strip() in ("finalize", "quit", "exit"):
+                        break
+                stop.set()
+            threading.Thread(target=wait_finalize, daemon=True).start()
+        try:
+            prod.run(a.frames, a.seconds, stop, align=a.trigger)
+        except KeyboardInterrupt:
+            pass
+        print(f"published={prod.published} failed={prod.failed} late={prod.late}", file=sys.stderr)
+    return 0
+
+
+def daemon_main(argv=None):
+    ap = argparse.ArgumentParser(prog="sonycam-daemon",
+                                 description="CAM1.exe を起動したまま持つ常駐デーモン（短いツールは借りるだけ）")
+    ap.add_argument("--idle", type=float, default=60.0, help="誰も借りていないブリッジを終えるまで [s]（0 で終えない）")
+    ap.add_argument("--libdir", default=None, help="CAM1.exe のあるフォルダ（既定: ./lib）")
+    ap.add_argument("--exe", default="CAM1.exe", help="実行ファイル名")
+    ap.add_argument("--stand-in", default=None,
+                    help='CAM1.exe の代わりのコマンド（例: "sonycam-produce --bridge --size 640x480"）')
+    ap.add_argument("--preload", nargs="*", default=[], help="起動時に立ち上げておく共有メモリ名")
+    ap.add_argument("--status", action="store_true", help="動いているデーモンの状態を表示して終わる")
+    ap.add_argument("--stop", action="store_true", help="動いているデーモンを止める")
+    a = ap.parse_args(argv)
+
+    import json
+    import shlex
+    import signal
+    import threading
+
+    from .daemon import BridgeDaemon, request
+    if a.status or a.stop:
+        reply = request(("stop",) if a.stop else ("status",))
+        if reply is None:
+            print("[err] no bridge daemon is running", file=sys.stderr)
+            return 1
+        if a.status:
+            print(json.dumps(reply[1], indent=1))
+        return 0
+    argv_cmd = shlex.split(a.stand_in, posix=sys.platform != "win32") if a.stand_in else None
+    try:
+        d = BridgeDaemon(a.libdir, a.exe, argv_cmd, a.idle)
+    except (OSError, RuntimeError) as e:
+        print(f"[err] {e}", file=sys.stderr)
+        return 1
+    print(f"[info] bridge daemon at {d.address} (registry {d.registry_path}, idle {a.idle:g}s)", file=sys.stderr)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())   # terminate でもブリッジを finalize してから終わる
+    with d:
+        for name in a.preload:
+            try:
+                d.preload(name)
+            except (OSError, RuntimeError) as e:
+                print(f"[err] {e}", file=sys.stderr)
+        try:
+            d.run(stop=stop)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+def control_main(argv=None):
+    ap = argparse.ArgumentParser(prog="sonycam-control",
+                                 description="露光・ゲイン・ROI・トリガを止めずに変える（制御ページ CBRC）。指定なしは今の値")
+    ap.add_argument("name", nargs="?", default=SHM_NAME_DEFAULT)
+    ap.add_argument("--exposure", type=float, default=None, help="ExposureTime [µs]")
+    ap.add_argument("--gain", type=float, default=None, help="Gain [dB]")
+    ap.add_argument("--roi", default=None, help="x,y,w,h（w, h は今の大きさ。オフセットだけ動かす）")
+    ap.add_argument("--trigger", default=None, choices=("on", "off"), help="TriggerMode")
+    ap.add_argument("--timeout", type=float, default=2.0)
+    a = ap.parse_args(argv)
+
+    from .control import STATUS_NAMES, CameraControl, ControlError
+
+    todo = [("exposure_us", a.exposure), ("gain_db", a.gain),
+            ("roi", tuple(int(v) for v in a.roi.split(",")) if a.roi else None),
+            ("trigger", None if a.trigger is None else int(a.trigger == "on"))]
+    todo = [(k, v) for k, v in todo if v is not None]
+    try:
+        with CameraControl(a.name) as ctl:
+            if not todo:
+                for k, v in ctl.settings(a.timeout).items():
+                    print(f"{k:13s} {v}")
+                return 0
+            rids = [(k, ctl.submit(k, v)) for k, v in todo]        # まとめて出すと同じフレームから効く
+            rc = 0
+            for k, rid in rids:
+                ack = ctl.wait(rid, a.timeout)
+                st = STATUS_NAMES.get(ack.status, ack.status)
+                print(f"{k:13s} {ack.value} {st}" + (f" from frame {ack.effective_frame}" if not ack.status else "")
+                      + f" (request {rid}, {ack.latency_s * 1e3:.1f} ms)")
+                rc |= ack.status != 0
+            return rc
+    except (OSError, ControlError, ValueError) as e:
+        print(f"[err] {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(peek_main())
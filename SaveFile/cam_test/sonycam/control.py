@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""カメラ設定の制御ページ 'CBRC'（露光・ゲイン・ROI・トリガを止めずに変える）
+
+フレームのセグメントとは別の小さな共有セグメント "<名前>_control" をブリッジ（CAM1.exe / Producer）が作り、
+読み手がスロットに要求を書き、ブリッジがキャプチャの合間に適用して応答を書き戻す。
+
+    with CameraControl(r"Local\\Cam1Mem") as ctl:
+        ack = ctl.set("exposure_us", 5000)         # -> Ack。ack.effective_frame からこの露光
+        ctl.set("gain_db", 12.0)
+        ctl.set("roi", (64, 32, 2464, 2056))       # x, y, w, h（w, h は今の大きさのまま。オフセットだけ動かす）
+        ctl.get("gain_db")                         # -> 12.0（ブリッジが持っている今の値）
+        rid = ctl.submit("gain_db", 6.0); ...; ack = ctl.wait(rid)   # 待たずに出して後で受け取る
+
+- 要求には request_id（ページで単調増加）が付き、応答（Ack）は status・ブリッジが採った値・
+  effective_frame（この設定で撮られる最初の frame_id）を返す。ブリッジは Capture の前に見るので、
+  応答までは最長でおよそ 1 フレーム周期。effective_frame は次のフレーム + lag（ドライバに溜まっていて
+  もう撮られたフレームの数。CAM1.exe は CAM1_CONTROL_LAG、既定 1）。
+- 幅・高さ・画素形式の変更はセグメントの幾何が変わるので STATUS_RESTART（起動し直しが要る）。
+  ブリッジを起動し直すと設定は初期値に戻る（出ていた要求には新しいブリッジが答える）。
+- スロットの確保だけ複数の読み手の間で排他する（posix / file は flock、Windows は名前付きミューテックス）。
+  確保したまま落ちた読み手のスロットは RECLAIM_S 秒後に再利用する。
+- 書き方は ShmHeader と同じく、要求は値を全部書いてから state を PENDING に、応答は DONE を最後に書く。
+- テキストのコマンド（標準入力の "capture" 等）は要らない。CAM1.exe はフリーランで、標準入力は finalize だけ。
+"""
+import collections
+import ctypes as C
+import os
+import threading
+import time
+
+from .header import SHM_NAME_DEFAULT, now_us
+from .transport import create_segment, open_segment, resolve, segment_exists, unlink_segment
+
+CTRL_MAGIC = 0x43524243              # 'CBRC'
+CTRL_VERSION = 1
+CTRL_SUFFIX = "_control"
+NSLOTS = 16
+RECLAIM_S = 30.0
+
+# スロットの state
+FREE, CLAIMED, PENDING, DONE = 0, 1, 2, 3
+OP_SET, OP_GET = 1, 2
+# status
+STATUS_OK, STATUS_UNSUPPORTED, STATUS_INVALID, STATUS_FAILED, STATUS_RESTART = 0, 1, 2, 3, 4
+STATUS_NAMES = {STATUS_OK: "ok", STATUS_UNSUPPORTED: "unsupported", STATUS_INVALID: "invalid",
+                STATUS_FAILED: "failed", STATUS_RESTART: "needs restart"}
+# 設定の種類（値の数）。SaveFile.cpp の CTRL_KEY_* と一致させる
+KEYS = {"exposure_us": 1, "gain_db": 2, "roi": 3, "trigger": 4, "pixel_format": 5}
+KEY_NAMES = {v: k for k, v in KEYS.items()}
+_NVALUES = {"roi": 4}
+
+
+class ControlPage(C.LittleEndianStructure):
+    """SaveFile.cpp の ControlPage と一致させる（pack 1, 64 バイト）"""
+    _pack_ = 1
+    _fields_ = [
+        ("magic", C.c_uint32),
+        ("version", C.c_uint32),
+        ("nslots", C.c_uint32),
+        ("pid", C.c_uint32),           # ブリッジ
+        ("caps", C.c_uint32),          # 受け付ける設定（1 << key）
+        ("lag", C.c_uint32),           # effective_frame = 次のフレーム + lag
+        ("next_id", C.c_uint32),       # 次の request_id（読み手がスロットの確保と一緒に進める）
+        ("reserved0", C.c_uint32),
+        ("served", C.c_uint64),        # ブリッジが応答した数
+        ("started_us", C.c_uint64),
+        ("reserved", C.c_uint64 * 2),
+    ]
+
+
+class ControlSlot(C.LittleEndianStructure):
+    """要求 1 件（pack 1, 80 バイト）"""
+    _pack_ = 1
+    _fields_ = [
+        ("state", C.c_uint32),         # FREE / CLAIMED / PENDING / DONE
+        ("request_id", C.c_uint32),
+        ("op", C.c_uint16),
+        ("key", C.c_uint16),
+        ("status", C.c_int32),
+        ("pid", C.c_uint32),           # 要求した読み手
+        ("reserved0", C.c_uint32),
+        ("stamp_us", C.c_uint64),      # 要求（読み手）/ 応答（ブリッジ）の時刻（header.now_us の時計）
+        ("effective_frame", C.c_uint64),
+        ("value", C.c_double * 4),     # 要求の値 → 応答ではブリッジが採った値
+        ("reserved1", C.c_uint64),
+    ]
+
+
+PAGE_SIZE = C.sizeof(ControlPage)
+SLOT_SIZE = C.sizeof(ControlSlot)
+assert PAGE_SIZE == 64 and SLOT_SIZE == 80
+
+
+def control_size(nslots=NSLOTS):
+    return PAGE_SIZE + SLOT_SIZE * nslots
+
+
+def control_name(name):
+    """フレームのセグメント名 → 制御ページの名前"""
+    return name + CTRL_SUFFIX
+
+
+# Ack.value: 値 1 つの設定は数、roi は (x, y, w, h)。latency_s は submit から応答を見るまで
+Ack = collections.namedtuple("Ack", "request_id key status value effective_frame latency_s")
+
+
+class ControlError(RuntimeError):
+    """要求が通らなかった（status）か応答が来なかった（status=None）"""
+
+    def __init__(self, msg, status=None, ack=None):
+        super().__init__(msg)
+        self.status, self.ack = status, ack
+
+
+def _key_code(key):
+    if isinstance(key, str):
+        if key not in KEYS:
+            raise ValueError(f"unknown setting {key!r} (use {sorted(KEYS)})")
+        return KEYS[key]
+    return int(key)
+
+
+def _values(key, value):
+    name = KEY_NAMES.get(key, "")
+    n = _NVALUES.get(name, 1)
+    if value is None:
+        return [0.0] * 4
+    vals = [float(v) for v in (value if n > 1 else [value])]
+    if len(vals) != n:
+        raise ValueError(f"{name} takes {n} values")
+    return vals + [0.0] * (4 - n)
+
+
+def _unpack(key, values):
+    n = _NVALUES.get(KEY_NAMES.get(key, ""), 1)
+    return tuple(int(v) for v in values[:n]) if n > 1 else values[0]
+
+
+class _ClaimLock:
+    """スロット確保の排他（プロセス間）。posix / file は flock、Windows は名前付きミューテックス"""
+
+    def __init__(self, name, kind=None):
+        kind, target = resolve(name, kind)
+        self._lock = threading.Lock()              # 同じプロセスのスレッド間
+        self._fd = self._h = None
+        if kind == "win":
+            from ctypes import wintypes as W
+            k32 = C.WinDLL("kernel32", use_last_error=True)
+            k32.CreateMutexW.argtypes = [C.c_void_p, W.BOOL, W.LPCWSTR]
+            k32.CreateMutexW.restype = W.HANDLE
+            k32.WaitForSingleObject.argtypes = [W.HANDLE, W.DWORD]
+            k32.WaitForSingleObject.restype = W.DWORD
+            for fn in (k32.ReleaseMutex, k32.CloseHandle):
+                fn.argtypes = [W.HANDLE]
+                fn.restype = W.BOOL
+            self._k32 = k32
+            self._h = k32.CreateMutexW(None, False, target + "_lock")
+            if not self._h:
+                raise OSError(C.get_last_error(), f"mutex not available: {target}_lock")
+        else:
+            self._fd = os.open(target, os.O_RDWR)
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._h:
+            self._k32.WaitForSingleObject(self._h, 0xFFFFFFFF)    # 持ったまま落ちた相手なら WAIT_ABANDONED で取れる
+        elif self._fd is not None:
+            import fcntl
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._h:
+            self._k32.ReleaseMutex(self._h)
+        elif self._fd is not None:
+            import fcntl
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def close(self):
+        if self._h:
+            self._k32.CloseHandle(self._h)
+            self._h = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class CameraControl:
+    """制御ページの読み手側（要求を出して応答を待つ）"""
+
+    def __init__(self, name=SHM_NAME_DEFAULT, kind=None, timeout=0.0):
+        """timeout 秒まで制御ページが現れるのを待つ。無ければ ControlError（制御ページの無い古いブリッジ等）"""
+        self.name = control_name(name)
+        self.kind = kind
+        deadline = time.monotonic() + timeout
+        while not segment_exists(self.name, kind):
+            if time.monotonic() >= deadline:
+                raise ControlError(f"no control page {self.name!r}: bridge not running, or built "
+                                   "without the control channel (rebuild CAM1.exe from SaveFile.cpp)")
+            time.sleep(0.02)
+        self._m = open_segment(self.name, PAGE_SIZE, kind)
+        page = ControlPage.from_buffer(self._m)
+        ok, nslots = page.magic == CTRL_MAGIC and page.version == CTRL_VERSION, page.nslots
+        del page
+        if not ok:
+            self._m.close()
+            raise ControlError(f"{self.name!r} is not a CBRC control page (version {CTRL_VERSION})")
+        self._m.close()
+        self._m = open_segment(self.name, control_size(nslots), kind)
+        self.page = ControlPage.from_buffer(self._m)
+        self.slots = (ControlSlot * nslots).from_buffer(self._m, PAGE_SIZE)
+        self._claim = _ClaimLock(self.name, kind)
+        self._mine = {}                            # request_id -> (slot, submit 時刻)
+
+    @property
+    def caps(self):
+        """ブリッジが受け付ける設定の名前"""
+        return sorted(k for k, v in KEYS.items() if self.page.caps & (1 << v))
+
+    def submit(self, key, value=None, op=OP_SET):
+        """要求を出す（待たない）-> request_id。空きスロットが無ければ ControlError"""
+        code = _key_code(key)
+        vals = _values(code, value)
+        now = now_us()
+        with self._claim:
+            for i, s in enumerate(self.slots):
+                if s.state == FREE or (s.state in (CLAIMED, DONE) and
+                                       now - s.stamp_us > RECLAIM_S * 1e6 and i not in self._owned()):
+                    break
+            else:
+                raise ControlError(f"all {len(self.slots)} control slots are busy")
+            s.state = CLAIMED
+            rid = self.page.next_id = (self.page.next_id + 1) & 0xFFFFFFFF or 1
+            s.stamp_us = now
+        s.request_id, s.op, s.key, s.pid = rid, op, code, os.getpid()
+        s.status, s.effective_frame = 0, 0
+        for j, v in enumerate(vals):
+            s.value[j] = v
+        s.state = PENDING                          # 値を全部書いてから（ブリッジは PENDING を見てから読む）
+        self._mine[rid] = (i, time.perf_counter())
+        return rid
+
+    def _owned(self):
+        return {i for i, _ in self._mine.values()}
+
+    def poll(self, request_id):
+        """応答が来ていれば Ack（スロットを返す）、まだなら None"""
+        i, t0 = self._mine[request_id]
+        s = self.slots[i]
+        if s.state != DONE or s.request_id != request_id:
+            return None
+        ack = Ack(request_id, KEY_NAMES.get(s.key, s.key), s.status, _unpack(s.key, list(s.value)),
+                  s.effective_frame, time.perf_counter() - t0)
+        s.state = FREE
+        del self._mine[request_id]
+        return ack
+
+    def wait(self, request_id, timeout=2.0):
+        """応答を待つ -> Ack。timeout なら ControlError（要求は出たまま。後で poll() で受け取れる）"""
+        deadline = time.monotonic() + timeout
+        delay = 0.0002
+        while True:
+            ack = self.poll(request_id)
+            if ack is not None:
+                return ack
+            if time.monotonic() >= deadline:
+                raise ControlError(f"no answer to request {request_id} within {timeout}s "
+                                   "(bridge stalled or not serving the control page)")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.002)
+
+    def request(self, key, value=None, op=OP_SET, timeout=2.0):
+        """出して待つ -> Ack。status が ok でなければ ControlError"""
+        ack = self.wait(self.submit(key, value, op), timeout)
+        if ack.status != STATUS_OK:
+            raise ControlError(f"{ack.key} {'set' if op == OP_SET else 'get'} refused: "
+                               f"{STATUS_NAMES.get(ack.status, ack.status)}", ack.status, ack)
+        return ack
+
+    def set(self, key, value, timeout=2.0):
+        """設定を変える -> Ack（ack.effective_frame からこの設定で撮られる）"""
+        return self.request(key, value, OP_SET, timeout)
+
+    def get(self, key, timeout=2.0):
+        """ブリッジが今使っている値"""
+        return self.request(key, None, OP_GET, timeout).value
+
+    def settings(self, timeout=2.0):
+        """受け付ける設定を全部読む -> {名前: 値}"""
+        rids = {k: self.submit(k, None, OP_GET) for k in self.caps}
+        out = {}
+        for k, rid in rids.items():
+            ack = self.wait(rid, timeout)
+            if ack.status == STATUS_OK:
+                out[k] = ack.value
+        return out
+
+    def close(self):
+        if self._m is None:
+            return
+        self._claim.close()
+        self.page = self.slots = None
+        self._m.close()
+        self._m = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ControlServer:
+    """制御ページのブリッジ側（Producer / テスト用。CAM1.exe は SaveFile.cpp が同じことをする）
+
+    poll(handler, next_frame) をキャプチャの前に呼ぶ。handler(op, key, values) -> (status, values)。
+    同じ大きさのページが既にあれば（落ちたブリッジの代わり）スロットは引き継ぎ、出ていた要求にも答える。
+    """
+
+    def __init__(self, name, kind=None, keys=tuple(KEYS), lag=0, nslots=NSLOTS):
+        self.name, self.kind = control_name(name), kind
+        self._buf = create_segment(self.name, control_size(nslots), kind)
+        self.page = p = ControlPage.from_buffer(self._buf)
+        self.slots = (ControlSlot * nslots).from_buffer(self._buf, PAGE_SIZE)
+        if not (p.magic == CTRL_MAGIC and p.version == CTRL_VERSION and p.nslots == nslots):
+            C.memset(C.addressof(p), 0, control_size(nslots))
+            p.version, p.nslots = CTRL_VERSION, nslots
+        p.pid, p.lag, p.started_us = os.getpid(), lag, now_us()
+        p.caps = sum(1 << _key_code(k) for k in keys)
+        p.magic = CTRL_MAGIC
+
+    def poll(self, handler, next_frame):
+        """出ている要求に全部答える -> 答えた数"""
+        n = 0
+        p = self.page
+        for s in self.slots:
+            if s.state != PENDING:
+                continue
+            if not p.caps & (1 << s.key):
+                status, vals = STATUS_UNSUPPORTED, list(s.value)
+            else:
+                try:
+                    status, vals = handler(s.op, s.key, list(s.value))
+                except (ValueError, OSError, RuntimeError):
+                    status, vals = STATUS_FAILED, list(s.value)
+            for j, v in enumerate(vals[:4]):
+                s.value[j] = v
+            s.status = status
+            s.effective_frame = next_frame + p.lag if s.op == OP_SET and status == STATUS_OK else 0
+            s.stamp_us = now_us()
+            s.state = DONE                         # 最後に
+            p.served += 1
+            n += 1
+        return n
+
+    def close(self, unlink=True):
+        if self._buf is None:
+            return
+        self.page = self.slots = None
+        self._buf.close()
+        self._buf = None
+        if unlink:
+            unlink_segment(self.name, self.kind)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
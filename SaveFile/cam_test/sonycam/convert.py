@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""ピクセル変換（cv2 は必要になった時だけ読み込む）
+
+Converter は 8/24/32bpp の DIB（stride の詰め物・下から上の行順を含む）を、
+呼び出し側が渡した（または OutputPool が使い回す）連続配列へ書き込む。フレーム毎の確保はしない。
+
+    conv = Converter.from_header(reader.header, "bgr")
+    pool = OutputPool(conv.out_shape)
+    img = conv(reader.pixels(), pool.get())      # 連続配列なので imwrite/imshow で隠れコピーが起きない
+
+ヘッダの flags に CFA 並びがあれば（Bayer 転送モード）8bpp の生値を demosaic する。
+半分解像度のプレビューや遅延 demosaic は bayer.py。
+"""
+import collections
+
+import numpy as np
+
+from .header import FLAG_BOTTOM_UP, cfa_pattern, channels
+
+TARGETS = ("bgr", "rgb", "gray", "bgra")
+
+# (入力チャンネル数, 出力) -> cv2 の変換コード名（None は単純コピー）
+_CODES = {
+    (4, "bgr"): "COLOR_BGRA2BGR", (4, "rgb"): "COLOR_BGRA2RGB",
+    (4, "gray"): "COLOR_BGRA2GRAY", (4, "bgra"): None,
+    (3, "bgr"): None, (3, "rgb"): "COLOR_BGR2RGB",
+    (3, "gray"): "COLOR_BGR2GRAY", (3, "bgra"): "COLOR_BGR2BGRA",
+    (1, "bgr"): "COLOR_GRAY2BGR", (1, "rgb"): "COLOR_GRAY2RGB",
+    (1, "gray"): None, (1, "bgra"): "COLOR_GRAY2BGRA",
+}
+_OUT_CH = {"bgr": 3, "rgb": 3, "gray": 1, "bgra": 4}
+
+# CFA 並び（GenICam 名。左上 2x2 の先頭行）-> OpenCV の Bayer コード名の接頭辞。
+# OpenCV は 2 行目の 2・3 画素目で名付けるので 1 位相ずれる（BayerRG8 は COLOR_BayerBG2*）
+_CV_BAYER = {"RG": "BG", "GR": "GB", "GB": "GR", "BG": "RG"}
+_BAYER_OUT = {"bgr": "BGR", "rgb": "RGB", "gray": "GRAY", "bgra": "BGRA"}
+# 行を 1 つずらした時の並び（下から上のバッファを偶数行の高さで読む時）
+_ROW_SWAP = {"RG": "GB", "GB": "RG", "GR": "BG", "BG": "GR"}
+
+
+def bayer_code(pattern, target="bgr", edge_aware=False):
+    """CFA 並び + 出力形式 -> cv2 の変換コード（edge_aware は bgr/rgb のみ）"""
+    if pattern not in _CV_BAYER:
+        raise ValueError(f"unknown CFA pattern {pattern!r}")
+    name = f"COLOR_Bayer{_CV_BAYER[pattern]}2{_BAYER_OUT[target]}"
+    if edge_aware:
+        if target not in ("bgr", "rgb"):
+            raise ValueError("edge_aware demosaic supports bgr/rgb only")
+        name += "_EA"
+    return getattr(_cv2(), name)
+
+
+def _cv2():
+    import cv2
+    return cv2
+
+
+def to_bgr(buf, w, h, bpp, stride):
+    """bytes/mmap/ndarray の stride 付き DIB → BGR 画像（反転なし）
+
+    32bpp では非連続のビューを返す（後段で隠れコピーが起きる）。新規コードは Converter を使うこと。
+    """
+    row = np.frombuffer(buf, np.uint8, count=stride * h).reshape(h, stride)
+    valid = row[:, : w * max(1, bpp // 8)]
+    if bpp == 32:
+        return valid.reshape(h, w, 4)[:, :, :3]      # BGRA→BGR
+    if bpp == 24:
+        return valid.reshape(h, w, 3)                # DIBはBGR順
+    if bpp == 8:
+        return _cv2().cvtColor(valid.reshape(h, w), _cv2().COLOR_GRAY2BGR)
+    c = max(1, bpp // 8)
+    return valid.reshape(h, w, c)[:, :, :3]
+
+
+class Converter:
+    """1 つの入力形式 → 1 つの出力形式の変換器（出力は常に上から下・連続配列）"""
+
+    def __init__(self, w, h, bpp, stride=None, bottom_up=False, target="bgr",
+                 cfa=None, edge_aware=False):
+        if target not in TARGETS:
+            raise ValueError(f"target must be one of {TARGETS}")
+        self.w, self.h, self.bpp = w, h, bpp
+        self.c = channels(bpp)
+        self.stride = stride or w * self.c
+        self.bottom_up = bool(bottom_up)
+        self.target = target
+        self.cfa = cfa
+        oc = _OUT_CH[target]
+        self.out_shape = (h, w) if oc == 1 else (h, w, oc)
+        if cfa is not None:
+            if self.c != 1:
+                raise ValueError(f"Bayer input must be 8bpp (bpp={bpp})")
+            # 下から上のバッファはメモリ順のまま demosaic して後で反転する。
+            # 高さが偶数ならメモリ先頭行は画像の奇数行なので並びの行が入れ替わる
+            mem = _ROW_SWAP[cfa] if self.bottom_up and h % 2 == 0 else cfa
+            self._code = bayer_code(mem, target, edge_aware)
+        else:
+            name = _CODES[(self.c, target)]
+            self._code = None if name is None else getattr(_cv2(), name)
+
+    @classmethod
+    def from_header(cls, hdr, target="bgr", edge_aware=False):
+        """ShmHeader / RingHeader から（向き・CFA 並びは flags から読む）"""
+        return cls(hdr.width, hdr.height, hdr.bpp, hdr.stride,
+                   bool(hdr.flags & FLAG_BOTTOM_UP), target,
+                   cfa_pattern(hdr.flags), edge_aware)
+
+    def new_output(self):
+        return np.empty(self.out_shape, np.uint8)
+
+    def source_view(self, buf, offset=0):
+        """bytes/mmap などの生バッファを stride 付きの入力ビューにする（コピーなし）"""
+        if isinstance(buf, np.ndarray) and buf.ndim >= 2:
+            return buf
+        if self.c == 1:
+            shape, strides = (self.h, self.w), (self.stride, 1)
+        else:
+            shape, strides = (self.h, self.w, self.c), (self.stride, self.c, 1)
+        return np.ndarray(shape, np.uint8, buffer=buf, offset=offset, strides=strides)
+
+    def __call__(self, src, out=None):
+        """src（reader.pixels() 等）を変換して out に書く。out 省略時だけ確保する"""
+        src = self.source_view(src)
+        if out is None:
+            out = self.new_output()
+        if self._code is None:
+            np.copyto(out, src[::-1] if self.bottom_up else src)
+            return out
+        cv2 = _cv2()
+        cv2.cvtColor(src, self._code, dst=out)
+        if self.bottom_up:
+            cv2.flip(out, 0, dst=out)        # 垂直反転はその場で行える（確保なし）
+        return out
+
+
+class OutputPool:
+    """出力バッファを n 枚用意して順に使い回す
+
+    get() が返した配列は n 回後の get() で上書きされる。それより長く保持するならコピーすること。
+    """
+
+    def __init__(self, shape, n=3, dtype=np.uint8):
+        self._bufs = collections.deque(np.empty(shape, dtype) for _ in range(n))
+
+    def get(self):
+        buf = self._bufs[0]
+        self._bufs.rotate(-1)
+        return buf
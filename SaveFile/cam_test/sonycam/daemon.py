@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""ブリッジの常駐管理（CAM1.exe を起動したままにして、短いツールは繋ぐだけにする）
+
+ツールごとに CAM1.exe を起動すると、SDK の初期化・SetMaxPacketSize・設定・空撮り 3 回の後に
+finalize で終わるので、1 枚取るだけで数秒掛かる。デーモンがブリッジを持ち続け、ツールは
+借りる（リース）だけにする。
+
+    sonycam-daemon --idle 60                           # 常駐（ユーザに 1 つ）
+
+    with lease(r"Local\\Cam1Mem") as rd:               # 動いていれば数 ms で FrameReader。無ければデーモンが起動
+        fid, ts, img = rd.read_frame()
+    ls = lease(name, launch=False)                     # デーモンが持っている時だけ（None なら自分で開く）
+    registry()                                         # {名前: {pid, refs, geometry, ...}}（動いているもの）
+
+- リースは連絡路の接続そのもの。acquire で参照 +1、切断（close / プロセスの終了）で -1。参照が 0 の
+  ブリッジは idle 秒後に finalize して終える（idle=0 なら終えない）。
+- デーモン自身もセグメントを開いたままにする（Windows の名前付きマッピングはハンドルが 1 つでも
+  残っていれば消えない）。リース中のブリッジは watchdog.Watchdog で見張り、フレームが止まった・落ちたら
+  restart_delay 秒（失敗が続けば倍々）あけて同じ名前で起動し直す。借り手は開き直さずに続きを読める。
+- 登録簿（registry_path()、JSON）は変化のたびに書き直す（一時ファイル → os.replace）。読む側は
+  デーモンに繋がらなければ古いものとして無視する。
+- 連絡路は multiprocessing.connection（Windows は名前付きパイプ、それ以外は UNIX ソケット）。
+- argv でスタンドイン（sonycam-produce --bridge 等）を使える（Linux での確認用）。
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from .header import SHM_NAME_DEFAULT, AttachError
+from .launcher import EXE_NAME_DEFAULT, default_libdir
+from .reader import attach
+from .watchdog import Watchdog
+
+
+def daemon_address():
+    """デーモンの待ち受けアドレス（SONYCAM_DAEMON で上書き可）"""
+    if os.environ.get("SONYCAM_DAEMON"):
+        return os.environ["SONYCAM_DAEMON"]
+    if os.name == "nt":
+        return r"\\.\pipe\sonycam_daemon"
+    return os.path.join(tempfile.gettempdir(), f"sonycam_daemon_{os.getuid()}.sock")
+
+
+def registry_path(address=None):
+    """登録簿のパス（アドレスの隣）"""
+    address = address or daemon_address()
+    base = address.replace("\\", "/").rstrip("/").split("/")[-1].rsplit(".", 1)[0]
+    return os.path.join(tempfile.gettempdir(), base + ".json")
+
+
+def _connect(address, timeout=0.0):
+    """デーモンへ繋ぐ。居なければ None"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return Client(address)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.02)
+
+
+def request(msg, address=None, timeout=5.0):
+    """デーモンへ 1 回だけ問い合わせる（("status",) / ("stop",)）。居なければ None"""
+    conn = _connect(address or daemon_address())
+    if conn is None:
+        return None
+    with conn:
+        conn.send(msg)
+        if not conn.poll(timeout):
+            raise RuntimeError("bridge daemon did not answer")
+        return conn.recv()
+
+
+def registry(address=None):
+    """動いているブリッジの登録簿 {名前: 情報}。デーモンが居なければ {}"""
+    address = address or daemon_address()
+    try:
+        with open(registry_path(address), encoding="utf-8") as f:
+            reg = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    conn = _connect(address)                       # 登録簿だけ残っている（デーモンが落ちた）なら無視
+    if conn is None:
+        return {}
+    conn.close()
+    return reg.get("segments", {})
+
+
+class Lease:
+    """デーモンから借りたブリッジの読み手。close()（with を抜ける）で返す"""
+
+    def __init__(self, conn, name, info, timeout):
+        self._conn = conn
+        self.name = name
+        self.info = info
+        try:
+            self.reader = attach(name, timeout=timeout)
+        except BaseException:
+            conn.close()
+            raise
+
+    def close(self):
+        if self._conn is None:
+            return
+        self.reader.close()
+        self._conn.close()                         # デーモンは切断で参照を返す
+        self._conn = None
+
+    def __enter__(self):
+        return self.reader
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def lease(name=SHM_NAME_DEFAULT, launch=True, timeout=20.0, label=None, address=None):
+    """デーモンからブリッジを借りる -> Lease。デーモンが居ない（launch=False なら持っていない）時は None
+
+    起動に失敗したら AttachError（理由はブリッジの最後のログ行）。
+    """
+    conn = _connect(address or daemon_address())
+    if conn is None:
+        return None
+    try:
+        conn.send(("acquire", name, launch, os.getpid(), label or f"pid{os.getpid()}"))
+        if not conn.poll(timeout + 5.0):
+            raise AttachError(f"bridge daemon did not start {name!r} in time")
+        reply = conn.recv()
+    except BaseException:
+        conn.close()
+        raise
+    if reply[0] == "ready":
+        return Lease(conn, name, reply[1], timeout)
+    conn.close()
+    if reply[0] == "absent":
+        return None
+    raise AttachError(reply[1])
+
+
+class _Bridge:
+    """デーモンが持つブリッジ 1 本（起動・見張り・起動し直しは Watchdog）"""
+
+    def __init__(self, name, wd):
+        self.name = name
+        self.wd = wd
+        self.lock = threading.Lock()               # 起動・終了
+        self.refs = 0
+        self.since = self.idle_since = time.time()
+        self.started = 0
+
+    @property
+    def proc(self):
+        return self.wd.proc
+
+    @property
+    def reader(self):
+        return self.wd.reader
+
+    @property
+    def alive(self):
+        return self.wd.alive
+
+    def info(self):
+        wd = self.wd
+        geom = wd.reader.geometry if wd.reader is not None else None
+        return {"pid": wd.proc.pid if wd.proc else None, "refs": self.refs, "serial": wd.serial,
+                "geometry": list(geom) if geom else None, "since": self.since, "state": wd.state,
+                "epoch": wd.reader.epoch if wd.reader is not None else None,
+                "restarts": wd.restarts, "outages": len(wd.outages),
+                "idle_for": round(time.time() - self.idle_since, 1) if not self.refs else 0.0,
+                "last_line": wd.lines[-1] if wd.lines else ""}
+
+
+class BridgeDaemon:
+    """ブリッジを起動したまま持ち、リースの参照数が 0 のまま idle 秒経ったものを終える"""
+
+    def __init__(self, libdir=None, exe_name=EXE_NAME_DEFAULT, argv=None, idle=60.0, address=None,
+                 start_timeout=20.0, restart_delay=2.0, stale_after=5.0):
+        """argv: 実行ファイルの代わりのコマンド（スタンドイン）。idle: 0 なら終えない。
+        restart_delay: 起動し直すまでの最初の待ち（失敗が続けば倍々）。stale_after: watchdog.Watchdog"""
+        self.libdir = default_libdir() if libdir is None and argv is None else libdir
+        self.exe_name, self.argv = exe_name, list(argv) if argv else None
+        self.idle, self.start_timeout, self.restart_delay = idle, start_timeout, restart_delay
+        self.stale_after = stale_after
+        self.address = address or daemon_address()
+        self.registry_path = registry_path(self.address)
+        conn = _connect(self.address)
+        if conn is not None:
+            conn.close()
+            raise RuntimeError(f"a bridge daemon is already running at {self.address}")
+        if os.name != "nt" and os.path.exists(self.address):
+            os.unlink(self.address)                # 前回の残り
+        self._listener = Listener(self.address)
+        self.bridges = {}
+        self.leases = self.launches = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._pub_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._publish()
+
+    # ---- ブリッジ ----
+    def _get(self, name):
+        with self._lock:
+            b = self.bridges.get(name)
+            if b is None:
+                wd = Watchdog(name, self.libdir, self.exe_name, self.argv, stale_after=self.stale_after,
+                              start_timeout=self.start_timeout, backoff=self.restart_delay)
+                b = self.bridges[name] = _Bridge(name, wd)
+            return b
+
+    def _start(self, b):
+        """ブリッジを起動してセグメントを検証する（b.lock を握って呼ぶ）"""
+        b.wd.launch()
+        b.since = time.time()
+        b.started += 1
+        self.launches += 1
+
+    def _stop_bridge(self, b):
+        b.wd.stop()
+
+    def _acquire(self, name, launch):
+        while True:
+            b = self._get(name)
+            with b.lock:
+                with self._lock:
+                    if self.bridges.get(name) is not b:    # 見回りが片付けた直後
+                        continue
+                if not b.alive:
+                    if not launch:
+                        return None
+                    self._start(b)
+                with self._lock:
+                    b.refs += 1
+                    self.leases += 1
+            self._publish()
+            return b
+
+    def _release(self, b):
+        with self._lock:
+            b.refs -= 1
+            if not b.refs:
+                b.idle_since = time.time()
+        self._publish()
+
+    def preload(self, name):
+        """ブリッジを起動しておく（借りて返すのと同じ。idle 秒は残る）"""
+        self._release(self._acquire(name, True))
+
+    def reap(self):
+        """参照 0 のまま idle 秒経ったブリッジを終え、リース中のものは見張る（止まった・落ちたら起動し直す）"""
+        changed = False
+        for b in list(self.bridges.values()):
+            with b.lock:
+                if b.wd.state == "stopped":
+                    continue
+                if not b.refs and (self.idle and time.time() - b.idle_since >= self.idle
+                                   or b.wd.state != "running" or b.proc.poll() is not None):
+                    self._stop_bridge(b)           # 借り手が居なければ起動し直さない
+                    changed = True
+                elif b.refs:
+                    changed |= b.wd.check() is not None
+        with self._lock:
+            for name, b in list(self.bridges.items()):
+                if b.wd.state == "stopped" and not b.refs and b.lock.acquire(blocking=False):
+                    del self.bridges[name]             # 起動中（lock を握っている）のものは残す
+                    b.lock.release()
+        if changed:
+            self._publish()
+
+    # ---- 連絡路 ----
+    def _serve(self, conn):
+        held = []
+        try:
+            while not self._stop.is_set():
+                if not conn.poll(0.2):
+                    continue
+                msg = conn.recv()
+                if msg[0] == "acquire":
+                    _, name, launch = msg[:3]
+                    try:
+                        b = self._acquire(name, launch)
+                    except (OSError, RuntimeError) as e:
+                        conn.send(("error", str(e)))
+                        continue
+                    if b is None:
+                        conn.send(("absent",))
+                        continue
+                    held.append(b)
+                    conn.send(("ready", b.info()))
+                elif msg[0] == "status":
+                    conn.send(("status", self.stats()))
+                elif msg[0] == "stop":
+                    conn.send(("ok",))
+                    self._stop.set()
+        except (OSError, EOFError):
+            pass
+        finally:
+            conn.close()
+            for b in held:
+                self._release(b)
+
+    def _accept(self):
+        while not self._stop.is_set():
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(conn,), daemon=True, name="sonycam-daemon-conn").start()
+
+    def _publish(self):
+        """登録簿を書き直す"""
+        with self._lock:
+            reg = {"pid": os.getpid(), "address": self.address, "started": self.started, "idle": self.idle,
+                   "segments": {n: b.info() for n, b in self.bridges.items() if b.alive}}
+        with self._pub_lock:                       # 一時ファイルは 1 つ
+            tmp = f"{self.registry_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(reg, f, indent=1)
+            os.replace(tmp, self.registry_path)
+
+    # ---- 実行 ----
+    def run(self, seconds=None, stop=None, interval=0.2):
+        """stop が立つか seconds 秒経つか ("stop",) を受けるまで、idle の見回りを続ける"""
+        if not self._threads:
+            t = threading.Thread(target=self._accept, daemon=True, name="sonycam-daemon-accept")
+            t.start()
+            self._threads.append(t)
+        t_end = None if seconds is None else time.monotonic() + seconds
+        while not self._stop.is_set() and (stop is None or not stop.is_set()):
+            if t_end is not None and time.monotonic() >= t_end:
+                break
+            self._stop.wait(interval)
+            self.reap()
+
+    def stats(self):
+        with self._lock:
+            return {"pid": os.getpid(), "address": self.address, "leases": self.leases,
+                    "launches": self.launches, "idle": self.idle,
+                    "bridges": {n: b.info() for n, b in self.bridges.items()}}
+
+    def close(self):
+        if self._listener is None:
+            return
+        self._stop.set()
+        self._listener.close()
+        self._listener = None
+        for t in self._threads:
+            t.join(1.0)
+        for b in list(self.bridges.values()):
+            with b.lock:
+                self._stop_bridge(b)
+        self.bridges.clear()
+        for path in ([self.registry_path] + ([self.address] if os.name != "nt" else [])):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""スナップショットのバックグラウンド保存（取り込みループで PNG エンコードを待たない）
+
+    with EncoderPool(workers=2, maxsize=4, policy="drop_oldest") as enc:
+        while ...:
+            fid, ts, img = reader.read_frame()
+            enc.submit(img, "latest.png", copy=False)   # 所有配列ならコピー不要
+        print(enc.stats())
+
+- キューは有界。満杯時の扱いは policy で選ぶ:
+    "drop_oldest"  待ち行列の最古を捨てて入れる（最新を優先。既定）
+    "drop_newest"  新しい方を捨てる（submit は False を返す）
+    "block"        空くまで待つ（timeout 付き）
+- 形式は拡張子で決まる（.png / .jpg / .jpeg / .npy）。PNG の圧縮レベルと JPEG の品質は指定できる。
+- 書き込みは同じフォルダの一時ファイル → os.replace なので、latest.png が書きかけで見えることはない。
+  同じパスへの依頼には受け付け順の番号を振り、os.replace はプール内で 1 つずつ行う。workers>1 で
+  古い方が後に書き終わっても、新しい方を置き換え済みなら捨てる（superseded に数える）。latest.png は戻らない。
+- kind="process" ならエンコードと書き込みを子プロセスで行う（画像は pickle で渡すのでコピーが 1 回増える）。
+  cv2.imencode は GIL を手放すので、通常は既定の "thread" で足りる。
+"""
+import collections
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .convert import _cv2
+
+POLICIES = ("drop_oldest", "drop_newest", "block")
+FORMATS = {".png": "png", ".jpg": "jpg", ".jpeg": "jpg", ".npy": "npy"}
+
+_tmp_ids = itertools.count()
+_Job = collections.namedtuple("_Job", "image path fmt param t_submit seq")
+
+
+def format_of(path):
+    ext = Path(path).suffix.lower()
+    try:
+        return FORMATS[ext]
+    except KeyError:
+        raise ValueError(f"unsupported snapshot format {ext!r} (use {sorted(FORMATS)})") from None
+
+
+def write_image(path, image, fmt=None, param=None):
+    """1 枚をエンコードして原子的に書く -> (encode 秒, write 秒)
+
+    param は PNG なら圧縮レベル（0-9）、JPEG なら品質（0-100）。npy では使わない。
+    """
+    tmp, enc, wr = _write_temp(path, image, fmt, param)
+    t0 = time.perf_counter()
+    try:
+        os.replace(tmp, path)
+    except BaseException:
+        _unlink(tmp)
+        raise
+    return enc, wr + time.perf_counter() - t0
+
+
+def _write_temp(path, image, fmt=None, param=None):
+    """エンコードして同じフォルダの一時ファイルに書く -> (一時ファイル, encode 秒, write 秒)"""
+    path = Path(path)
+    fmt = fmt or format_of(path)
+    t0 = time.perf_counter()
+    if fmt == "npy":
+        data = None
+    else:
+        cv2 = _cv2()
+        if fmt == "png":
+            flags = [cv2.IMWRITE_PNG_COMPRESSION, 1 if param is None else int(param)]
+        else:
+            flags = [cv2.IMWRITE_JPEG_QUALITY, 90 if param is None else int(param)]
+        ok, data = cv2.imencode("." + fmt, image, flags)
+        if not ok:
+            raise RuntimeError(f"encode failed: {path}")
+    t1 = time.perf_counter()
+    # 置き換えは呼び出し側（プールなら後で）なので、同じプロセスの次の依頼と名前が被らないよう連番も付ける
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.{next(_tmp_ids)}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            if data is None:
+                np.save(f, image)
+            else:
+                f.write(data)
+    except BaseException:
+        _unlink(tmp)
+        raise
+    return str(tmp), t1 - t0, time.perf_counter() - t1
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class EncoderPool:
+    """有界キュー + ワーカスレッドによるスナップショット保存
+
+    png_compression: PNG の圧縮レベル（0-9。1 は速く、9 は小さい）
+    jpeg_quality:    JPEG の品質（0-100）
+    stats() でエンコード時間・書き込み時間の分位とキューの深さを返す。
+    """
+
+    def __init__(self, workers=2, maxsize=4, policy="drop_oldest", kind="thread",
+                 png_compression=1, jpeg_quality=90, keep_timings=256):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}")
+        if kind not in ("thread", "process"):
+            raise ValueError("kind must be 'thread' or 'process'")
+        self.policy = policy
+        self.maxsize = maxsize
+        self.params = {"png": png_compression, "jpg": jpeg_quality, "npy": None}
+        self._q = collections.deque()
+        self._cv = threading.Condition()
+        self._closed = False
+        self._busy = 0
+        self._procs = ProcessPoolExecutor(workers) if kind == "process" else None
+        self.submitted = self.written = self.dropped = self.errors = self.superseded = 0
+        self._paths = {}                           # path → [未完了の依頼数, 置き換え済みの最新 seq]
+        self.max_depth = 0
+        self.last_error = None
+        self._encode_s = collections.deque(maxlen=keep_timings)
+        self._write_s = collections.deque(maxlen=keep_timings)
+        self._latency_s = collections.deque(maxlen=keep_timings)
+        self._threads = [threading.Thread(target=self._worker, name=f"sonycam-enc{i}", daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    @property
+    def queue_depth(self):
+        return len(self._q)
+
+    def submit(self, image, path, fmt=None, param=None, copy=True, timeout=None):
+        """保存を依頼する。受け付けたら True（drop_newest で満杯・block で timeout なら False）
+
+        copy=False は呼び出し側が以後 image を書き換えない時だけ（OutputPool の出力などは copy=True）。
+        """
+        fmt = fmt or format_of(path)
+        if param is None:
+            param = self.params[fmt]
+        img = np.array(image, order="C") if copy else image
+        t_submit = time.perf_counter()
+        with self._cv:
+            if self._closed:
+                raise RuntimeError("encoder pool is closed")
+            self.submitted += 1
+            job = _Job(img, str(path), fmt, param, t_submit, self.submitted)
+            if len(self._q) >= self.maxsize:
+                if self.policy == "drop_newest":
+                    self.dropped += 1
+                    return False
+                if self.policy == "drop_oldest":
+                    self._forget(self._q.popleft())
+                    self.dropped += 1
+                elif not self._cv.wait_for(lambda: len(self._q) < self.maxsize or self._closed,
+                                           timeout):
+                    self.dropped += 1
+                    return False
+                if self._closed:
+                    raise RuntimeError("encoder pool is closed")
+            self._paths.setdefault(job.path, [0, 0])[0] += 1
+            self._q.append(job)
+            self.max_depth = max(self.max_depth, len(self._q))
+            self._cv.notify_all()
+        return True
+
+    def _worker(self):
+        while True:
+            with self._cv:
+                self._cv.wait_for(lambda: self._q or self._closed)
+                if not self._q:
+                    return
+                job = self._q.popleft()
+                self._busy += 1
+                self._cv.notify_all()              # block 中の submit を起こす
+            try:
+                if self._procs is None:
+                    tmp, enc, wr = _write_temp(job.path, job.image, job.fmt, job.param)
+                else:
+                    tmp, enc, wr = self._procs.submit(_write_temp, job.path, job.image,
+                                                      job.fmt, job.param).result()
+                with self._cv:
+                    committed = self._commit(job, tmp)
+            except Exception as e:
+                with self._cv:
+                    self._forget(job)
+                    self.errors += 1
+                    self.last_error = e
+                    self._busy -= 1
+                    self._cv.notify_all()
+                continue
+            with self._cv:
+                self._forget(job)
+                self._busy -= 1
+                self._cv.notify_all()
+                if not committed:
+                    self.superseded += 1
+                    continue
+                self.written += 1
+                self._encode_s.append(enc)
+                self._write_s.append(wr)
+                self._latency_s.append(time.perf_counter() - job.t_submit)
+
+    def _commit(self, job, tmp):
+        """一時ファイルを job.path へ置き換える（_cv を握って呼ぶ）。新しい依頼が置き換え済みなら捨てて False"""
+        st = self._paths[job.path]
+        if job.seq < st[1]:
+            _unlink(tmp)
+            return False
+        try:
+            os.replace(tmp, job.path)
+        except BaseException:
+            _unlink(tmp)
+            raise
+        st[1] = job.seq
+        return True
+
+    def _forget(self, job):
+        """job を未完了から外す（_cv を握って呼ぶ）。そのパスの依頼が無くなれば記録も消す"""
+        st = self._paths[job.path]
+        st[0] -= 1
+        if not st[0]:
+            del self._paths[job.path]
+
+    def flush(self, timeout=None):
+        """待ち行列と実行中の保存が空になるまで待つ。空になれば True"""
+        with self._cv:
+            return self._cv.wait_for(lambda: not self._q and not self._busy, timeout)
+
+    def stats(self):
+        """カウンタと時間の分位（ms）。直近 keep_timings 件で計算する"""
+        with self._cv:
+            s = {
+                "submitted": self.submitted, "written": self.written,
+                "dropped": self.dropped, "errors": self.errors, "superseded": self.superseded,
+                "queue_depth": len(self._q), "max_depth": self.max_depth, "busy": self._busy,
+            }
+            timings = {"encode": sorted(self._encode_s), "write": sorted(self._write_s),
+                       "latency": sorted(self._latency_s)}
+        for key, v in timings.items():
+            if v:
+                s[f"{key}_ms_p50"] = v[len(v) // 2] * 1e3
+                s[f"{key}_ms_p99"] = v[min(len(v) - 1, int(len(v) * 0.99))] * 1e3
+                s[f"{key}_ms_max"] = v[-1] * 1e3
+        return s
+
+    def close(self, wait=True):
+        """wait=True なら待ち行列を書き切ってから止める。False なら未着手の分は捨てる"""
+        with self._cv:
+            if self._closed:
+                return
+            if not wait:
+                self.dropped += len(self._q)
+                for job in self._q:
+                    self._forget(job)
+                self._q.clear()
+            self._closed = True
+            self._cv.notify_all()
+        for t in self._threads:
+            t.join()
+        if self._procs is not None:
+            self._procs.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+"""1 つの読み手から複数の消費者プロセスへの配信（ファンアウト）
+
+表示・保存・解析がそれぞれ Local\\Cam1Mem を開いて 20 MB をコピーすると、メモリ帯域が人数倍になり、
+消費者ごとに別の瞬間（別の torn 状態）を見ることになる。ハブが 1 回だけ読み、消費者には
+共有プールのスロット番号（ハンドル）だけを渡す。
+
+    # ハブ（1 プロセス）
+    with FanoutHub(r"Local\\Cam1Mem", nslots=8) as hub:
+        hub.run()                                      # または hub.start() でスレッド
+
+    # 消費者（何プロセスでも）
+    with Subscriber(r"Local\\Cam1Mem", queue=2) as sub:
+        while True:
+            with sub.get(timeout=1.0) as f:            # f.image はプールのビュー（コピーなし）
+                ...                                    # with を抜けると解放（release()）
+
+- プール: セグメント "<名前>_fanout"。リング形式（CBRR）と同じヘッダ・スロット配置で magic だけ 'CBRF'
+  （スロットは frame_id 順ではなく空いている所を使う）。
+- 参照カウントはハブが持つ。ハンドルを送るたびに +1、消費者からの release と切断で -1。
+  参照のあるスロットは上書きしない。ハブ自身も最新の 1 枚を参照して、遅れた消費者に後から渡せるようにする。
+- 消費者ごとの上限 queue: 未解放のハンドルが queue 個あればその消費者には送らず skipped に数え、
+  空いた時点で最新の 1 枚だけを送る（skip-to-latest）。Subscriber.get(latest=True) は届いている分の古い方を解放して最新を返す。
+- 連絡路は multiprocessing.connection（Windows は名前付きパイプ、それ以外は UNIX ソケット）。
+"""
+import collections
+import os
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from .header import SHM_NAME_DEFAULT, channels
+from .reader import TornFrameError, open_shm
+from .ring import RING_HDR_SIZE, RingHeader, SlotHeader, open_ring, ring_layout
+from .transport import create_segment, open_segment, unlink_segment
+
+FANOUT_MAGIC = 0x46524243            # 'CBRF'
+FANOUT_SUFFIX = "_fanout"
+
+
+def pool_name(name):
+    return name + FANOUT_SUFFIX
+
+
+def fanout_address(name):
+    """ハブの待ち受けアドレス（名前から決める）"""
+    base = name.split(":", 1)[1] if name.split(":", 1)[0] in ("win", "posix", "file") else name
+    base = base.replace("/", "\\").split("\\")[-1] or "Cam1Mem"
+    if os.name == "nt":
+        return rf"\\.\pipe\sonycam_{base}{FANOUT_SUFFIX}"
+    return os.path.join(tempfile.gettempdir(), f"sonycam_{base}{FANOUT_SUFFIX}.sock")
+
+
+class _Source:
+    """CBRG（FrameReader）と CBRR（RingReader）の読み方をそろえる"""
+
+    def __init__(self, name):
+        try:
+            self.reader, self.ring = open_shm(name), False
+        except RuntimeError:
+            self.reader, self.ring = open_ring(name), True
+        h = self.reader.header
+        self.geometry = (h.width, h.height, h.bpp, h.flags)
+
+    def wait(self, after_id, timeout):
+        return self.reader.wait_for_frame(after_id, timeout)
+
+    def read(self, out):
+        """-> (frame_id, timestamp_us) / 読めなければ None"""
+        if self.ring:
+            r = self.reader.latest(out)
+            return None if r is None else r[:2]
+        try:
+            fid, ts, _ = self.reader.read_frame(out)
+        except TornFrameError:
+            return None
+        return fid, ts
+
+    def close(self):
+        self.reader.close()
+
+
+class _Sub:
+    """ハブ側の消費者 1 人分"""
+
+    def __init__(self, conn, pid, label, limit):
+        self.conn, self.pid, self.label, self.limit = conn, pid, label, max(1, limit)
+        self.held = collections.Counter()          # スロット → 参照数
+        self.outstanding = 0
+        self.sent = self.skipped = self.released = 0
+        self.last_sent = self.last_released = 0
+        self.outbox = collections.deque()          # _claim 済みで未送信（_lock の内側で積む順 = frame_id の順）
+        self.send_lock = threading.Lock()
+        self.alive = True
+
+
+class FanoutHub:
+    """共有の読み手。取り込んだフレームをプールに置き、購読者へハンドルを配る"""
+
+    def __init__(self, name=SHM_NAME_DEFAULT, nslots=8, address=None, kind=None):
+        self.name = name
+        self.source = _Source(name)
+        w, h, bpp, flags = self.source.geometry
+        stride, pitch, data_offset, total = ring_layout(w, h, bpp, nslots)
+        self.pool_name, self.kind, self.pool_size = pool_name(name), kind, total
+        self._buf = create_segment(self.pool_name, total, kind)
+        self.header = rh = RingHeader.from_buffer(self._buf)
+        rh.magic = 0
+        rh.version, rh.nslots = 1, nslots
+        rh.width, rh.height, rh.bpp, rh.stride, rh.flags = w, h, bpp, stride, flags
+        rh.slot_pitch, rh.data_offset, rh.write_index = pitch, data_offset, 0
+        self.slots = (SlotHeader * nslots).from_buffer(self._buf, RING_HDR_SIZE)
+        for s in self.slots:
+            s.frame_id = s.timestamp_us = s.state = 0
+        self._views = _slot_views(self._buf, rh)
+        rh.magic = FANOUT_MAGIC
+        self.refs = [0] * nslots
+        self.latest = None                         # (slot, frame_id, timestamp_us)。ハブ自身が参照
+        self._seen = 0                             # 最後に気づいた frame_id（見送った分も含む）
+        self.frames = self.pool_full = self.torn = 0
+        self.peak_in_use = 0
+        self.subs = []
+        self.address = address or fanout_address(name)
+        if os.name != "nt" and os.path.exists(self.address):
+            os.unlink(self.address)                # 前回の残り
+        self._listener = Listener(self.address)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    # ---- 参照カウント（_lock を握って呼ぶ）----
+    def _free_slot(self):
+        for i, r in enumerate(self.refs):
+            if r == 0:
+                return i
+        return None
+
+    def _ref(self, i):
+        self.refs[i] += 1
+        in_use = sum(1 for r in self.refs if r)
+        if in_use > self.peak_in_use:
+            self.peak_in_use = in_use
+
+    def _claim(self, sub, slot, fid, ts):
+        """sub に送る 1 枚の参照を取って（+1）outbox に積む -> sub。_lock を握って呼ぶ。送るのは _deliver()"""
+        self._ref(slot)
+        sub.held[slot] += 1
+        sub.outstanding += 1
+        sub.sent += 1
+        sub.last_sent = fid
+        sub.outbox.append(("frame", slot, fid, ts))
+        return sub
+
+    def _deliver(self, subs):
+        """outbox を積んだ順に送る。_lock を放してから呼ぶ（遅い購読者がハブ全体を止めないように）"""
+        for sub in subs:
+            try:
+                with sub.send_lock:
+                    while sub.outbox:
+                        sub.conn.send(sub.outbox.popleft())
+            except (OSError, EOFError, ValueError):
+                with self._lock:
+                    self._drop(sub)
+
+    def _drop(self, sub):
+        """切断した購読者の参照を全部返す"""
+        if not sub.alive:
+            return
+        sub.alive = False
+        for slot, n in sub.held.items():
+            self.refs[slot] -= n
+        sub.held.clear()
+        sub.outbox.clear()
+        sub.outstanding = 0
+        if sub in self.subs:
+            self.subs.remove(sub)
+        try:
+            sub.conn.close()
+        except OSError:
+            pass
+
+    # ---- 取り込み ----
+    def step(self, timeout=0.5):
+        """次の新着を 1 枚取り込んで配る -> frame_id / 新着なしで None"""
+        prev = self._seen
+        seen = self.source.wait(prev, timeout)
+        if seen is None:
+            return None
+        self._seen = seen
+        with self._lock:
+            i = self._free_slot()
+            if i is None:
+                self.pool_full += 1                # 全スロットが参照中 → この 1 枚は見送る
+                return None
+            self.refs[i] += 1                      # 書いている間は自分が持つ
+        sh = self.slots[i]
+        sh.state += 1
+        r = self.source.read(self._views[i])
+        if r is None:
+            sh.state += 1
+            with self._lock:
+                self.refs[i] -= 1
+            self.torn += 1
+            return None
+        fid, ts = r
+        if fid <= prev:                            # もう配った frame_id（リングの latest が古い等）
+            sh.state += 1
+            with self._lock:
+                self.refs[i] -= 1
+            return None
+        self._seen = max(self._seen, fid)          # wait の後に次が確定していれば read はそれを読んでいる
+        sh.frame_id, sh.timestamp_us = fid, ts
+        sh.state += 1
+        self.header.write_index = fid
+        with self._lock:
+            prev, self.latest = self.latest, (i, fid, ts)
+            self._ref(i)
+            self.refs[i] -= 1                      # 書き込み用の参照 → 最新としての参照に置き換え
+            if prev is not None:
+                self.refs[prev[0]] -= 1
+            self.frames += 1
+            ready = []
+            for sub in list(self.subs):
+                if sub.outstanding < sub.limit:
+                    ready.append(self._claim(sub, i, fid, ts))
+                else:
+                    sub.skipped += 1
+        self._deliver(ready)
+        return fid
+
+    def _serve_sub(self, sub):
+        conn = sub.conn
+        while not self._stop.is_set():
+            try:
+                if not conn.poll(0.2):
+                    continue
+                msg = conn.recv()
+            except (OSError, EOFError):
+                break
+            if msg[0] != "release":
+                continue
+            _, slot, fid = msg
+            ready = []
+            with self._lock:
+                if not sub.alive or sub.held[slot] == 0:
+                    continue
+                sub.held[slot] -= 1
+                self.refs[slot] -= 1
+                sub.outstanding -= 1
+                sub.released += 1
+                sub.last_released = max(sub.last_released, fid)
+                # 上限で送れなかった分は最新の 1 枚だけ送る
+                if self.latest is not None and self.latest[1] > sub.last_sent:
+                    ready.append(self._claim(sub, *self.latest))
+            self._deliver(ready)
+        with self._lock:
+            self._drop(sub)
+
+    def _accept(self):
+        while not self._stop.is_set():
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                break
+            try:
+                hello = conn.recv()
+                _, pid, label, limit = hello
+                conn.send(("ready", self.pool_name, self.pool_size))
+            except (OSError, EOFError, ValueError, TypeError):
+                conn.close()
+                continue
+            sub = _Sub(conn, pid, label, limit)
+            ready = []
+            with self._lock:
+                self.subs.append(sub)
+                if self.latest is not None:
+                    ready.append(self._claim(sub, *self.latest))
+            self._deliver(ready)
+            t = threading.Thread(target=self._serve_sub, args=(sub,), daemon=True,
+                                 name=f"sonycam-fanout-{label}")
+            t.start()
+
+    # ---- 実行 ----
+    def _start_accept(self):
+        if not self._threads:
+            t = threading.Thread(target=self._accept, daemon=True, name="sonycam-fanout-accept")
+            t.start()
+            self._threads.append(t)
+
+    def run(self, seconds=None, stop=None):
+        """stop（threading.Event 等）が立つか seconds 秒経つまで取り込み続ける"""
+        self._start_accept()
+        t_end = None if seconds is None else time.monotonic() + seconds
+        while not self._stop.is_set() and (stop is None or not stop.is_set()):
+            if t_end is not None and time.monotonic() >= t_end:
+                break
+            self.step()
+
+    def start(self):
+        """run() を別スレッドで回す"""
+        t = threading.Thread(target=self.run, daemon=True, name="sonycam-fanout")
+        t.start()
+        self._threads.append(t)
+        return self
+
+    def stats(self):
+        """プールの占有と購読者ごとの遅れ（lag = 最新 frame_id - 解放済みの最後）"""
+        with self._lock:
+            latest = self.latest[1] if self.latest else 0
+            return {
+                "frames": self.frames, "pool_full": self.pool_full, "torn": self.torn,
+                "nslots": len(self.refs), "in_use": sum(1 for r in self.refs if r),
+                "peak_in_use": self.peak_in_use,
+                "subscribers": {
+                    f"{s.label}[{s.pid}]": {
+                        "queue": s.limit, "outstanding": s.outstanding, "sent": s.sent,
+                        "skipped": s.skipped, "released": s.released,
+                        "lag": latest - s.last_released if s.last_released else latest - s.last_sent,
+                    } for s in self.subs},
+            }
+
+    def close(self):
+        if self._buf is None:
+            return
+        self._stop.set()
+        self._listener.close()
+        for t in self._threads:
+            if t is not threading.current_thread():
+                t.join(1.0)
+        with self._lock:
+            for sub in list(self.subs):
+                self._drop(sub)
+        self.source.close()
+        self._views = None
+        self.slots = None
+        self.header = None
+        self._buf.close()
+        self._buf = None
+        unlink_segment(self.pool_name, self.kind)
+        if os.name != "nt":
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _slot_views(buf, rh):
+    c = channels(rh.bpp)
+    if c == 1:
+        shape, strides = (rh.height, rh.width), (rh.stride, 1)
+    else:
+        shape, strides = (rh.height, rh.width, c), (rh.stride, c, 1)
+    return [np.ndarray(shape, np.uint8, buffer=buf, offset=rh.data_offset + i * rh.slot_pitch,
+                       strides=strides) for i in range(rh.nslots)]
+
+
+class FrameHandle:
+    """プールの 1 スロットへのハンドル（image はコピーなしのビュー）。release() まで上書きされない"""
+
+    __slots__ = ("frame_id", "timestamp_us", "image", "slot", "_sub")
+
+    def __init__(self, sub, slot, frame_id, timestamp_us, image):
+        self._sub, self.slot = sub, slot
+        self.frame_id, self.timestamp_us, self.image = frame_id, timestamp_us, image
+
+    def release(self):
+        if self._sub is not None:
+            self._sub._release(self)
+            self._sub = None
+            self.image = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Subscriber:
+    """ハブへ繋ぐ消費者。get() でハンドルを受け取り、使い終わったら release()"""
+
+    def __init__(self, name=SHM_NAME_DEFAULT, queue=2, label=None, address=None, timeout=5.0):
+        self.address = address or fanout_address(name)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self._conn = Client(self.address)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"fan-out hub not found at {self.address}") from None
+                time.sleep(0.05)
+        self._conn.send(("hello", os.getpid(), label or f"sub{os.getpid()}", queue))
+        _, pname, size = self._conn.recv()
+        try:
+            self._buf = open_segment(pname, size)
+        except OSError:
+            self._conn.close()
+            raise
+        self.header = RingHeader.from_buffer(self._buf)
+        if self.header.magic != FANOUT_MAGIC:
+            # ハブには切断で知らせる（残すと何も解放しない購読者になる）
+            self.header = None
+            self._buf.close()
+            self._conn.close()
+            raise RuntimeError(f"{pname!r} is not a CBRF fan-out pool")
+        self.slots = (SlotHeader * self.header.nslots).from_buffer(self._buf, RING_HDR_SIZE)
+        self._views = _slot_views(self._buf, self.header)
+        self.received = self.skipped = 0
+        self._open = 0
+
+    @property
+    def geometry(self):
+        h = self.header
+        return h.width, h.height, h.bpp, h.stride
+
+    def get(self, timeout=None, latest=False):
+        """次のハンドル。timeout なら None。latest=True なら届いている分の最新だけ返す（古い方は解放）"""
+        conn = self._conn
+        if not conn.poll(timeout):
+            return None
+        h = self._recv()
+        while latest and conn.poll(0):
+            h.release()
+            self.skipped += 1
+            h = self._recv()
+        return h
+
+    def _recv(self):
+        try:
+            msg = self._conn.recv()
+        except EOFError:
+            raise RuntimeError("fan-out hub closed the connection") from None
+        _, slot, fid, ts = msg
+        self.received += 1
+        self._open += 1
+        return FrameHandle(self, slot, fid, ts, self._views[slot])
+
+    def _release(self, h):
+        self._open -= 1
+        try:
+            self._conn.send(("release", h.slot, h.frame_id))
+        except (OSError, ValueError):
+            pass
+
+    def close(self):
+        if self._conn is None:
+            return
+        self._conn.close()                         # ハブは切断で参照を全部返す
+        self._conn = None
+        self._views = None
+        self.slots = None
+        self.header = None
+        try:
+            self._buf.close()
+        except BufferError:
+            pass                                   # ハンドルの image がまだ残っている（GC に任せる）
+        self._buf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
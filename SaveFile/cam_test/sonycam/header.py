@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""CBRG 共有メモリのヘッダ定義（SaveFile.cpp の ShmHeader / ShmHeaderExt と一致させる）"""
+import collections
+import ctypes as C
+import struct
+import time
+
+from .transport import open_segment
+
+SHM_NAME_DEFAULT = r"Local\Cam1Mem"
+MAGIC = 0x47524243                  # 'CBRG'
+
+# struct ShmHeader {                 // #pragma pack(1), 44 bytes
+#   uint32 magic;                    // 'CBRG'
+#   uint32 width, height;
+#   uint32 bpp;                      // 8/24/32...
+#   uint32 stride;                   // bytes per row (4B align)
+#   uint64 frame_id;                 // +1 / frame
+#   uint64 timestamp_us;
+#   uint32 seq;                      // seqlock（奇数=書き込み中）
+#   uint32 flags;                    // FLAG_*（旧 reserved）
+# };
+HDR_FMT = "<IIIIIQQII"              # magic,w,h,bpp,stride,frame_id,timestamp,seq,flags
+HDR_SIZE = struct.calcsize(HDR_FMT)
+
+FLAG_BOTTOM_UP = 0x1                # 行が下から上（biHeight > 0 の DIB）
+FLAG_HIRES_TS = 0x2                 # timestamp_us が高分解能の単調時計（下記）
+FLAG_EXT_HEADER = 0x4               # offset 44 に ShmHeaderExt（版・ヘッダ長・セグメント長・画素形式）がある
+
+# timestamp_us の定義
+#   FLAG_HIRES_TS あり: キャプチャ完了（共有メモリへのコピー開始）時点の
+#       Windows: QueryPerformanceCounter / Linux: CLOCK_MONOTONIC を µs にしたもの。
+#       Python の time.perf_counter_ns() と同じ時計なので、同じマシンの読み手は now_us() と直接引き算できる
+#   なし（旧ブリッジ）: GetTickCount64() * 1000（分解能 10〜16 ms。Windows の time.monotonic() と同じ時計）
+# リング形式（CBRR）では RingHeader.flags に立て、SlotHeader.timestamp_us が同じ定義になる
+
+
+def now_us():
+    """FLAG_HIRES_TS の timestamp_us と同じ時計の現在時刻 [µs]"""
+    return time.perf_counter_ns() // 1000
+
+# flags のビット 8..11: Bayer の CFA 並び（0 = Bayer ではない）。bpp は 8（1 画素 1 バイトの生値）
+# 並びは上から下に直した画像の左上 2x2 の先頭行（GenICam の PixelFormat 名 BayerRG8 等と同じ）
+CFA_SHIFT = 8
+CFA_MASK = 0xF << CFA_SHIFT
+CFA_PATTERNS = (None, "RG", "GR", "GB", "BG")
+
+
+def cfa_flags(pattern):
+    """'RG'/'GR'/'GB'/'BG'（None は非 Bayer）-> flags に OR する値"""
+    if pattern is None:
+        return 0
+    try:
+        return CFA_PATTERNS.index(pattern.upper()) << CFA_SHIFT
+    except ValueError:
+        raise ValueError(f"unknown CFA pattern {pattern!r}") from None
+
+
+def cfa_pattern(flags):
+    """flags -> 'RG'/'GR'/'GB'/'BG'。Bayer でなければ None"""
+    k = (flags & CFA_MASK) >> CFA_SHIFT
+    return CFA_PATTERNS[k] if k < len(CFA_PATTERNS) else None
+
+# 書き手の再起動（watchdog.py）
+#   FLAG_STALE: 見張りが「フレームが止まった / ブリッジが落ちた」と判断した時に立てる。起動し直した書き手が消す
+#   ビット 16..31: epoch。同じセグメント（幾何が同じ）を書き手が引き継ぐたびに +1。frame_id は続きから
+#   読み手はマップしたまま epoch の変化で途切れ（ギャップ）を知る
+FLAG_STALE = 0x8
+EPOCH_SHIFT = 16
+EPOCH_MASK = 0xFFFF << EPOCH_SHIFT
+
+
+def epoch(flags):
+    return (flags & EPOCH_MASK) >> EPOCH_SHIFT
+
+
+class ShmHeader(C.LittleEndianStructure):
+    """ヘッダの ctypes ビュー。from_buffer(mmap) で共有メモリを直接読む（コピーなし）"""
+    _pack_ = 1
+    _fields_ = [
+        ("magic", C.c_uint32),
+        ("width", C.c_uint32),
+        ("height", C.c_uint32),
+        ("bpp", C.c_uint32),
+        ("stride", C.c_uint32),
+        ("frame_id", C.c_uint64),
+        ("timestamp_us", C.c_uint64),
+        ("seq", C.c_uint32),
+        ("flags", C.c_uint32),
+    ]
+
+
+assert C.sizeof(ShmHeader) == HDR_SIZE
+
+# 版 2（FLAG_EXT_HEADER）: ShmHeader の直後に拡張を置き、ピクセルは header_size から（64 = キャッシュライン境界）
+# struct ShmHeaderExt {              // offset 44, 20 bytes
+#   uint32 version;                  // LAYOUT_VERSION
+#   uint32 header_size;              // ピクセル領域の先頭 offset
+#   uint64 segment_size;             // セグメント全体のバイト数（header_size + stride*height 以上）
+#   uint32 pixel_format;             // GenICam PFNC のコード（PIXEL_FORMATS）
+# };
+# 旧ブリッジ（flags にビットなし）は版 1: ヘッダ 44 バイトの直後にピクセル、画素形式は bpp と CFA から決まる
+LAYOUT_VERSION = 2
+HDR_SIZE_V2 = 64
+
+
+class ShmHeaderExt(C.LittleEndianStructure):
+    _pack_ = 1
+    _fields_ = [
+        ("version", C.c_uint32),
+        ("header_size", C.c_uint32),
+        ("segment_size", C.c_uint64),
+        ("pixel_format", C.c_uint32),
+    ]
+
+
+assert HDR_SIZE + C.sizeof(ShmHeaderExt) == HDR_SIZE_V2
+
+# GenICam PFNC のコード -> (名前, bpp, CFA 並び)。DIB の 24/32bpp は BGR / BGRa の並び
+PIXEL_FORMATS = {
+    0x01080001: ("Mono8", 8, None),
+    0x01080008: ("BayerGR8", 8, "GR"),
+    0x01080009: ("BayerRG8", 8, "RG"),
+    0x0108000A: ("BayerGB8", 8, "GB"),
+    0x0108000B: ("BayerBG8", 8, "BG"),
+    0x02180015: ("BGR8", 24, None),
+    0x02200017: ("BGRa8", 32, None),
+}
+
+
+def pixel_format_code(bpp, cfa=None):
+    """bpp と CFA 並び -> PFNC のコード（PIXEL_FORMATS に無ければ 0）"""
+    for code, (_, b, p) in PIXEL_FORMATS.items():
+        if b == bpp and p == cfa:
+            return code
+    return 0
+
+
+def pixel_format_name(code):
+    return PIXEL_FORMATS[code][0] if code in PIXEL_FORMATS else f"0x{code:08X}"
+
+
+Layout = collections.namedtuple("Layout", "version header_size segment_size pixel_format")
+
+# CBRG 以外で同じ名前の付け方をするセグメント（取り違えた時の案内）
+OTHER_MAGICS = {
+    0x52524243: "ring segment 'CBRR' (open it with ring.open_ring)",
+    0x46524243: "fan-out pool 'CBRF' (use fanout.Subscriber)",
+    0x54524243: "telemetry page 'CBRT' (use telemetry.TelemetryMonitor)",
+}
+
+
+class AttachError(RuntimeError):
+    """セグメントを使えない理由。retry=True は待てば直る見込みがあるもの（まだ無い・公開前）"""
+
+    def __init__(self, msg, retry=False):
+        super().__init__(msg)
+        self.retry = retry
+
+
+def read_layout(buf, offset=0):
+    """ヘッダのコピーと Layout を返す（検証はしない）。版 1 は bpp / CFA から補う"""
+    hdr = ShmHeader.from_buffer_copy(buf, offset)
+    if hdr.flags & FLAG_EXT_HEADER and len(buf) - offset >= HDR_SIZE_V2:
+        ext = ShmHeaderExt.from_buffer_copy(buf, offset + HDR_SIZE)
+        return hdr, Layout(ext.version, ext.header_size, ext.segment_size, ext.pixel_format)
+    return hdr, Layout(1, HDR_SIZE, HDR_SIZE + hdr.stride * hdr.height,
+                       pixel_format_code(hdr.bpp, cfa_pattern(hdr.flags)))
+
+
+def check_layout(name, hdr, layout, size):
+    """ヘッダと Layout をマップした大きさ size と突き合わせる -> ピクセルの offset。だめなら AttachError"""
+    where = f"shared memory {name!r}"
+    if hdr.magic != MAGIC:
+        if hdr.magic == 0:
+            raise AttachError(f"{where} has no header yet (magic=0): producer still starting "
+                              "or nobody writes this name", retry=True)
+        if hdr.magic in OTHER_MAGICS:
+            raise AttachError(f"{where} is a {OTHER_MAGICS[hdr.magic]}, not a CBRG frame segment")
+        raise AttachError(f"{where} has no CBRG header (magic=0x{hdr.magic:08X}); "
+                          "headerless legacy bridge? rebuild CAM1.exe from SaveFile.cpp")
+    if layout.version > LAYOUT_VERSION:
+        raise AttachError(f"{where} uses header version {layout.version}; this reader knows "
+                          f"<= {LAYOUT_VERSION} (update sonycam)")
+    if hdr.flags & FLAG_EXT_HEADER and layout.version < 2:
+        raise AttachError(f"{where} is {size} bytes, too small for the extended header")
+    if hdr.width == 0 or hdr.height == 0:
+        raise AttachError(f"{where} has not published its geometry yet", retry=True)
+    try:
+        c = channels(hdr.bpp)
+    except ValueError:
+        raise AttachError(f"{where}: unsupported bpp={hdr.bpp}") from None
+    if hdr.stride < hdr.width * c:
+        raise AttachError(f"{where}: stride {hdr.stride} < width {hdr.width} x {c} bytes")
+    if layout.header_size < (HDR_SIZE_V2 if layout.version >= 2 else HDR_SIZE):
+        raise AttachError(f"{where}: header_size {layout.header_size} is smaller than the header")
+    need = layout.header_size + hdr.stride * hdr.height
+    if layout.segment_size < need:
+        raise AttachError(f"{where}: segment_size {layout.segment_size} < header_size + stride*height "
+                          f"= {need}")
+    if size < layout.segment_size:
+        raise AttachError(f"{where} is {size} bytes, header says {layout.segment_size} "
+                          "(producer still sizing it?)", retry=True)
+    if layout.version >= 2:
+        fmt = PIXEL_FORMATS.get(layout.pixel_format)
+        if fmt is None or fmt[1:] != (hdr.bpp, cfa_pattern(hdr.flags)):
+            raise AttachError(f"{where}: pixel_format {pixel_format_name(layout.pixel_format)} does not "
+                              f"match bpp={hdr.bpp} cfa={cfa_pattern(hdr.flags)}")
+    return layout.header_size
+
+
+def aligned_stride(w, bpp):
+    b = max(1, bpp // 8)
+    return ((w * b + 3) // 4) * 4
+
+
+def channels(bpp):
+    c = bpp // 8
+    if c not in (1, 3, 4):
+        raise ValueError(f"unsupported bpp={bpp}")
+    return c
+
+
+def frame_bytes(hdr):
+    """ピクセル領域のバイト数（stride 込み）"""
+    return hdr.stride * hdr.height
+
+
+class HeaderMap:
+    """ヘッダだけをマップする軽量ビュー（numpy を読み込まないので peek/watch 向け）"""
+
+    def __init__(self, name=SHM_NAME_DEFAULT):
+        self.name = name
+        self._m = open_segment(name, HDR_SIZE_V2)
+        self.header = ShmHeader.from_buffer(self._m)
+        if self.header.magic != MAGIC:
+            magic = self.header.magic
+            self.close()
+            raise RuntimeError(f"CBRGヘッダが見つかりません (name={name}, magic=0x{magic:08X})")
+
+    @property
+    def layout(self):
+        return read_layout(self._m)[1]
+
+    def close(self):
+        self.header = None
+        if self._m is not None:
+            self._m.close()
+            self._m = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
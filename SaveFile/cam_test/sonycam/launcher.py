@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""CAM1.exe（ブリッジ）の起動・起動ログ読み取り・終了"""
+import os
+import queue
+import subprocess
+import threading
+import time
+import weakref
+from pathlib import Path
+
+EXE_NAME_DEFAULT = "CAM1.exe"
+
+# Sony SDK の DLL パス（存在するものだけ PATH に足す）
+SDK_PATHS = [
+    r"C:\Program Files\Sony\XCCam\GenICam_v3_0\bin\Win64_x64",
+    r"C:\Program Files\Sony\XCCam\GenICam_v3_0\bin\Win64_x64\GenApi",
+    r"C:\Program Files\Sony\XCCam\GenICam_v3_0\bin\Win64_x64\TLIs",
+]
+
+
+def default_libdir():
+    """SONYCAM_LIBDIR があればそれ、無ければカレントの lib/"""
+    return Path(os.environ.get("SONYCAM_LIBDIR") or Path.cwd() / "lib")
+
+
+def sdk_env():
+    env = os.environ.copy()
+    add = [p for p in SDK_PATHS if os.path.isdir(p)]
+    if add:
+        env["PATH"] = os.pathsep.join(add + [env.get("PATH", "")])
+    return env
+
+
+def launch_cam(libdir, shm_name, exe_name=EXE_NAME_DEFAULT, argv=None):
+    """CAM1.exe を起動して共有メモリ名（ASCII + LF）を渡す。stderr は stdout に合流
+
+    argv を渡すと実行ファイルの代わりにそのコマンドを使う（sonycam-produce --bridge 等のスタンドイン）。
+    """
+    if argv:
+        argv, cwd = list(argv), None
+    else:
+        libdir = Path(libdir)
+        exe = libdir / exe_name
+        if not exe.exists():
+            raise FileNotFoundError(f"{exe} が見つかりません。lib に {exe_name} を置いてください。")
+        argv, cwd = [str(exe)], str(libdir)
+    proc = subprocess.Popen(
+        argv,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        cwd=cwd,
+        text=False,
+        bufsize=0,
+        env=sdk_env(),
+    )
+    proc.stdin.write((shm_name + "\n").encode("ascii"))
+    proc.stdin.flush()
+    return proc
+
+
+_pumps = weakref.WeakKeyDictionary()
+_pumps_lock = threading.Lock()
+
+
+def line_queue(pipe):
+    """pipe（proc.stdout）を読み続けるスレッドの queue.Queue（パイプごとに 1 本、行は bytes、EOF で None）
+
+    read_wh_line() の後も同じパイプを読むなら、readline() ではなくこのキューから取ること（行を取り合わない）。
+    """
+    with _pumps_lock:
+        q = _pumps.get(pipe)
+        if q is None:
+            q = _pumps[pipe] = queue.Queue()
+            threading.Thread(target=_pump, args=(pipe, q), daemon=True, name="sonycam-stdout").start()
+    return q
+
+
+def _pump(pipe, q):
+    try:
+        for b in iter(pipe.readline, b""):
+            q.put(b)
+    except (OSError, ValueError):
+        pass
+    q.put(None)
+
+
+def _readline(pipe, timeout):
+    """1 行 -> str。timeout なら ""、EOF なら None（次に読む人のために None を戻しておく）"""
+    q = line_queue(pipe)
+    try:
+        b = q.get(timeout=timeout)
+    except queue.Empty:
+        return ""
+    if b is None:
+        q.put(None)
+        return None
+    return b.decode("utf-8", errors="ignore").strip()
+
+
+def parse_wh(line):
+    """'WH w h BPP b STRIDE s' -> (w, h, bpp, stride)。形式違いは None"""
+    parts = line.split()
+    if not parts or parts[0] != "WH":
+        return None
+    try:
+        w, h = int(parts[1]), int(parts[2])
+        bpp = int(parts[parts.index("BPP") + 1]) if "BPP" in parts else None
+        stride = int(parts[parts.index("STRIDE") + 1]) if "STRIDE" in parts else None
+    except (IndexError, ValueError):
+        return None
+    return w, h, bpp, stride
+
+
+PROMPT = "Enter the shared memory name:"
+
+
+def clean_line(line):
+    """起動ログ 1 行からプロンプトとノイズを除く（残らなければ ""）
+
+    プロンプトは改行なしで出るので、シリアル番号が同じ行に続く。
+    """
+    line = line.strip()
+    if line.startswith(PROMPT):
+        line = line[len(PROMPT):].strip()
+    low = line.lower()
+    if "appender" in low and "win32debug" in low:
+        return ""
+    return line
+
+
+def read_wh_line(pipe, timeout_sec=8.0, debug=False):
+    """起動ログから WH/BPP/STRIDE を拾う -> ((w, h, bpp, stride), 最後の非空行)。無ければ w=None"""
+    deadline = time.time() + timeout_sec
+    last_nonempty = ""
+    while time.time() < deadline:
+        line = _readline(pipe, 0.4)
+        if line is None:                           # 終わった（WH を出さずに落ちた）
+            break
+        if not line:
+            continue
+        if debug:
+            print("[cam-exe]", line)
+        line = clean_line(line)
+        if not line:
+            continue
+        wh = parse_wh(line)
+        if wh:
+            return wh, last_nonempty
+        last_nonempty = line
+    return (None, None, None, None), last_nonempty
+
+
+def stop_cam(proc, timeout=2.0):
+    """finalize を送ってから terminate"""
+    try:
+        proc.stdin.write(b"finalize\n")
+        proc.stdin.flush()
+    except Exception:
+        pass
+    try:
+        proc.terminate()
+        proc.wait(timeout=timeout)
+    except Exception:
+        pass
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""変化（動き）検出。間引いた輝度画像と背景モデルの差を取り、変化の始まり・終わりをイベントで返す
+
+    det = MotionDetector.from_header(reader.header, threshold=25, min_area=0.002)
+    while True:
+        if reader.wait_for_frame(det.frame_id, 1.0) is None:
+            continue
+        ev = det.read(reader)                  # 間引き読み出し（read_decimated）→ 判定
+        if ev and ev.kind == "start":
+            ...                                # 保存・録画を始める
+        if det.active:
+            ...                                # 変化の続いている間だけ保存・録画する
+
+    ev = det.update(img, frame_id, timestamp_us)   # 自分で読んだ画像（上から下）を渡してもよい
+
+- 判定は幅 width（既定 320）前後まで整数間引きした輝度で行う。共有メモリからは RegionPlan の skip で
+  読むので、2464x2056 でも 1 フレーム 1 ms 前後（全画素は読まない）。Bayer は 2x2 セルごと間引いて
+  セルの平均を輝度にする。
+- 背景は float32 の移動平均（cv2.accumulateWeighted、alpha）。差の絶対値が threshold 以上の画素を
+  変化とし、監視範囲（mask）に占める割合が min_area 以上なら変化ありのフレーム。
+- start_frames フレーム続けて変化ありで "start"、hold 秒変化なしが続いたら "end" を返す
+  （時刻はヘッダの timestamp_us）。regions を渡すと領域ごとの変化の割合もイベントに入る。
+- mask / regions の値は (x, y, w, h)（元画像の座標）か、そのリストか、元画像または判定画像の大きさの
+  配列（0 以外が対象）。
+- 作業用の配列は最初に作って使い回す。大きさ（幾何）が変わったら作り直して背景を学習し直す。
+"""
+import collections
+
+import numpy as np
+
+from .convert import _cv2
+from .header import cfa_pattern, channels, now_us
+
+ChangeEvent = collections.namedtuple("ChangeEvent", "kind frame_id timestamp_us fraction bbox regions")
+
+
+class MotionDetector:
+    """間引いた輝度の背景差分による変化検出（1 フレームごとに update / read）"""
+
+    def __init__(self, w, h, bpp, cfa=None, width=320, threshold=25, min_area=0.002, alpha=0.05,
+                 blur=5, start_frames=2, hold=1.0, mask=None, regions=None):
+        """w, h, bpp, cfa: 元画像の幾何（cfa は header.cfa_pattern の並び or None）
+
+        width: 判定画像の幅の目安。threshold: 輝度差（0..255）。min_area: 変化とみなす画素の割合。
+        alpha: 背景の更新率。blur: 判定画像のガウシアンの大きさ（0 で無し）。hold: "end" までの静止時間 [s]。
+        """
+        self.width = width
+        self.threshold, self.min_area, self.alpha = threshold, min_area, alpha
+        self.blur = blur | 1 if blur else 0
+        self.start_frames, self.hold_us = start_frames, int(hold * 1e6)
+        self._mask_spec, self._region_spec = mask, dict(regions or {})
+        self.frame_id = 0
+        self.active = False
+        self.changed = False
+        self.fraction = 0.0
+        self.frames = self.events = 0
+        self._run = 0
+        self._last_change_us = 0
+        self._configure(w, h, bpp, cfa)
+
+    @classmethod
+    def from_header(cls, hdr, **kw):
+        """ShmHeader / RingHeader から（CFA 並びは flags から読む）"""
+        return cls(hdr.width, hdr.height, hdr.bpp, cfa_pattern(hdr.flags), **kw)
+
+    @property
+    def geometry(self):
+        return self.w, self.h, self.bpp, self.cfa
+
+    # ---- 準備 ----
+    def _small_hw(self):
+        """間引き後（RegionPlan skip）の大きさと、判定画像の大きさ"""
+        s = self.step
+        if self.cfa is not None:
+            oh, ow = 2 * -(-self.h // s), 2 * -(-self.w // s)
+            return (oh, ow), (oh // 2, ow // 2)
+        oh, ow = -(-self.h // s), -(-self.w // s)
+        return (oh, ow), (oh, ow)
+
+    def _configure(self, w, h, bpp, cfa):
+        """幾何が変わったら間引き・作業用配列・マスクを作り直す（背景も学習し直し）"""
+        self.w, self.h, self.bpp, self.cfa = w, h, bpp, cfa
+        self.c = channels(bpp)
+        step = max(1, w // self.width)
+        if cfa is not None:
+            step = max(2, step - step % 2)         # 2x2 セルごと間引く（並びを保つ）
+        self.step = step
+        self._plan = None
+        _, (gh, gw) = self._small_hw()
+        self.shape = (gh, gw)
+        self._gray = np.empty((gh, gw), np.uint8)
+        self._bg8 = np.empty((gh, gw), np.uint8)
+        self._diff = np.empty((gh, gw), np.uint8)
+        self._fg = np.empty((gh, gw), np.uint8)
+        self._mask = self._to_mask(self._mask_spec) if self._mask_spec is not None else None
+        self._area = int(np.count_nonzero(self._mask)) if self._mask is not None else gh * gw
+        if not self._area:
+            raise ValueError("mask selects no pixels")
+        self._regions = {}
+        for name, spec in self._region_spec.items():
+            m = self._to_mask(spec)
+            if self._mask is not None:
+                m &= self._mask
+            self._regions[name] = (m, max(1, int(np.count_nonzero(m))))
+        self._tmp = np.empty((gh, gw), np.uint8) if self._regions else None
+        self._bg = None
+
+    def _to_mask(self, spec):
+        """(x, y, w, h) / そのリスト / 配列 → 判定画像の大きさの 0/255 マスク"""
+        gh, gw = self.shape
+        if isinstance(spec, np.ndarray):
+            m = (spec != 0).astype(np.uint8) * 255
+            if m.shape[:2] != (gh, gw):
+                cv2 = _cv2()
+                m = cv2.resize(m, (gw, gh), interpolation=cv2.INTER_NEAREST)
+            return m
+        rects = [spec] if len(spec) == 4 and all(isinstance(v, (int, np.integer)) for v in spec) else spec
+        m = np.zeros((gh, gw), np.uint8)
+        sx, sy = gw / self.w, gh / self.h
+        for x, y, w, h in rects:
+            x0, y0 = int(x * sx), int(y * sy)
+            x1, y1 = max(x0 + 1, int(np.ceil((x + w) * sx))), max(y0 + 1, int(np.ceil((y + h) * sy)))
+            m[max(0, y0):y1, max(0, x0):x1] = 255
+        return m
+
+    def reset(self):
+        """背景を捨てて次のフレームから学習し直す"""
+        self._bg = None
+        self.active = self.changed = False
+        self._run = 0
+
+    # ---- 入力 ----
+    def read(self, reader):
+        """reader（FrameReader）の最新フレームを間引いて読み、判定する -> ChangeEvent or None
+
+        TornFrameError はそのまま上げる（次の新着で読み直せばよい）。
+        """
+        hdr = reader.header
+        geom = hdr.width, hdr.height, hdr.bpp, cfa_pattern(hdr.flags)
+        if geom != self.geometry:
+            self._configure(*geom)
+        fid, ts, small = reader.read_decimated(self.step)
+        return self._detect(small, fid, ts)
+
+    def update(self, image, frame_id=None, timestamp_us=0):
+        """上から下の画像（BGR / BGRA / GRAY / Bayer モザイク）を 1 枚渡す -> ChangeEvent or None
+
+        2 次元の画像は作成時の cfa に従って Bayer モザイクとして扱う（変換済みなら GRAY）。
+        """
+        from .roi import RegionPlan
+        h, w = image.shape[:2]
+        c = image.shape[2] if image.ndim == 3 else 1
+        geom = w, h, 8 * c, self.cfa if c == 1 else None
+        if geom != self.geometry:
+            self._configure(*geom)
+        if self._plan is None:
+            self._plan = RegionPlan(w, h, self.bpp, None, False, None, self.step, "skip", self.cfa)
+        if not image.flags.c_contiguous:
+            image = np.ascontiguousarray(image)
+        self._plan.bind(image)
+        self._plan.gather()
+        small = self._plan.finish()
+        self._plan.release()
+        return self._detect(small, self.frame_id + 1 if frame_id is None else frame_id, timestamp_us)
+
+    # ---- 判定 ----
+    def _luma(self, small):
+        cv2 = _cv2()
+        g = self._gray
+        if self.cfa is not None:                   # 2x2 セルの平均
+            cv2.resize(small, (g.shape[1], g.shape[0]), dst=g, interpolation=cv2.INTER_AREA)
+        elif self.c == 1:
+            np.copyto(g, small)
+        else:
+            cv2.cvtColor(small, cv2.COLOR_BGRA2GRAY if self.c == 4 else cv2.COLOR_BGR2GRAY, dst=g)
+        if self.blur:
+            cv2.GaussianBlur(g, (self.blur, self.blur), 0, dst=g)
+        return g
+
+    def _detect(self, small, fid, ts):
+        cv2 = _cv2()
+        g = self._luma(small)
+        ts = ts or now_us()
+        self.frame_id = fid
+        self.frames += 1
+        if self._bg is None:                       # 最初の 1 枚は背景にするだけ
+            self._bg = g.astype(np.float32)
+            self.changed, self.fraction = False, 0.0
+            return None
+        cv2.convertScaleAbs(self._bg, dst=self._bg8)
+        cv2.absdiff(g, self._bg8, dst=self._diff)
+        cv2.threshold(self._diff, self.threshold, 255, cv2.THRESH_BINARY, dst=self._fg)
+        if self._mask is not None:
+            cv2.bitwise_and(self._fg, self._mask, dst=self._fg)
+        self.fraction = cv2.countNonZero(self._fg) / self._area
+        self.changed = self.fraction >= self.min_area
+        cv2.accumulateWeighted(g, self._bg, self.alpha)
+
+        if self.changed:
+            self._run += 1
+            self._last_change_us = ts
+            if not self.active and self._run >= self.start_frames:
+                self.active = True
+                return self._event("start", fid, ts)
+        else:
+            self._run = 0
+            if self.active and ts - self._last_change_us >= self.hold_us:
+                self.active = False
+                return self._event("end", fid, ts)
+        return None
+
+    def _event(self, kind, fid, ts):
+        self.events += 1
+        return ChangeEvent(kind, fid, ts, self.fraction, self.bbox(), self.region_fractions())
+
+    def bbox(self):
+        """直近のフレームで変化した範囲 (x, y, w, h)（元画像の座標）。変化なしなら None"""
+        if not self.changed:
+            return None
+        x, y, w, h = _cv2().boundingRect(self._fg)
+        sx, sy = self.w / self.shape[1], self.h / self.shape[0]
+        return int(x * sx), int(y * sy), int(np.ceil(w * sx)), int(np.ceil(h * sy))
+
+    def region_fractions(self):
+        """直近のフレームの領域ごとの変化の割合 {名前: 0..1}"""
+        cv2 = _cv2()
+        out = {}
+        for name, (m, area) in self._regions.items():
+            cv2.bitwise_and(self._fg, m, dst=self._tmp)
+            out[name] = cv2.countNonZero(self._tmp) / area
+        return out
+
+    @property
+    def foreground(self):
+        """直近のフレームの変化マスク（判定画像の大きさ、0/255。次の判定で上書きされる）"""
+        return self._fg
+
+    def stats(self):
+        return {"frames": self.frames, "events": self.events, "active": self.active,
+                "fraction": self.fraction, "step": self.step, "shape": self.shape}
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""複数台のカメラ（ブリッジ N 本）をまとめ、時刻の揃ったフレームの組を出す
+
+    with MultiCam.launch(3, tolerance_ms=5) as mc:         # CAM1.exe を 3 本起動（Local\\Cam1Mem ...）
+        for fs in mc.sets(timeout=1.0):
+            for serial, f in fs.frames.items():            # キーはブリッジが起動時に出すシリアル番号
+                f.frame_id, f.timestamp_us, f.image
+        print(mc.stats())
+
+    mc = MultiCam.attach({"left": r"Local\\Cam1Mem", "right": r"Local\\Cam2Mem"})   # 起動済みに繋ぐ
+
+- カメラごとに読み手スレッドがあり、新着を所有バッファ（直近 depth 枚）へ seqlock 付きでコピーする。
+  遅いカメラや止まったカメラが他のカメラの取り込みを止めることはない。
+- 組は「各カメラの最新の中で最も古い時刻」を基準に、各カメラからその時刻に最も近いフレームを選ぶ。
+  全部が基準から tolerance 以内なら組として出す。どこかのカメラにその時刻のフレームが無ければ
+  （取りこぼし・周期違い）基準のフレームを捨てて incomplete に数え、次の基準で探し直す。
+- timestamp_us はカメラごとに trace.ClockMap で読み手の時計へ写してから比べる
+  （FLAG_HIRES_TS のブリッジなら同じマシンの QPC なのでそのまま比べられる）。
+- fs.frames の画像は次の next_set() まで有効（読み手スレッドが上書きしないよう固定している）。
+  それ以上保持するなら copy=True で受け取るか自分でコピーすること。
+- CAM1.exe はカメラを選ぶ引数を持たず、起動した順に空いているカメラを開く。どの本がどのカメラかは
+  起動時のシリアル番号行で判断する。
+"""
+import collections
+import threading
+import time
+
+import numpy as np
+
+from .launcher import (EXE_NAME_DEFAULT, clean_line, default_libdir, launch_cam, line_queue, read_wh_line,
+                       stop_cam)
+from .reader import TornFrameError, open_shm
+from .trace import ClockMap, Histogram
+
+Frame = collections.namedtuple("Frame", "frame_id timestamp_us image")
+_Slot = collections.namedtuple("_Slot", "frame_id timestamp_us local_us index")
+
+
+class FrameSet:
+    """時刻の揃ったフレームの組（frames: キー → Frame）"""
+
+    __slots__ = ("timestamp_us", "skew_us", "frames")
+
+    def __init__(self, timestamp_us, skew_us, frames):
+        self.timestamp_us = timestamp_us           # 基準時刻（読み手の時計）
+        self.skew_us = skew_us                     # 組の中の最大 - 最小
+        self.frames = frames
+
+    def __getitem__(self, key):
+        return self.frames[key]
+
+    def __len__(self):
+        return len(self.frames)
+
+
+class _Camera:
+    """1 台分の読み手スレッドと直近 depth 枚の所有バッファ"""
+
+    def __init__(self, key, shm_name, cv, depth, proc=None):
+        self.key, self.shm_name, self.proc = key, shm_name, proc
+        self.reader = open_shm(shm_name)
+        self.clock = ClockMap(self.reader.header.flags)
+        shape = self.reader.pixels().shape
+        self.bufs = [np.empty(shape, np.uint8) for _ in range(depth + 1)]
+        self.slots = collections.deque()           # 古い順の _Slot（最大 depth）
+        self.depth = depth
+        self.pinned = None                         # 渡した組が使っているバッファ
+        self.last_used = 0                         # 組に入れた最後の frame_id
+        self.frames = self.dropped = self.torn = self.unused = 0
+        self._cv = cv
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"sonycam-cam-{key}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _free_index(self):
+        busy = {s.index for s in self.slots}
+        if self.pinned is not None:
+            busy.add(self.pinned)
+        for i in range(len(self.bufs)):
+            if i not in busy:
+                return i
+        old = self.slots.popleft()                 # 満杯: 最古を捨てる
+        if old.frame_id > self.last_used:
+            self.unused += 1
+        return old.index
+
+    def _run(self):
+        rd = self.reader
+        last = rd.frame_id
+        while not self._stop.is_set():
+            if rd.wait_for_frame(last, timeout=0.2) is None:
+                continue
+            with self._cv:
+                i = self._free_index()
+            try:
+                fid, ts, _ = rd.read_frame(self.bufs[i])
+            except TornFrameError:
+                self.torn += 1
+                continue
+            with self._cv:
+                if last and fid > last + 1:
+                    self.dropped += fid - last - 1
+                self.frames += 1
+                self.slots.append(_Slot(fid, ts, self.clock.to_local(ts), i))
+                if len(self.slots) > self.depth:
+                    old = self.slots.popleft()
+                    if old.frame_id > self.last_used:
+                        self.unused += 1
+                self._cv.notify_all()
+            last = fid
+
+    def candidates(self):
+        return [s for s in self.slots if s.frame_id > self.last_used]
+
+    def consume(self, slot, pin):
+        """slot までを使用済みにする（pin なら slot のバッファを固定）"""
+        while self.slots and self.slots[0].frame_id <= slot.frame_id:
+            s = self.slots.popleft()
+            if s.frame_id < slot.frame_id and s.frame_id > self.last_used:
+                self.unused += 1
+        self.last_used = slot.frame_id
+        if pin:
+            self.pinned = slot.index
+
+    def stats(self):
+        return {"shm_name": self.shm_name, "frames": self.frames, "dropped": self.dropped,
+                "torn": self.torn, "unused": self.unused, "last_used": self.last_used}
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(1.0)
+        self.reader.close()
+        if self.proc is not None:
+            stop_cam(self.proc)
+            self.proc = None
+
+
+def _drain(proc, lines):
+    """ブリッジの stdout を読み捨てる（誰も読まないとパイプが詰まって SUM 行の printf で止まる）
+
+    read_wh_line() と同じ line_queue() から読む（パイプを読むスレッドは 1 本だけ）。
+    """
+    q = line_queue(proc.stdout)
+    while True:
+        b = q.get()
+        if b is None:
+            break
+        line = clean_line(b.decode("utf-8", "ignore"))
+        if line:
+            lines.append(line)
+
+
+class MultiCam:
+    """N 台のブリッジを起動/接続し、時刻の揃ったフレームの組を出す"""
+
+    def __init__(self, tolerance_ms=5.0, depth=4):
+        self.tolerance_us = int(tolerance_ms * 1000)
+        self.depth = depth
+        self.cameras = {}                          # キー → _Camera
+        self.lines = {}                            # キー → ブリッジの stdout の最新行
+        self.sets_delivered = 0
+        self.incomplete = 0
+        self.skew = Histogram()
+        self._cv = threading.Condition()
+        self._closed = False
+
+    # ---- 構成 ----
+    @classmethod
+    def attach(cls, names, **kw):
+        """起動済みのセグメントに繋ぐ。names は {キー: 名前} か名前のリスト（キー = 名前）"""
+        mc = cls(**kw)
+        items = names.items() if isinstance(names, dict) else ((n, n) for n in names)
+        try:
+            for key, name in items:
+                mc.add(key, name)
+        except BaseException:
+            mc.close()
+            raise
+        return mc
+
+    @classmethod
+    def launch(cls, count=None, names=None, libdir=None, exe_name=EXE_NAME_DEFAULT, argv=None,
+               wh_timeout=8.0, **kw):
+        """ブリッジを count 本（または names の数だけ）起動し、シリアル番号をキーにして繋ぐ
+
+        names 省略時は Local\\Cam1Mem, Local\\Cam2Mem, ...。argv はスタンドイン用のコマンド
+        （文字列の {i} は 0 始まりの番号に置き換える）。
+        """
+        names = list(names) if names else [rf"Local\Cam{i + 1}Mem" for i in range(count or 1)]
+        libdir = default_libdir() if libdir is None and argv is None else libdir
+        mc = cls(**kw)
+        try:
+            for i, name in enumerate(names):
+                cmd = [a.replace("{i}", str(i)) for a in argv] if argv else None
+                proc = launch_cam(libdir, name, exe_name, cmd)
+                (w, _, _, _), serial = read_wh_line(proc.stdout, wh_timeout)
+                if not w:
+                    stop_cam(proc)
+                    raise RuntimeError(f"bridge for {name} did not report WH (last line: {serial!r})")
+                key = serial or name
+                if key in mc.cameras:
+                    stop_cam(proc)
+                    raise RuntimeError(f"two bridges report the same serial {key!r} ({name})")
+                lines = mc.lines[key] = collections.deque(maxlen=50)
+                threading.Thread(target=_drain, args=(proc, lines), daemon=True).start()
+                try:
+                    mc.add(key, name, proc)                # 開けなければ（AttachError 等）proc はまだ mc のものではない
+                except BaseException:
+                    stop_cam(proc)
+                    raise
+        except BaseException:
+            mc.close()
+            raise
+        return mc
+
+    def add(self, key, shm_name, proc=None):
+        cam = _Camera(key, shm_name, self._cv, self.depth, proc)
+        with self._cv:
+            self.cameras[key] = cam
+        cam.start()
+        return cam
+
+    @property
+    def keys(self):
+        return list(self.cameras)
+
+    # ---- 組 ----
+    def _match(self):
+        """組が作れれば (基準時刻, skew, {キー: _Slot})、作れなければ None（cv を握って呼ぶ）"""
+        cams = list(self.cameras.values())
+        if not cams:
+            return None
+        while True:
+            cands = []
+            for c in cams:
+                cand = c.candidates()
+                if not cand:
+                    return None
+                cands.append(cand)
+            ref = min(cand[-1].local_us for cand in cands)
+            chosen = [min(cand, key=lambda s: abs(s.local_us - ref)) for cand in cands]
+            if all(abs(s.local_us - ref) <= self.tolerance_us for s in chosen):
+                ts = [s.local_us for s in chosen]
+                return ref, max(ts) - min(ts), dict(zip(self.cameras, chosen))
+            # 基準の時刻に揃うフレームを持たないカメラがある → 基準側のフレームを諦める
+            for c, s in zip(cams, chosen):
+                if s.local_us == ref:
+                    c.consume(s, pin=False)
+            self.incomplete += 1
+
+    def next_set(self, timeout=None, copy=False):
+        """次の組（FrameSet）。timeout 秒以内に揃わなければ None"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cv:
+            for c in self.cameras.values():
+                c.pinned = None                    # 前回渡した組のバッファを解放
+            while True:
+                if self._closed:
+                    return None
+                m = self._match()
+                if m is not None:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cv.wait(remaining if remaining is not None else 0.5)
+            ref, skew, slots = m
+            frames = {}
+            for key, s in slots.items():
+                cam = self.cameras[key]
+                cam.consume(s, pin=not copy)
+                img = cam.bufs[s.index]
+                frames[key] = Frame(s.frame_id, s.timestamp_us, img.copy() if copy else img)
+            self.sets_delivered += 1
+            self.skew.add(skew)
+        return FrameSet(ref, skew, frames)
+
+    def sets(self, timeout=None, copy=False):
+        """組を出し続けるイテレータ（timeout 秒揃わなければ終わる）"""
+        while True:
+            fs = self.next_set(timeout, copy)
+            if fs is None:
+                return
+            yield fs
+
+    def stats(self):
+        with self._cv:
+            seen = self.sets_delivered + self.incomplete
+            return {"sets": self.sets_delivered, "incomplete": self.incomplete,
+                    "incomplete_rate": self.incomplete / seen if seen else 0.0,
+                    "skew_ms": self.skew.summary(),
+                    "cameras": {k: c.stats() for k, c in self.cameras.items()}}
+
+    def close(self):
+        with self._cv:
+            self._closed = True
+            cams, self.cameras = list(self.cameras.values()), {}
+            self._cv.notify_all()
+        for c in cams:
+            c.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
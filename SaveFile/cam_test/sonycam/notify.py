@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""フレーム到着通知（sleep ポーリングの置き換え）
+
+    Windows : 名前付き manual-reset イベント "<共有メモリ名>_ready"
+              ブリッジは Capture 前に ResetEvent、フレーム確定後に SetEvent する
+    Linux   : ヘッダ内の 32bit ワード（CBRG: seq / CBRR: write_index 下位）に対する futex
+              書き手は確定後に FUTEX_WAKE。共有マッピングなのでプロセスをまたいで効く
+    その他  : 通知なし。FrameWaiter が spin → 適応スリープで待つ
+
+通知しない書き手（旧ブリッジ等）でも FrameWaiter は動く。通知待ちがタイムアウトしたのに
+フレームが進んでいた場合が続いたら、通知を諦めて適応スリープに切り替える。
+"""
+import ctypes as C
+import os
+import platform
+import sys
+import time
+
+EVENT_SUFFIX = "_ready"
+
+_WAIT_SLICE = 0.02         # 通知待ち 1 回の上限（通知が来ない書き手の検出用）
+_MISSES_BEFORE_POLL = 2     # 通知なしでフレームが進んだ回数がこれを超えたらポーリングへ
+
+
+def event_name(shm_name):
+    return shm_name + EVENT_SUFFIX
+
+
+# ===== Linux: futex =====
+_SYS_FUTEX = {"x86_64": 202, "amd64": 202, "aarch64": 98, "arm64": 98,
+              "i386": 240, "i686": 240, "armv7l": 240}
+_FUTEX_WAIT, _FUTEX_WAKE = 0, 1
+
+
+class _timespec(C.Structure):
+    _fields_ = [("tv_sec", C.c_long), ("tv_nsec", C.c_long)]
+
+
+class FutexSignal:
+    """共有マッピング上の 32bit ワードを futex として使う"""
+
+    def __init__(self, addr):
+        self.addr = addr
+        self._libc = C.CDLL(None, use_errno=True)
+        self._nr = _SYS_FUTEX[platform.machine().lower()]
+
+    def begin(self):
+        pass
+
+    def publish(self):
+        self._libc.syscall(self._nr, C.c_void_p(self.addr), _FUTEX_WAKE, 0x7FFFFFFF, None, None, 0)
+
+    def wait(self, expected, timeout):
+        """ワードが expected のままなら最大 timeout 秒眠る。起こされた/値が違えば True"""
+        ts = _timespec(int(timeout), int((timeout % 1.0) * 1e9))
+        r = self._libc.syscall(self._nr, C.c_void_p(self.addr), _FUTEX_WAIT,
+                               C.c_uint32(expected), C.byref(ts), None, 0)
+        return r == 0 or C.get_errno() != 110          # 110 = ETIMEDOUT
+
+    def close(self):
+        pass
+
+
+# ===== Windows: 名前付きイベント =====
+class EventSignal:
+    """manual-reset の名前付きイベント。create=True はブリッジ（書き手）側"""
+
+    SYNCHRONIZE = 0x00100000
+    EVENT_MODIFY_STATE = 0x0002
+    WAIT_OBJECT_0 = 0
+
+    def __init__(self, name, create=False):
+        from ctypes import wintypes as W
+        k32 = C.WinDLL("kernel32", use_last_error=True)
+        self._k32 = k32
+        k32.CreateEventW.argtypes = [C.c_void_p, W.BOOL, W.BOOL, W.LPCWSTR]
+        k32.CreateEventW.restype = W.HANDLE
+        k32.OpenEventW.argtypes = [W.DWORD, W.BOOL, W.LPCWSTR]
+        k32.OpenEventW.restype = W.HANDLE
+        k32.WaitForSingleObject.argtypes = [W.HANDLE, W.DWORD]
+        k32.WaitForSingleObject.restype = W.DWORD
+        for fn in (k32.SetEvent, k32.ResetEvent, k32.CloseHandle):
+            fn.argtypes = [W.HANDLE]
+            fn.restype = W.BOOL
+        if create:
+            self._h = k32.CreateEventW(None, True, False, name)
+        else:
+            self._h = k32.OpenEventW(self.SYNCHRONIZE | self.EVENT_MODIFY_STATE, False, name)
+        if not self._h:
+            raise OSError(C.get_last_error(), f"event not available: {name}")
+
+    def begin(self):
+        self._k32.ResetEvent(self._h)
+
+    def publish(self):
+        self._k32.SetEvent(self._h)
+
+    def wait(self, expected, timeout):
+        return self._k32.WaitForSingleObject(self._h, int(timeout * 1000)) == self.WAIT_OBJECT_0
+
+    def close(self):
+        if self._h:
+            self._k32.CloseHandle(self._h)
+            self._h = None
+
+
+def producer_signal(shm_name, word_addr):
+    """書き手用の通知オブジェクト（使えなければ None）。Windows は名前が必要"""
+    try:
+        if os.name == "nt":
+            return EventSignal(event_name(shm_name), create=True) if shm_name else None
+        if sys.platform.startswith("linux"):
+            return FutexSignal(word_addr)
+    except (OSError, KeyError, AttributeError):
+        pass
+    return None
+
+
+def consumer_signal(shm_name, word_addr):
+    """読み手用の通知オブジェクト（書き手が通知を用意していなければ None）"""
+    try:
+        if os.name == "nt":
+            return EventSignal(event_name(shm_name)) if shm_name else None
+        if sys.platform.startswith("linux"):
+            return FutexSignal(word_addr)
+    except (OSError, KeyError, AttributeError):
+        pass
+    return None
+
+
+class FrameWaiter:
+    """after_id より新しい frame_id を待つ: 短い spin → 通知待ち（または適応スリープ）
+
+    read_id() は確定済みの最新 frame_id、read_word() は通知ワードの現在値を返す関数。
+    適応スリープの上限は観測したフレーム周期の 1/8（max_sleep でさらに頭打ち）。
+    """
+
+    def __init__(self, read_id, read_word=None, signal=None, spin=0.0002, max_sleep=0.005):
+        self._read_id = read_id
+        self._read_word = read_word
+        self.signal = signal
+        self.spin = spin
+        self.max_sleep = max_sleep
+        self.period = None          # 推定フレーム周期 [s]
+        self._last_t = None
+        self._misses = 0
+
+    def _observe(self):
+        t = time.monotonic()
+        if self._last_t is not None:
+            dt = t - self._last_t
+            self.period = dt if self.period is None else 0.8 * self.period + 0.2 * dt
+        self._last_t = t
+
+    def wait(self, after_id, timeout=None):
+        """新しい frame_id を返す。timeout 秒で来なければ None"""
+        t0 = time.monotonic()
+        deadline = None if timeout is None else t0 + timeout
+        spin_end = t0 + self.spin
+        nap = 0.0001
+        cap = self.max_sleep
+        if self.period:
+            cap = max(0.0002, min(cap, self.period / 8))
+        while True:
+            fid = self._read_id()
+            if fid > after_id:
+                self._observe()
+                return fid
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                return None
+            remaining = _WAIT_SLICE if deadline is None else min(_WAIT_SLICE, deadline - now)
+            if now < spin_end:
+                time.sleep(0)
+                continue
+            if self.signal is not None:
+                word = self._read_word()
+                if self._read_id() > after_id:
+                    continue
+                woke = self.signal.wait(word, remaining)
+                if woke:
+                    if self._read_id() > after_id:
+                        self._misses = 0
+                        continue
+                    # イベントが立ちっぱなし（次フレームの Reset 前）→ 少しだけ寝る
+                    time.sleep(min(nap, cap))
+                    nap = min(nap * 2, cap)
+                elif self._read_id() > after_id:
+                    self._misses += 1
+                    if self._misses > _MISSES_BEFORE_POLL:
+                        self.signal = None      # 通知しない書き手 → 適応スリープへ
+                continue
+            time.sleep(min(nap, cap, remaining))
+            nap = min(nap * 2, cap)
+
+    def close(self):
+        # read_id/read_word はヘッダ（from_buffer のビュー）を掴んでいることがある。例外で抜けた wait() の
+        # フレームが waiter を生かしていても mmap.close() できるよう、ここで手放す
+        self._read_id = self._read_word = None
+        if self.signal is not None:
+            self.signal.close()
+            self.signal = None
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""取り込みと切り離したプレビュー表示（表示は専用スレッド / 子プロセス、最新の 1 枚だけを描く）
+
+    with Preview("CAM1", max_fps=30) as pv:                # 取り込みループから渡す
+        while not pv.closed:                               # ESC / q / ウィンドウを閉じると True
+            fid, ts, img = reader.read_frame(out)
+            pv.submit(img, fid, ts, reader.header.flags)   # ブロックしない（間に合わない分は捨てる）
+
+    Preview.spawn(r"Local\\Cam1Mem")                        # 子プロセスが共有メモリを自分で読んで表示
+    Preview("CAM1", source=r"Local\\Cam1Mem").run()         # 同じことをこのスレッドで
+
+- cv2.imshow / waitKey は表示スレッドだけが呼ぶ。ウィンドウのドラッグ等で表示が止まっても取り込みは止まらない。
+- submit() は前回の受け付けから 1/max_fps 経っていなければ何もしない（コピーもしない）。受け付けた
+  時だけ裏バッファへ 1 回コピーし、表示スレッドはその時点の最新だけを描く（古い分は描かずに捨てる）。
+- 縮小はウィンドウの大きさ（size 固定も可）に合わせた cv2.INTER_AREA。倍率・出力バッファは
+  ウィンドウの大きさが変わった時だけ作り直す。source 指定時は roi.RegionPlan の間引きで読む量から減らす。
+- 重ね書き（FPS・frame_id・経過時間・取りこぼし）はヘッダの frame_id / timestamp_us から計算する
+  （画像の統計は取らない）。経過時間は trace.ClockMap で読み手の時計に写した timestamp_us からの差。
+- sink を渡すと imshow の代わりにそれへ描画済みの画像を渡す（GUI の無い環境での確認用）。
+  macOS の HighGUI はメインスレッド以外から使えないので spawn()（子プロセス）を使うこと。
+"""
+import collections
+import threading
+import time
+
+import numpy as np
+
+from .convert import Converter, _cv2
+from .header import FLAG_HIRES_TS, SHM_NAME_DEFAULT, cfa_pattern, now_us
+from .trace import ClockMap
+
+Painted = collections.namedtuple("Painted", "frame_id timestamp_us painted_us")
+
+
+class _Fit:
+    """元の大きさ → 表示の大きさ（縦横比を保つ）。大きさが変わった時だけ作り直す"""
+
+    def __init__(self, src_wh, box_wh):
+        sw, sh = src_wh
+        bw, bh = box_wh
+        s = min(1.0, bw / sw, bh / sh)
+        self.src_wh, self.box_wh = src_wh, box_wh
+        self.size = (max(1, round(sw * s)), max(1, round(sh * s)))
+        self.scale = s
+        self.out = None
+
+    def __call__(self, img):
+        if self.scale >= 1.0:
+            return img
+        shape = (self.size[1], self.size[0]) + img.shape[2:]
+        if self.out is None or self.out.shape != shape:
+            self.out = np.empty(shape, np.uint8)
+        cv2 = _cv2()
+        return cv2.resize(img, self.size, dst=self.out, interpolation=cv2.INTER_AREA)
+
+
+class _Rate:
+    """ヘッダの frame_id / timestamp_us から書き手の fps と取りこぼしを出す（約 1 秒の窓）"""
+
+    def __init__(self):
+        self.fps = 0.0
+        self.dropped = 0
+        self._last = None
+        self._win = None
+
+    def add(self, fid, ts):
+        if self._last is not None and fid > self._last + 1:
+            self.dropped += fid - self._last - 1
+        self._last = fid
+        if self._win is None:
+            self._win = (fid, ts)
+            return
+        f0, t0 = self._win
+        if ts - t0 >= 1000000 and fid > f0:
+            self.fps = (fid - f0) * 1e6 / (ts - t0)
+            self._win = (fid, ts)
+
+
+class Preview:
+    """表示だけを受け持つ。submit() で渡すか、source の共有メモリを自分で読む"""
+
+    def __init__(self, title="CAM1", max_fps=30.0, size=None, overlay=True, source=None, sink=None):
+        """size: (幅, 高さ) で表示の大きさを固定（省略時はウィンドウに合わせ、初期値は 1280x1024 に収める）"""
+        self.title = title
+        self.period = 1.0 / max_fps if max_fps and max_fps > 0 else 0.0
+        self.size = tuple(size) if size else None
+        self.overlay = overlay
+        self.source = source
+        self.sink = sink
+        self.submitted = self.accepted = self.painted = 0
+        self.last = None                           # 最後に描いた Painted
+        self._rate = _Rate()
+        self._clock = None
+        self._fit = None
+        self._cv = threading.Condition()
+        self._bufs = [None, None]                  # 裏 / 表
+        self._pending = None                       # (frame_id, timestamp_us, flags)。裏バッファに新着あり
+        self._next_accept = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._window = False
+
+    # ---- 取り込み側 ----
+    def submit(self, image, frame_id=0, timestamp_us=0, flags=0):
+        """最新フレームを渡す（上から下の BGR / GRAY）。受け付けたら True（コピー 1 回）"""
+        self.submitted += 1
+        now = time.perf_counter()
+        if now < self._next_accept or self._stop.is_set():
+            return False
+        self._next_accept = now + self.period * 0.9       # 表示の周期より少し早めに受け付ける
+        with self._cv:
+            back = self._bufs[0]
+            if back is None or back.shape != image.shape:
+                back = self._bufs[0] = np.empty(image.shape, np.uint8)
+            np.copyto(back, image)
+            self._pending = (frame_id, timestamp_us, flags)
+            self.accepted += 1
+            self._cv.notify()
+        return True
+
+    @property
+    def closed(self):
+        return self._stop.is_set()
+
+    # ---- 表示側 ----
+    def start(self):
+        """表示スレッドを開始する（source 指定時はそのスレッドが共有メモリも読む）"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, daemon=True, name="sonycam-preview")
+            self._thread.start()
+        return self
+
+    def run(self):
+        """閉じられるまで描き続ける（このスレッドで）"""
+        try:
+            if self.source is not None:
+                self._run_source()
+            else:
+                self._run_submitted()
+        finally:
+            self._stop.set()
+            self._destroy()
+
+    def _run_submitted(self):
+        t_next = time.perf_counter()
+        while not self._stop.is_set():
+            with self._cv:
+                if self._pending is None:
+                    self._cv.wait(self.period or 0.05)
+                item = self._pending
+                if item is not None:
+                    self._bufs.reverse()           # 裏 ↔ 表（コピーなし）
+                    self._pending = None
+            if item is not None:
+                self._paint(self._bufs[1], *item)
+            t_next = self._pace(t_next)
+
+    def _run_source(self):
+        from .reader import TornFrameError, open_shm
+        from .roi import RegionPlan
+        rd = open_shm(SHM_NAME_DEFAULT if self.source is True else self.source)
+        hdr = rd.header
+        plan = conv = bgr = None
+        last = 0
+        t_next = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                if rd.wait_for_frame(last, timeout=0.2) is None:
+                    self._poll()
+                    continue
+                box = self._box()
+                step = max(1, int(min(hdr.width / box[0], hdr.height / box[1])) // 2)
+                if cfa_pattern(hdr.flags) and step > 1 and step % 2:
+                    step -= 1                      # 並びを保つ偶数の間引き
+                if plan is None or plan.step != step or plan.geometry != rd.geometry:
+                    if plan is not None:
+                        plan.release()
+                    plan = RegionPlan.from_header(hdr, None, step)
+                    oh, ow = plan.outputs[0].shape[:2]
+                    conv = Converter(ow, oh, hdr.bpp, None, False, "bgr", cfa_pattern(hdr.flags))
+                    bgr = conv.new_output()
+                try:
+                    fid, ts, img = rd.read_regions(plan)
+                except TornFrameError:
+                    continue
+                self._paint(conv(img, bgr), fid, ts, hdr.flags)
+                last = fid
+                t_next = self._pace(t_next)
+        finally:
+            if plan is not None:
+                plan.release()
+            del hdr                                # ヘッダのビューも手放してから閉じる
+            rd.close()
+
+    def _pace(self, t_next):
+        """描画の上限（max_fps）まで待ちつつウィンドウのイベントを処理する"""
+        t_next = max(t_next + self.period, time.perf_counter())     # 遅れた分は取り戻さない
+        while True:
+            self._poll()
+            dt = t_next - time.perf_counter()
+            if dt <= 0 or self._stop.is_set():
+                return t_next
+            time.sleep(min(dt, 0.01))
+
+    def _box(self):
+        if self.size:
+            return self.size
+        if self._window and self.sink is None:
+            try:
+                _, _, w, h = _cv2().getWindowImageRect(self.title)
+                if w > 0 and h > 0:
+                    return w, h
+            except Exception:                      # 閉じられた直後など
+                pass
+        return 1280, 1024
+
+    def _paint(self, img, fid, ts, flags):
+        if self._clock is None or self._clock.hires != bool(flags & FLAG_HIRES_TS):
+            self._clock = ClockMap(flags)
+        self._rate.add(fid, ts)
+        src_wh = (img.shape[1], img.shape[0])
+        box = self._box()
+        if self._fit is None or self._fit.src_wh != src_wh or self._fit.box_wh != box:
+            self._fit = _Fit(src_wh, box)
+        out = self._fit(img)                       # 縮小なしなら img（表バッファ）にそのまま重ね書きする
+        if self.overlay:
+            age_ms = (now_us() - self._clock.to_local(ts)) / 1e3 if ts else 0.0
+            self._text(out, f"#{fid}  {self._rate.fps:4.1f} fps  age {age_ms:5.1f} ms  drop {self._rate.dropped}")
+        if self.sink is not None:
+            self.sink(out)
+        else:
+            cv2 = _cv2()
+            if not self._window:
+                cv2.namedWindow(self.title, cv2.WINDOW_NORMAL)
+                cv2.resizeWindow(self.title, *self._fit.size)
+                self._window = True
+            cv2.imshow(self.title, out)
+        self.painted += 1
+        self.last = Painted(fid, ts, now_us())
+
+    @staticmethod
+    def _text(img, s):
+        cv2 = _cv2()
+        scale = max(0.4, img.shape[1] / 1600)
+        org = (8, int(24 * scale / 0.6))
+        color = (0, 255, 0) if img.ndim == 3 else 255
+        cv2.putText(img, s, org, cv2.FONT_HERSHEY_SIMPLEX, scale, 0, 3, cv2.LINE_AA)
+        cv2.putText(img, s, org, cv2.FONT_HERSHEY_SIMPLEX, scale, color, 1, cv2.LINE_AA)
+
+    def _poll(self):
+        """waitKey でイベントを回し、ESC / q / ウィンドウを閉じたら止める"""
+        if self.sink is not None or not self._window:
+            return
+        cv2 = _cv2()
+        key = cv2.waitKey(1) & 0xFF
+        if key in (27, ord("q")):
+            self._stop.set()
+        elif cv2.getWindowProperty(self.title, cv2.WND_PROP_VISIBLE) < 1:
+            self._stop.set()
+
+    def _destroy(self):
+        if self._window:
+            try:
+                _cv2().destroyWindow(self.title)
+            except Exception:
+                pass
+            self._window = False
+
+    def stats(self):
+        return {"submitted": self.submitted, "accepted": self.accepted, "painted": self.painted,
+                "writer_fps": self._rate.fps, "dropped": self._rate.dropped,
+                "last_frame_id": self.last.frame_id if self.last else 0}
+
+    def close(self):
+        self._stop.set()
+        with self._cv:
+            self._cv.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(2.0)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- 子プロセス ----
+    @classmethod
+    def spawn(cls, source=SHM_NAME_DEFAULT, **kw):
+        """子プロセスで source を読んで表示する -> multiprocessing.Process（terminate() で閉じる）"""
+        import multiprocessing as mp
+        p = mp.Process(target=_preview_process, args=(source, kw), daemon=True, name="sonycam-preview")
+        p.start()
+        return p
+
+
+def _preview_process(source, kw):
+    Preview(source=source, **kw).run()
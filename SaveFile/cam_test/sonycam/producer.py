@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""CAM1.exe のスタンドイン（カメラ無しで CBRG / CBRR セグメントへフレームを書き続ける）
+
+    src = SyntheticSource(2464, 2056, 24, pattern="bars")     # 動く合成パターン
+    src = ReplaySource("run1.cbrv")                            # 録画（.cbrv）や画像フォルダの再生
+    with Producer("posix:Cam1Mem", src, fps=30) as prod:
+        prod.run(seconds=10)
+
+書き手は writer.FrameWriter / ring.RingWriter（ブリッジと同じヘッダ・seqlock・通知）なので、
+読み手側は CAM1.exe の時と同じコードで端から端まで測れる。テレメトリページ（telemetry.py）も同じく書き、
+制御ページ（control.py）にも答える（露光・ゲインは明るさの倍率として絵に効く。ROI・トリガは値を持つだけ）。
+パターンは横幅 2 倍の元画像を 1 回だけ作り、毎フレームその切り出しをコピーする（フレーム毎の確保なし）。
+"""
+import glob
+import os
+import time
+
+import numpy as np
+
+from .convert import _cv2
+from .control import (KEY_NAMES, OP_GET, STATUS_INVALID, STATUS_OK, STATUS_RESTART, STATUS_UNSUPPORTED,
+                      ControlServer)
+from .header import FLAG_BOTTOM_UP, LAYOUT_VERSION, cfa_flags, cfa_pattern, channels, pixel_format_code
+from .ring import RingWriter, ring_size
+from .telemetry import PROBE_BYTES, TelemetryWriter
+from .transport import create_segment, signal_name, unlink_segment
+from .writer import FrameWriter, segment_size
+
+PATTERNS = ("bars", "gradient", "checker", "noise")
+_BARS = np.array([(255, 255, 255), (0, 255, 255), (255, 255, 0), (0, 255, 0),
+                  (255, 0, 255), (0, 0, 255), (255, 0, 0), (16, 16, 16)], np.uint8)   # BGR
+_LAYOUT = {"RG": "RGGB", "GR": "GRBG", "GB": "GBRG", "BG": "BGGR"}
+
+
+def _bgr_pattern(w, h, pattern, seed=0):
+    """横方向に周期 w の BGR 画像（h, w）"""
+    x = np.arange(w)
+    if pattern == "bars":
+        img = np.broadcast_to(_BARS[x * len(_BARS) // w], (h, w, 3))
+    elif pattern == "gradient":
+        t = 2 * np.pi * x / w
+        row = np.stack([127.5 + 127.5 * np.cos(t + k * 2 * np.pi / 3) for k in range(3)], -1)
+        ramp = np.linspace(0.25, 1.0, h)[:, None, None]
+        img = (row[None] * ramp).astype(np.uint8)
+    elif pattern == "checker":
+        cell = max(8, w // 32)
+        on = ((x // cell)[None, :] + (np.arange(h) // cell)[:, None]) & 1
+        img = np.repeat((on * 200 + 30).astype(np.uint8)[..., None], 3, axis=2)
+    elif pattern == "noise":
+        img = np.random.default_rng(seed).integers(0, 256, (h, w, 3), dtype=np.uint8)
+    else:
+        raise ValueError(f"pattern must be one of {PATTERNS}")
+    return np.ascontiguousarray(img)
+
+
+def _to_format(bgr, bpp, cfa=None):
+    """BGR 画像 → bpp（8/24/32）の画素。cfa があれば 8bpp の Bayer モザイク"""
+    if cfa is not None:
+        raw = np.empty(bgr.shape[:2], np.uint8)
+        ch = {"R": 2, "G": 1, "B": 0}
+        for i, c in enumerate(_LAYOUT[cfa]):
+            dy, dx = divmod(i, 2)
+            raw[dy::2, dx::2] = bgr[dy::2, dx::2, ch[c]]
+        return raw
+    c = channels(bpp)
+    if c == 3:
+        return bgr
+    if c == 4:
+        out = np.full(bgr.shape[:2] + (4,), 255, np.uint8)
+        out[..., :3] = bgr
+        return out
+    return (bgr @ np.array([0.114, 0.587, 0.299])).astype(np.uint8)
+
+
+class SyntheticSource:
+    """横にスクロールする合成パターン（bars / gradient / checker / noise）
+
+    speed: 1 フレームあたりの移動量 [px]。cfa を渡すと Bayer（8bpp）で出す。
+    Bayer では並びを保つため移動量を偶数に丸める。
+    """
+
+    def __init__(self, w, h, bpp=24, pattern="bars", cfa=None, speed=8, seed=0):
+        if cfa is not None and bpp != 8:
+            raise ValueError("Bayer output must be 8bpp")
+        self.w, self.h, self.bpp = w, h, bpp
+        self.flags = cfa_flags(cfa)
+        self.speed = speed & ~1 if cfa else speed
+        base = _to_format(_bgr_pattern(w, h, pattern, seed), bpp, cfa)
+        self._base = np.concatenate([base, base], axis=1)       # 周期 w を 2 倍幅に
+
+    def render(self, px, frame_id):
+        off = (frame_id * self.speed) % self.w
+        np.copyto(px, self._base[:, off:off + self.w])
+
+
+class ReplaySource:
+    """録画（.cbrv）、.npy、画像ファイル（glob 可）を順に繰り返し流す
+
+    .cbrv は録画時の形式・向き・CFA のまま。画像は w/h/bpp（省略時は 1 枚目）に合わせる。
+    """
+
+    def __init__(self, path, w=None, h=None, bpp=24):
+        self.flags = 0
+        path = str(path)
+        if path.endswith(".cbrv"):
+            from .recorder import Recording
+            self._rec = Recording(path)
+            if not len(self._rec):
+                raise ValueError(f"empty recording: {path}")
+            hdr = self._rec.header
+            self.w, self.h, self.bpp, self.flags = hdr.width, hdr.height, hdr.bpp, hdr.flags
+            self.frames = self._rec.frames
+            return
+        self._rec = None
+        files = sorted(glob.glob(path)) if not os.path.isdir(path) else \
+            sorted(glob.glob(os.path.join(path, "*")))
+        if not files:
+            raise FileNotFoundError(f"no frames found: {path}")
+        cv2 = _cv2()
+        frames = []
+        for f in files:
+            img = np.load(f) if f.endswith(".npy") else cv2.imread(f, cv2.IMREAD_COLOR)
+            if img is None:
+                continue
+            if img.ndim == 2:
+                img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+            if w is None:
+                h, w = img.shape[:2]
+            if img.shape[:2] != (h, w):
+                img = cv2.resize(img, (w, h), interpolation=cv2.INTER_AREA)
+            frames.append(_to_format(img[..., :3], bpp))
+        if not frames:
+            raise ValueError(f"no readable frames: {path}")
+        self.w, self.h, self.bpp = w, h, bpp
+        self.frames = frames
+
+    def render(self, px, frame_id):
+        np.copyto(px, self.frames[(frame_id - 1) % len(self.frames)])
+
+
+class Producer:
+    """source のフレームを共有セグメントへ fps で書き続ける
+
+    ring_slots >= 2 ならリング形式（CBRR）、それ以外は単一スロット（CBRG）。
+    name は transport.py の名前（"posix:Cam1Mem" / "file:/tmp/seg" / Windows なら r"Local\\Cam1Mem"）。
+    """
+
+    def __init__(self, name, source, fps=30.0, ring_slots=0, kind=None, bottom_up=False, telemetry=True,
+                 header_version=LAYOUT_VERSION, control=True, control_lag=0, fail_after=None):
+        """bottom_up: biHeight > 0 の DIB と同じく行を下から上に並べ、FLAG_BOTTOM_UP を立てる
+        telemetry: "<name>_telemetry" に CAM1.exe と同じテレメトリを書く
+        header_version: CBRG の版（1 = 旧ブリッジと同じ 44 バイトのヘッダ。CAM1_HEADER_VERSION 相当）
+        control: "<name>_control" の要求に答える。control_lag: CAM1_CONTROL_LAG 相当（既定 0 = 次のフレームから）
+        fail_after: その枚数を公開した後は Capture の失敗を真似る（SaveFile.cpp と同じく公開せず failed だけ数える）
+        """
+        self.name, self.kind = name, kind
+        self.source = source
+        self.fps = fps
+        w, h, bpp = source.w, source.h, source.bpp
+        self.bottom_up = bool(bottom_up)
+        flags = source.flags | (FLAG_BOTTOM_UP if bottom_up else 0)
+        size = ring_size(w, h, bpp, ring_slots) if ring_slots else segment_size(w, h, bpp, header_version)
+        self._buf = create_segment(name, size, kind)
+        sig = signal_name(name, kind)
+        if ring_slots:
+            self.writer = RingWriter(self._buf, w, h, bpp, ring_slots, name=sig, flags=flags)
+        else:
+            self.writer = FrameWriter(self._buf, w, h, bpp, name=sig, flags=flags, version=header_version)
+        self.telemetry = TelemetryWriter(name, kind) if telemetry else None
+        # SaveFile.cpp の初期値（ExposureTime 10 ms / Gain 18 / フリーラン）
+        self.settings = {"exposure_us": 10000.0, "gain_db": 18.0, "roi": (0, 0, w, h), "trigger": 0,
+                         "pixel_format": pixel_format_code(bpp, cfa_pattern(flags))}
+        self._lut = None
+        self._luts = []                            # (効き始める frame_id, LUT)。lag の分だけ遅らせる
+        self._next_fid = 0
+        self.control = ControlServer(name, kind, lag=control_lag) if control else None
+        self.fail_after = fail_after
+        self.published = 0
+        self.failed = 0
+        self.late = 0                  # 周期に間に合わなかった回数
+        row = self.writer.header.stride
+        self._probe_rows = max(1, min(h, -(-PROBE_BYTES // row)))
+
+    @property
+    def geometry(self):
+        hdr = self.writer.header
+        return hdr.width, hdr.height, hdr.bpp, hdr.stride
+
+    def step(self, capture_s=0.0):
+        """1 フレーム書いて公開する -> frame_id（Capture の失敗を真似た時は None）
+
+        capture_s はテレメトリの capture 時間（run() ではカメラの露光待ちに当たる周期待ちの時間）。
+        """
+        fid = self._frame_id() + 1
+        if self.control is not None:               # CAM1.exe と同じく Capture の前に
+            self._next_fid = fid
+            self.control.poll(self._apply_control, fid)
+            while self._luts and self._luts[0][0] <= fid:
+                self._lut = self._luts.pop(0)[1]
+        if self.fail_after is not None and self.published >= self.fail_after:
+            self.failed += 1                       # 公開しない（frame_id・seq はそのまま）
+            if self.telemetry is not None:
+                self.telemetry.record(capture_s, 0.0, ok=False)
+            return None
+        t0 = time.perf_counter()
+        with self.writer.frame() as px:
+            # 下から上の DIB を真似る時は、上から下の絵を逆順の行に書く
+            self.source.render(px[::-1] if self.bottom_up else px, fid)
+            if self._lut is not None:              # 露光・ゲインの分だけ明るさを変える
+                np.take(self._lut, px, out=px)
+        copy_s = time.perf_counter() - t0
+        if self.telemetry is not None:
+            # SaveFile.cpp の SUM と同じくメモリ上の先頭 64KB（行の詰め物は除く）
+            self.telemetry.record(capture_s, copy_s, probe=px[:self._probe_rows])
+        self.published += 1
+        return fid
+
+    def _apply_control(self, op, key, vals):
+        """制御ページの要求 1 件 -> (status, 値)。範囲は SaveFile.cpp と同じ"""
+        name = KEY_NAMES.get(key)
+        cur = self.settings.get(name)
+        if name is None:
+            return STATUS_UNSUPPORTED, vals
+        if op == OP_GET:
+            return STATUS_OK, list(cur) if name == "roi" else [float(cur)]
+        if name == "exposure_us":
+            if not 10.0 <= vals[0] <= 10e6:
+                return STATUS_INVALID, [cur]
+        elif name == "gain_db":
+            if not 0.0 <= vals[0] <= 48.0:
+                return STATUS_INVALID, [cur]
+        elif name == "roi":
+            x, y, w, h = (int(v) for v in vals)
+            if (w, h) != cur[2:]:
+                return STATUS_RESTART, list(cur)   # 幾何が変わる
+            if x < 0 or y < 0:
+                return STATUS_INVALID, list(cur)
+            self.settings["roi"] = (x, y, w, h)
+            return STATUS_OK, [x, y, w, h]
+        elif name == "trigger":
+            if vals[0] not in (0.0, 1.0):
+                return STATUS_INVALID, [cur]
+            vals[0] = int(vals[0])
+        elif name == "pixel_format":
+            return (STATUS_OK if int(vals[0]) == cur else STATUS_RESTART), [cur]
+        self.settings[name] = vals[0]
+        scale = self.settings["exposure_us"] / 10000.0 * 10 ** ((self.settings["gain_db"] - 18.0) / 20)
+        lut = None if abs(scale - 1.0) < 1e-6 else np.clip(np.arange(256) * scale + 0.5, 0, 255).astype(np.uint8)
+        self._luts.append((self._next_fid + self.control.page.lag, lut))
+        return STATUS_OK, [float(vals[0])]
+
+    def _frame_id(self):
+        w = self.writer
+        return w.header.write_index if isinstance(w, RingWriter) else w.frame_id
+
+    def run(self, frames=None, seconds=None, stop=None, align=False):
+        """frames 枚 / seconds 秒 / stop（threading.Event 等）が立つまで fps で書く（fps<=0 は全速）
+
+        align=True なら書く時刻を perf_counter（プロセス間で共通の単調時計）の周期の倍数に揃える。
+        同じ fps の Producer 同士がハードウェアトリガで揃えたカメラと同じく同時刻のフレームを出す。
+        """
+        period = 1.0 / self.fps if self.fps and self.fps > 0 else 0.0
+        t_end = None if seconds is None else time.perf_counter() + seconds
+        t_next = time.perf_counter()
+        if align and period:
+            t_next = (t_next // period + 1) * period
+            time.sleep(max(0.0, t_next - time.perf_counter()))
+        n = 0
+        wait_s = 0.0
+        while (frames is None or n < frames) and (t_end is None or time.perf_counter() < t_end):
+            if stop is not None and stop.is_set():
+                break
+            self.step(wait_s)
+            n += 1
+            if not period:
+                continue
+            t_next += period
+            dt = t_next - time.perf_counter()
+            wait_s = max(0.0, dt)
+            if dt > 0:
+                time.sleep(dt)
+            else:
+                self.late += 1
+                t_next = time.perf_counter()        # 遅れは取り戻さない（カメラと同じく間引かれる）
+                if align:                           # 次の周期の頭まで待つ
+                    t_next = (t_next // period + 1) * period
+                    time.sleep(max(0.0, t_next - time.perf_counter()))
+        return n
+
+    def close(self, unlink=True):
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.writer = None
+        self._buf = None
+        if self.telemetry is not None:
+            self.telemetry.close(unlink)
+            self.telemetry = None
+        if self.control is not None:
+            self.control.close(unlink)
+            self.control = None
+        if unlink:
+            unlink_segment(self.name, self.kind)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
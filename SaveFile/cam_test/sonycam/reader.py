@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""CBRG 共有メモリのゼロコピー読み出し
+
+ヘッダは ctypes ビュー、ピクセルはマッピング上の strided ndarray として公開する。
+ポーリングと読み出しではコピーもメモリ確保もしない。コピーが必要な時だけ snapshot() を呼ぶ。
+
+書き込み途中のフレーム（半分旧・半分新）を掴まないよう、read_frame() は ShmHeader.seq の
+seqlock を検証する（手順は SaveFile.cpp のコメント参照）。
+新着待ちは wait_for_frame()（notify.py の通知 + 適応スリープ）を使う。
+「今から後に撮れた 1 枚」が欲しい時は grab()（要求時刻より後の timestamp_us の最初のフレーム、コピー 1 回）。
+名前から開く時は attach()（1 回マップして検証、使えなければ理由つきの AttachError）。
+"""
+import collections
+import ctypes as C
+import time
+
+import numpy as np
+
+from .header import (FLAG_HIRES_TS, FLAG_STALE, HDR_SIZE, HDR_SIZE_V2, MAGIC, SHM_NAME_DEFAULT, AttachError,
+                     ShmHeader, channels, check_layout, epoch, now_us, read_layout)
+from .notify import FrameWaiter, consumer_signal
+from .trace import ClockMap
+from .transport import open_segment, resolve, segment_exists, signal_name
+
+
+class TornFrameError(RuntimeError):
+    """再試行回数内に一貫したフレームを取れなかった"""
+
+
+# grab() の結果。latency_s: 要求時刻から手元にコピーし終わるまで、wait_s: grab() の呼び出しから返るまで、
+# skipped: 要求より後に撮れたのに読む前に上書きされた枚数（最初の 1 枚を取れていれば 0）
+Grab = collections.namedtuple("Grab", "frame_id timestamp_us image latency_s wait_s skipped")
+
+
+class FrameReader:
+    """mmap 等の書き込み可能バッファ（ヘッダ + ピクセル）に被せるリーダ
+
+    pixels() が返す配列はマッピングそのものなので、プロデューサが書き換えると中身も変わる。
+    保持したいフレームは snapshot() で所有コピーを取ること。
+    """
+
+    def __init__(self, buf, offset=0, name=None):
+        self._buf = buf
+        self._offset = offset
+        self.name = name
+        self.header = ShmHeader.from_buffer(buf, offset)
+        if self.header.magic != MAGIC:
+            raise ValueError(f"magic mismatch: got=0x{self.header.magic:08X}, expected=0x{MAGIC:08X}")
+        self.layout = read_layout(buf, offset)[1]          # 版 1 なら header_size = 44
+        self._pix = offset + self.layout.header_size
+        self._geom = None
+        self._view = None
+        self._waiter = None
+        self._plans = {}
+        self._clock = None
+
+    # ---- ヘッダ（コピーなし）----
+    @property
+    def frame_id(self):
+        return self.header.frame_id
+
+    @property
+    def seq(self):
+        return self.header.seq
+
+    @property
+    def geometry(self):
+        h = self.header
+        return h.width, h.height, h.bpp, h.stride
+
+    @property
+    def epoch(self):
+        """書き手の引き継ぎ回数（flags の 16..31）。変われば途切れ（ブリッジの再起動）があった"""
+        return epoch(self.header.flags)
+
+    @property
+    def stale(self):
+        """見張り（watchdog.py）がフレームが止まった / ブリッジが落ちたと判断して、まだ再開していない"""
+        return bool(self.header.flags & FLAG_STALE)
+
+    def age_us(self):
+        """最新フレームの timestamp_us から今までの µs（読み手の時計に写して）。フレームが無ければ None"""
+        hdr = self.header
+        if not hdr.frame_id:
+            return None
+        return now_us() - self._clockmap().to_local(hdr.timestamp_us)
+
+    def _clockmap(self):
+        hdr = self.header
+        if self._clock is None or self._clock.hires != bool(hdr.flags & FLAG_HIRES_TS):
+            self._clock = ClockMap(hdr.flags)
+        return self._clock
+
+    # ---- ピクセル ----
+    def pixels(self):
+        """(H, W, C) または (H, W) の strided ビュー。stride の詰め物は見えない"""
+        geom = self.geometry
+        if geom != self._geom:
+            w, h, bpp, stride = geom
+            c = channels(bpp)
+            stride = stride or w * c
+            if self._pix + stride * h > len(self._buf):
+                raise ValueError(f"segment too small for {w}x{h} stride={stride}")
+            if c == 1:
+                shape, strides = (h, w), (stride, 1)
+            else:
+                shape, strides = (h, w, c), (stride, c, 1)
+            self._view = np.ndarray(shape, np.uint8, buffer=self._buf,
+                                    offset=self._pix, strides=strides)
+            self._geom = geom
+        return self._view
+
+    def raw_view(self):
+        """ピクセル領域（stride 込み stride*height バイト）の memoryview（コピーなし）
+
+        ファイルへそのまま write() する時など、行の詰め物ごと 1 塊で扱いたい時に使う。
+        残っていると close() できないので with reader.raw_view() as mv: で使うこと。
+        """
+        hdr = self.header
+        start = self._pix
+        return memoryview(self._buf)[start:start + hdr.stride * hdr.height]
+
+    def snapshot(self, out=None):
+        """所有コピー（連続配列）を返す。out を渡せばそこへ書く（確保なし）"""
+        view = self.pixels()
+        if out is None:
+            return np.array(view, order="C")
+        np.copyto(out, view)
+        return out
+
+    def read_frame(self, out=None, retries=4, timeout=0.5):
+        """seqlock で検証した所有コピーを返す -> (frame_id, timestamp_us, img)
+
+        コピー前後で seq と frame_id が一致した時だけ採用する（全フレーム比較はしない）。
+        書き込み中（seq 奇数）は timeout まで待つ。コピー中に書き換えられたら retries 回まで
+        読み直し、それでも駄目なら TornFrameError。
+        seq を書かない旧ブリッジでは frame_id の比較だけになる。
+        """
+        view = self.pixels()
+        if out is None:
+            out = np.empty(view.shape, np.uint8)
+        fid, ts = self._consistent(lambda: np.copyto(out, view), retries, timeout)
+        return fid, ts, out
+
+    def _consistent(self, copy, retries, timeout):
+        """seqlock の内側で copy() を呼ぶ -> 一貫していた時の (frame_id, timestamp_us)"""
+        hdr = self.header
+        deadline = time.monotonic() + timeout
+        torn = 0
+        while True:
+            s1 = hdr.seq
+            if s1 & 1:
+                if time.monotonic() > deadline:
+                    raise TornFrameError(f"writer busy for {timeout}s (seq={s1})")
+                time.sleep(0)
+                continue
+            fid, ts = hdr.frame_id, hdr.timestamp_us
+            copy()
+            if hdr.seq == s1 and hdr.frame_id == fid:
+                return fid, ts
+            torn += 1
+            if torn > retries:
+                raise TornFrameError(f"torn {torn} times in a row (seq={s1})")
+
+    # ---- ROI・間引き（roi.py）----
+    def read_regions(self, plan, retries=4, timeout=0.5):
+        """RegionPlan の ROI / 間引きだけを seqlock 付きで読む -> (frame_id, timestamp_us, 出力)
+
+        出力は plan が持つ配列（ROI 1 つなら配列、複数ならリスト）。次の読み出しで上書きされる。
+        """
+        if plan.geometry != self.geometry:
+            raise ValueError(f"plan is for {plan.geometry}, segment is {self.geometry}")
+        plan.bind(self._buf, self._pix)
+        fid, ts = self._consistent(plan.gather, retries, timeout)
+        return fid, ts, plan.finish()
+
+    def _plan(self, rois, step, mode):
+        from .roi import RegionPlan
+        key = (rois if rois is None or isinstance(rois[0], (int, np.integer)) else tuple(map(tuple, rois)),
+               step, mode, self.geometry)
+        plan = self._plans.get(key)
+        if plan is None:
+            if len(self._plans) >= 8:
+                self._plans.clear()
+            plan = self._plans[key] = RegionPlan.from_header(self.header, rois, step, mode)
+        return plan
+
+    def read_roi(self, rois, step=1, mode="skip"):
+        """ROI（(x, y, w, h) か、そのリスト）を読む -> (frame_id, timestamp_us, 配列 or リスト)
+
+        座標は画像の向き（下から上のバッファでも上から下）。出力は次の同じ呼び出しで上書きされる。
+        """
+        return self.read_regions(self._plan(tuple(rois) if isinstance(rois[0], (int, np.integer)) else rois,
+                                            step, mode))
+
+    def read_decimated(self, step, mode="skip"):
+        """全体を 1/step に（skip: step 画素おき / bin: step x step の平均）-> (frame_id, timestamp_us, 配列)"""
+        return self.read_regions(self._plan(None, step, mode))
+
+    def wait_for_frame(self, after_id, timeout=None):
+        """frame_id > after_id になるまで待って新しい frame_id を返す。timeout なら None"""
+        if self._waiter is None:
+            # ヘッダは self 経由で読む（このフレームのローカルに残すと、例外の traceback が close() を妨げる）
+            addr = C.addressof(self.header) + ShmHeader.seq.offset
+            self._waiter = FrameWaiter(lambda: self.header.frame_id, lambda: self.header.seq,
+                                       consumer_signal(self.name, addr))
+        return self._waiter.wait(after_id, timeout)
+
+    def grab(self, after=None, timeout=1.0, out=None, retries=4):
+        """after（time.monotonic() の秒。既定は呼んだ時点）より後に撮れた最初のフレーム -> Grab。timeout なら None
+
+        書き手の timestamp_us（キャプチャ完了の時刻）を読み手の時計に写して after と比べる。今のフレームが
+        after より前なら次の確定を wait_for_frame() で待ち、後のものだけを seqlock 付きで out へ 1 回コピーする
+        （後のものが来るまではコピーしない。out を渡せば確保もしない）。書き込み中・破れたら期限まで読み直す。
+        FLAG_HIRES_TS の無い旧ブリッジでは timestamp_us の分解能（10〜16 ms）だけ判定が粗くなる。
+        """
+        t0 = time.monotonic()
+        if after is None:
+            after = t0
+        hdr = self.header
+        # after を書き手の時計へ（now_us と monotonic は同じ瞬間で差を取る）
+        limit = now_us() - int((t0 - after) * 1e6) - self._clockmap().offset_us
+        deadline = t0 + timeout
+        view = self.pixels()
+        if out is None:
+            out = np.empty(view.shape, np.uint8)
+        before = None                                  # after より前と分かっている最後の frame_id
+        while True:
+            fid = hdr.frame_id
+            if fid and hdr.timestamp_us > limit:
+                try:
+                    fid, ts = self._consistent(lambda: np.copyto(out, view), retries,
+                                               max(deadline - time.monotonic(), 0.0))
+                except TornFrameError:             # 期限まで書き込み中だった / 破れ続けた
+                    if time.monotonic() >= deadline:
+                        return None
+                    continue
+                if ts > limit:
+                    t1 = time.monotonic()
+                    skipped = fid - before - 1 if before is not None else 0
+                    return Grab(fid, ts, out, t1 - after, t1 - t0, skipped)
+            else:
+                before = fid
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.wait_for_frame(fid, remaining) is None:
+                return None
+
+    def close(self):
+        if self._waiter is not None:
+            self._waiter.close()
+            self._waiter = None
+        # ビューが残っていると mmap.close() が BufferError になるので先に手放す
+        self._view = None
+        self._geom = None
+        for plan in self._plans.values():
+            plan.release()
+        self._plans = {}
+        self.header = None
+        buf, self._buf = self._buf, None
+        if buf is not None and hasattr(buf, "close"):
+            buf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(name=SHM_NAME_DEFAULT, timeout=0.0):
+    """名前付きの CBRG セグメントを 1 回だけマップして検証し、FrameReader を返す
+
+    大きさの推測や開き直しはしない。使えなければ理由つきの AttachError（RuntimeError）。
+    timeout 秒までは待てば直るもの（まだ無い・ヘッダ公開前・大きさを合わせている途中）だけ待ち直す
+    （既定 0 = すぐ失敗）。posix / file はファイルの大きさで 1 回マップする。Windows の名前付き
+    マッピングは大きさを mmap から聞けないので、64 バイトのヘッダを読んでから segment_size でマップする。
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.001
+    while True:
+        try:
+            return _attach(name)
+        except AttachError as e:
+            if not e.retry or time.monotonic() + delay > deadline:
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, 0.01)
+
+
+def _attach(name):
+    kind, _ = resolve(name)
+    if not segment_exists(name):
+        raise AttachError(f"shared memory {name!r} does not exist (producer not running?)", retry=True)
+    try:
+        if kind == "win":
+            m = open_segment(name, HDR_SIZE_V2)
+            try:
+                hdr, layout = read_layout(m)
+            finally:
+                m.close()
+            check_layout(name, hdr, layout, layout.segment_size)
+            m = open_segment(name, layout.segment_size)
+        else:
+            m = open_segment(name)
+    except FileNotFoundError:
+        raise AttachError(f"shared memory {name!r} does not exist (producer not running?)", retry=True) from None
+    except ValueError:                             # 大きさ 0 のファイル（作った直後）
+        raise AttachError(f"shared memory {name!r} is empty (producer still sizing it)", retry=True) from None
+    try:
+        if len(m) < HDR_SIZE:
+            raise AttachError(f"shared memory {name!r} is {len(m)} bytes, smaller than the header", retry=True)
+        hdr, layout = read_layout(m)
+        check_layout(name, hdr, layout, len(m))
+        return FrameReader(m, name=signal_name(name))
+    except BaseException:
+        m.close()
+        raise
+
+
+def open_shm(name=SHM_NAME_DEFAULT):
+    """名前付きの共有メモリ（transport.py の win/posix/file）を開いて FrameReader を返す（attach と同じ）"""
+    return attach(name)
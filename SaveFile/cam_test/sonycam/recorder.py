@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""フルレートの生録画（事前確保した固定スロットのコンテナファイル 'CBRV'）
+
+    with Recorder.create("run1.cbrv", reader.header, capacity=2000) as rec:
+        while rec.record(reader, timeout=1.0) is not False: ...
+
+    rec = Recording("run1.cbrv")           # np.memmap で開く（読み込みはアクセスした分だけ）
+    img = rec[123]                         # i 番目のフレーム（コピーなしのビュー）
+    img = rec.at_time(ts_us)               # timestamp_us 以前で最も新しいフレーム
+
+レイアウト（little-endian, pack 1）:
+    [FileHeader 80B][pad → 4096][IndexEntry 24B x capacity][pad → 4096][slot 0][slot 1]...
+    slot i のピクセルは data_offset + i * slot_pitch から stride * height バイト（共有メモリと同じ並び）
+
+書き込みは共有メモリのピクセル領域をそのまま 1 回の write() で積む（コピーなし・4096 境界の連続書き込み）。
+クラッシュ耐性: 索引（frame_id, timestamp_us, offset）はピクセルを書き終えた後に入れるので、
+索引にあるフレームは必ず全部書けている。count は close() と flush_every 枚ごとにしか更新しないが、
+開く側が count 以降の索引も offset != 0 の間たどるので、失うのは書きかけの最後の 1 枚だけ。
+sync=True なら close/flush で fsync する（OS ごと落ちる場合に備える）。
+"""
+import ctypes as C
+import mmap
+import os
+import time
+
+import numpy as np
+
+from .header import channels
+
+REC_MAGIC = 0x56524243               # 'CBRV'
+REC_VERSION = 1
+PAGE = 4096
+
+
+class FileHeader(C.LittleEndianStructure):
+    _pack_ = 1
+    _fields_ = [
+        ("magic", C.c_uint32),
+        ("version", C.c_uint32),
+        ("width", C.c_uint32),
+        ("height", C.c_uint32),
+        ("bpp", C.c_uint32),
+        ("stride", C.c_uint32),
+        ("flags", C.c_uint32),         # 録画元の header.FLAG_* / CFA 並びをそのまま
+        ("closed", C.c_uint32),        # close() まで済んだら 1
+        ("capacity", C.c_uint64),      # スロット数
+        ("slot_pitch", C.c_uint64),
+        ("index_offset", C.c_uint64),
+        ("data_offset", C.c_uint64),
+        ("count", C.c_uint64),         # 確定済みフレーム数（最後の更新時点。実際はこれ以上のことがある）
+        ("reserved", C.c_uint64),
+    ]
+
+
+class IndexEntry(C.LittleEndianStructure):
+    _pack_ = 1
+    _fields_ = [
+        ("frame_id", C.c_uint64),
+        ("timestamp_us", C.c_uint64),
+        ("offset", C.c_uint64),        # ピクセルのファイル内オフセット（0 = 未書き込み）
+    ]
+
+
+FILE_HDR_SIZE = C.sizeof(FileHeader)
+INDEX_DTYPE = np.dtype([("frame_id", "<u8"), ("timestamp_us", "<u8"), ("offset", "<u8")])
+assert FILE_HDR_SIZE == 80 and C.sizeof(IndexEntry) == INDEX_DTYPE.itemsize == 24
+
+
+def _align(n, a=PAGE):
+    return (n + a - 1) // a * a
+
+
+def container_layout(stride, h, capacity):
+    """-> (slot_pitch, index_offset, data_offset, 全体のバイト数)"""
+    pitch = _align(stride * h)
+    index_offset = PAGE
+    data_offset = _align(index_offset + 24 * capacity)
+    return pitch, index_offset, data_offset, data_offset + pitch * capacity
+
+
+def _preallocate(fd, size):
+    os.ftruncate(fd, size)
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)      # 実ブロックを先に確保（途中で容量不足にならない）
+        except OSError:
+            pass
+
+
+class Recorder:
+    """固定スロットのコンテナへフレームを追記する
+
+    ヘッダと索引だけを mmap し、ピクセルは unbuffered のファイルへ順に write() する。
+    満杯になったら record()/append() は False を返す（上書きはしない）。
+    """
+
+    def __init__(self, path, w, h, bpp, capacity, stride=None, flags=0,
+                 flush_every=64, sync=False):
+        c = channels(bpp)
+        stride = stride or w * c
+        pitch, index_offset, data_offset, total = container_layout(stride, h, capacity)
+        self.path = str(path)
+        self.sync = sync
+        self.flush_every = flush_every
+        self._f = open(self.path, "w+b", buffering=0)
+        try:
+            _preallocate(self._f.fileno(), total)
+            self._meta = mmap.mmap(self._f.fileno(), data_offset)
+        except BaseException:
+            self._f.close()
+            raise
+        self.header = hdr = FileHeader.from_buffer(self._meta)
+        self.index = (IndexEntry * capacity).from_buffer(self._meta, index_offset)
+        hdr.version = REC_VERSION
+        hdr.width, hdr.height, hdr.bpp, hdr.stride, hdr.flags = w, h, bpp, stride, flags
+        hdr.capacity, hdr.slot_pitch = capacity, pitch
+        hdr.index_offset, hdr.data_offset = index_offset, data_offset
+        hdr.count = hdr.closed = 0
+        hdr.magic = REC_MAGIC
+        self.frame_bytes = stride * h
+        self.count = 0
+        self.last_id = 0
+        self.torn = 0                  # 書いている間に上書きされて捨てた回数
+        self.skipped = 0               # 録画側が遅れて取り逃した frame_id の数
+        self.bytes_written = 0
+        self.write_s = 0.0
+
+    @classmethod
+    def create(cls, path, src_header, capacity, **kw):
+        """ShmHeader / RingHeader と同じ形式・向き・CFA で作る"""
+        h = src_header
+        return cls(path, h.width, h.height, h.bpp, capacity, h.stride, h.flags, **kw)
+
+    @property
+    def full(self):
+        return self.count >= self.header.capacity
+
+    def _commit(self, frame_id, timestamp_us, offset):
+        e = self.index[self.count]
+        e.frame_id, e.timestamp_us = frame_id, timestamp_us
+        e.offset = offset              # offset を最後に書く（これで確定）
+        self.count += 1
+        if self.flush_every and self.count % self.flush_every == 0:
+            self.flush()
+
+    def append(self, data, frame_id=0, timestamp_us=0):
+        """stride*height バイトのバッファ（bytes/memoryview/連続 ndarray）を 1 枚追記する"""
+        if self.full:
+            return False
+        mv = memoryview(data).cast("B")
+        if mv.nbytes != self.frame_bytes:
+            raise ValueError(f"frame is {mv.nbytes} bytes, expected {self.frame_bytes}")
+        off = self.header.data_offset + self.count * self.header.slot_pitch
+        t0 = time.perf_counter()
+        self._f.seek(off)
+        self._write_all(mv)
+        self.write_s += time.perf_counter() - t0
+        self.bytes_written += mv.nbytes
+        self._commit(frame_id, timestamp_us, off)
+        return True
+
+    def _write_all(self, mv):
+        while mv:
+            n = self._f.write(mv)
+            mv = mv[n:]
+
+    def record(self, reader, timeout=None, retries=2):
+        """reader（FrameReader）の次の新着フレームを共有メモリから直接書く
+
+        戻り値: 書いた frame_id / 新着なし（timeout）か retries 回続けて上書きされたら None /
+        満杯で False。書いている間に上書きされたら（seqlock 不一致）同じスロットに書き直す。
+        """
+        if self.full:
+            return False
+        fid = reader.wait_for_frame(self.last_id, timeout)
+        if fid is None:
+            return None
+        hdr = reader.header
+        off = self.header.data_offset + self.count * self.header.slot_pitch
+        deadline = time.monotonic() + 0.5
+        with reader.raw_view() as mv:
+            for _ in range(retries + 1):
+                s1 = hdr.seq
+                while s1 & 1:                  # 書き込み中（1 フレーム分のコピー時間）は待つ
+                    if time.monotonic() > deadline:
+                        return None
+                    time.sleep(0)
+                    s1 = hdr.seq
+                fid, ts = hdr.frame_id, hdr.timestamp_us
+                t0 = time.perf_counter()
+                self._f.seek(off)
+                self._write_all(mv)
+                self.write_s += time.perf_counter() - t0
+                if hdr.seq == s1 and hdr.frame_id == fid:
+                    break
+                self.torn += 1
+            else:
+                return None
+        if self.last_id and fid > self.last_id + 1:
+            self.skipped += fid - self.last_id - 1
+        self.last_id = fid
+        self.bytes_written += self.frame_bytes
+        self._commit(fid, ts, off)
+        return fid
+
+    def flush(self):
+        """count をヘッダへ反映する（sync なら fsync まで）"""
+        self.header.count = self.count
+        if self.sync:
+            self._meta.flush()
+            os.fsync(self._f.fileno())
+
+    def stats(self):
+        mb = self.bytes_written / 1e6
+        return {"frames": self.count, "capacity": self.header.capacity,
+                "skipped": self.skipped, "torn": self.torn, "MB": mb,
+                "write_MBps": mb / self.write_s if self.write_s else 0.0}
+
+    def close(self):
+        if self._f is None:
+            return
+        self.header.count = self.count
+        self.header.closed = 1
+        self._meta.flush()
+        if self.sync:
+            os.fsync(self._f.fileno())
+        self.header = None
+        self.index = None
+        self._meta.close()
+        self._f.close()
+        self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Recording:
+    """録画ファイルの読み手（np.memmap。i 番目・frame_id・時刻で O(1)/O(log n) に引ける）
+
+    rec[i] は読み取り専用のビュー。ファイルを閉じた後も使うならコピーすること。
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        hdr = FileHeader()
+        with open(self.path, "rb") as f:
+            f.readinto(hdr)
+        if hdr.magic != REC_MAGIC:
+            raise ValueError(f"not a CBRV recording: {path} (magic=0x{hdr.magic:08X})")
+        self.header = hdr
+        raw_index = np.memmap(self.path, INDEX_DTYPE, "r", hdr.index_offset, (hdr.capacity,))
+        # count から先も offset が入っている間は確定済み（クラッシュで count が古いまま残った場合）
+        n = min(hdr.count, hdr.capacity)
+        while n < hdr.capacity and raw_index[n]["offset"]:
+            n += 1
+        self.count = n
+        self.index = raw_index[:n]
+        self.frame_ids = self.index["frame_id"]
+        self.timestamps_us = self.index["timestamp_us"]
+        c = channels(hdr.bpp)
+        shape = (n, hdr.height, hdr.width) + (() if c == 1 else (c,))
+        strides = (hdr.slot_pitch, hdr.stride) + ((1,) if c == 1 else (c, 1))
+        self._mm = np.memmap(self.path, np.uint8, "r", hdr.data_offset,
+                             (n * hdr.slot_pitch,)) if n else None
+        self.frames = (np.ndarray(shape, np.uint8, buffer=self._mm, strides=strides)
+                       if n else np.empty(shape, np.uint8))
+
+    @property
+    def closed_cleanly(self):
+        return bool(self.header.closed)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return self.frames[i]
+
+    def find(self, frame_id):
+        """frame_id の位置（無ければ None）"""
+        i = int(np.searchsorted(self.frame_ids, frame_id))
+        return i if i < self.count and self.frame_ids[i] == frame_id else None
+
+    def index_at(self, timestamp_us):
+        """timestamp_us 以前で最も新しいフレームの位置（それより前しか無ければ 0）"""
+        return max(0, int(np.searchsorted(self.timestamps_us, timestamp_us, side="right")) - 1)
+
+    def at_time(self, timestamp_us):
+        return self.frames[self.index_at(timestamp_us)]
+
+    def close(self):
+        self.frames = self.index = self.frame_ids = self.timestamps_us = None
+        self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""N スロットのリングバッファ形式（'CBRR'）
+
+単一スロットの CBRG 形式では、読み手が 1 フレーム周期より長く止まると（PNG 保存や imshow）
+その間のフレームが黙って失われる。リング形式では書き手が N 枚を順に使い回すので、
+読み手は「最新」か「未読の次」を選べ、遅れた分は dropped として数えられる。
+
+レイアウト（little-endian, pack 1。SaveFile.cpp の RingHeader/SlotHeader と一致させる）:
+    [RingHeader 64B][SlotHeader 32B x N][pad → 4096 境界][slot 0][slot 1]...[slot N-1]
+    slot i のピクセルは data_offset + i * slot_pitch から stride * height バイト
+    frame_id f（1 始まり）は slot (f - 1) % N に入る
+
+書き手（スロットごとの seqlock + 全体の write_index）:
+    slot.state を奇数 → ピクセル・frame_id・timestamp_us → slot.state を偶数 → write_index = f
+読み手:
+    write_index で最新 frame_id を知り、slot.state が偶数かつ読み前後で不変、
+    かつ slot.frame_id が期待値の時だけ採用する。
+"""
+import ctypes as C
+from contextlib import contextmanager
+
+import numpy as np
+
+from .header import FLAG_HIRES_TS, SHM_NAME_DEFAULT, aligned_stride, channels, now_us
+from .notify import FrameWaiter, consumer_signal, producer_signal
+from .transport import open_segment, signal_name
+
+RING_MAGIC = 0x52524243              # 'CBRR'
+RING_VERSION = 1
+PAGE = 4096
+
+
+class RingHeader(C.LittleEndianStructure):
+    _pack_ = 1
+    _fields_ = [
+        ("magic", C.c_uint32),
+        ("version", C.c_uint32),
+        ("nslots", C.c_uint32),
+        ("width", C.c_uint32),
+        ("height", C.c_uint32),
+        ("bpp", C.c_uint32),
+        ("stride", C.c_uint32),
+        ("flags", C.c_uint32),         # header.FLAG_*
+        ("slot_pitch", C.c_uint64),    # スロット間のバイト数（4096 境界）
+        ("data_offset", C.c_uint64),   # slot 0 の先頭
+        ("write_index", C.c_uint64),   # 公開済みの最新 frame_id（0 = まだ無し）
+        ("reserved1", C.c_uint64),
+    ]
+
+
+class SlotHeader(C.LittleEndianStructure):
+    _pack_ = 1
+    _fields_ = [
+        ("frame_id", C.c_uint64),
+        ("timestamp_us", C.c_uint64),
+        ("state", C.c_uint32),         # seqlock: 奇数=書き込み中 / 偶数=確定
+        ("reserved0", C.c_uint32),
+        ("reserved1", C.c_uint64),
+    ]
+
+
+RING_HDR_SIZE = C.sizeof(RingHeader)
+SLOT_HDR_SIZE = C.sizeof(SlotHeader)
+assert (RING_HDR_SIZE, SLOT_HDR_SIZE) == (64, 32)
+
+
+def _align(n, a=PAGE):
+    return (n + a - 1) // a * a
+
+
+def ring_layout(w, h, bpp, nslots):
+    """-> (stride, slot_pitch, data_offset, total)"""
+    stride = aligned_stride(w, bpp)
+    pitch = _align(stride * h)
+    data_offset = _align(RING_HDR_SIZE + SLOT_HDR_SIZE * nslots)
+    return stride, pitch, data_offset, data_offset + pitch * nslots
+
+
+def ring_size(w, h, bpp, nslots):
+    return ring_layout(w, h, bpp, nslots)[3]
+
+
+class _RingBase:
+    def __init__(self, buf, offset=0, name=None):
+        self._buf = buf
+        self._offset = offset
+        self.name = name
+        self.header = RingHeader.from_buffer(buf, offset)
+        self.signal = None
+        # 通知ワード = write_index の下位 32bit（little-endian なので先頭 4 バイト）
+        self._word_addr = C.addressof(self.header) + RingHeader.write_index.offset
+
+    def _attach(self):
+        rh, off = self.header, self._offset
+        n = rh.nslots
+        self.slots = (SlotHeader * n).from_buffer(self._buf, off + RING_HDR_SIZE)
+        c = channels(rh.bpp)
+        if c == 1:
+            shape, strides = (rh.height, rh.width), (rh.stride, 1)
+        else:
+            shape, strides = (rh.height, rh.width, c), (rh.stride, c, 1)
+        self._views = [
+            np.ndarray(shape, np.uint8, buffer=self._buf,
+                       offset=off + rh.data_offset + i * rh.slot_pitch, strides=strides)
+            for i in range(n)
+        ]
+
+    @property
+    def nslots(self):
+        return self.header.nslots
+
+    @property
+    def write_index(self):
+        return self.header.write_index
+
+    def slot_of(self, frame_id):
+        return (frame_id - 1) % self.header.nslots
+
+    def close(self):
+        self._waiter = None
+        if self.signal is not None:
+            self.signal.close()
+            self.signal = None
+        self._views = None
+        self.slots = None
+        self.header = None
+        buf, self._buf = self._buf, None
+        if buf is not None and hasattr(buf, "close"):
+            buf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RingWriter(_RingBase):
+    """リングの参照ライタ（スタンドイン用）"""
+
+    def __init__(self, buf, w, h, bpp, nslots, offset=0, name=None, flags=0):
+        if nslots < 2:
+            raise ValueError("nslots must be >= 2")
+        stride, pitch, data_offset, total = ring_layout(w, h, bpp, nslots)
+        if len(buf) - offset < total:
+            raise ValueError(f"buffer too small for ring {w}x{h} {bpp}bpp x{nslots}")
+        super().__init__(buf, offset, name)
+        rh = self.header
+        rh.magic = 0
+        rh.version, rh.nslots = RING_VERSION, nslots
+        rh.width, rh.height, rh.bpp, rh.stride = w, h, bpp, stride
+        rh.flags = flags | FLAG_HIRES_TS
+        rh.slot_pitch, rh.data_offset = pitch, data_offset
+        rh.write_index = 0
+        self._attach()
+        for s in self.slots:
+            s.frame_id = s.timestamp_us = s.state = 0
+        rh.magic = RING_MAGIC          # 最後に magic（読み手は magic で準備完了を知る）
+        self.signal = producer_signal(name, self._word_addr)
+
+    @contextmanager
+    def frame(self, timestamp_us=None):
+        """with ring.frame() as px: ...  — 次のスロットに書いて公開する
+
+        ブロックが例外で抜けたら公開しない: スロットは奇数（読み手は採らない）のまま、
+        write_index も進めない。次の frame() が同じスロットに書き直す。
+        """
+        rh = self.header
+        fid = rh.write_index + 1
+        i = (fid - 1) % rh.nslots
+        sh = self.slots[i]
+        if timestamp_us is None:
+            timestamp_us = now_us()    # キャプチャ完了 = コピー開始の時点（FLAG_HIRES_TS）
+        if self.signal is not None:
+            self.signal.begin()
+        sh.state += 1 - (sh.state & 1)  # 奇数: 書き込み中（前回が例外で抜けて既に奇数ならそのまま）
+        yield self._views[i]           # 例外ならここで抜ける（奇数のまま = 未確定）
+        sh.frame_id = fid
+        sh.timestamp_us = timestamp_us
+        sh.state += 1                  # 偶数: 確定
+        rh.write_index = fid
+        if self.signal is not None:
+            self.signal.publish()
+
+    def publish(self, img, timestamp_us=None):
+        with self.frame(timestamp_us) as px:
+            np.copyto(px, img)
+        return self.header.write_index
+
+
+class RingReader(_RingBase):
+    """リングの読み手。latest() で最新、next() で未読の次（追い越されたら最古へ飛ぶ）"""
+
+    def __init__(self, buf, offset=0, name=None):
+        super().__init__(buf, offset, name)
+        if self.header.magic != RING_MAGIC:
+            raise ValueError(f"ring magic mismatch: got=0x{self.header.magic:08X}")
+        self._attach()
+        self.last_id = 0               # 最後に返した frame_id
+        self.dropped = 0               # next() で読み飛ばした枚数
+        self._waiter = None
+
+    def wait_for_frame(self, after_id=None, timeout=None):
+        """write_index > after_id（既定は最後に返した frame_id）まで待つ。timeout なら None"""
+        if self._waiter is None:
+            # ヘッダは self 経由で読む（ローカルに残すと、例外の traceback が close() を妨げる）
+            word = C.c_uint32.from_address(self._word_addr)
+            self.signal = consumer_signal(self.name, self._word_addr)
+            self._waiter = FrameWaiter(lambda: self.header.write_index, lambda: word.value, self.signal)
+        return self._waiter.wait(self.last_id if after_id is None else after_id, timeout)
+
+    def view(self, frame_id):
+        """frame_id のスロットのビュー（コピーなし。採用前に valid() で確認すること）"""
+        i = self.slot_of(frame_id)
+        return self.slots[i].state, self._views[i]
+
+    def valid(self, frame_id, state):
+        sh = self.slots[self.slot_of(frame_id)]
+        return not (state & 1) and sh.state == state and sh.frame_id == frame_id
+
+    def _read(self, frame_id, out):
+        i = self.slot_of(frame_id)
+        sh = self.slots[i]
+        s1 = sh.state
+        if s1 & 1 or sh.frame_id != frame_id:
+            return None
+        ts = sh.timestamp_us
+        if out is None:
+            out = np.empty(self._views[i].shape, np.uint8)
+        np.copyto(out, self._views[i])
+        if sh.state != s1 or sh.frame_id != frame_id:
+            return None
+        return frame_id, ts, out
+
+    def latest(self, out=None, retries=4):
+        """最新フレームの所有コピー -> (frame_id, timestamp_us, img)。まだ無ければ None"""
+        for _ in range(retries + 1):
+            wi = self.header.write_index
+            if wi == 0:
+                return None
+            r = self._read(wi, out)
+            if r is not None:
+                self.last_id = wi
+                return r
+        return None
+
+    def next(self, out=None):
+        """未読の次フレーム。新着が無ければ None
+
+        書き手に追い越された分は残っている最古のフレームへ飛び、dropped に加える。
+        """
+        while True:
+            wi = self.header.write_index
+            want = self.last_id + 1
+            if want > wi:
+                return None
+            # 最古の 1 枚は今まさに上書き中かもしれないので数えない
+            oldest = max(1, wi - self.header.nslots + 2)
+            if want < oldest:
+                self.dropped += oldest - want
+                want = oldest
+            r = self._read(want, out)
+            if r is not None:
+                self.last_id = want
+                return r
+            self.last_id = want        # 読んでいる間に上書きされた → 落としたものとして進む
+            self.dropped += 1
+
+
+def open_ring(name=SHM_NAME_DEFAULT):
+    """名前付きの共有メモリ（CAM1_RING_SLOTS 付きで起動したブリッジ等）を開く"""
+    m = open_segment(name, RING_HDR_SIZE)
+    try:
+        rh = RingHeader.from_buffer_copy(m)
+    finally:
+        m.close()
+    if rh.magic != RING_MAGIC:
+        raise RuntimeError(f"CBRRヘッダが見つかりません (name={name})")
+    return RingReader(open_segment(name, rh.data_offset + rh.slot_pitch * rh.nslots),
+                      name=signal_name(name))
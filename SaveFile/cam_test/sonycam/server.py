@@ -0,0 +1,582 @@
+# -*- coding: utf-8 -*-
+"""LAN 向けのフレーム配信（MJPEG over HTTP / 生フレーム over TCP / 最新 1 枚）
+
+    with FrameServer(r"Local\\Cam1Mem", port=8080, raw_port=8081, scale=0.5) as srv:
+        srv.serve_forever()
+
+    http://host:8080/stream.mjpg                 MJPEG（ブラウザ / VLC / cv2.VideoCapture で見られる）
+    http://host:8080/snapshot.jpg                最新 1 枚（.png も可）
+    http://host:8080/stats                       エンコード回数・クライアントごとの送信数/間引き数（JSON）
+    クエリ ?scale=0.25&roi=x,y,w,h&q=70 で縮小・切り出し・JPEG 品質をリクエストごとに変えられる
+    （roi はフレームに収まるよう切り詰める。重なりが無ければ 400。fmt は MJPEG が jpg、snapshot が jpg/png だけ）
+    tcp://host:8081                              生フレーム（RawClient。1 行送るごとに 1 枚返る。行にクエリを書ける）
+
+- 取り込みスレッドは生値だけ所有バッファへコピーする（クライアントがいない間は読まない）。
+  変換・縮小・エンコードは最初に欲しがったクライアントのスレッドが 1 回だけ行い、同じフレーム・同じ
+  形式（Variant）の他のクライアントはその結果のバイト列をそのまま送る。クライアント数に比例するのは送信だけ。
+- クライアントごとの送信待ち行列は持たない。送り終えた時点の最新フレームを次に送るので、遅い
+  クライアントは自動的に間引かれる（skipped に数える）。生フレームは要求 1 行につき 1 枚なので
+  ソケットにも溜まらない。MJPEG は押し出し式なので、前の 1 枚がソケットから出ていく（書き込み可能に
+  なる）まで次を取らない。Linux / macOS では TCP_NOTSENT_LOWAT で「未送信がほぼ 0」を書き込み可能の
+  条件にするので、相手が読まずに受信ウィンドウが閉じていれば待ち、その間のフレームは飛ばして最新を送る。
+  相手に溜まるのは受信バッファに入った 1 枚までなので、遅いクライアントの遅延はその読み取り間隔の約 2 倍で止まる。
+  TCP_NOTSENT_LOWAT の無い OS（Windows）では送信バッファを 1 枚分に絞る（SO_SNDBUF）だけになる。
+- 縮小は切り出し後に cv2.INTER_AREA。Bayer 転送（flags に CFA 並び）で scale<=0.5 なら
+  bayer.HalfDemosaic で半分解像度から作るので、フル解像度の demosaic はしない。
+"""
+import collections
+import json
+import socket
+import select
+import socketserver
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from .bayer import HalfDemosaic
+from .convert import Converter, _cv2
+from .header import FLAG_BOTTOM_UP, SHM_NAME_DEFAULT, cfa_pattern
+from .reader import TornFrameError, open_shm
+
+FORMATS = ("jpg", "png", "raw")
+BOUNDARY = "cbrgframe"
+MAX_BUFFERS = 6                      # 生値の所有バッファの上限（使用中なら取り込みを見送る）
+MIN_SNDBUF = 64 * 1024
+NOTSENT_LOWAT = 16 * 1024            # これ以下しか未送信が残っていなければ前の 1 枚は出ていったとみなす
+# Linux は 25、macOS は 0x201（古い Python には定数が無い）
+TCP_NOTSENT_LOWAT = getattr(socket, "TCP_NOTSENT_LOWAT",
+                            {"linux": 25, "darwin": 0x201}.get(sys.platform.rstrip("0123456789")))
+MAX_STAT_VARIANTS = 32               # stats に形式ごとに数える上限（超えた分は "other" にまとめる）
+
+# 生フレームの 1 枚ごとの前置き: magic 'CBRS', 前置きの長さ, frame_id, timestamp_us,
+# 幅, 高さ, チャンネル数（jpg/png は 0）, 続くバイト数
+RAW_MAGIC = 0x53524243
+RAW_HDR = struct.Struct("<IIQQIIII")
+
+Variant = collections.namedtuple("Variant", "fmt scale roi quality")
+
+
+def parse_variant(query, default, formats=FORMATS, size=None):
+    """クエリ文字列（"scale=0.5&roi=0,0,640,480&q=70&fmt=raw"）→ Variant（無い項目は default）
+
+    formats: 受け付ける fmt。size=(幅, 高さ) を渡すと roi をフレーム内に切り詰める（clip_roi）。
+    """
+    q = {k: v[-1] for k, v in parse_qs(query or "").items()}
+    fmt = q.get("fmt", default.fmt).lower().replace("jpeg", "jpg")
+    if fmt not in formats:
+        raise ValueError(f"fmt must be one of {formats}")
+    scale = float(q.get("scale", default.scale))
+    if not 0 < scale <= 1:
+        raise ValueError("scale must be in (0, 1]")
+    roi = default.roi
+    if "roi" in q:
+        roi = tuple(int(v) for v in q["roi"].split(",")) if q["roi"] else None
+        if roi is not None and (len(roi) != 4 or roi[2] <= 0 or roi[3] <= 0):
+            raise ValueError("roi must be x,y,w,h")
+    if roi is not None and size is not None:
+        roi = clip_roi(roi, *size)
+    quality = int(q.get("q", default.quality))
+    return Variant(fmt, scale, roi, max(1, min(100, quality)))
+
+
+def clip_roi(roi, width, height):
+    """(x, y, w, h) をフレーム（width x height）との重なりに切り詰める。重ならなければ ValueError"""
+    x, y, w, h = roi
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(width, x + w), min(height, y + h)
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError(f"roi {x},{y},{w},{h} is outside the {width}x{height} frame")
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def _count(counter, variant):
+    """Variant ごとに数える。クライアントが選べる形式は無数なので MAX_STAT_VARIANTS 個を超えたら None（other）へ"""
+    if variant not in counter and len(counter) >= MAX_STAT_VARIANTS:
+        variant = None
+    counter[variant] += 1
+
+
+class _Entry:
+    """取り込んだ 1 フレーム（生値）と、形式ごとのエンコード結果"""
+
+    __slots__ = ("frame_id", "timestamp_us", "raw", "users", "retired", "cache", "locks")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.frame_id = self.timestamp_us = 0
+        self.users = 0
+        self.retired = False
+        self.cache = {}                            # Variant / 基底画像の鍵 → 結果
+        self.locks = {}
+
+
+class _Client:
+    __slots__ = ("kind", "peer", "variant", "sent", "skipped", "bytes", "last_id", "since")
+
+    def __init__(self, kind, peer, variant):
+        self.kind, self.peer, self.variant = kind, peer, variant
+        self.sent = self.skipped = self.bytes = self.last_id = 0
+        self.since = time.monotonic()
+
+
+class FrameServer:
+    """CBRG の読み手 1 つを HTTP / TCP のクライアントへ配る"""
+
+    def __init__(self, name=SHM_NAME_DEFAULT, host="0.0.0.0", port=8080, raw_port=None,
+                 scale=1.0, roi=None, quality=80, fmt="jpg"):
+        self.name = name
+        self.reader = open_shm(name)
+        hdr = self.reader.header
+        self.conv = Converter.from_header(hdr, "bgr")
+        cfa = cfa_pattern(hdr.flags)
+        self.half = (HalfDemosaic(hdr.width, hdr.height, cfa, hdr.stride, bool(hdr.flags & FLAG_BOTTOM_UP))
+                     if cfa else None)
+        self.size = hdr.width, hdr.height
+        try:
+            self.default = parse_variant("", Variant(fmt, scale, tuple(roi) if roi else None, quality),
+                                         size=self.size)
+        except ValueError:
+            self.reader.close()
+            raise
+        self.latest = None
+        self.frames = self.busy = self.torn = 0
+        self.encodes = collections.Counter()      # Variant → エンコード（変換）回数（上限つき。_count）
+        self.served = collections.Counter()       # Variant → 送信回数（同上）
+        self.clients = set()
+        self._free = []
+        self._nbuf = 0
+        self._half_lock = threading.Lock()        # HalfDemosaic は作業用の配列を持つ
+        self._cv = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self.http = _HTTPServer((host, port), _HTTPHandler, self)
+        self.raw = _RawServer((host, raw_port), _RawHandler, self) if raw_port is not None else None
+
+    @property
+    def address(self):
+        return self.http.server_address
+
+    @property
+    def raw_address(self):
+        return self.raw.server_address if self.raw else None
+
+    # ---- 取り込み ----
+    def _take_buffer(self):
+        """空いている生値バッファ（_cv を握って呼ぶ）。上限まで使用中なら None"""
+        if self._free:
+            return self._free.pop()
+        if self._nbuf >= MAX_BUFFERS:
+            return None
+        self._nbuf += 1
+        return np.empty(self.reader.pixels().shape, np.uint8)
+
+    def _release(self, entry):
+        """最新でなくなり、誰も使っていないフレームのバッファを戻す（_cv を握って呼ぶ）"""
+        if entry.retired and entry.users == 0 and entry.raw is not None:
+            self._free.append(entry.raw)
+            entry.raw = None
+            entry.cache.clear()
+
+    def _capture(self):
+        rd = self.reader
+        last = rd.frame_id
+        while not self._stop.is_set():
+            if not self.clients:
+                time.sleep(0.05)                  # 見ている人がいなければ読まない
+                last = rd.frame_id
+                continue
+            if rd.wait_for_frame(last, timeout=0.2) is None:
+                continue
+            with self._cv:
+                buf = self._take_buffer()
+            if buf is None:
+                self.busy += 1
+                last = rd.frame_id
+                continue
+            try:
+                fid, ts, _ = rd.read_frame(buf)
+            except TornFrameError:
+                with self._cv:
+                    self._free.append(buf)
+                self.torn += 1
+                continue
+            entry = _Entry(buf)
+            entry.frame_id, entry.timestamp_us = fid, ts
+            with self._cv:
+                prev, self.latest = self.latest, entry
+                if prev is not None:
+                    prev.retired = True
+                    self._release(prev)
+                self.frames += 1
+                self._cv.notify_all()
+            last = fid
+
+    def next_frame(self, after_id, timeout=1.0):
+        """after_id より新しい最新フレーム（users +1 済み。done() で返す）/ timeout なら None"""
+        deadline = time.monotonic() + timeout
+        with self._cv:
+            while self.latest is None or self.latest.frame_id <= after_id:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    return None
+                self._cv.wait(remaining)
+            entry = self.latest
+            entry.users += 1
+            return entry
+
+    def done(self, entry):
+        with self._cv:
+            entry.users -= 1
+            self._release(entry)
+
+    def parse(self, query, default=None, formats=FORMATS):
+        """クライアントの要求 → Variant（roi はこのフレームの大きさに切り詰め済み）。不正なら ValueError"""
+        return parse_variant(query, self.default if default is None else default, formats, self.size)
+
+    # ---- 変換・エンコード（フレーム × 形式ごとに 1 回）----
+    def _once(self, entry, key, make):
+        r = entry.cache.get(key)
+        if r is not None:
+            return r
+        with entry.locks.setdefault(key, threading.Lock()):
+            r = entry.cache.get(key)
+            if r is None:
+                r = entry.cache[key] = make()
+        return r
+
+    def _base(self, entry, half):
+        """上から下の BGR 画像（half なら Bayer の 2x2 をまとめた半分解像度）"""
+        if half:
+            def make():
+                with self._half_lock:
+                    return self.half(entry.raw)
+            return self._once(entry, "half", make)
+        return self._once(entry, "full", lambda: self.conv(entry.raw))
+
+    def encode(self, entry, variant):
+        """entry を variant の形式にしたもの（raw は連続配列、jpg/png は bytes 相当の配列）"""
+        def make():
+            with self._cv:
+                _count(self.encodes, variant)
+            cv2 = _cv2()
+            half = self.half is not None and variant.scale <= 0.5
+            img = self._base(entry, half)
+            f = 2 if half else 1                   # 半分解像度の画像上の座標へ
+            if variant.roi:
+                x, y, w, h = variant.roi               # parse() で切り詰め済み
+                img = img[y // f:-(-(y + h) // f), x // f:-(-(x + w) // f)]
+            if not img.size:
+                raise ValueError(f"empty image for {_vkey(variant)}")
+            s = variant.scale * f
+            if s < 1 and img.size:
+                size = (max(1, round(img.shape[1] * s)), max(1, round(img.shape[0] * s)))
+                img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+            if variant.fmt == "raw":
+                return np.ascontiguousarray(img)
+            flags = ([cv2.IMWRITE_JPEG_QUALITY, variant.quality] if variant.fmt == "jpg"
+                     else [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            ok, data = cv2.imencode("." + variant.fmt, img, flags)
+            if not ok:
+                raise RuntimeError(f"imencode failed ({variant.fmt})")
+            return data
+
+        data = self._once(entry, variant, make)
+        with self._cv:
+            _count(self.served, variant)
+        return data
+
+    def stream(self, client, timeout=1.0):
+        """client の形式で新着を 1 枚ずつ返すジェネレータ（送り終えてから次を取るので遅ければ間引く）"""
+        with self._cv:
+            self.clients.add(client)
+        try:
+            while not self._stop.is_set():
+                entry = self.next_frame(client.last_id, timeout)
+                if entry is None:
+                    yield None                     # 新着なし（呼び出し側は接続を保つ）
+                    continue
+                try:
+                    data = self.encode(entry, client.variant)
+                finally:
+                    self.done(entry)
+                if client.last_id and entry.frame_id > client.last_id + 1:
+                    client.skipped += entry.frame_id - client.last_id - 1
+                client.last_id = entry.frame_id
+                yield entry.frame_id, entry.timestamp_us, data
+                client.sent += 1
+                client.bytes += data.nbytes
+        finally:
+            with self._cv:
+                self.clients.discard(client)
+
+    # ---- 実行 ----
+    def start(self):
+        """取り込みと待ち受けを別スレッドで開始する"""
+        if self._threads:
+            return self
+        targets = [self._capture, self.http.serve_forever]
+        if self.raw is not None:
+            targets.append(self.raw.serve_forever)
+        for t in targets:
+            th = threading.Thread(target=t, daemon=True, name=f"sonycam-server-{t.__name__}")
+            th.start()
+            self._threads.append(th)
+        return self
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+
+    def stats(self):
+        with self._cv:
+            now = time.monotonic()
+            return {
+                "frames": self.frames, "busy": self.busy, "torn": self.torn, "buffers": self._nbuf,
+                "encodes": {_vkey(v): n for v, n in self.encodes.items()},
+                "served": {_vkey(v): n for v, n in self.served.items()},
+                "clients": [{"kind": c.kind, "peer": c.peer, "variant": _vkey(c.variant),
+                             "sent": c.sent, "skipped": c.skipped, "bytes": c.bytes,
+                             "fps": c.sent / max(1e-3, now - c.since)} for c in self.clients],
+            }
+
+    def close(self):
+        if self.reader is None:
+            return
+        self._stop.set()
+        with self._cv:
+            self._cv.notify_all()
+        for srv in (self.http, self.raw):
+            if srv is not None:
+                if self._threads:
+                    srv.shutdown()                 # serve_forever が回っていない時に呼ぶと戻らない
+                srv.server_close()
+        for t in self._threads:
+            t.join(1.0)
+        self.latest = None
+        self._free.clear()
+        self.reader.close()
+        self.reader = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _vkey(v):
+    if v is None:
+        return "other"
+    roi = ",".join(map(str, v.roi)) if v.roi else "-"
+    return f"{v.fmt} scale={v.scale:g} roi={roi} q={v.quality}"
+
+
+# ---- HTTP ----
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, handler, app):
+        self.app = app
+        super().__init__(addr, handler)
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        app = self.server.app
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/") or "/"
+        try:
+            if path == "/stats":
+                return self._send(200, "application/json", json.dumps(app.stats()).encode())
+            if path in ("/", "/stream.mjpg"):
+                v = app.parse(url.query, app.default._replace(fmt="jpg"), ("jpg",))
+                return self._mjpeg(app, v)
+            if path in ("/snapshot.jpg", "/snapshot.png"):
+                v = app.parse(url.query, app.default._replace(fmt=path.rsplit(".", 1)[1]), ("jpg", "png"))
+                return self._snapshot(app, v)
+        except ValueError as e:
+            return self._send(400, "text/plain", str(e).encode())
+        self._send(404, "text/plain", b"not found")
+
+    def _send(self, code, ctype, body):
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _snapshot(self, app, v):
+        # 誰も見ていない間は取り込みが止まっているので、共有メモリの今のフレーム以降を待つ
+        client = _Client("snapshot", "%s:%d" % self.client_address[:2], v)
+        with app._cv:
+            app.clients.add(client)
+        try:
+            entry = app.next_frame(app.reader.frame_id - 1, timeout=2.0)
+        finally:
+            with app._cv:
+                app.clients.discard(client)
+        if entry is None:
+            return self._send(503, "text/plain", b"no frame yet")
+        try:
+            data = app.encode(entry, v)
+        finally:
+            app.done(entry)
+        self._send(200, f"image/{'jpeg' if v.fmt == 'jpg' else v.fmt}", data)
+
+    def _mjpeg(self, app, v):
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        sock = self.connection
+        lowat = _set_notsent_lowat(sock)
+        sndbuf = 0
+        client = _Client("mjpeg", "%s:%d" % self.client_address[:2], v)
+        frames = app.stream(client)
+        try:
+            for item in frames:
+                if item is None:
+                    continue
+                fid, ts, data = item
+                if not lowat and (data.nbytes > sndbuf or data.nbytes < sndbuf // 4):
+                    sndbuf = max(MIN_SNDBUF, data.nbytes)     # 1 枚分（縮小率やシーンで変わるので追従）
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+                self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {data.nbytes}\r\n"
+                                 f"X-Frame-Id: {fid}\r\nX-Timestamp-Us: {ts}\r\n\r\n".encode())
+                self.wfile.write(memoryview(data).cast("B"))
+                self.wfile.write(b"\r\n")
+                # 出ていくまで次を取らない（その間の新着は stream() が飛ばして skipped に数える）
+                while not app._stop.is_set() and not select.select([], [sock], [], 0.2)[1]:
+                    pass
+        except (ConnectionError, OSError):
+            pass                                   # クライアントが切断
+        finally:
+            frames.close()
+
+
+def _set_notsent_lowat(sock):
+    """未送信が NOTSENT_LOWAT 以下になるまで書き込み可能にしない。使えなければ False"""
+    if TCP_NOTSENT_LOWAT is None:
+        return False
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, TCP_NOTSENT_LOWAT, NOTSENT_LOWAT)
+    except OSError:
+        return False
+    return True
+
+
+# ---- 生フレーム（TCP）----
+class _RawServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, addr, handler, app):
+        self.app = app
+        super().__init__(addr, handler)
+
+
+class _RawHandler(socketserver.StreamRequestHandler):
+    """1 行の要求ごとに最新を 1 枚送る（空行は前と同じ形式）"""
+
+    def handle(self):
+        app = self.server.app
+        default = app.default._replace(fmt="raw")
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = _Client("raw", "%s:%d" % self.client_address[:2], default)
+        frames = app.stream(client)
+        try:
+            while True:
+                line = self.rfile.readline(1024)
+                if not line:
+                    break
+                query = line.decode("ascii", "ignore").strip()
+                if query:
+                    client.variant = app.parse(query, default)   # 不正な要求は接続ごと断る
+                item = next(frames)
+                while item is None:
+                    item = next(frames)
+                fid, ts, data = item
+                if client.variant.fmt == "raw":
+                    h, w = data.shape[:2]
+                    c = data.shape[2] if data.ndim == 3 else 1
+                else:
+                    w = h = c = 0
+                sock.sendall(RAW_HDR.pack(RAW_MAGIC, RAW_HDR.size, fid, ts, w, h, c, data.nbytes))
+                sock.sendall(memoryview(data).cast("B"))
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            frames.close()
+
+
+class RawClient:
+    """FrameServer の生フレームポートのクライアント
+
+    with RawClient("host", 8081, "scale=0.5") as rc:
+        fid, ts, img = rc.recv()        # img は使い回す配列（次の recv で上書き）。jpg/png なら符号化バイト列
+
+    recv() のたびに 1 枚要求するので、処理が遅ければその分だけ新しいフレームが返る（間引きはサーバ側）。
+    """
+
+    def __init__(self, host, port, query="", timeout=5.0):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.query = query
+        self._hdr = bytearray(RAW_HDR.size)
+        self._buf = bytearray()
+
+    def _read_into(self, mv):
+        got = 0
+        while got < len(mv):
+            n = self.sock.recv_into(mv[got:])
+            if not n:
+                raise ConnectionError("frame server closed the connection")
+            got += n
+
+    def recv(self, query=None):
+        """最新を 1 枚要求する -> (frame_id, timestamp_us, 画像 or 符号化バイト列)。query で形式を変えられる"""
+        if query is not None:
+            self.query = query
+        self.sock.sendall((self.query or "").encode("ascii") + b"\n")
+        self.query = ""
+        self._read_into(memoryview(self._hdr))
+        magic, size, fid, ts, w, h, c, n = RAW_HDR.unpack(self._hdr)
+        if magic != RAW_MAGIC or size != RAW_HDR.size:
+            raise RuntimeError(f"bad frame header (magic=0x{magic:08X})")
+        if len(self._buf) < n:
+            self._buf = bytearray(n)
+        mv = memoryview(self._buf)[:n]
+        self._read_into(mv)
+        data = np.frombuffer(self._buf, np.uint8, count=n)
+        if w:
+            data = data.reshape((h, w, c) if c > 1 else (h, w))
+        return fid, ts, data
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""書き手の健康状態（テレメトリ）ページ 'CBRT'
+
+フレームのセグメントとは別の小さな共有セグメント "<名前>_telemetry"（128 バイト）に、
+CAM1.exe / Producer がフレームごとに書く。読み手はピクセルに触れずに数 µs で読める。
+
+    with TelemetryMonitor(r"Local\\Cam1Mem") as mon:
+        t = mon.read()                 # seqlock で検証したコピー（Telemetry）
+        print(t.fps, t.capture_us_avg, t.failed, mon.age_s())
+
+書き方は ShmHeader と同じ seqlock（seq を奇数 → 全フィールド → seq を偶数）。
+fps と *_avg / *_max は直近 1 秒の窓（確定した窓の値。最初の 1 秒は 0）。
+probe は先頭 64KB（SaveFile.cpp の SUM と同じ範囲）の合計と、0 / 255 の割合（ppm）。
+ヘッダだけのツールからも使うので numpy は読み込まない（書き手の probe 計算だけ遅延 import）。
+"""
+import ctypes as C
+import os
+import time
+
+from .header import SHM_NAME_DEFAULT, now_us
+from .transport import create_segment, open_segment, unlink_segment
+
+TELE_MAGIC = 0x54524243              # 'CBRT'
+TELE_VERSION = 1
+TELE_SUFFIX = "_telemetry"
+PROBE_BYTES = 65536
+SAT_FRAME_PPM = 990000               # probe の 99% 以上が 255 なら飽和フレームとして数える
+WINDOW_US = 1000000
+
+
+class Telemetry(C.LittleEndianStructure):
+    """SaveFile.cpp の TelemetryPage と一致させる（pack 1, 128 バイト）"""
+    _pack_ = 1
+    _fields_ = [
+        ("magic", C.c_uint32),
+        ("version", C.c_uint32),
+        ("seq", C.c_uint32),           # seqlock（奇数=書き込み中）
+        ("pid", C.c_uint32),
+        ("updated_us", C.c_uint64),    # 最後に書いた時刻（header.now_us と同じ時計）
+        ("frames", C.c_uint64),        # 成功したキャプチャ数
+        ("failed", C.c_uint64),        # 失敗したキャプチャ数
+        ("zero_frames", C.c_uint64),   # probe が全部 0 だったフレーム数
+        ("saturated_frames", C.c_uint64),
+        ("fps_milli", C.c_uint32),     # キャプチャ fps x 1000（直近の窓）
+        ("capture_us_last", C.c_uint32),
+        ("capture_us_avg", C.c_uint32),
+        ("capture_us_max", C.c_uint32),
+        ("copy_us_last", C.c_uint32),
+        ("copy_us_avg", C.c_uint32),
+        ("copy_us_max", C.c_uint32),
+        ("probe_bytes", C.c_uint32),
+        ("probe_sum", C.c_uint64),     # 最後のフレームの probe の合計（旧 SUM 行）
+        ("zero_ppm", C.c_uint32),      # 最後のフレームの probe 中の 0 の割合 [ppm]
+        ("sat_ppm", C.c_uint32),       # 同 255 の割合 [ppm]
+        ("started_us", C.c_uint64),
+        ("reserved", C.c_uint64 * 2),
+    ]
+
+    @property
+    def fps(self):
+        return self.fps_milli / 1000.0
+
+    @property
+    def probe_mean(self):
+        return self.probe_sum / self.probe_bytes if self.probe_bytes else 0.0
+
+    def to_dict(self):
+        d = {k: getattr(self, k) for k, _ in self._fields_ if k not in ("magic", "version", "seq", "reserved")}
+        d["fps"] = self.fps
+        return d
+
+
+TELE_SIZE = C.sizeof(Telemetry)
+assert TELE_SIZE == 128
+
+
+def telemetry_name(name):
+    """フレームのセグメント名 → テレメトリの名前（win/posix/file とも接尾辞を付けるだけ）"""
+    return name + TELE_SUFFIX
+
+
+class TelemetryWriter:
+    """テレメトリページの書き手（Producer / テスト用。CAM1.exe は SaveFile.cpp が同じことをする）"""
+
+    def __init__(self, name, kind=None):
+        self.name, self.kind = telemetry_name(name), kind
+        self._buf = create_segment(self.name, TELE_SIZE, kind)
+        self.page = t = Telemetry.from_buffer(self._buf)
+        C.memset(C.addressof(t), 0, TELE_SIZE)
+        t.version, t.pid = TELE_VERSION, os.getpid()
+        t.started_us = t.updated_us = now_us()
+        t.magic = TELE_MAGIC
+        self._win_start = t.started_us
+        self._win = [0, 0, 0, 0, 0]    # フレーム数, capture 合計/最大, copy 合計/最大 [µs]
+
+    def record(self, capture_s, copy_s, ok=True, probe=None):
+        """1 フレーム分を反映する。probe は先頭 PROBE_BYTES の uint8 配列（省略時は据え置き）"""
+        t = self.page
+        cap_us, copy_us = int(capture_s * 1e6), int(copy_s * 1e6)
+        if probe is not None:
+            psum, zero_ppm, sat_ppm, nbytes = _probe_stats(probe)
+        now = now_us()
+        t.seq += 1                     # 奇数: 書き込み中
+        if ok:
+            t.frames += 1
+            t.capture_us_last, t.copy_us_last = cap_us, copy_us
+            w = self._win
+            w[0] += 1
+            w[1] += cap_us
+            w[2] = max(w[2], cap_us)
+            w[3] += copy_us
+            w[4] = max(w[4], copy_us)
+            if probe is not None:
+                t.probe_sum, t.zero_ppm, t.sat_ppm, t.probe_bytes = psum, zero_ppm, sat_ppm, nbytes
+                t.zero_frames += zero_ppm == 1000000
+                t.saturated_frames += sat_ppm >= SAT_FRAME_PPM
+        else:
+            t.failed += 1
+        dt = now - self._win_start
+        if dt >= WINDOW_US:
+            w = self._win
+            t.fps_milli = w[0] * 1000000000 // dt
+            if w[0]:
+                t.capture_us_avg, t.capture_us_max = w[1] // w[0], w[2]
+                t.copy_us_avg, t.copy_us_max = w[3] // w[0], w[4]
+            self._win = [0, 0, 0, 0, 0]
+            self._win_start = now
+        t.updated_us = now
+        t.seq += 1                     # 偶数: 確定
+
+    def close(self, unlink=True):
+        if self._buf is None:
+            return
+        self.page = None
+        self._buf.close()
+        self._buf = None
+        if unlink:
+            unlink_segment(self.name, self.kind)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _probe_stats(probe):
+    """-> (合計, 0 の ppm, 255 の ppm, バイト数)"""
+    import numpy as np
+    p = np.asarray(probe, np.uint8).reshape(-1)[:PROBE_BYTES]
+    n = p.size
+    if not n:
+        return 0, 0, 0, 0
+    zeros = n - int(np.count_nonzero(p))
+    sat = int(np.count_nonzero(p == 255))
+    return int(p.sum(dtype=np.uint64)), zeros * 1000000 // n, sat * 1000000 // n, n
+
+
+class TelemetryMonitor:
+    """テレメトリページの読み手（ピクセルには触れない）"""
+
+    def __init__(self, name=SHM_NAME_DEFAULT, kind=None):
+        self.name = telemetry_name(name)
+        self._m = open_segment(self.name, TELE_SIZE, kind)
+        self.page = Telemetry.from_buffer(self._m)
+        if self.page.magic != TELE_MAGIC:
+            magic = self.page.magic
+            self.close()
+            raise RuntimeError(f"CBRTテレメトリが見つかりません (name={self.name}, magic=0x{magic:08X})")
+        self._copy = Telemetry()
+
+    def read(self, out=None, timeout=0.1):
+        """seqlock で検証したコピーを返す（out を渡せばそこへ。確保なし）"""
+        out = out if out is not None else self._copy
+        t = self.page
+        src, dst = C.addressof(t), C.addressof(out)
+        deadline = None
+        while True:
+            s1 = t.seq
+            if not s1 & 1:
+                C.memmove(dst, src, TELE_SIZE)
+                if t.seq == s1:
+                    return out
+            if deadline is None:
+                deadline = time.monotonic() + timeout
+            elif time.monotonic() > deadline:
+                raise RuntimeError(f"telemetry writer busy for {timeout}s (seq={s1})")
+            time.sleep(0)
+
+    def age_s(self):
+        """最後に書かれてからの秒数（書き手が止まっていないかの目安。同じマシン前提）"""
+        return max(0, now_us() - self.page.updated_us) / 1e6
+
+    def alive(self, max_age_s=2.0):
+        if os.name != "nt":
+            try:
+                os.kill(self.page.pid, 0)
+            except ProcessLookupError:
+                return False
+            except OSError:
+                pass
+        return self.age_s() <= max_age_s
+
+    def close(self):
+        self.page = None
+        if self._m is not None:
+            self._m.close()
+            self._m = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
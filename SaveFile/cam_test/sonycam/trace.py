@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""フレームごとの段階時刻のトレース（遅延・取りこぼし・ジッタ）
+
+    tr = FrameTracer(reader.header.flags, path="trace.csv")
+    while ...:
+        fid = reader.wait_for_frame(last_id, 1.0)
+        tr.observe()                               # 新着に気づいた
+        fid, ts, img = reader.read_frame(out)
+        tr.frame(fid, ts)                          # コピー完了（copied）
+        bgr = conv(img)
+        tr.mark("converted")
+        ...
+        tr.deliver()                               # 使い終わった / 渡した
+        last_id = fid
+    print(tr.stats())
+
+段階は STAGES の順（produced はヘッダの timestamp_us を読み手の時計に写したもの）。
+打たなかった段階は飛ばし、隣り合う段階の間隔ごとに対数ヒストグラムを取る。
+時計は time.perf_counter_ns()（= header.now_us()）。壁時計へは to_wall_us() で写す。
+path を渡すと 1 フレーム 1 行の CSV（.json なら chrome://tracing / Perfetto の Trace Event 形式）を書く。
+"""
+import math
+import time
+
+from .header import FLAG_HIRES_TS, now_us
+
+STAGES = ("produced", "observed", "copied", "converted", "delivered")
+_INDEX = {s: i for i, s in enumerate(STAGES)}
+
+
+class Histogram:
+    """µs 値の対数ヒストグラム（1 オクターブ 8 分割 → 分位の誤差は約 9% 以内。確保なし）"""
+
+    SUB = 8
+    BUCKETS = 8 * 28                   # 〜2^28 µs（約 4.5 分）まで。超えた分は最後のバケツ
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, us):
+        us = max(0, int(us))
+        i = 0 if us < 1 else min(self.BUCKETS - 1, int(math.log2(us) * self.SUB) + 1)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+
+    def percentile(self, p):
+        """p（0..1）分位の近似値 [µs]（バケツの上端。最大値は超えない）"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(self.count * p))
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank:
+                return min(self.max, 0 if i == 0 else 2 ** (i / self.SUB))
+        return self.max
+
+    def summary(self):
+        """-> {count, mean, p50, p90, p99, max}（ms）"""
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "mean": self.total / self.count / 1e3,
+                **{f"p{int(p * 100)}": self.percentile(p) / 1e3 for p in (0.5, 0.9, 0.99)},
+                "max": self.max / 1e3}
+
+
+class _Running:
+    """平均と標準偏差（Welford）"""
+
+    __slots__ = ("n", "mean", "m2", "max")
+
+    def __init__(self):
+        self.n, self.mean, self.m2, self.max = 0, 0.0, 0.0, 0.0
+
+    def add(self, x):
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+        self.max = max(self.max, x)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+class ClockMap:
+    """書き手の timestamp_us → 読み手の時計（now_us）と壁時計
+
+    FLAG_HIRES_TS があれば同じ時計なのでずれは 0。無ければ（旧ブリッジの GetTickCount64）
+    time.monotonic との差を起動時に測って足す（分解能は 10〜16 ms のまま）。
+    写した produced が読み手の観測時刻より slack 以上未来になったら（別マシンの file: 転送など）
+    その分ずらして合わせ直し、adjustments に数える。
+    """
+
+    def __init__(self, flags=0):
+        self.hires = bool(flags & FLAG_HIRES_TS)
+        self.resolution_us = 1 if self.hires else 16000
+        self.slack_us = 1000 if self.hires else 20000
+        self.offset_us = 0 if self.hires else self._sample(lambda: time.monotonic_ns() // 1000)
+        self.wall_offset_us = -self._sample(lambda: time.time_ns() // 1000)
+        self.adjustments = 0
+
+    @staticmethod
+    def _sample(clock, n=5):
+        """now_us - clock のずれ（前後の now_us の間隔が最も短い 1 回を採る）"""
+        best = None
+        for _ in range(n):
+            a = now_us()
+            c = clock()
+            b = now_us()
+            if best is None or b - a < best[0]:
+                best = (b - a, (a + b) // 2 - c)
+        return best[1]
+
+    def to_local(self, timestamp_us):
+        return timestamp_us + self.offset_us
+
+    def check(self, produced_local, observed):
+        """produced が observed より未来ならずれを合わせ直す -> 補正後の produced"""
+        ahead = produced_local - observed
+        if ahead > self.slack_us:
+            self.offset_us -= ahead
+            self.adjustments += 1
+            return observed
+        return produced_local
+
+    def to_wall_us(self, local_us):
+        """読み手の時計 → UNIX 時刻 [µs]"""
+        return local_us + self.wall_offset_us
+
+
+class FrameTracer:
+    """1 フレームずつ段階時刻を打ち、間隔のヒストグラム・drop・ジッタを集める
+
+    observe() → frame() → mark() … → deliver() で 1 フレーム。observe() は省いてよい
+    （observed が空になり、produced→copied の間隔として数える）。
+    """
+
+    def __init__(self, flags=0, path=None):
+        self.clock = ClockMap(flags)
+        self.frames = 0
+        self.dropped = 0
+        self.last_id = 0
+        self.hist = {}                 # "a->b" / "age" -> Histogram
+        self.period = _Running()       # produced の間隔 [µs]（書き手側のジッタ）
+        self.arrival = _Running()      # observed の間隔 [µs]（読み手側のジッタ）
+        self._t = [None] * len(STAGES)
+        self._fid = None
+        self._last_produced = None
+        self._last_observed = None
+        self._out = None
+        self._json = False
+        if path:
+            self._json = str(path).endswith(".json")
+            self._out = open(path, "w", buffering=1 << 16)
+            if self._json:
+                self._out.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+                self._sep = ""
+            else:
+                self._out.write("frame_id," + ",".join(f"{s}_us" for s in STAGES) + ",wall_us\n")
+
+    def observe(self):
+        """新着に気づいた時点"""
+        self._t[1] = now_us()
+
+    def frame(self, frame_id, timestamp_us, stage="copied"):
+        """フレームの素性（frame_id とヘッダの timestamp_us）を入れ、stage の時刻を打つ"""
+        t = self._t
+        self._fid = frame_id
+        now = now_us()
+        t[0] = self.clock.check(self.clock.to_local(timestamp_us), t[1] if t[1] is not None else now)
+        t[_INDEX[stage]] = now
+
+    def mark(self, stage):
+        self._t[_INDEX[stage]] = now_us()
+
+    def deliver(self):
+        """delivered を打って 1 フレーム分を集計する"""
+        t = self._t
+        t[-1] = now_us()
+        fid = self._fid
+        if fid is None:
+            raise RuntimeError("deliver() before frame()")
+        if self.last_id and fid > self.last_id + 1:
+            self.dropped += fid - self.last_id - 1
+        if fid > self.last_id:
+            self.last_id = fid
+        self.frames += 1
+        prev = None
+        for i, v in enumerate(t):
+            if v is None:
+                continue
+            if prev is not None:
+                self._hist(f"{STAGES[prev]}->{STAGES[i]}").add(v - t[prev])
+            prev = i
+        self._hist("age").add(t[-1] - t[0])
+        if self._last_produced is not None and t[0] > self._last_produced:
+            self.period.add(t[0] - self._last_produced)
+        self._last_produced = t[0]
+        if t[1] is not None:
+            if self._last_observed is not None:
+                self.arrival.add(t[1] - self._last_observed)
+            self._last_observed = t[1]
+        if self._out is not None:
+            self._write(fid, t)
+        self._fid = None
+        for i in range(len(t)):
+            t[i] = None
+
+    def _hist(self, key):
+        h = self.hist.get(key)
+        if h is None:
+            h = self.hist[key] = Histogram()
+        return h
+
+    def _write(self, fid, t):
+        if not self._json:
+            cells = ("" if v is None else str(v) for v in t)
+            self._out.write(f"{fid},{','.join(cells)},{self.clock.to_wall_us(t[-1])}\n")
+            return
+        prev = None
+        for i, v in enumerate(t):
+            if v is None:
+                continue
+            if prev is not None:
+                self._out.write(f'{self._sep}{{"name": "{STAGES[prev]}->{STAGES[i]}", "ph": "X", '
+                                f'"pid": 1, "tid": {i}, "ts": {t[prev]}, "dur": {v - t[prev]}, '
+                                f'"args": {{"frame_id": {fid}}}}}')
+                self._sep = ",\n"
+            prev = i
+
+    def stats(self):
+        """カウンタ・間隔ごとの分位（ms）・ジッタ（ms）"""
+        seen = self.frames + self.dropped
+        s = {"frames": self.frames, "dropped": self.dropped,
+             "drop_rate": self.dropped / seen if seen else 0.0,
+             "hires": self.clock.hires, "clock_adjustments": self.clock.adjustments,
+             "intervals": {k: h.summary() for k, h in self.hist.items()}}
+        for key, r in (("period", self.period), ("arrival", self.arrival)):
+            if r.n:
+                s[key] = {"mean": r.mean / 1e3, "std": r.std / 1e3, "max": r.max / 1e3}
+        return s
+
+    def close(self):
+        if self._out is None:
+            return
+        if self._json:
+            self._out.write("\n]}\n")
+        self._out.close()
+        self._out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""共有メモリの置き場所（トランスポート）を OS から切り離す
+
+    win   : Windows の名前付きマッピング（mmap の tagname。CAM1.exe が作るもの）
+    posix : POSIX 共有メモリ（/dev/shm/<名前>。無い OS では一時フォルダのファイル）
+    file  : 任意パスのファイルを mmap（録画の再生・別マシンとの受け渡し・デバッグ用）
+
+名前に "win:" / "posix:" / "file:" を付ければその方式、付けなければ Windows は win・それ以外は posix。
+Windows の名前空間（"Local\\" / "Global\\"）は posix では外す（r"Local\\Cam1Mem" → /dev/shm/Cam1Mem）。
+ヘッダだけのツールからも使うので numpy は読み込まない。
+"""
+import mmap
+import os
+import tempfile
+
+KINDS = ("win", "posix", "file")
+
+
+def default_kind():
+    return "win" if os.name == "nt" else "posix"
+
+
+def resolve(name, kind=None):
+    """-> (方式, 方式ごとの名前/パス)"""
+    for k in KINDS:
+        if name.startswith(k + ":"):
+            kind, name = k, name[len(k) + 1:]
+            break
+    kind = kind or default_kind()
+    if kind not in KINDS:
+        raise ValueError(f"unknown transport {kind!r} (use {KINDS})")
+    if kind == "posix":
+        base = name.replace("/", "\\").split("\\")[-1]
+        if not base:
+            raise ValueError(f"empty shared memory name: {name!r}")
+        root = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        name = os.path.join(root, base)
+    elif kind == "win" and os.name != "nt":
+        raise OSError("Windows named mappings are only available on Windows "
+                      "(use a posix: or file: name)")
+    return kind, name
+
+
+def _map_path(path, size, create):
+    flags = os.O_RDWR | (os.O_CREAT if create else 0) | getattr(os, "O_BINARY", 0)
+    fd = os.open(path, flags, 0o666)
+    try:
+        if create:
+            os.ftruncate(fd, size)
+        else:
+            actual = os.fstat(fd).st_size
+            if size is None:
+                size = actual
+            elif actual < size:
+                raise RuntimeError(f"segment {path} is {actual} bytes, expected >= {size} "
+                                   "(producer not ready?)")
+        return mmap.mmap(fd, size)
+    finally:
+        os.close(fd)
+
+
+def create_segment(name, size, kind=None):
+    """書き手側: size バイトの共有セグメントを作って（既存なら大きさを合わせて）mmap を返す"""
+    kind, target = resolve(name, kind)
+    if kind == "win":
+        return mmap.mmap(-1, size, target)
+    return _map_path(target, size, create=True)
+
+
+def open_segment(name, size=None, kind=None):
+    """読み手側: 既存のセグメントを開く。size 省略は posix/file なら全体（win では必須）
+
+    無ければ FileNotFoundError（win では OS が空のマッピングを作るので、呼び出し側が magic で判定する）。
+    """
+    kind, target = resolve(name, kind)
+    if kind == "win":
+        if size is None:
+            raise ValueError("size is required for Windows named mappings")
+        return mmap.mmap(-1, size, target)
+    return _map_path(target, size, create=False)
+
+
+def segment_exists(name, kind=None):
+    """セグメントがあるかだけを確かめる（作らない）
+
+    win の mmap(-1, n, tagname) は名前が無ければ空のマッピングを作ってしまい、後から起動したブリッジが
+    その小さいマッピングを掴んで失敗するので、OpenFileMappingW で調べる。
+    """
+    kind, target = resolve(name, kind)
+    if kind != "win":
+        return os.path.exists(target)
+    import ctypes as C
+    from ctypes import wintypes as W
+    k32 = C.WinDLL("kernel32", use_last_error=True)
+    k32.OpenFileMappingW.argtypes = [W.DWORD, W.BOOL, W.LPCWSTR]
+    k32.OpenFileMappingW.restype = W.HANDLE
+    k32.CloseHandle.argtypes = [W.HANDLE]
+    k32.CloseHandle.restype = W.BOOL
+    h = k32.OpenFileMappingW(0x0004, False, target)       # FILE_MAP_READ
+    if not h:
+        return False
+    k32.CloseHandle(h)
+    return True
+
+
+def signal_name(name, kind=None):
+    """notify.py に渡す名前（Windows の名前付きマッピングの時だけ。それ以外は None）"""
+    kind, target = resolve(name, kind)
+    return target if kind == "win" else None
+
+
+def unlink_segment(name, kind=None):
+    """posix/file のセグメントを消す（win は最後のハンドルが閉じた時に OS が消すので何もしない）"""
+    kind, target = resolve(name, kind)
+    if kind != "win":
+        try:
+            os.unlink(target)
+        except FileNotFoundError:
+            pass
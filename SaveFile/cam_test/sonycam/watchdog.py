@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""ブリッジの見張り（フレームの年齢とプロセスの生死。止まった・落ちたら同じ名前で起動し直す）
+
+    with Watchdog(r"Local\\Cam1Mem", stale_after=2.0) as wd:
+        wd.launch()                                    # 起動してセグメントを検証（AttachError なら理由つき）
+        wd.start()                                     # 見張りのスレッド（または wd.check() を自分で回す）
+        ...
+        print(wd.stats())                              # availability / time-to-recover / 再起動回数
+
+    Watchdog(name, argv=["sonycam-produce", "--bridge"])   # スタンドイン
+
+- 年齢は frame_id が最後に進んでからの時間（見張り側の単調時計で測るので、ヘッダの時計の種類に依らない）。
+  stale_after 秒進まなければ「止まった」（cam->Capture で固まった等）、プロセスが終わっていれば「落ちた」。
+  Capture が失敗し続けるブリッジは公開しない（frame_id が止まる）ので同じく止まったとみなす。テレメトリ
+  （telemetry.py）が書かれ続けていて failed を数えていれば、固まったのではなく「失敗し続けている」と区別する。
+- 止まった・落ちたら flags に FLAG_STALE を立て、プロセスを kill して（finalize は固まったブリッジに
+  届かない）、backoff 秒後に同じ名前で起動し直す。起動し直しても最初のフレームが来なければ待ちを倍にして
+  やり直す（上限 max_backoff）。stable 秒続けて動けば待ちを初期値に戻す。
+- 見張りはセグメントを開いたままにするので、起動し直したブリッジは同じマッピング（posix は同じファイル）を
+  引き継ぎ、frame_id の続きから書く（flags の epoch が +1、FLAG_STALE は消える。writer.py / SaveFile.cpp）。
+  読み手は開き直さずに reader.stale / reader.epoch で途切れを知り、wait_for_frame はそのまま続きを返す。
+  前のブリッジがきれいに終わってセグメントを消していた（posix）時だけは見張りも開き直す（読み手も開き直しが要る）。
+- 指標: 停止ごとの Outage（最後のフレーム・検出・復帰の時刻）。time-to-recover は最後のフレームから
+  再開後の最初のフレームまで。availability は見張った時間のうち停止していなかった割合。
+- CBRG（1 枚）形式だけ。リング形式（CAM1_RING_SLOTS）は見張らない。
+"""
+import collections
+import threading
+import time
+
+from .header import FLAG_STALE, AttachError
+from .launcher import EXE_NAME_DEFAULT, clean_line, default_libdir, launch_cam, parse_wh, stop_cam
+from .reader import attach
+from .telemetry import TelemetryMonitor
+from .transport import segment_exists
+
+# kind: "died" / "stalled" / "failing"。時刻は time.monotonic()。recovered は復帰前なら None
+Outage = collections.namedtuple("Outage", "kind last_frame detected recovered attempts epoch")
+
+
+class Watchdog:
+    """ブリッジ 1 本を起動して見張り、止まった・落ちたら起動し直す"""
+
+    def __init__(self, name, libdir=None, exe_name=EXE_NAME_DEFAULT, argv=None, stale_after=2.0,
+                 start_timeout=20.0, backoff=0.5, max_backoff=30.0, stable=10.0, on_event=None):
+        """stale_after: frame_id が進まないまま何秒で止まったとみなすか。start_timeout: 起動から最初の
+        フレームまでの上限。on_event(kind, outage): "stalled" / "failing" / "died" / "recovered" / "retry" で呼ぶ"""
+        self.name = name
+        self.libdir = default_libdir() if libdir is None and argv is None else libdir
+        self.exe_name, self.argv = exe_name, list(argv) if argv else None
+        self.stale_after, self.start_timeout = stale_after, start_timeout
+        self.backoff, self.max_backoff, self.stable = backoff, max_backoff, stable
+        self.on_event = on_event
+        self.proc = None
+        self.reader = None
+        self.lines = collections.deque(maxlen=50)
+        self.serial = ""
+        self.state = "stopped"                     # stopped / running / down / restarting
+        self.outages = []
+        self.restarts = 0
+        self._delay = backoff
+        self._retry_at = 0.0
+        self._launched = 0.0
+        self._last_fid = 0
+        self._last_change = 0.0
+        self._since = None                         # 見張り始め（availability の分母）
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---- 起動・終了 ----
+    def _spawn(self):
+        self.lines.clear()
+        proc = launch_cam(self.libdir, self.name, self.exe_name, self.argv)
+        threading.Thread(target=self._drain, args=(proc,), daemon=True, name=f"sonycam-bridge-{self.name}").start()
+        self._launched = time.monotonic()
+        return proc
+
+    def _drain(self, proc):
+        """ブリッジの stdout を読み続ける（読まないとパイプが詰まる）。WH 行の前の行をシリアル番号とする"""
+        wh = False
+        try:
+            for b in iter(proc.stdout.readline, b""):
+                line = clean_line(b.decode("utf-8", "ignore"))
+                if not line:
+                    continue
+                self.lines.append(line)
+                if parse_wh(line):
+                    wh = True
+                elif not wh and not line.startswith("RESUME"):
+                    self.serial = line
+        except (OSError, ValueError):
+            pass
+
+    def launch(self):
+        """ブリッジを起動し、セグメントを検証して開く（最初の 1 回）。失敗したら AttachError"""
+        with self._lock:
+            self.stop()
+            proc = self._spawn()
+            deadline = time.monotonic() + self.start_timeout
+            while True:
+                try:
+                    self.reader = attach(self.name, timeout=0.1)
+                    break
+                except AttachError as e:
+                    if proc.poll() is not None or not e.retry or time.monotonic() >= deadline:
+                        stop_cam(proc)
+                        last = self.lines[-1] if self.lines else ""
+                        why = "exited" if proc.poll() is not None else "did not publish a usable segment"
+                        raise AttachError(f"bridge for {self.name!r} {why}: {e} (last line: {last!r})") from None
+            self.proc = proc
+            now = time.monotonic()
+            self._last_fid, self._last_change = self.reader.frame_id, now
+            self._since = self._since or now
+            self.state = "running"
+            self._delay = self.backoff
+        return self.reader
+
+    def stop(self):
+        """ブリッジを finalize して閉じる（見張りも止める）"""
+        with self._lock:
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
+            if self.proc is not None:
+                stop_cam(self.proc)
+                self.proc = None
+            if self._since is not None:
+                self._end_outage(time.monotonic(), None)
+            self.state = "stopped"
+
+    @property
+    def alive(self):
+        return self.state in ("running", "down", "restarting") and self.reader is not None
+
+    # ---- 見張り ----
+    def frame_age(self):
+        """frame_id が最後に進んでからの秒数（見張りの観測）"""
+        return time.monotonic() - self._last_change if self._last_change else None
+
+    def check(self):
+        """見張りを 1 回。状態が変わったら "stalled" / "failing" / "died" / "recovered" / "retry"、それ以外は None"""
+        with self._lock:
+            if self.state == "stopped":
+                return None
+            now = time.monotonic()
+            fid = self.reader.frame_id if self.reader is not None else self._last_fid
+            advanced = fid != self._last_fid
+            if advanced:
+                self._last_fid, self._last_change = fid, now
+            if self.state == "running":
+                if self._launched and now - self._launched >= self.stable:
+                    self._delay = self.backoff             # 安定したので待ちを初期値へ
+                dead = self.proc.poll() is not None
+                if dead or now - self._last_change >= self.stale_after:
+                    return self._down("died" if dead else "failing" if self._failing() else "stalled", now)
+                return None
+            if self.state == "restarting":
+                if advanced:
+                    return self._recovered(now)
+                if self.proc.poll() is not None or now - self._launched >= self.start_timeout:
+                    self._kill()
+                    return self._schedule(now)
+                return None
+            if now >= self._retry_at:                      # down: 待ちが明けたので起動し直す
+                return self._restart(now)
+            return None
+
+    def _failing(self):
+        """ループは回っている（テレメトリが新しい）のに失敗したキャプチャしか無い -> True。テレメトリが無ければ False"""
+        try:
+            with TelemetryMonitor(self.name) as mon:
+                return mon.age_s() < self.stale_after and mon.read().failed > 0
+        except (OSError, RuntimeError, ValueError):
+            return False
+
+    def _kill(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.kill()                       # 固まっている（finalize は届かない）
+            try:
+                self.proc.wait(2.0)
+            except Exception:
+                pass
+        self.proc = None
+
+    def _down(self, kind, now):
+        hdr = self.reader.header
+        hdr.flags |= FLAG_STALE                    # 読み手へ（マップしたまま見える）
+        self.outages.append(Outage(kind, self._last_change, now, None, 0, self.reader.epoch))
+        self._kill()
+        self._launched = 0.0
+        return self._schedule(now, kind)
+
+    def _schedule(self, now, kind="retry"):
+        self.state = "down"
+        self._retry_at = now + self._delay
+        self._delay = min(self._delay * 2, self.max_backoff)
+        self._emit(kind)
+        return kind
+
+    def _restart(self, now):
+        o = self.outages[-1]
+        self.outages[-1] = o._replace(attempts=o.attempts + 1)
+        self.restarts += 1
+        if not segment_exists(self.name) and self.reader is not None:
+            # 前のブリッジがセグメントを消して終わった（posix）: 新しいものを開き直す
+            self.reader.close()
+            self.reader = None
+        try:
+            self.proc = self._spawn()
+        except OSError as e:                       # 実行ファイルが無い・すぐ終わってパイプが切れた
+            self.lines.append(f"[watchdog] {e}")
+            return self._schedule(now)
+        if self.reader is None:
+            try:
+                self.reader = attach(self.name, timeout=self.start_timeout)
+                self._last_fid = 0
+            except AttachError as e:
+                self.lines.append(f"[watchdog] {e}")
+                self._kill()
+                return self._schedule(now)
+        self.state = "restarting"
+        return None
+
+    def _recovered(self, now):
+        self._end_outage(now, now)
+        self.state = "running"
+        self._emit("recovered")
+        return "recovered"
+
+    def _end_outage(self, now, recovered):
+        if self.outages and self.outages[-1].recovered is None:
+            o = self.outages[-1]
+            self.outages[-1] = o._replace(recovered=recovered if recovered is not None else now)
+
+    def _emit(self, kind):
+        if self.on_event is not None:
+            try:
+                self.on_event(kind, self.outages[-1] if self.outages else None)
+            except Exception:
+                pass
+
+    # ---- 実行 ----
+    def run(self, seconds=None, stop=None, interval=0.1):
+        """stop が立つか seconds 秒経つまで interval ごとに check()"""
+        t_end = None if seconds is None else time.monotonic() + seconds
+        while not self._stop.is_set() and (stop is None or not stop.is_set()):
+            if t_end is not None and time.monotonic() >= t_end:
+                break
+            self.check()
+            self._stop.wait(interval)
+
+    def start(self, interval=0.1):
+        """run() を別スレッドで回す"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, kwargs={"interval": interval}, daemon=True,
+                                            name=f"sonycam-watchdog-{self.name}")
+            self._thread.start()
+        return self
+
+    def stats(self):
+        """availability（見張った時間のうち停止していなかった割合）と time-to-recover [s]"""
+        with self._lock:
+            now = time.monotonic()
+            total = now - self._since if self._since else 0.0
+            down = sum((o.recovered or now) - o.last_frame for o in self.outages)
+            ttr = sorted(o.recovered - o.last_frame for o in self.outages if o.recovered is not None)
+            detect = sorted(o.detected - o.last_frame for o in self.outages)
+            return {
+                "state": self.state, "pid": self.proc.pid if self.proc else None,
+                "epoch": self.reader.epoch if self.reader is not None else None,
+                "frame_id": self._last_fid, "frame_age": self.frame_age(),
+                "outages": len(self.outages), "restarts": self.restarts,
+                "died": sum(o.kind == "died" for o in self.outages),
+                "stalled": sum(o.kind == "stalled" for o in self.outages),
+                "failing": sum(o.kind == "failing" for o in self.outages),
+                "availability": 1.0 - down / total if total > 0 else 1.0,
+                "ttr_p50": ttr[len(ttr) // 2] if ttr else None, "ttr_max": ttr[-1] if ttr else None,
+                "detect_p50": detect[len(detect) // 2] if detect else None,
+                "backoff": self._delay, "monitored_s": total,
+            }
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(2.0)
+            self._thread = None
+        self.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""CBRG セグメントの参照ライタ（CAM1.exe のスタンドイン / テスト用）
+
+SaveFile.cpp と同じ seqlock 手順で書く:
+    seq を奇数 → ピクセル・frame_id・timestamp_us → seq を偶数
+timestamp_us は FLAG_HIRES_TS の定義（frame() に入った時点の now_us()）。
+ヘッダは既定で版 2（FLAG_EXT_HEADER、ピクセルは 64 バイト目から）。version=1 で旧ブリッジと同じ 44 バイト。
+magic は他を全部書いてから最後に書く（読み手は magic を見てから他を信じる）。
+同じ幾何の CBRG ヘッダが既にあれば（落ちたブリッジの代わり）引き継ぐ: magic はそのまま、frame_id と seq は
+続きから、flags の epoch を +1 して FLAG_STALE を消す。読み手は開き直さずに続きを読める。
+"""
+import ctypes as C
+from contextlib import contextmanager
+
+import numpy as np
+
+from .header import (EPOCH_SHIFT, FLAG_EXT_HEADER, FLAG_HIRES_TS, HDR_SIZE, HDR_SIZE_V2, LAYOUT_VERSION,
+                     MAGIC, ShmHeader, ShmHeaderExt, aligned_stride, cfa_pattern, channels, epoch, now_us,
+                     pixel_format_code, read_layout)
+from .notify import producer_signal
+
+
+def header_size(version=LAYOUT_VERSION):
+    return HDR_SIZE if version == 1 else HDR_SIZE_V2
+
+
+def segment_size(w, h, bpp, version=LAYOUT_VERSION):
+    return header_size(version) + aligned_stride(w, bpp) * h
+
+
+class FrameWriter:
+    """書き込み可能バッファにヘッダを作り、フレームを seqlock 付きで公開する
+
+    確定ごとに notify.py の通知（Linux: seq の futex / Windows: name が要る）を送る。
+    """
+
+    def __init__(self, buf, w, h, bpp, offset=0, name=None, flags=0, version=LAYOUT_VERSION):
+        c = channels(bpp)
+        stride = aligned_stride(w, bpp)
+        hsize = header_size(version)
+        size = len(buf) - offset
+        if size < hsize + stride * h:
+            raise ValueError(f"buffer too small for {w}x{h} {bpp}bpp")
+        self._buf = buf
+        self.header = hdr = ShmHeader.from_buffer(buf, offset)
+        self.resumed = (hdr.magic == MAGIC and (hdr.width, hdr.height, hdr.bpp, hdr.stride) == (w, h, bpp, stride)
+                        and read_layout(buf, offset)[1].header_size == hsize)
+        if self.resumed:                  # 前の書き手の続き。書き込み中（seq 奇数）に落ちたなら奇数のまま次の確定まで
+            ep = (epoch(hdr.flags) + 1) & 0xFFFF
+            hdr.seq += 2
+        else:
+            ep = 0
+            hdr.magic = 0                 # 作り直しの間は読み手に使わせない
+            hdr.seq = 0
+            hdr.width, hdr.height, hdr.bpp, hdr.stride = w, h, bpp, stride
+            hdr.frame_id = 0
+            hdr.timestamp_us = 0
+        fl = flags | FLAG_HIRES_TS | (ep << EPOCH_SHIFT)
+        if version != 1:
+            ext = ShmHeaderExt.from_buffer(buf, offset + HDR_SIZE)
+            ext.version, ext.header_size, ext.segment_size = LAYOUT_VERSION, hsize, size
+            ext.pixel_format = pixel_format_code(bpp, cfa_pattern(flags))
+            fl |= FLAG_EXT_HEADER
+            del ext
+        hdr.flags = fl                    # 1 回で書く（引き継ぎ中も読み手は正しい flags を見る）
+        hdr.magic = MAGIC
+        if c == 1:
+            shape, strides = (h, w), (stride, 1)
+        else:
+            shape, strides = (h, w, c), (stride, c, 1)
+        self._px = np.ndarray(shape, np.uint8, buffer=buf,
+                              offset=offset + hsize, strides=strides)
+        self.signal = producer_signal(name, C.addressof(hdr) + ShmHeader.seq.offset)
+
+    @property
+    def frame_id(self):
+        return self.header.frame_id
+
+    @contextmanager
+    def frame(self, timestamp_us=None):
+        """with writer.frame() as px: px[...] = ...  — ブロックを抜けた時点で公開
+
+        timestamp_us を渡す時は now_us() と同じ時計の値にすること（FLAG_HIRES_TS を立てているため）。
+        ブロックが例外で抜けたら公開しない: seq は奇数のまま、frame_id も進めず通知もしない
+        （読み手は書きかけを採らない。次の frame() がそのまま続きから書く）。
+        """
+        hdr = self.header
+        if timestamp_us is None:
+            timestamp_us = now_us()       # キャプチャ完了 = コピー開始の時点
+        if self.signal is not None:
+            self.signal.begin()
+        hdr.seq += 1 - (hdr.seq & 1)      # 奇数: 書き込み中（引き継いだ直後で既に奇数ならそのまま）
+        yield self._px                    # 例外ならここで抜ける（奇数のまま = 未確定）
+        hdr.frame_id += 1
+        hdr.timestamp_us = timestamp_us
+        hdr.seq += 1                      # 偶数: 確定
+        if self.signal is not None:
+            self.signal.publish()
+
+    def publish(self, img, timestamp_us=None):
+        with self.frame(timestamp_us) as px:
+            np.copyto(px, img)
+        return self.header.frame_id
+
+    def close(self):
+        if self.signal is not None:
+            self.signal.close()
+            self.signal = None
+        self._px = None
+        self.header = None
+        buf, self._buf = self._buf, None
+        if buf is not None and hasattr(buf, "close"):
+            buf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()